@@ -0,0 +1,98 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from waterdip.core.commons.models import TimeGrain, TimeRange
+from waterdip.core.commons.time_ranges import (
+    grain_ceil,
+    grain_floor,
+    normalize_time_range,
+)
+
+MOMENT = datetime(2023, 1, 10, 14, 35, 12, 500000)
+
+
+@pytest.mark.parametrize(
+    "grain, floor, ceil",
+    [
+        (TimeGrain.HOUR, datetime(2023, 1, 10, 14), datetime(2023, 1, 10, 15)),
+        (TimeGrain.DAY, datetime(2023, 1, 10), datetime(2023, 1, 11)),
+    ],
+)
+def test_should_floor_and_ceil_to_grain(grain, floor, ceil):
+    assert grain_floor(MOMENT, grain) == floor
+    assert grain_ceil(MOMENT, grain) == ceil
+    assert grain_ceil(floor, grain) == floor
+
+
+def test_should_snap_time_range_to_whole_hours():
+    time_range = normalize_time_range(
+        start_time=datetime(2023, 1, 3, 9, 20), end_time=MOMENT
+    )
+
+    assert time_range == TimeRange(
+        start_time=datetime(2023, 1, 3, 9),
+        end_time=datetime(2023, 1, 10, 15) - timedelta(milliseconds=1),
+    )
+    assert (
+        normalize_time_range(
+            start_time=time_range.start_time, end_time=time_range.end_time
+        )
+        == time_range
+    )
+
+
+def test_should_snap_end_on_boundary_to_the_end_of_its_bucket():
+    time_range = normalize_time_range(
+        start_time=datetime(2023, 1, 3),
+        end_time=datetime(2023, 1, 10),
+        grain=TimeGrain.DAY,
+    )
+
+    assert time_range.end_time == datetime(2023, 1, 11) - timedelta(milliseconds=1)
+
+
+def test_should_default_to_last_week_at_call_time():
+    time_range = normalize_time_range(grain=TimeGrain.DAY, now=MOMENT)
+
+    assert time_range == TimeRange(
+        start_time=datetime(2023, 1, 3),
+        end_time=datetime(2023, 1, 11) - timedelta(milliseconds=1),
+    )
+
+
+def test_ranges_ending_in_same_bucket_should_be_equal():
+    first = normalize_time_range(now=MOMENT)
+    second = normalize_time_range(now=MOMENT + timedelta(minutes=10))
+
+    assert first == second
+
+
+def test_should_convert_timezone_aware_bounds_to_utc():
+    time_range = normalize_time_range(
+        start_time=datetime(2023, 1, 3, 9, 20, tzinfo=timezone(timedelta(hours=2))),
+        end_time=datetime(2023, 1, 3, 12, 0, tzinfo=timezone.utc),
+    )
+
+    assert time_range.start_time == datetime(2023, 1, 3, 7)
+    assert time_range.start_time.tzinfo is None
+
+
+def test_should_reject_start_after_end():
+    with pytest.raises(ValueError):
+        normalize_time_range(start_time=MOMENT, end_time=datetime(2023, 1, 1))
@@ -15,11 +15,15 @@ import uuid
 from datetime import datetime
 from uuid import UUID
 
+import pytest
+
 from tests.testing_helpers import MongodbBackendTesting, clean_model_data
-from waterdip.core.commons.models import DatasetType, Environment, TimeRange
+from waterdip.core.commons.models import DatasetType, Environment, TimeGrain, TimeRange
 from waterdip.core.metrics.classification_metrics import (
+    ClassificationClassMetrics,
     ClassificationDateHistogramDBMetrics,
 )
+from waterdip.core.metrics.rollups import RowStats
 from waterdip.server.db.models.dataset_rows import (
     BaseClassificationEventRowDB,
     BaseEventRowDB,
@@ -231,7 +235,8 @@ class TestClassificationDateHist:
                 end_time=datetime(year=2022, month=12, day=23),
             )
         )
-        assert result["accuracy"]["23-12-2022"] == 0.33
+        assert result["buckets"] == [datetime(year=2022, month=12, day=23)]
+        assert result["accuracy"] == [0.33]
 
     def test_should_return_classification_metrics_with_time_range(self):
         clf_date_hist = ClassificationDateHistogramDBMetrics(
@@ -245,4 +250,124 @@ class TestClassificationDateHist:
                 end_time=datetime(year=2022, month=12, day=22),
             )
         )
-        assert sorted(list(result["accuracy"].keys())) == ["21-12-2022", "22-12-2022"]
+        assert result["buckets"] == [
+            datetime(year=2022, month=12, day=21),
+            datetime(year=2022, month=12, day=22),
+        ]
+        assert len(result["accuracy"]) == 2
+
+    def test_should_bucket_every_day_touched_by_the_time_range(self):
+        clf_date_hist = ClassificationDateHistogramDBMetrics(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=UUID(TEST_CLASSIFICATION_MODEL_EVENT_DATASET_ID),
+            positive_class="true",
+        )
+        buckets = clf_date_hist._get_date_hist_buckets(
+            time_range=TimeRange(
+                start_time=datetime(year=2022, month=12, day=21, hour=18),
+                end_time=datetime(year=2022, month=12, day=23, hour=6),
+            )
+        )
+        assert buckets == [
+            datetime(year=2022, month=12, day=21),
+            datetime(year=2022, month=12, day=22),
+            datetime(year=2022, month=12, day=23),
+        ]
+
+    def test_should_count_the_same_rows_per_hour_and_per_week(self):
+        time_range = TimeRange(
+            start_time=datetime(year=2022, month=12, day=19),
+            end_time=datetime(year=2022, month=12, day=25, hour=23, minute=59),
+        )
+        metrics = {
+            granularity: ClassificationDateHistogramDBMetrics(
+                collection=database[MONGO_COLLECTION_EVENT_ROWS],
+                dataset_id=UUID(TEST_CLASSIFICATION_MODEL_EVENT_DATASET_ID),
+                positive_class="true",
+                granularity=granularity,
+            )
+            for granularity in (TimeGrain.HOUR, TimeGrain.DAY, TimeGrain.WEEK)
+        }
+        totals = {
+            granularity: [
+                metric._bucket_stats(time_range).get(bucket, RowStats()).rows
+                for bucket in metric._get_date_hist_buckets(time_range)
+            ]
+            for granularity, metric in metrics.items()
+        }
+
+        assert len(totals[TimeGrain.HOUR]) == 7 * 24
+        assert len(totals[TimeGrain.WEEK]) == 1
+        assert sum(totals[TimeGrain.HOUR]) == sum(totals[TimeGrain.DAY]) > 0
+        assert totals[TimeGrain.WEEK] == [sum(totals[TimeGrain.DAY])]
+
+    def test_should_compute_every_metric_from_one_confusion_cell_group(self):
+        clf_date_hist = ClassificationDateHistogramDBMetrics(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=UUID(TEST_CLASSIFICATION_MODEL_EVENT_DATASET_ID),
+            positive_class="true",
+        )
+        time_range = TimeRange(
+            start_time=datetime(year=2022, month=12, day=23),
+            end_time=datetime(year=2022, month=12, day=23),
+        )
+        query = clf_date_hist._aggregation_query(
+            time_filter=clf_date_hist._time_filter_builder(time_range)
+        )
+        result = clf_date_hist.aggregation_result(time_range=time_range)
+
+        assert [list(stage) for stage in query] == [["$match"], ["$group"]]
+        assert round(result["micro_precision"][0], 2) == result["accuracy"][0]
+        assert {"macro_precision", "macro_recall", "macro_f1", "micro_f1"} <= set(
+            result
+        )
+
+
+class TestClassificationClassMetrics:
+    DATASET_ID = uuid.uuid4()
+
+    @classmethod
+    def setup_class(cls):
+        rows = [
+            (["cat", "small"], ["cat", "small"]),
+            (["cat", "large"], ["dog", "large"]),
+            (["dog", "small"], ["dog", "large"]),
+            (["dog", "small"], None),
+        ]
+        database[MONGO_COLLECTION_EVENT_ROWS].insert_many(
+            [
+                {
+                    "row_id": str(uuid.uuid4()),
+                    "dataset_id": str(cls.DATASET_ID),
+                    "prediction_cf": prediction_cf,
+                    "actual_cf": actual_cf,
+                    "created_at": datetime(year=2022, month=12, day=23),
+                }
+                for prediction_cf, actual_cf in rows
+            ]
+        )
+
+    @classmethod
+    def teardown_class(cls):
+        database[MONGO_COLLECTION_EVENT_ROWS].delete_many(
+            {"dataset_id": str(cls.DATASET_ID)}
+        )
+
+    def test_should_report_every_prediction_position(self):
+        result = ClassificationClassMetrics(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+        ).aggregation_result(classes=["bird", "cat", "dog"])
+
+        first, second = result["positions"]
+        first_classes = {c["class_name"]: c for c in first["classes"]}
+        second_classes = {c["class_name"]: c for c in second["classes"]}
+
+        assert first["position"] == 0 and second["position"] == 1
+        assert list(first_classes) == ["bird", "cat", "dog"]
+        assert (first_classes["cat"]["tp"], first_classes["cat"]["fp"]) == (1, 1)
+        assert first_classes["dog"]["recall"] == 0.5
+        assert first_classes["bird"]["support"] == 0
+        assert second_classes["large"]["recall"] == 0.5
+        assert second_classes["small"]["precision"] == 0.5
+        assert first["weighted_recall"] == pytest.approx(2 / 3)
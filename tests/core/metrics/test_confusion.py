@@ -0,0 +1,111 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from collections import Counter
+
+import pytest
+
+from waterdip.core.metrics.confusion import (
+    ClassCounts,
+    averages,
+    class_counts,
+    class_report,
+)
+
+# 3 classes, 10 labelled rows and 2 rows without actuals
+CELLS = Counter(
+    {
+        ("a", "a"): 3,
+        ("a", "b"): 1,
+        ("b", "b"): 2,
+        ("b", "c"): 1,
+        ("c", "c"): 2,
+        ("c", "a"): 1,
+        ("a", None): 2,
+    }
+)
+
+
+def test_should_count_one_vs_rest_per_class():
+    counts = class_counts(CELLS)
+
+    assert counts["a"] == ClassCounts(tp=3, fp=3, fn=1, tn=5)
+    assert counts["b"] == ClassCounts(tp=2, fp=1, fn=1, tn=8)
+    assert counts["c"] == ClassCounts(tp=2, fp=1, fn=1, tn=8)
+    assert counts[None] == ClassCounts(tp=0, fp=0, fn=2, tn=10)
+    for count in counts.values():
+        assert count.tp + count.fp + count.fn + count.tn == sum(CELLS.values())
+
+
+def test_should_average_over_labelled_rows():
+    result = averages(CELLS)
+
+    # labelled rows only: a = 3/4 precision, 3/4 recall; b, c = 2/3 precision/recall
+    assert result["macro_precision"] == pytest.approx((3 / 4 + 2 / 3 + 2 / 3) / 3)
+    assert result["macro_recall"] == pytest.approx((3 / 4 + 2 / 3 + 2 / 3) / 3)
+    # every labelled row is a tp or a fp of exactly one class, micro = accuracy
+    assert result["micro_precision"] == pytest.approx(7 / 10)
+    assert result["micro_recall"] == pytest.approx(7 / 10)
+    assert result["micro_f1"] == pytest.approx(7 / 10)
+
+
+def test_should_not_average_without_labelled_rows():
+    assert averages(Counter({("a", None): 3})) == {
+        "micro_precision": None,
+        "micro_recall": None,
+        "micro_f1": None,
+        "macro_precision": None,
+        "macro_recall": None,
+        "macro_f1": None,
+    }
+
+
+def test_should_derive_ratios_of_class_counts():
+    count = ClassCounts(tp=3, fp=1, fn=2, tn=4)
+
+    assert count.precision == 3 / 4
+    assert count.recall == 3 / 5
+    assert count.specificity == 4 / 5
+    assert count.f1 == pytest.approx(2 * 0.75 * 0.6 / 1.35)
+    assert ClassCounts().precision is None
+
+
+def test_should_report_known_classes_and_weighted_averages():
+    report = class_report(CELLS, classes=["a", "b", "c", "d"])
+
+    by_class = {metrics["class_name"]: metrics for metrics in report["classes"]}
+    assert [metrics["class_name"] for metrics in report["classes"]] == [
+        "a",
+        "b",
+        "c",
+        "d",
+    ]
+    # the rows without actuals are not counted
+    assert by_class["a"]["fp"] == 1 and by_class["a"]["support"] == 4
+    assert by_class["d"] == {
+        "class_name": "d",
+        "support": 0,
+        "tp": 0,
+        "fp": 0,
+        "fn": 0,
+        "tn": 10,
+        "precision": None,
+        "recall": None,
+        "f1": None,
+    }
+    assert report["weighted_recall"] == pytest.approx(
+        (4 * 3 / 4 + 3 * 2 / 3 + 3 * 2 / 3) / 10
+    )
+    assert report["macro_recall"] == pytest.approx((3 / 4 + 2 / 3 + 2 / 3) / 3)
@@ -12,10 +12,14 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import statistics
 import uuid
 from datetime import datetime
+from unittest.mock import MagicMock
 from uuid import UUID
 
+import pytest
+
 from tests.testing_helpers import (
     DATASET_EVENT_ID_V2,
     MODEL_ID,
@@ -27,9 +31,11 @@ from waterdip.core.metrics.data_metrics import (
     CardinalityCategorical,
     CategoricalCountHistogram,
     CountEmptyHistogram,
+    DatasetProfileMetric,
     NumericBasicMetrics,
     NumericCountHistogram,
 )
+from waterdip.core.metrics.streaming import StreamingDatasetProfile, bucket_auto
 from waterdip.server.db.models.dataset_rows import (
     BaseDatasetBatchRowDB,
     BaseEventRowDB,
@@ -43,6 +49,7 @@ from waterdip.server.db.mongodb import (
     MONGO_COLLECTION_EVENT_ROWS,
     MONGO_COLLECTION_MODEL_VERSIONS,
 )
+from waterdip.server.db.repositories.dataset_row_repository import column_list_to_maps
 
 DATASET_BATCH_ID_V2_3 = "1d195bf6-7a1f-4a33-b7b1-37a603aadd33"
 
@@ -270,7 +277,6 @@ class TestHistogramCategoricalFeatures:
         assert max(f4["count"]) == 2
 
     def test_should_apply_date_filter(self):
-
         hist = CategoricalCountHistogram(
             collection=database[MONGO_COLLECTION_EVENT_ROWS],
             dataset_id=UUID(DATASET_EVENT_ID_V2),
@@ -286,7 +292,6 @@ class TestHistogramCategoricalFeatures:
 
 class TestCountEmptyHistogram:
     def test_should_return_null_columns(self):
-
         hist = CountEmptyHistogram(
             collection=database[MONGO_COLLECTION_EVENT_ROWS],
             dataset_id=UUID(DATASET_EVENT_ID_V2),
@@ -356,3 +361,283 @@ class TestNumericCountHistogram:
             numeric_columns=["f3"],
         )
         assert numeric_basic_result["f3"]["bins"] == ["0", "2"]
+
+
+class TestColumnMapMetrics:
+    DATASET_ID = uuid.uuid4()
+    COLUMN_MAP = {
+        "features": {"f3": "NUMERIC", "f4": "CATEGORICAL"},
+        "predictions": {"p2": "CATEGORICAL"},
+    }
+    TIME_RANGE = TimeRange(
+        start_time=datetime(year=2022, month=12, day=18),
+        end_time=datetime(year=2022, month=12, day=23),
+    )
+
+    @classmethod
+    def setup_class(cls):
+        database[MONGO_COLLECTION_EVENT_ROWS].insert_many(
+            documents=[
+                {
+                    "dataset_id": str(cls.DATASET_ID),
+                    "created_at": row["created_at"],
+                    **column_list_to_maps(row["columns"]),
+                }
+                for row in event_rows
+            ]
+        )
+
+    @classmethod
+    def teardown_class(cls):
+        database[MONGO_COLLECTION_EVENT_ROWS].delete_many(
+            filter={"dataset_id": str(cls.DATASET_ID)}
+        )
+
+    def _results(self, metric_class, **kwargs):
+        column_list_metric = metric_class(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=UUID(DATASET_EVENT_ID_V2),
+        )
+        column_map_metric = metric_class(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        )
+        return (
+            column_list_metric.aggregation_result(time_range=self.TIME_RANGE, **kwargs),
+            column_map_metric.aggregation_result(time_range=self.TIME_RANGE, **kwargs),
+        )
+
+    def test_should_match_categorical_histogram_of_column_list(self):
+        column_list_result, column_map_result = self._results(CategoricalCountHistogram)
+
+        assert column_map_result.keys() == column_list_result.keys()
+        for column, hist in column_list_result.items():
+            assert sorted(zip(hist["bins"], hist["count"])) == sorted(
+                zip(
+                    column_map_result[column]["bins"],
+                    column_map_result[column]["count"],
+                )
+            )
+
+    def test_should_match_empty_histogram_of_column_list(self):
+        column_list_result, column_map_result = self._results(CountEmptyHistogram)
+
+        assert column_map_result == column_list_result
+
+    def test_should_match_cardinality_of_column_list(self):
+        column_list_result, column_map_result = self._results(CardinalityCategorical)
+
+        assert column_map_result["f4"]["unique_values"] == 2
+        assert column_map_result["f4"]["top_value"] == "yellow"
+        assert (
+            column_map_result["p2"]["unique_values"]
+            == column_list_result["p2"]["unique_values"]
+        )
+
+    def test_should_match_numeric_basic_metrics_of_column_list(self):
+        column_list_result, column_map_result = self._results(
+            NumericBasicMetrics, std_dev_disable="true"
+        )
+
+        assert column_map_result == column_list_result
+
+    def test_should_not_unwind_rows(self):
+        hist = NumericCountHistogram(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        )
+        query = hist._column_map_aggregation_query(numeric_columns=["f3"])
+
+        assert all("$unwind" not in stage for stage in query)
+        assert query[1]["$facet"]["c0"][1]["$bucketAuto"]["groupBy"] == "$features.f3"
+
+
+class CountingCollection:
+    """Collection wrapper recording the aggregation pipelines"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return self._collection.aggregate(pipeline)
+
+
+class RecordingCollection(CountingCollection):
+    """Collection stub returning empty results for every $facet sub pipeline"""
+
+    def __init__(self):
+        super().__init__(collection=None)
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        if "$facet" not in pipeline[-1]:
+            return iter([])
+        cursor = MagicMock()
+        cursor.next.return_value = {key: [] for key in pipeline[-1]["$facet"]}
+        return cursor
+
+
+class TestDatasetProfileMetric:
+    TIME_RANGE = TimeRange(
+        start_time=datetime(year=2022, month=12, day=18),
+        end_time=datetime(year=2022, month=12, day=23),
+    )
+
+    @classmethod
+    def setup_class(cls):
+        TestColumnMapMetrics.setup_class()
+
+    @classmethod
+    def teardown_class(cls):
+        TestColumnMapMetrics.teardown_class()
+
+    def _metric_args(self, column_map):
+        if column_map is None:
+            return {"dataset_id": UUID(DATASET_EVENT_ID_V2)}
+        return {"dataset_id": TestColumnMapMetrics.DATASET_ID, "column_map": column_map}
+
+    @pytest.mark.parametrize("column_map", [None, TestColumnMapMetrics.COLUMN_MAP])
+    def test_should_match_results_of_individual_metrics_in_two_aggregations(
+        self, column_map
+    ):
+        collection = CountingCollection(database[MONGO_COLLECTION_EVENT_ROWS])
+        profile = DatasetProfileMetric(
+            collection=collection, **self._metric_args(column_map)
+        ).aggregation_result(
+            numeric_columns=[], time_range=self.TIME_RANGE, std_dev_disable="true"
+        )
+
+        # one $facet aggregation and a cursor aggregation of the categorical values
+        assert len(collection.pipelines) == 2
+        assert "$facet" not in collection.pipelines[1][-1]
+        for metric_class, kwargs in [
+            (CategoricalCountHistogram, {}),
+            (CountEmptyHistogram, {}),
+            (CardinalityCategorical, {}),
+            (NumericBasicMetrics, {"std_dev_disable": "true"}),
+        ]:
+            metric = metric_class(
+                collection=database[MONGO_COLLECTION_EVENT_ROWS],
+                **self._metric_args(column_map),
+            )
+            assert profile[metric.metric_name] == metric.aggregation_result(
+                time_range=self.TIME_RANGE, **kwargs
+            )
+        assert profile["numeric_count_hist"] == {}
+
+    @pytest.mark.parametrize(
+        "column_map, group_by",
+        [
+            (None, "$columns.value_numeric"),
+            (TestColumnMapMetrics.COLUMN_MAP, "$features.f3"),
+        ],
+    )
+    def test_should_bucket_numeric_columns_in_the_same_facet(
+        self, column_map, group_by
+    ):
+        """
+        Records the pipeline as MongoMock does not support $bucketAuto
+        """
+        collection = RecordingCollection()
+        profile = DatasetProfileMetric(
+            collection=collection, **self._metric_args(column_map)
+        ).aggregation_result(numeric_columns=["f3"], time_range=self.TIME_RANGE)
+
+        facet = collection.pipelines[0][-1]["$facet"]
+        assert len(collection.pipelines) == 2
+        assert facet["h0"][-1]["$bucketAuto"]["groupBy"] == group_by
+        assert profile["numeric_count_hist"] == {"f3": {"bins": [], "count": []}}
+
+
+def _comparable(profile):
+    """Profile with the value order of the categorical results normalized"""
+    for hist in profile["categorical_count_hist"].values():
+        hist["bins"], hist["count"] = zip(*sorted(zip(hist["bins"], hist["count"])))
+    for cardinality in profile["categorical_cardinality"].values():
+        cardinality["values"].sort(key=lambda x: (-x["count"], x["value"]))
+        cardinality.pop("top_value")
+    return profile
+
+
+class TestStreamingDatasetProfile:
+    @classmethod
+    def setup_class(cls):
+        TestColumnMapMetrics.setup_class()
+
+    @classmethod
+    def teardown_class(cls):
+        TestColumnMapMetrics.teardown_class()
+
+    @pytest.mark.parametrize(
+        "collection, dataset_id, column_map",
+        [
+            (MONGO_COLLECTION_BATCH_ROWS, UUID(DATASET_BATCH_ID_V2_3), None),
+            (MONGO_COLLECTION_EVENT_ROWS, UUID(DATASET_EVENT_ID_V2), None),
+            (
+                MONGO_COLLECTION_EVENT_ROWS,
+                TestColumnMapMetrics.DATASET_ID,
+                TestColumnMapMetrics.COLUMN_MAP,
+            ),
+        ],
+    )
+    def test_should_match_results_of_mongo_aggregation(
+        self, collection, dataset_id, column_map
+    ):
+        kwargs = {
+            "numeric_columns": [],
+            "time_range": TestColumnMapMetrics.TIME_RANGE,
+            "std_dev_disable": "true",
+        }
+        aggregated = DatasetProfileMetric(
+            collection=database[collection],
+            dataset_id=dataset_id,
+            column_map=column_map,
+        ).aggregation_result(**kwargs)
+        streamed = StreamingDatasetProfile(
+            collection=database[collection],
+            dataset_id=dataset_id,
+            column_map=column_map,
+            batch_size=2,
+        ).aggregation_result(**kwargs)
+
+        assert _comparable(streamed) == _comparable(aggregated)
+
+    def test_should_return_numeric_histogram_and_std_dev(self):
+        streamed = StreamingDatasetProfile(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=TestColumnMapMetrics.DATASET_ID,
+            column_map=TestColumnMapMetrics.COLUMN_MAP,
+        ).aggregation_result(numeric_columns=["f3"])
+
+        assert streamed["numeric_count_hist"]["f3"] == {
+            "bins": [0, 2, 30],
+            "count": [1, 1, 1],
+        }
+        assert streamed["numeric_basic"]["f3"]["std_dev"] == round(
+            statistics.pstdev([0, 2, 30]), 2
+        )
+
+
+@pytest.mark.parametrize(
+    "values, buckets, expected",
+    [
+        (
+            list(range(1, 11)),
+            9,
+            [(i, i + 1, 1) for i in range(1, 9)] + [(9, 10, 2)],
+        ),
+        ([1, 1, 1, 2, 3], 2, [(1, 2, 3), (2, 3, 2)]),
+        ([1, 1, 1, 1, 2], 2, [(1, 2, 4), (2, 2, 1)]),
+        ([None, 3, None, 1], 2, [(None, 1, 2), (1, 3, 2)]),
+        ([], 9, []),
+    ],
+)
+def test_bucket_auto_should_bucket_like_mongodb(values, buckets, expected):
+    assert [
+        (bucket["_id"]["min"], bucket["_id"]["max"], bucket["count"])
+        for bucket in bucket_auto(values, buckets)
+    ] == expected
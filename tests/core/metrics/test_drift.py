@@ -0,0 +1,258 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from tests.testing_helpers import MongodbBackendTesting
+from waterdip.core.metrics.data_metrics import CategoricalVocabularyDiff
+from waterdip.core.metrics.drift import (
+    OTHER_CATEGORY,
+    BaselineCache,
+    BaselineDistribution,
+    ColumnDistributionMetric,
+    PSIDriftMetric,
+    population_stability_index,
+)
+from waterdip.core.metrics.profiles import DatasetProfile, profile_stats
+from waterdip.core.metrics.rollups import ColumnStats, raw_daily_stats
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASET_PROFILES,
+)
+from waterdip.server.db.repositories.dataset_row_repository import column_list_to_maps
+from waterdip.server.db.repositories.profile_repository import DatasetProfileRepository
+
+database = MongodbBackendTesting.get_instance().database
+COLUMN_MAP = {
+    "features": {"f1": "NUMERIC", "f2": "CATEGORICAL"},
+    "predictions": {"p1": "CATEGORICAL"},
+}
+COLUMNS = {"f1": "NUMERIC", "f2": "CATEGORICAL", "p1": "CATEGORICAL"}
+
+
+def _stats(data_type, values):
+    stats = ColumnStats(data_type)
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+def _row(f1, f2, p1):
+    return {
+        "created_at": datetime(year=2022, month=12, day=20),
+        "columns": [
+            {
+                "name": "f1",
+                "value_numeric": f1,
+                "data_type": "NUMERIC",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "f2",
+                "value_categorical": f2,
+                "data_type": "CATEGORICAL",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "p1",
+                "value_categorical": p1,
+                "data_type": "CATEGORICAL",
+                "mapping_type": "PREDICTION",
+            },
+        ],
+    }
+
+
+def test_should_not_drift_from_same_distribution():
+    assert population_stability_index([0.2, 0.3, 0.5], [0.2, 0.3, 0.5]) == 0
+
+
+def test_should_bound_psi_of_empty_bins():
+    psi = population_stability_index([1.0, 0.0], [0.5, 0.5])
+
+    assert 0 < psi < 10
+
+
+def test_should_bin_numeric_values_by_baseline_quantiles():
+    distribution = BaselineDistribution.from_stats(
+        _stats("NUMERIC", range(1, 101)), bins=4
+    )
+
+    assert len(distribution.edges) == 3
+    assert distribution.proportions == pytest.approx([0.25] * 4, abs=0.03)
+    assert distribution.psi(_stats("NUMERIC", range(1, 101)))["psi"] == 0
+    assert distribution.psi(_stats("NUMERIC", range(60, 160)))["psi"] > 0.25
+
+
+def test_should_bin_new_categories_together():
+    distribution = BaselineDistribution.from_stats(
+        _stats("CATEGORICAL", ["a", "a", "b", None])
+    )
+
+    assert distribution.bins == ["a", "b", OTHER_CATEGORY]
+    assert distribution.counts(_stats("CATEGORICAL", ["a", "c", "d", None])) == [
+        1,
+        0,
+        2,
+    ]
+
+
+def test_should_not_create_baseline_without_values():
+    assert BaselineDistribution.from_stats(_stats("NUMERIC", [None, None])) is None
+
+
+def test_should_evict_least_recently_used_baseline():
+    cache = BaselineCache(max_size=2)
+    cache.put("a", {})
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {}
+    assert len(cache) == 2
+
+
+class DistributionTestData:
+    COLUMN_MAP = None
+
+    @classmethod
+    def setup_class(cls):
+        cls.DATASET_ID = uuid.uuid4()
+        rows = [
+            _row(
+                None if i % 7 == 0 else float(i % 10),
+                ["red", "yellow", None][i % 3],
+                "true" if i % 2 else "false",
+            )
+            for i in range(30)
+        ]
+        database[MONGO_COLLECTION_BATCH_ROWS].insert_many(
+            [
+                {"dataset_id": str(cls.DATASET_ID), **row}
+                if cls.COLUMN_MAP is None
+                else {
+                    "dataset_id": str(cls.DATASET_ID),
+                    "created_at": row["created_at"],
+                    **column_list_to_maps(row["columns"]),
+                }
+                for row in rows
+            ]
+        )
+
+    @classmethod
+    def teardown_class(cls):
+        for collection in [
+            MONGO_COLLECTION_BATCH_ROWS,
+            MONGO_COLLECTION_DATASET_PROFILES,
+        ]:
+            database[collection].delete_many({"dataset_id": str(cls.DATASET_ID)})
+
+    def test_should_count_distributions_of_all_columns_at_once(self):
+        raw_stats = raw_daily_stats(
+            database[MONGO_COLLECTION_BATCH_ROWS],
+            self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        ).column_totals()
+
+        column_stats = ColumnDistributionMetric(
+            collection=database[MONGO_COLLECTION_BATCH_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        ).aggregation_result(columns=COLUMNS)
+
+        assert column_stats.keys() == COLUMNS.keys()
+        for name, stats in column_stats.items():
+            assert stats.sketch.buckets == raw_stats[name].sketch.buckets
+            assert stats.values == raw_stats[name].values
+
+    def test_should_compute_psi_of_every_baseline_column(self):
+        baseline = {
+            "f1": BaselineDistribution.from_stats(_stats("NUMERIC", range(10))),
+            "f2": BaselineDistribution.from_stats(
+                _stats("CATEGORICAL", ["red", "blue"])
+            ),
+        }
+
+        drift = PSIDriftMetric(
+            collection=database[MONGO_COLLECTION_BATCH_ROWS],
+            dataset_id=self.DATASET_ID,
+            baseline=baseline,
+            column_map=self.COLUMN_MAP,
+        ).aggregation_result()
+
+        assert drift.keys() == {"f1", "f2"}
+        assert drift["f1"]["psi"] < 0.1
+        # half of the values are "yellow", never seen in the baseline
+        assert drift["f2"]["psi"] > 1
+        assert drift["f2"]["actual"] == [0.5, 0.0, 0.5]
+
+    @pytest.mark.parametrize("with_profile", [False, True])
+    def test_should_diff_vocabulary_of_every_column(self, with_profile):
+        profile = None
+        if with_profile:
+            DatasetProfileRepository(
+                mongodb=MongodbBackendTesting.get_instance()
+            ).replace_chunk(
+                dataset_id=self.DATASET_ID,
+                model_id=uuid.uuid4(),
+                model_version_id=uuid.uuid4(),
+                chunk=0,
+                daily_stats=profile_stats(
+                    database[MONGO_COLLECTION_BATCH_ROWS].find(
+                        {"dataset_id": str(self.DATASET_ID)}
+                    ),
+                    self.COLUMN_MAP,
+                ),
+            )
+            profile = DatasetProfile(
+                collection=database[MONGO_COLLECTION_DATASET_PROFILES],
+                dataset_id=self.DATASET_ID,
+                column_map=self.COLUMN_MAP,
+            )
+
+        diff = CategoricalVocabularyDiff(
+            collection=database[MONGO_COLLECTION_BATCH_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+            rollups=profile,
+        ).aggregation_result(
+            vocabulary={"f2": {"red", "blue"}, "p1": {"true", "false"}}
+        )
+
+        assert diff == {
+            "f2": {
+                "new_count": 1,
+                "new_values": ["yellow"],
+                "missing_count": 1,
+                "missing_values": ["blue"],
+            },
+            "p1": {
+                "new_count": 0,
+                "new_values": [],
+                "missing_count": 0,
+                "missing_values": [],
+            },
+        }
+
+
+class TestColumnListDistributions(DistributionTestData):
+    COLUMN_MAP = None
+
+
+class TestColumnMapDistributions(DistributionTestData):
+    COLUMN_MAP = COLUMN_MAP
@@ -0,0 +1,214 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from tests.testing_helpers import MongodbBackendTesting
+from waterdip.core.metrics.data_metrics import (
+    CardinalityCategorical,
+    CategoricalCountHistogram,
+    CountEmptyHistogram,
+    DatasetProfileMetric,
+    NumericBasicMetrics,
+)
+from waterdip.core.metrics.profiles import DatasetProfile, profile_stats
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASET_PROFILES,
+)
+from waterdip.server.db.repositories.dataset_row_repository import column_list_to_maps
+from waterdip.server.db.repositories.profile_repository import DatasetProfileRepository
+
+database = MongodbBackendTesting.get_instance().database
+COLUMN_MAP = {
+    "features": {"f1": "NUMERIC", "f2": "CATEGORICAL"},
+    "predictions": {"p1": "CATEGORICAL"},
+}
+
+
+def _batch_row(created_at, f1, f2, p1):
+    return {
+        "created_at": created_at,
+        "columns": [
+            {
+                "name": "f1",
+                "value_numeric": f1,
+                "data_type": "NUMERIC",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "f2",
+                "value_categorical": f2,
+                "data_type": "CATEGORICAL",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "p1",
+                "value_categorical": p1,
+                "data_type": "CATEGORICAL",
+                "mapping_type": "PREDICTION",
+            },
+        ],
+        "prediction_cf": [p1],
+    }
+
+
+batch_rows = [
+    _batch_row(
+        # the rows of a dataset can span days, the profile ignores them
+        datetime(year=2022, month=12, day=19 + i % 3, hour=i),
+        None if i % 4 == 0 else float(i % 5),
+        [None, "red", "yellow"][i % 3],
+        "true" if i % 2 else "false",
+    )
+    for i in range(15)
+]
+
+
+class ProfileTestData:
+    COLUMN_MAP = None
+
+    @classmethod
+    def setup_class(cls):
+        cls.DATASET_ID = uuid.uuid4()
+        documents = [
+            {"dataset_id": str(cls.DATASET_ID), **row}
+            if cls.COLUMN_MAP is None
+            else {
+                "dataset_id": str(cls.DATASET_ID),
+                **{k: v for k, v in row.items() if k != "columns"},
+                **column_list_to_maps(row["columns"]),
+            }
+            for row in batch_rows
+        ]
+        database[MONGO_COLLECTION_BATCH_ROWS].insert_many(documents=documents)
+
+        # stored in two upload chunks which are merged by the reader
+        repository = DatasetProfileRepository(
+            mongodb=MongodbBackendTesting.get_instance()
+        )
+        for chunk, chunk_documents in enumerate([documents[:6], documents[6:]]):
+            repository.replace_chunk(
+                dataset_id=cls.DATASET_ID,
+                model_id=uuid.uuid4(),
+                model_version_id=uuid.uuid4(),
+                chunk=chunk,
+                daily_stats=profile_stats(chunk_documents, cls.COLUMN_MAP),
+            )
+
+    @classmethod
+    def teardown_class(cls):
+        for collection in [
+            MONGO_COLLECTION_BATCH_ROWS,
+            MONGO_COLLECTION_DATASET_PROFILES,
+        ]:
+            database[collection].delete_many({"dataset_id": str(cls.DATASET_ID)})
+
+    def _profile(self):
+        return DatasetProfile(
+            collection=database[MONGO_COLLECTION_DATASET_PROFILES],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        )
+
+    def _results(self, metric_class, **kwargs):
+        raw_metric = metric_class(
+            collection=database[MONGO_COLLECTION_BATCH_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        )
+        profile_metric = metric_class(
+            collection=database[MONGO_COLLECTION_BATCH_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+            rollups=self._profile(),
+        )
+        return (
+            raw_metric.aggregation_result(**kwargs),
+            profile_metric.aggregation_result(**kwargs),
+        )
+
+    def test_should_store_one_document_per_chunk_and_column(self):
+        documents = database[MONGO_COLLECTION_DATASET_PROFILES].find(
+            {"dataset_id": str(self.DATASET_ID)}
+        )
+
+        assert sorted((d["chunk"], d["column"], d["count"]) for d in documents) == [
+            (chunk, column, count)
+            for chunk, count in [(0, 6), (1, 9)]
+            for column in ["f1", "f2", "p1"]
+        ]
+
+    def test_should_match_categorical_histogram_of_rows(self):
+        raw_result, profile_result = self._results(CategoricalCountHistogram)
+
+        assert raw_result.keys() == profile_result.keys()
+        for column, hist in raw_result.items():
+            assert sorted(zip(hist["bins"], hist["count"])) == sorted(
+                zip(profile_result[column]["bins"], profile_result[column]["count"])
+            )
+
+    def test_should_match_empty_histogram_of_rows(self):
+        raw_result, profile_result = self._results(CountEmptyHistogram)
+
+        assert profile_result == raw_result
+
+    def test_should_match_cardinality_of_rows(self):
+        raw_result, profile_result = self._results(CardinalityCategorical)
+
+        for column, cardinality in raw_result.items():
+            assert (
+                profile_result[column]["unique_values"] == cardinality["unique_values"]
+            )
+
+    def test_should_match_numeric_basic_metrics_of_rows(self):
+        raw_result, profile_result = self._results(
+            NumericBasicMetrics, std_dev_disable="true"
+        )
+
+        assert profile_result == raw_result
+
+    def test_should_serve_dataset_profile_without_rows(self):
+        database[MONGO_COLLECTION_BATCH_ROWS].delete_many(
+            {"dataset_id": str(self.DATASET_ID)}
+        )
+        result = DatasetProfileMetric(
+            collection=database[MONGO_COLLECTION_BATCH_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+            rollups=self._profile(),
+        ).aggregation_result(numeric_columns=["f1"], std_dev_disable="true")
+
+        assert result["numeric_basic"]["f1"]["total"] == 11
+        assert result["count_empty_hist"]["f2"]["empty_count"] == 5
+
+
+class TestColumnListProfile(ProfileTestData):
+    COLUMN_MAP = None
+
+
+class TestColumnMapProfile(ProfileTestData):
+    COLUMN_MAP = COLUMN_MAP
+
+
+def test_should_not_serve_dataset_without_profile():
+    profile = DatasetProfile(
+        collection=database[MONGO_COLLECTION_DATASET_PROFILES],
+        dataset_id=uuid.uuid4(),
+    )
+
+    assert profile.daily_stats() is None
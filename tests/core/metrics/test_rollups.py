@@ -0,0 +1,360 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.testing_helpers import MongodbBackendTesting
+from waterdip.core.commons.models import TimeGrain, TimeRange
+from waterdip.core.metrics.classification_metrics import (
+    ClassificationDateHistogramDBMetrics,
+)
+from waterdip.core.metrics.data_metrics import (
+    CardinalityCategorical,
+    CategoricalCountHistogram,
+    CountEmptyHistogram,
+    NumericBasicMetrics,
+    NumericCountHistogram,
+)
+from waterdip.core.metrics.rollups import (
+    MAX_TRACKED_VALUES,
+    ColumnStats,
+    DailyRollups,
+    DailyStats,
+    escape_key,
+    raw_daily_stats,
+    unescape_key,
+)
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_EVENT_ROLLUPS,
+    MONGO_COLLECTION_EVENT_ROWS,
+)
+from waterdip.server.db.repositories.dataset_row_repository import column_list_to_maps
+from waterdip.server.db.repositories.rollup_repository import EventRollupRepository
+
+database = MongodbBackendTesting.get_instance().database
+COLUMN_MAP = {
+    "features": {"f3": "NUMERIC", "f4": "CATEGORICAL"},
+    "predictions": {"p2": "CATEGORICAL"},
+}
+ROLLUP_FROM = datetime(year=2022, month=12, day=21)
+TIME_RANGE = TimeRange(
+    start_time=datetime(year=2022, month=12, day=20, hour=6),
+    end_time=datetime(year=2022, month=12, day=23, hour=12),
+)
+
+
+def _event_row(created_at, f3, f4, p2, actual):
+    return {
+        "created_at": created_at,
+        "columns": [
+            {
+                "name": "f3",
+                "value_numeric": f3,
+                "data_type": "NUMERIC",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "f4",
+                "value_categorical": f4,
+                "data_type": "CATEGORICAL",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "p2",
+                "value_categorical": p2,
+                "data_type": "CATEGORICAL",
+                "mapping_type": "PREDICTION",
+            },
+        ],
+        "prediction_cf": [p2],
+        "actual_cf": [actual],
+        "is_match": True,
+    }
+
+
+event_rows = [
+    _event_row(
+        datetime(year=2022, month=12, day=19 + i // 4, hour=(i * 5) % 24),
+        None if i % 5 == 0 else (i % 3) * 1.5,
+        [None, "red", "yellow", "a.b$c"][i % 4],
+        "true" if i % 2 else "false",
+        "true" if i % 3 else "false",
+    )
+    for i in range(20)
+]
+
+
+class RollupsTestData:
+    COLUMN_MAP = None
+
+    @classmethod
+    def setup_class(cls):
+        cls.DATASET_ID = uuid.uuid4()
+        documents = [
+            {"dataset_id": str(cls.DATASET_ID), **row}
+            if cls.COLUMN_MAP is None
+            else {
+                "dataset_id": str(cls.DATASET_ID),
+                **{k: v for k, v in row.items() if k != "columns"},
+                **column_list_to_maps(row["columns"]),
+            }
+            for row in event_rows
+        ]
+        database[MONGO_COLLECTION_EVENT_ROWS].insert_many(documents=documents)
+
+        daily_stats = DailyStats(column_map=cls.COLUMN_MAP)
+        for document in documents:
+            daily_stats.add_document(document)
+        EventRollupRepository(
+            mongodb=MongodbBackendTesting.get_instance()
+        ).replace_days(
+            dataset_id=cls.DATASET_ID,
+            model_id=uuid.uuid4(),
+            model_version_id=uuid.uuid4(),
+            daily_stats=daily_stats,
+            first_day=datetime.min,
+            end_day=datetime.max,
+        )
+
+    @classmethod
+    def teardown_class(cls):
+        for collection in [MONGO_COLLECTION_EVENT_ROWS, MONGO_COLLECTION_EVENT_ROLLUPS]:
+            database[collection].delete_many({"dataset_id": str(cls.DATASET_ID)})
+
+    def _rollups(self):
+        return DailyRollups(
+            collection=database[MONGO_COLLECTION_EVENT_ROLLUPS],
+            rows_collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            rollup_from=ROLLUP_FROM,
+            column_map=self.COLUMN_MAP,
+        )
+
+    def _results(self, metric_class, **kwargs):
+        raw_metric = metric_class(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        )
+        rollup_metric = metric_class(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+            rollups=self._rollups(),
+        )
+        return (
+            raw_metric.aggregation_result(time_range=TIME_RANGE, **kwargs),
+            rollup_metric.aggregation_result(time_range=TIME_RANGE, **kwargs),
+        )
+
+    def test_should_compute_raw_daily_stats_of_the_documents(self):
+        raw_stats = raw_daily_stats(
+            database[MONGO_COLLECTION_EVENT_ROWS],
+            self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+        )
+        stored_stats = self._rollups().stored_stats(datetime.min, datetime.max)
+
+        assert raw_stats.rows.keys() == stored_stats.rows.keys()
+        for day, row_stats in raw_stats.rows.items():
+            assert row_stats.to_document() == stored_stats.rows[day].to_document()
+        assert raw_stats.columns.keys() == stored_stats.columns.keys()
+        for key, column_stats in raw_stats.columns.items():
+            assert column_stats.to_document() == stored_stats.columns[key].to_document()
+
+    def test_should_match_categorical_histogram_of_rows(self):
+        raw_result, rollup_result = self._results(CategoricalCountHistogram)
+
+        assert raw_result.keys() == rollup_result.keys()
+        for column, hist in raw_result.items():
+            assert sorted(zip(hist["bins"], hist["count"])) == sorted(
+                zip(rollup_result[column]["bins"], rollup_result[column]["count"])
+            )
+
+    def test_should_match_empty_histogram_of_rows(self):
+        raw_result, rollup_result = self._results(CountEmptyHistogram)
+
+        assert rollup_result == raw_result
+
+    def test_should_match_cardinality_of_rows(self):
+        raw_result, rollup_result = self._results(CardinalityCategorical)
+
+        for column, cardinality in raw_result.items():
+            assert (
+                rollup_result[column]["unique_values"] == cardinality["unique_values"]
+            )
+
+    def test_should_match_numeric_basic_metrics_of_rows(self):
+        raw_result, rollup_result = self._results(
+            NumericBasicMetrics, std_dev_disable="true"
+        )
+
+        assert rollup_result == raw_result
+
+    def test_should_return_numeric_histogram_of_sketches(self):
+        numeric_values = [
+            column["value_numeric"]
+            for row in event_rows
+            if TIME_RANGE.start_time <= row["created_at"] <= TIME_RANGE.end_time
+            for column in row["columns"]
+            if column["name"] == "f3" and column["value_numeric"] is not None
+        ]
+        hist = NumericCountHistogram(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            column_map=self.COLUMN_MAP,
+            rollups=self._rollups(),
+        ).aggregation_result(numeric_columns=["f3"], time_range=TIME_RANGE)
+
+        assert sum(hist["f3"]["count"]) == len(numeric_values)
+        assert hist["f3"]["bins"][0] == min(numeric_values)
+        assert hist["f3"]["bins"][-1] == max(numeric_values)
+        assert sorted(set(numeric_values)) == pytest.approx(
+            hist["f3"]["bins"], rel=0.01
+        )
+
+    @pytest.mark.parametrize("granularity", [TimeGrain.DAY, TimeGrain.WEEK])
+    def test_should_match_classification_histogram_of_rows(self, granularity):
+        raw_metric = ClassificationDateHistogramDBMetrics(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            positive_class="true",
+            granularity=granularity,
+        )
+        rollup_metric = ClassificationDateHistogramDBMetrics(
+            collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=self.DATASET_ID,
+            positive_class="true",
+            rollups=self._rollups(),
+            granularity=granularity,
+        )
+
+        assert rollup_metric.aggregation_result(
+            time_range=TIME_RANGE
+        ) == raw_metric.aggregation_result(time_range=TIME_RANGE)
+
+
+class TestColumnListRollups(RollupsTestData):
+    COLUMN_MAP = None
+
+
+class TestColumnMapRollups(RollupsTestData):
+    COLUMN_MAP = COLUMN_MAP
+
+
+class TestDailyRollups:
+    def _rollups(self):
+        return DailyRollups(
+            collection=database[MONGO_COLLECTION_EVENT_ROLLUPS],
+            rows_collection=database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=uuid.uuid4(),
+            rollup_from=ROLLUP_FROM,
+        )
+
+    def test_should_split_whole_days_and_edges(self):
+        days, raw_ranges = self._rollups().split(TIME_RANGE)
+
+        assert days == (ROLLUP_FROM, datetime(year=2022, month=12, day=23))
+        assert raw_ranges == [
+            TimeRange(
+                start_time=TIME_RANGE.start_time,
+                end_time=ROLLUP_FROM - timedelta(milliseconds=1),
+            ),
+            TimeRange(
+                start_time=datetime(year=2022, month=12, day=23),
+                end_time=TIME_RANGE.end_time,
+            ),
+        ]
+
+    def test_should_serve_day_ending_at_its_last_millisecond(self):
+        time_range = TimeRange(
+            start_time=ROLLUP_FROM,
+            end_time=ROLLUP_FROM + timedelta(days=1) - timedelta(milliseconds=1),
+        )
+
+        assert self._rollups().split(time_range) == (
+            (ROLLUP_FROM, ROLLUP_FROM + timedelta(days=1)),
+            [],
+        )
+
+    def test_should_not_serve_time_range_without_whole_day(self):
+        time_range = TimeRange(
+            start_time=datetime(year=2022, month=12, day=22, hour=1),
+            end_time=datetime(year=2022, month=12, day=22, hour=20),
+        )
+
+        assert self._rollups().split(time_range) == (None, [time_range])
+        assert self._rollups().daily_stats(time_range) is None
+
+
+def test_should_move_row_to_delayed_actuals():
+    day = datetime(year=2022, month=12, day=19)
+    row = {**event_rows[0], "actual_cf": None, "is_match": None}
+    daily_stats = DailyStats()
+    daily_stats.add_document(row)
+    actual_column = {
+        "name": "p2",
+        "value_categorical": "false",
+        "data_type": "CATEGORICAL",
+        "mapping_type": "ACTUAL",
+    }
+
+    daily_stats.move_actuals(
+        row, actual_cf=["false"], is_match=True, columns=[actual_column]
+    )
+
+    assert daily_stats.rows[day].rows == 1
+    assert daily_stats.rows[day].matches == 1
+    assert +daily_stats.rows[day].cells == {("false", "false"): 1}
+    assert daily_stats.columns[(day, "ACTUAL", "p2")].values == {"false": 1}
+
+
+def test_should_fold_least_frequent_values_of_high_cardinality_column():
+    day = datetime(year=2022, month=12, day=19)
+    dataset_id = uuid.uuid4()
+    repository = EventRollupRepository(mongodb=MongodbBackendTesting.get_instance())
+
+    for batch in range(2):
+        daily_stats = DailyStats()
+        stats = daily_stats.column((day, "FEATURE", "f2"), "CATEGORICAL")
+        for i in range(MAX_TRACKED_VALUES):
+            stats.add(f"id-{batch}-{i}")
+        stats.add("frequent")
+        stats.add("frequent")
+        repository.increment(dataset_id, uuid.uuid4(), uuid.uuid4(), daily_stats)
+
+    document = database[MONGO_COLLECTION_EVENT_ROLLUPS].find_one(
+        {"dataset_id": str(dataset_id), "column": "f2"}
+    )
+    assert len(document["values"]) == MAX_TRACKED_VALUES
+    assert document["values"]["frequent"] == 4
+    assert sum(document["values"].values()) + document["other_count"] == 2004
+
+    stats = ColumnStats.from_document(document)
+    stats.add("frequent")
+    stored = stats.to_document()
+    assert len(stored["values"]) == MAX_TRACKED_VALUES
+    assert stored["values"]["frequent"] == 5
+    assert sum(stored["values"].values()) + stored["other_count"] == 2005
+
+
+@pytest.mark.parametrize("value", [None, "", "red", "a.b", "$x", "\\d", "a\x00b"])
+def test_should_escape_value_as_key(value):
+    key = escape_key(value)
+
+    assert "." not in key and not key.startswith("$") and key
+    assert unescape_key(key) == value
@@ -0,0 +1,86 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import random
+
+import mongomock
+import pytest
+
+from waterdip.core.metrics.sketches import (
+    SKETCH_RELATIVE_ACCURACY,
+    LogBucketSketch,
+    bucket_id,
+    bucket_key,
+    value_bucket_key,
+)
+
+rng = random.Random(7)
+VALUES = [rng.lognormvariate(0, 2) for _ in range(2000)] + [
+    -3.5,
+    -0.2,
+    0,
+    0,
+]
+
+
+def _sketch(values):
+    sketch = LogBucketSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("q", [0.0, 0.1, 0.5, 0.9, 0.99, 1.0])
+def test_should_estimate_quantiles_within_relative_accuracy(q):
+    values = sorted(VALUES)
+    exact = values[int(q * (len(values) - 1))]
+
+    assert _sketch(VALUES).quantile(q) == pytest.approx(
+        exact, rel=SKETCH_RELATIVE_ACCURACY, abs=1e-9
+    )
+
+
+def test_merged_sketches_should_equal_sketch_of_all_values():
+    merged = _sketch(VALUES[:500]).merge(_sketch(VALUES[500:]))
+
+    assert merged.to_document() == _sketch(VALUES).to_document()
+    assert LogBucketSketch.from_document(merged.to_document()).count == len(VALUES)
+
+
+def test_should_return_equal_frequency_histogram():
+    bins, count = _sketch(VALUES).histogram(
+        9, min_value=min(VALUES), max_value=max(VALUES)
+    )
+
+    assert len(bins) == len(count) == 9
+    assert bins == sorted(bins)
+    assert bins[0] == min(VALUES) and bins[-1] == max(VALUES)
+    assert sum(count) == len(VALUES)
+    assert max(count) < 2 * len(VALUES) / 9
+
+
+def test_should_return_empty_histogram_without_values():
+    assert LogBucketSketch().histogram(9) == ([], [])
+    assert LogBucketSketch().quantile(0.5) is None
+
+
+def test_aggregation_bucket_should_match_value_bucket():
+    collection = mongomock.MongoClient().db.values
+    collection.insert_many([{"v": value} for value in VALUES])
+
+    for doc in collection.aggregate(
+        [{"$group": {"_id": bucket_id("$v"), "values": {"$push": "$v"}}}]
+    ):
+        key = bucket_key(doc["_id"]["s"], int(doc["_id"]["i"]))
+        assert {value_bucket_key(value) for value in doc["values"]} == {key}
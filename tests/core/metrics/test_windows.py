@@ -0,0 +1,209 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from waterdip.core.commons.models import TimeRange
+from waterdip.core.metrics.rollups import raw_daily_stats
+from waterdip.core.metrics.windows import (
+    ONE_HOUR,
+    SlidingWindowStats,
+    hour_floor,
+    late_hours,
+)
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MONITOR_WINDOWS,
+    MongodbBackend,
+)
+from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+from waterdip.server.db.repositories.dataset_row_repository import column_list_to_maps
+
+COLUMN_MAP = {"features": {"f1": "NUMERIC", "f2": "CATEGORICAL"}}
+NOW = datetime(year=2022, month=10, day=2, hour=12, minute=30)
+
+
+def _rows(dataset_id, column_map, start, hours):
+    rows = []
+    for i in range(hours * 2):
+        columns = [
+            {
+                "name": "f1",
+                "value_numeric": None if i % 7 == 0 else float(i % 5),
+                "data_type": "NUMERIC",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "f2",
+                "value_categorical": ["a", "b", "c"][i % 3],
+                "data_type": "CATEGORICAL",
+                "mapping_type": "FEATURE",
+            },
+        ]
+        row = {
+            "dataset_id": str(dataset_id),
+            "created_at": start + timedelta(minutes=30 * i + 7),
+        }
+        if column_map is None:
+            row["columns"] = columns
+        else:
+            row.update(column_list_to_maps(columns))
+        rows.append(row)
+    return rows
+
+
+def _totals(daily_stats):
+    return {
+        name: (stats.count, stats.null_count, stats.sum, dict(stats.values))
+        for name, stats in daily_stats.column_totals().items()
+    }
+
+
+@pytest.mark.usefixtures("mock_mongo_backend")
+class TestSlidingWindowStats:
+    @staticmethod
+    def _window(mongodb: MongodbBackend, dataset_id, column_map):
+        return SlidingWindowStats(
+            collection=mongodb.database[MONGO_COLLECTION_MONITOR_WINDOWS],
+            rows_collection=mongodb.database[MONGO_COLLECTION_EVENT_ROWS],
+            window_id=f"{dataset_id}:1d",
+            dataset_id=dataset_id,
+            model_id=uuid.uuid4(),
+            column_map=column_map,
+        )
+
+    @pytest.mark.parametrize("column_map", [None, COLUMN_MAP])
+    def test_should_serve_the_exact_time_range(
+        self, mock_mongo_backend: MongodbBackend, column_map
+    ):
+        dataset_id = uuid.uuid4()
+        rows = mock_mongo_backend.database[MONGO_COLLECTION_EVENT_ROWS]
+        rows.insert_many(_rows(dataset_id, column_map, NOW - timedelta(hours=30), 31))
+        time_range = TimeRange(start_time=NOW - timedelta(days=1), end_time=NOW)
+
+        daily_stats = self._window(
+            mock_mongo_backend, dataset_id, column_map
+        ).daily_stats(time_range)
+
+        assert _totals(daily_stats) == _totals(
+            raw_daily_stats(
+                rows,
+                dataset_id,
+                time_filter={
+                    "created_at": {
+                        "$gte": time_range.start_time,
+                        "$lte": time_range.end_time,
+                    }
+                },
+                column_map=column_map,
+            )
+        )
+
+    def test_should_compute_only_new_hours_and_expire_old_hours(
+        self, mock_mongo_backend: MongodbBackend
+    ):
+        dataset_id = uuid.uuid4()
+        rows = mock_mongo_backend.database[MONGO_COLLECTION_EVENT_ROWS]
+        windows = mock_mongo_backend.database[MONGO_COLLECTION_MONITOR_WINDOWS]
+        rows.insert_many(_rows(dataset_id, None, NOW - timedelta(hours=30), 32))
+        time_range = TimeRange(start_time=NOW - timedelta(days=1), end_time=NOW)
+
+        first = self._window(mock_mongo_backend, dataset_id, None)
+        first.daily_stats(time_range)
+        assert first.computed_buckets == 23
+
+        # the latest hour is computed again for the rows logged late
+        rows.insert_one(
+            {
+                **_rows(dataset_id, None, hour_floor(NOW) - ONE_HOUR, 1)[0],
+                "columns": [],
+            }
+        )
+        second = self._window(mock_mongo_backend, dataset_id, None)
+        daily_stats = second.daily_stats(time_range)
+        assert second.computed_buckets == 1
+        assert sum(stats.rows for stats in daily_stats.rows.values()) == 49
+
+        later = TimeRange(
+            start_time=time_range.start_time + ONE_HOUR,
+            end_time=time_range.end_time + ONE_HOUR,
+        )
+        third = self._window(mock_mongo_backend, dataset_id, None)
+        third.daily_stats(later)
+        assert third.computed_buckets == 1
+        assert (
+            windows.count_documents(
+                {"bucket": {"$lt": hour_floor(later.start_time) + ONE_HOUR}}
+            )
+            == 0
+        )
+        assert windows.count_documents({"column": None}) == 23
+
+    def test_should_compute_again_the_hours_of_rows_logged_late(
+        self, mock_mongo_backend: MongodbBackend
+    ):
+        dataset_id = uuid.uuid4()
+        rows = mock_mongo_backend.database[MONGO_COLLECTION_EVENT_ROWS]
+        rows.insert_many(_rows(dataset_id, None, NOW - timedelta(hours=30), 32))
+        time_range = TimeRange(start_time=NOW - timedelta(days=1), end_time=NOW)
+        self._window(mock_mongo_backend, dataset_id, None).daily_stats(time_range)
+
+        late_row = {
+            **_rows(dataset_id, None, hour_floor(NOW) - 5 * ONE_HOUR, 1)[0],
+            "columns": [],
+        }
+        rows.insert_one(late_row)
+        DatasetRepository(mongodb=mock_mongo_backend).delete_monitor_window_hours(
+            late_hours([late_row], now=NOW)
+        )
+        window = self._window(mock_mongo_backend, dataset_id, None)
+        daily_stats = window.daily_stats(time_range)
+
+        # the hour of the late row and the latest complete hour
+        assert window.computed_buckets == 2
+        assert sum(stats.rows for stats in daily_stats.rows.values()) == 49
+
+    def test_should_only_report_complete_hours_as_late(self):
+        dataset_id = str(uuid.uuid4())
+        documents = [
+            {"dataset_id": dataset_id, "created_at": NOW},
+            {"dataset_id": dataset_id, "created_at": NOW - timedelta(minutes=45)},
+            {
+                "dataset_id": dataset_id,
+                "created_at": (NOW - timedelta(hours=3)).replace(tzinfo=timezone.utc),
+            },
+        ]
+
+        assert late_hours(documents, now=NOW) == {
+            dataset_id: {
+                hour_floor(NOW) - ONE_HOUR,
+                hour_floor(NOW) - 3 * ONE_HOUR,
+            }
+        }
+
+    def test_should_not_serve_a_time_range_without_a_whole_hour(
+        self, mock_mongo_backend: MongodbBackend
+    ):
+        time_range = TimeRange(
+            start_time=NOW - timedelta(minutes=20), end_time=NOW + timedelta(minutes=20)
+        )
+
+        assert (
+            self._window(mock_mongo_backend, uuid.uuid4(), None).daily_stats(time_range)
+            is None
+        )
@@ -16,8 +16,15 @@ import uuid
 
 from tests.testing_helpers import MongodbBackendTesting
 from waterdip.core.commons.models import DataQualityMetric
-from waterdip.core.metrics.data_metrics import CountEmptyHistogram
-from waterdip.core.monitors.evaluators.data_quality import EmptyValueEvaluator
+from waterdip.core.metrics.data_metrics import (
+    CategoricalVocabularyDiff,
+    CountEmptyHistogram,
+)
+from waterdip.core.monitors.evaluators.data_quality import (
+    EmptyValueEvaluator,
+    MissingValueEvaluator,
+    NewValueEvaluator,
+)
 from waterdip.core.monitors.models import (
     DataQualityBaseMonitorCondition,
     MonitorDimensions,
@@ -78,3 +85,60 @@ class TestEmptyValueEvaluator:
         violations = evaluator.evaluate()
 
         assert len(violations) == 1
+
+
+class TestVocabularyEvaluators:
+    DIFF = {
+        "f1": {
+            "new_count": 3,
+            "new_values": ["a", "b", "c"],
+            "missing_count": 0,
+            "missing_values": [],
+        },
+        "f2": {
+            "new_count": 0,
+            "new_values": [],
+            "missing_count": 1,
+            "missing_values": ["d"],
+        },
+    }
+
+    def _violations(self, mocker, evaluator_class, metric):
+        aggregation_result = mocker.patch(
+            "waterdip.core.metrics.data_metrics.CategoricalVocabularyDiff.aggregation_result",
+            return_value=self.DIFF,
+        )
+        condition = DataQualityBaseMonitorCondition(
+            threshold=MonitorThreshold(threshold="gt", value=0),
+            evaluation_metric=metric,
+            dimensions=MonitorDimensions(features=["f1", "f2", "f3"]),
+        )
+        evaluator = evaluator_class(
+            monitor_condition=condition,
+            metric=CategoricalVocabularyDiff(
+                collection=MongodbBackendTesting.get_instance().database[
+                    "event_collection"
+                ],
+                dataset_id=uuid.uuid4(),
+            ),
+            vocabulary={"f1": {"x"}, "f2": {"d"}},
+        )
+        violations = evaluator.evaluate()
+        # columns without a baseline vocabulary are not compared
+        assert aggregation_result.call_args.kwargs["vocabulary"].keys() == {"f1", "f2"}
+        return violations
+
+    def test_should_generate_new_value_violations(self, mocker):
+        violations = self._violations(
+            mocker, NewValueEvaluator, DataQualityMetric.NEW_VALUE
+        )
+
+        assert [(v["dimension"], v["metric_value"]) for v in violations] == [("f1", 3)]
+        assert violations[0]["values"] == ["a", "b", "c"]
+
+    def test_should_generate_missing_value_violations(self, mocker):
+        violations = self._violations(
+            mocker, MissingValueEvaluator, DataQualityMetric.MISSING_VALUE
+        )
+
+        assert [(v["dimension"], v["metric_value"]) for v in violations] == [("f2", 1)]
@@ -0,0 +1,54 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+
+from tests.testing_helpers import MongodbBackendTesting
+from waterdip.core.commons.models import DriftMetric, Environment, ModelBaseline
+from waterdip.core.metrics.drift import PSIDriftMetric
+from waterdip.core.monitors.evaluators.drift import PSIDriftEvaluator
+from waterdip.core.monitors.models import (
+    DriftBaseMonitorCondition,
+    MonitorDimensions,
+    MonitorThreshold,
+)
+
+
+class TestPSIDriftEvaluator:
+    def test_should_generate_drift_violations(self, mocker):
+        mocker.patch(
+            "waterdip.core.metrics.drift.PSIDriftMetric.aggregation_result",
+            return_value={"f1": {"psi": 0.31}, "f2": {"psi": 0.05}},
+        )
+
+        condition = DriftBaseMonitorCondition(
+            threshold=MonitorThreshold(threshold="gt", value=0.2),
+            evaluation_metric=DriftMetric.PSI,
+            dimensions=MonitorDimensions(features=["f1", "f2", "f3"]),
+            baseline=ModelBaseline(dataset_env=Environment.TRAINING),
+        )
+        metric = PSIDriftMetric(
+            collection=MongodbBackendTesting.get_instance().database[
+                "event_collection"
+            ],
+            dataset_id=uuid.uuid4(),
+            baseline={},
+        )
+
+        evaluator = PSIDriftEvaluator(monitor_condition=condition, metric=metric)
+
+        violations = evaluator.evaluate()
+
+        assert [violation["dimension"] for violation in violations] == ["f1"]
+        assert violations[0]["metric_value"] == 0.31
@@ -0,0 +1,123 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import datetime
+import uuid
+
+import pytest
+
+from waterdip.core.commons.models import DataQualityMetric, MonitorType
+from waterdip.core.monitors.models import (
+    DataQualityBaseMonitorCondition,
+    MonitorDimensions,
+    MonitorThreshold,
+)
+from waterdip.processor.monitors.monitor_cache import MonitorCache, monitor_ref
+from waterdip.server.db.models.monitors import BaseMonitorDB, MonitorIdentification
+from waterdip.server.db.mongodb import MONGO_COLLECTION_MONITORS, MongodbBackend
+from waterdip.server.db.repositories.monitor_repository import MonitorRepository
+
+
+def _monitor(features) -> BaseMonitorDB:
+    return BaseMonitorDB(
+        monitor_id=uuid.uuid4(),
+        monitor_name="M1",
+        monitor_identification=MonitorIdentification(
+            model_id=uuid.uuid4(), model_version_id=uuid.uuid4()
+        ),
+        monitor_type=MonitorType.DATA_QUALITY,
+        monitor_condition=DataQualityBaseMonitorCondition(
+            threshold=MonitorThreshold(threshold="gt", value=0),
+            evaluation_metric=DataQualityMetric.EMPTY_VALUE,
+            dimensions=MonitorDimensions(features=features),
+        ),
+        created_at=datetime.datetime.utcnow(),
+    )
+
+
+def test_monitor_version_should_change_with_the_definition_only():
+    monitor = _monitor(["f1"])
+    version = monitor.version()
+
+    monitor.last_run = "2022-10-01T00:00:00Z"
+    monitor.next_run_at = datetime.datetime.utcnow()
+    assert monitor.version() == version
+
+    monitor.monitor_condition.dimensions.features = ["f1", "f2"]
+    assert monitor.version() != version
+
+
+@pytest.mark.usefixtures("mock_mongo_backend")
+class TestMonitorCache:
+    def test_should_load_monitors_missing_from_the_cache_once(
+        self, mocker, mock_mongo_backend: MongodbBackend
+    ):
+        repository = MonitorRepository(mongodb=mock_mongo_backend)
+        monitors = [_monitor(["f1"]), _monitor(["f2"])]
+        for monitor in monitors:
+            repository.insert_monitor(monitor)
+        refs = [
+            monitor_ref(
+                {"monitor_id": monitor.monitor_id, "version": monitor.version()}
+            )
+            for monitor in monitors
+        ]
+        find_monitors = mocker.spy(repository, "find_monitors")
+        cache = MonitorCache(max_size=10)
+
+        first = cache.resolve(refs, repository)
+        second = cache.resolve(refs, repository)
+
+        assert [monitor["monitor_id"] for monitor in first] == [
+            ref["monitor_id"] for ref in refs
+        ]
+        assert second == first
+        assert find_monitors.call_count == 1
+        assert len(cache) == 2
+
+    def test_should_reload_changed_monitors_and_skip_deleted_monitors(
+        self, mock_mongo_backend: MongodbBackend
+    ):
+        repository = MonitorRepository(mongodb=mock_mongo_backend)
+        changed, deleted = _monitor(["f1"]), _monitor(["f1"])
+        repository.insert_monitor(changed)
+        repository.insert_monitor(deleted)
+        refs = [
+            {"monitor_id": str(monitor.monitor_id), "version": monitor.version()}
+            for monitor in (changed, deleted)
+        ]
+        cache = MonitorCache(max_size=10)
+        cache.resolve(refs[:1], repository)
+
+        mock_mongo_backend.database[MONGO_COLLECTION_MONITORS].update_one(
+            {"monitor_id": str(changed.monitor_id)},
+            {"$set": {"monitor_condition.dimensions.features": ["f1", "f2"]}},
+        )
+        repository.delete_monitor(deleted.monitor_id)
+        changed.monitor_condition.dimensions.features = ["f1", "f2"]
+        refs = [
+            {"monitor_id": str(monitor.monitor_id), "version": monitor.version()}
+            for monitor in (changed, deleted)
+        ]
+
+        resolved = cache.resolve(refs, repository)
+
+        assert [monitor["monitor_id"] for monitor in resolved] == [
+            str(changed.monitor_id)
+        ]
+        assert resolved[0]["monitor_condition"]["dimensions"]["features"] == [
+            "f1",
+            "f2",
+        ]
@@ -17,22 +17,36 @@ import uuid
 
 import pytest
 
+from tests.testing_helpers import MODEL_VERSION_V1_SCHEMA
 from waterdip.core.commons.models import (
     DataQualityMetric,
     DatasetType,
+    DriftMetric,
     Environment,
+    ModelBaseline,
     MonitorSeverity,
     MonitorType,
 )
 from waterdip.core.monitors.models import MonitorDimensions, MonitorThreshold
-from waterdip.processor.monitors.monitor_processor import MonitorProcessor
+from waterdip.processor.monitors.monitor_processor import (
+    MonitorGroupProcessor,
+    MonitorProcessor,
+    group_monitors,
+)
 from waterdip.server.db.models.datasets import BaseDatasetDB
+from waterdip.server.db.models.models import BaseModelVersionDB, ModelVersionSchemaInDB
 from waterdip.server.db.models.monitors import (
     BaseMonitorCondition,
     BaseMonitorDB,
     MonitorIdentification,
 )
-from waterdip.server.db.mongodb import MongodbBackend
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+    MongodbBackend,
+)
 from waterdip.server.db.repositories.alert_repository import AlertRepository
 from waterdip.server.db.repositories.dataset_repository import DatasetRepository
 
@@ -42,7 +56,6 @@ class TestMonitorProcessor:
     def test_should_process_data_quality_monitor(
         self, mocker, mock_mongo_backend: MongodbBackend
     ):
-
         mocker.patch(
             "waterdip.processor.monitors.monitor_processor.MonitorProcessor._get_event_dataset",
             return_value=BaseDatasetDB(
@@ -87,3 +100,223 @@ class TestMonitorProcessor:
         )
         violation = monitor_processor.process()
         assert len(violation) == 1
+
+    @staticmethod
+    def _baseline_data(database):
+        """
+        Model version with a TRAINING batch dataset and an event dataset, f1 is
+        shifted and f2 has one more category in the event dataset
+        """
+        model_id, model_version_id = uuid.uuid4(), uuid.uuid4()
+        database[MONGO_COLLECTION_MODEL_VERSIONS].insert_one(
+            BaseModelVersionDB(
+                model_version_id=model_version_id,
+                model_version="v1",
+                model_id=model_id,
+                created_at=datetime.datetime.utcnow(),
+                version_schema=ModelVersionSchemaInDB(**MODEL_VERSION_V1_SCHEMA),
+            ).dict()
+        )
+        for dataset_type, environment, rows_collection, offset, f2_values in [
+            (
+                DatasetType.BATCH,
+                Environment.TRAINING,
+                MONGO_COLLECTION_BATCH_ROWS,
+                0,
+                ["red", "yellow"],
+            ),
+            (
+                DatasetType.EVENT,
+                Environment.PRODUCTION,
+                MONGO_COLLECTION_EVENT_ROWS,
+                25,
+                ["red", "yellow", "green"],
+            ),
+        ]:
+            dataset_id = uuid.uuid4()
+            database[MONGO_COLLECTION_DATASETS].insert_one(
+                BaseDatasetDB(
+                    dataset_id=dataset_id,
+                    dataset_name=environment.value,
+                    environment=environment,
+                    created_at=datetime.datetime.utcnow(),
+                    dataset_type=dataset_type,
+                    model_id=model_id,
+                    model_version_id=model_version_id,
+                ).dict()
+            )
+            database[rows_collection].insert_many(
+                [
+                    {
+                        "dataset_id": str(dataset_id),
+                        "created_at": datetime.datetime.utcnow()
+                        - datetime.timedelta(hours=1),
+                        "columns": [
+                            {
+                                "name": "f1",
+                                "value_numeric": float(offset + i),
+                                "data_type": "NUMERIC",
+                                "mapping_type": "FEATURE",
+                            },
+                            {
+                                "name": "f2",
+                                "value_categorical": f2_values[i % len(f2_values)],
+                                "data_type": "CATEGORICAL",
+                                "mapping_type": "FEATURE",
+                            },
+                        ],
+                    }
+                    for i in range(50)
+                ]
+            )
+        return model_id, model_version_id
+
+    @staticmethod
+    def _monitor(monitor_type, condition, model_id, model_version_id):
+        return BaseMonitorDB(
+            monitor_id=uuid.uuid4(),
+            monitor_name="M2",
+            monitor_identification=MonitorIdentification(
+                model_id=model_id, model_version_id=model_version_id
+            ),
+            monitor_type=monitor_type,
+            monitor_condition=condition,
+            created_at="2021-08-01T00:00:00Z",
+            last_run="2021-08-01T00:00:00Z",
+            severity="LOW",
+        ).dict()
+
+    def _process(
+        self, mongodb_backend, monitor_type, condition, model_id, model_version_id
+    ):
+        return MonitorProcessor(
+            monitor=self._monitor(monitor_type, condition, model_id, model_version_id),
+            mongodb_backend=mongodb_backend,
+            alert_repo=AlertRepository(mongodb=mongodb_backend),
+            dataset_repo=DatasetRepository(mongodb=mongodb_backend),
+        ).process()
+
+    def test_should_process_psi_drift_monitor(self, mock_mongo_backend: MongodbBackend):
+        condition = BaseMonitorCondition(
+            threshold=MonitorThreshold(threshold="gt", value=0.2),
+            evaluation_metric=DriftMetric.PSI,
+            dimensions=MonitorDimensions(features=["f1"]),
+            baseline=ModelBaseline(dataset_env=Environment.TRAINING),
+        )
+
+        violations = self._process(
+            mock_mongo_backend,
+            MonitorType.DRIFT,
+            condition,
+            *self._baseline_data(mock_mongo_backend.database),
+        )
+
+        assert [violation["dimension"] for violation in violations] == ["f1"]
+
+    @pytest.mark.parametrize(
+        "metric, values",
+        [
+            (DataQualityMetric.NEW_VALUE, ["green"]),
+            (DataQualityMetric.MISSING_VALUE, None),
+        ],
+    )
+    def test_should_process_vocabulary_monitor(
+        self, mock_mongo_backend: MongodbBackend, metric, values
+    ):
+        condition = BaseMonitorCondition(
+            threshold=MonitorThreshold(threshold="gt", value=0),
+            evaluation_metric=metric,
+            dimensions=MonitorDimensions(features=["f1", "f2"]),
+            baseline=ModelBaseline(dataset_env=Environment.TRAINING),
+        )
+
+        violations = self._process(
+            mock_mongo_backend,
+            MonitorType.DATA_QUALITY,
+            condition,
+            *self._baseline_data(mock_mongo_backend.database),
+        )
+
+        assert [violation["values"] for violation in violations] == (
+            [values] if values else []
+        )
+
+    @staticmethod
+    def _condition(metric, features, baseline=None, evaluation_window="1d"):
+        return BaseMonitorCondition(
+            threshold=MonitorThreshold(threshold="gt", value=0),
+            evaluation_metric=metric,
+            dimensions=MonitorDimensions(features=features),
+            baseline=baseline,
+            evaluation_window=evaluation_window,
+        )
+
+    def test_should_group_monitors_by_version_window_and_metric_family(self):
+        model_id, model_version_id = uuid.uuid4(), uuid.uuid4()
+        monitors = [
+            self._monitor(
+                MonitorType.DATA_QUALITY,
+                self._condition(metric, ["f1"], evaluation_window=window),
+                model_id,
+                version_id,
+            )
+            for metric, window, version_id in [
+                (DataQualityMetric.EMPTY_VALUE, "1d", model_version_id),
+                (DataQualityMetric.EMPTY_VALUE, "1d", model_version_id),
+                (DataQualityMetric.NEW_VALUE, "1d", model_version_id),
+                (DataQualityMetric.MISSING_VALUE, "1d", model_version_id),
+                (DataQualityMetric.EMPTY_VALUE, "7d", model_version_id),
+                (DataQualityMetric.EMPTY_VALUE, "1d", uuid.uuid4()),
+            ]
+        ]
+
+        groups = group_monitors(monitors)
+
+        assert [len(group) for group in groups] == [2, 2, 1, 1]
+
+    def test_should_process_monitor_group_with_one_scan(
+        self, mock_mongo_backend: MongodbBackend
+    ):
+        model_id, model_version_id = self._baseline_data(mock_mongo_backend.database)
+        baseline = ModelBaseline(dataset_env=Environment.TRAINING)
+        monitors = [
+            self._monitor(
+                MonitorType.DATA_QUALITY,
+                self._condition(metric, features, baseline),
+                model_id,
+                model_version_id,
+            )
+            for metric, features in [
+                (DataQualityMetric.NEW_VALUE, ["f2"]),
+                (DataQualityMetric.MISSING_VALUE, ["f2"]),
+                (DataQualityMetric.NEW_VALUE, ["f1", "f2"]),
+            ]
+        ]
+        # a monitor of an unknown model version fails alone
+        monitors.append(
+            self._monitor(
+                MonitorType.DATA_QUALITY,
+                self._condition(DataQualityMetric.NEW_VALUE, ["f2"], baseline),
+                model_id,
+                uuid.uuid4(),
+            )
+        )
+
+        result = MonitorGroupProcessor(
+            monitors=monitors,
+            mongodb_backend=mock_mongo_backend,
+            alert_repo=AlertRepository(mongodb=mock_mongo_backend),
+            dataset_repo=DatasetRepository(mongodb=mock_mongo_backend),
+        ).process()
+
+        violations = [
+            result["violations"][str(monitor["monitor_id"])] for monitor in monitors[:3]
+        ]
+        assert [[v["values"] for v in monitor] for monitor in violations] == [
+            [["green"]],
+            [],
+            [["green"]],
+        ]
+        assert result["failed"] == [str(monitors[3]["monitor_id"])]
+        assert result["scans"] == 1
+        assert result["saved_scans"] == 2
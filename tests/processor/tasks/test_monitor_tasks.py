@@ -0,0 +1,144 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import datetime
+import uuid
+
+import pytest
+
+from waterdip.core.commons.models import (
+    DataQualityMetric,
+    DriftMetric,
+    ModelBaseline,
+    MonitorType,
+)
+from waterdip.core.monitors.models import (
+    DataQualityBaseMonitorCondition,
+    DriftBaseMonitorCondition,
+    MonitorDimensions,
+    MonitorThreshold,
+)
+from waterdip.processor.tasks.monitors import (
+    generate_monitor_jobs,
+    process_monitor,
+    process_monitor_group,
+)
+from waterdip.server.commons.config import settings
+from waterdip.server.db.models.monitors import BaseMonitorDB, MonitorIdentification
+from waterdip.server.db.mongodb import MongodbBackend
+from waterdip.server.db.repositories.monitor_repository import MonitorRepository
+
+
+@pytest.mark.usefixtures("mock_mongo_backend")
+class TestMonitorTasks:
+    @staticmethod
+    def _insert_monitors(repository: MonitorRepository):
+        identification = MonitorIdentification(
+            model_id=uuid.uuid4(), model_version_id=uuid.uuid4()
+        )
+        threshold = MonitorThreshold(threshold="gt", value=0)
+        conditions = [
+            (
+                MonitorType.DATA_QUALITY,
+                DataQualityBaseMonitorCondition(
+                    threshold=threshold,
+                    evaluation_metric=metric,
+                    dimensions=MonitorDimensions(features=["f1"]),
+                ),
+            )
+            for metric in (DataQualityMetric.EMPTY_VALUE, DataQualityMetric.EMPTY_VALUE)
+        ] + [
+            (
+                MonitorType.DRIFT,
+                DriftBaseMonitorCondition(
+                    threshold=threshold,
+                    evaluation_metric=DriftMetric.PSI,
+                    dimensions=MonitorDimensions(features=["f1"]),
+                    baseline=ModelBaseline(),
+                ),
+            )
+        ]
+        monitors = []
+        for monitor_type, condition in conditions:
+            monitors.append(
+                repository.insert_monitor(
+                    BaseMonitorDB(
+                        monitor_id=uuid.uuid4(),
+                        monitor_name="M1",
+                        monitor_identification=identification,
+                        monitor_type=monitor_type,
+                        monitor_condition=condition,
+                        created_at=datetime.datetime.utcnow(),
+                    )
+                )
+            )
+        return monitors
+
+    @pytest.fixture
+    def repository(self, mocker, mock_mongo_backend: MongodbBackend):
+        repository = MonitorRepository(mongodb=mock_mongo_backend)
+        mocker.patch(
+            "waterdip.processor.tasks.monitors.MongodbBackend.get_instance",
+            return_value=mock_mongo_backend,
+        )
+        mocker.patch(
+            "waterdip.processor.tasks.monitors.MonitorRepository.get_instance",
+            return_value=repository,
+        )
+        return repository
+
+    def test_should_send_monitor_group_references_to_their_queues(
+        self, mocker, repository: MonitorRepository
+    ):
+        monitors = self._insert_monitors(repository)
+        apply_async = mocker.patch.object(process_monitor_group, "apply_async")
+
+        result = generate_monitor_jobs()
+
+        assert result == {"jobs": 2, "due_monitors": 3}
+        jobs = {
+            call.kwargs["queue"]: call.kwargs["kwargs"]["monitors"]
+            for call in apply_async.call_args_list
+        }
+        assert jobs == {
+            settings.monitor_queue: [
+                {"monitor_id": str(monitor.monitor_id), "version": monitor.version()}
+                for monitor in monitors[:2]
+            ],
+            settings.monitor_drift_queue: [
+                {
+                    "monitor_id": str(monitors[2].monitor_id),
+                    "version": monitors[2].version(),
+                }
+            ],
+        }
+
+    def test_should_send_one_monitor_reference_per_job_without_grouping(
+        self, mocker, repository: MonitorRepository
+    ):
+        self._insert_monitors(repository)
+        mocker.patch.object(settings, "monitor_grouped_evaluation", False)
+        apply_async = mocker.patch.object(process_monitor, "apply_async")
+
+        generate_monitor_jobs()
+
+        assert [
+            sorted(call.kwargs["kwargs"]) for call in apply_async.call_args_list
+        ] == [["monitor_id", "version"]] * 3
+        assert [call.kwargs["queue"] for call in apply_async.call_args_list] == [
+            settings.monitor_queue,
+            settings.monitor_queue,
+            settings.monitor_drift_queue,
+        ]
@@ -18,6 +18,7 @@ from uuid import UUID
 
 import pytest
 from fastapi.testclient import TestClient
+from pymongo.errors import BulkWriteError
 
 from tests.testing_helpers import (
     MODEL_ID,
@@ -26,8 +27,20 @@ from tests.testing_helpers import (
     MODEL_VERSION_V1_SCHEMA,
     MongodbBackendTesting,
 )
+from waterdip.server.commons.config import settings
 from waterdip.server.db.models.models import BaseModelVersionDB, ModelVersionSchemaInDB
-from waterdip.server.db.mongodb import MONGO_COLLECTION_MODEL_VERSIONS
+from waterdip.server.db.mongodb import (
+    DUPLICATE_KEY_ERROR,
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASET_PROFILES,
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+    MONGO_COLLECTION_PENDING_ACTUALS,
+)
+from waterdip.server.db.repositories.dataset_row_repository import (
+    EventDatasetRowRepository,
+)
 
 
 @pytest.mark.usefixtures("test_client")
@@ -63,7 +76,6 @@ class TestLogDataset:
         )
 
     def test_should_log_batch_dataset(self, test_client: TestClient):
-
         request_body = {
             "model_version_id": str(self.LOCAL_MODEL_VERSION),
             "environment": "TRAINING",
@@ -126,3 +138,346 @@ class TestLogEvents:
 
         assert response.status_code == 200
         assert response.json()["total"] == 2
+
+    def test_should_accept_event_logged_twice_as_already_ingested(
+        self, mocker, test_client: TestClient
+    ):
+        """
+        MongoMock ignores the partial filter of the unique event id index, the index
+        is emulated by the insert
+        """
+        event_rows = MongodbBackendTesting.get_instance().database[
+            MONGO_COLLECTION_EVENT_ROWS
+        ]
+
+        def insert_documents(documents, ordered=True):
+            stored = {
+                (row["model_version_id"], row["event_id"])
+                for row in event_rows.find({}, {"model_version_id": 1, "event_id": 1})
+                if isinstance(row.get("event_id"), str)
+            }
+            duplicated = [
+                i
+                for i, document in enumerate(documents)
+                if (document["model_version_id"], document["event_id"]) in stored
+            ]
+            inserted = [d for i, d in enumerate(documents) if i not in duplicated]
+            if inserted:
+                event_rows.insert_many(inserted)
+            if duplicated:
+                raise BulkWriteError(
+                    {
+                        "nInserted": len(inserted),
+                        "writeErrors": [
+                            {"index": i, "code": DUPLICATE_KEY_ERROR}
+                            for i in duplicated
+                        ],
+                    }
+                )
+            return [document["row_id"] for document in documents]
+
+        mocker.patch.object(
+            EventDatasetRowRepository,
+            "insert_documents",
+            side_effect=insert_documents,
+        )
+        event_id = str(uuid.uuid4())
+        request_body = {
+            "model_version_id": str(MODEL_VERSION_ID_V1),
+            "timestamp": "2021-09-20 17:20:00",
+            "events": [
+                {
+                    "event_id": event_id,
+                    "features": {"f1": 11, "f2": "red"},
+                    "predictions": {"p1": 1},
+                },
+                {"features": {"f1": 9, "f2": "pink"}, "predictions": {"p1": 0}},
+            ],
+        }
+
+        first = test_client.post(url="/v1/log.events", json=request_body)
+        retried = test_client.post(url="/v1/log.events", json=request_body)
+
+        assert first.status_code == 200
+        assert retried.status_code == 200
+        assert retried.json()["total"] == 2
+        assert event_rows.count_documents({"event_id": event_id}) == 1
+        event_rows.delete_many({"event_id": event_id})
+
+    def test_should_return_event_ingestion_stats(self, test_client: TestClient):
+        response = test_client.get(url="/v1/log.events.stats")
+
+        assert response.status_code == 200
+        assert response.json()["depth"] == 0
+
+
+@pytest.mark.usefixtures("test_client")
+class TestLogActuals:
+    EVENT_IDS = [str(uuid.uuid4()) for _ in range(3)]
+
+    @classmethod
+    def teardown_class(cls):
+        database = MongodbBackendTesting.get_instance().database
+        for collection in [
+            MONGO_COLLECTION_EVENT_ROWS,
+            MONGO_COLLECTION_PENDING_ACTUALS,
+        ]:
+            database[collection].delete_many({"event_id": {"$in": cls.EVENT_IDS}})
+
+    def _log_events(self, test_client: TestClient, events):
+        response = test_client.post(
+            url="/v1/log.events",
+            json={"model_version_id": str(MODEL_VERSION_ID_V1), "events": events},
+        )
+        assert response.status_code == 200
+
+    def _log_actuals(self, test_client: TestClient, actuals):
+        response = test_client.post(
+            url="/v1/log.actuals",
+            json={"model_version_id": str(MODEL_VERSION_ID_V1), "actuals": actuals},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    def _row(self, event_id):
+        database = MongodbBackendTesting.get_instance().database
+        return database[MONGO_COLLECTION_EVENT_ROWS].find_one({"event_id": event_id})
+
+    def test_should_join_actuals_to_logged_events_by_event_id(
+        self, test_client: TestClient, mocker
+    ):
+        event_id = self.EVENT_IDS[0]
+        self._log_events(
+            test_client,
+            [
+                {
+                    "event_id": event_id,
+                    "features": {"f1": 11, "f2": "red"},
+                    "predictions": {"p1": 1},
+                }
+            ],
+        )
+
+        result = self._log_actuals(
+            test_client, [{"event_id": event_id, "actuals": {"p1": 1}}]
+        )
+
+        assert result == {"matched": 1, "pending": 0}
+        row = self._row(event_id)
+        assert row["actual_cf"] == ["1.0"]
+        assert row["is_match"] is True
+        assert [c["mapping_type"] for c in row["columns"]].count("ACTUAL") == 1
+
+        # the replaced actual columns are removed in the update setting the new ones
+        bulk_update = mocker.spy(EventDatasetRowRepository, "bulk_update")
+        self._log_actuals(test_client, [{"event_id": event_id, "actuals": {"p1": 0}}])
+
+        assert bulk_update.call_count == 1
+        row = self._row(event_id)
+        assert row["actual_cf"] == ["0.0"]
+        assert row["is_match"] is False
+        actual_columns = [c for c in row["columns"] if c["mapping_type"] == "ACTUAL"]
+        assert [c["value_numeric"] for c in actual_columns] == [0.0]
+        feature_columns = [c for c in row["columns"] if c["mapping_type"] == "FEATURE"]
+        assert [c["name"] for c in feature_columns] == ["f1", "f2"]
+
+    def test_should_keep_actuals_until_event_is_logged(self, test_client: TestClient):
+        event_id = self.EVENT_IDS[1]
+
+        result = self._log_actuals(
+            test_client, [{"event_id": event_id, "actuals": {"p1": 0}}]
+        )
+        assert result == {"matched": 0, "pending": 1}
+
+        self._log_events(
+            test_client,
+            [
+                {
+                    "event_id": event_id,
+                    "features": {"f1": 9, "f2": "pink"},
+                    "predictions": {"p1": 0},
+                }
+            ],
+        )
+
+        row = self._row(event_id)
+        assert row["actual_cf"] == ["0.0"]
+        assert row["is_match"] is True
+        database = MongodbBackendTesting.get_instance().database
+        assert (
+            database[MONGO_COLLECTION_PENDING_ACTUALS].find_one({"event_id": event_id})
+            is None
+        )
+
+
+@pytest.mark.usefixtures("test_client")
+class TestLogDatasetStream:
+    LOCAL_MODEL_VERSION = uuid.uuid4()
+
+    @classmethod
+    def setup_class(cls):
+        database = MongodbBackendTesting.get_instance().database
+        model_version = BaseModelVersionDB(
+            model_version_id=cls.LOCAL_MODEL_VERSION,
+            model_version=MODEL_VERSION_ID_V1_NAME,
+            model_id=UUID(MODEL_ID),
+            created_at=datetime.datetime(year=2022, month=11, day=17),
+            version_schema=ModelVersionSchemaInDB(**MODEL_VERSION_V1_SCHEMA),
+        )
+        database[MONGO_COLLECTION_MODEL_VERSIONS].insert_one(model_version.dict())
+
+    @classmethod
+    def teardown_class(cls):
+        database = MongodbBackendTesting.get_instance().database
+        for collection in [
+            MONGO_COLLECTION_MODEL_VERSIONS,
+            MONGO_COLLECTION_DATASETS,
+            MONGO_COLLECTION_BATCH_ROWS,
+            MONGO_COLLECTION_DATASET_PROFILES,
+        ]:
+            database[collection].delete_many(
+                {"model_version_id": str(cls.LOCAL_MODEL_VERSION)}
+            )
+
+    def _rows(self, upload_id, chunk):
+        database = MongodbBackendTesting.get_instance().database
+        return list(
+            database[MONGO_COLLECTION_BATCH_ROWS].find(
+                {"dataset_id": upload_id, "upload_chunk": chunk}
+            )
+        )
+
+    def _profile(self, dataset_id):
+        database = MongodbBackendTesting.get_instance().database
+        return {
+            (profile["chunk"], profile["column"]): profile["count"]
+            for profile in database[MONGO_COLLECTION_DATASET_PROFILES].find(
+                {"dataset_id": dataset_id}
+            )
+        }
+
+    def test_should_stream_dataset_in_resumable_chunks(
+        self, test_client: TestClient, monkeypatch
+    ):
+        monkeypatch.setattr(settings, "batch_upload_batch_size", 2)
+        rows = [
+            {"features": {"f1": i, "f2": "red"}, "predictions": {"p1": i % 2}}
+            for i in range(5)
+        ]
+
+        response = test_client.post(
+            url="/v1/log.dataset.stream",
+            params={
+                "model_version_id": str(self.LOCAL_MODEL_VERSION),
+                "environment": "TRAINING",
+            },
+            data="\n".join(json.dumps(row) for row in rows[:3]),
+        )
+        assert response.status_code == 200
+        upload_id = response.json()["upload_id"]
+        assert response.json()["total"] == 3
+        assert len(self._rows(upload_id, 0)) == 3
+
+        # a chunk which fails in the middle is not committed and can be sent again
+        response = test_client.post(
+            url="/v1/log.dataset.stream",
+            params={"upload_id": upload_id, "chunk": 1},
+            data=json.dumps(rows[3:])[:-5],
+        )
+        assert response.status_code == 422
+        status = test_client.get(
+            url="/v1/log.dataset.upload", params={"upload_id": upload_id}
+        ).json()
+        assert status["chunks"] == [0]
+
+        response = test_client.post(
+            url="/v1/log.dataset.stream",
+            params={"upload_id": upload_id, "chunk": 1},
+            data=json.dumps(rows[3:]),
+        )
+        assert response.json()["total"] == 2
+        assert len(self._rows(upload_id, 1)) == 2
+        status = test_client.get(
+            url="/v1/log.dataset.upload", params={"upload_id": upload_id}
+        ).json()
+        assert status["chunks"] == [0, 1]
+        assert status["rows"] == 5
+        assert self._profile(upload_id) == {
+            (chunk, column): count
+            for chunk, count in [(0, 3), (1, 2)]
+            for column in ["f1", "f2", "p1"]
+        }
+
+        # the rows of a chunk sent again replace the rows of its earlier attempt
+        response = test_client.post(
+            url="/v1/log.dataset.stream",
+            params={"upload_id": upload_id, "chunk": 0},
+            data="\n".join(json.dumps(row) for row in rows[:3]),
+        )
+        assert response.status_code == 200
+        status = test_client.get(
+            url="/v1/log.dataset.upload", params={"upload_id": upload_id}
+        ).json()
+        assert status["chunks"] == [0, 1]
+        assert status["rows"] == 5
+
+    def test_should_log_dataset_from_csv_file(self, test_client: TestClient):
+        response = test_client.post(
+            url="/v1/log.dataset.file",
+            params={
+                "model_version_id": str(self.LOCAL_MODEL_VERSION),
+                "environment": "VALIDATION",
+                "file_format": "CSV",
+            },
+            data=b"f1,f2,p1,row\n10,red,0,a\n,yellow,1,b\n",
+        )
+
+        assert response.status_code == 200
+        assert response.json()["total"] == 2
+        database = MongodbBackendTesting.get_instance().database
+        rows = list(
+            database[MONGO_COLLECTION_BATCH_ROWS].find(
+                {"dataset_id": response.json()["dataset_id"]}
+            )
+        )
+        assert [len(row["columns"]) for row in rows] == [3, 3]
+        assert self._profile(response.json()["dataset_id"]) == {
+            (0, "f1"): 2,
+            (0, "f2"): 2,
+            (0, "p1"): 2,
+        }
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            b"f1,f2,p1,row\nten,red,0,a\n,yellow,1,b\n",
+            b"f1,f2,p1,row\n10,red,0,a\nten,yellow,1,b\n",
+        ],
+    )
+    def test_should_not_keep_dataset_of_invalid_file(
+        self, test_client: TestClient, monkeypatch, body
+    ):
+        monkeypatch.setattr(settings, "batch_upload_batch_size", 1)
+        database = MongodbBackendTesting.get_instance().database
+        filters = {"model_version_id": str(self.LOCAL_MODEL_VERSION)}
+        datasets = database[MONGO_COLLECTION_DATASETS].count_documents(filters)
+        rows = database[MONGO_COLLECTION_BATCH_ROWS].count_documents(filters)
+
+        response = test_client.post(
+            url="/v1/log.dataset.file",
+            params={
+                "model_version_id": str(self.LOCAL_MODEL_VERSION),
+                "environment": "TESTING",
+                "file_format": "CSV",
+            },
+            data=body,
+        )
+
+        assert response.status_code == 422
+        assert database[MONGO_COLLECTION_DATASETS].count_documents(filters) == datasets
+        assert database[MONGO_COLLECTION_BATCH_ROWS].count_documents(filters) == rows
+
+    def test_should_require_model_version_of_new_upload(self, test_client: TestClient):
+        response = test_client.post(url="/v1/log.dataset.stream", data="{}")
+
+        assert response.status_code == 422
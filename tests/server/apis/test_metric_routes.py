@@ -54,3 +54,84 @@ class TestDatasetMetrics:
         response = test_client.get(url="/v1/metrics.dataset", params=params)
         response_data = response.json()
         print(response_data)
+
+    def test_should_return_metrics_cache_stats(self, test_client: TestClient):
+        response = test_client.get(url="/v1/metrics.cache.stats")
+
+        assert response.status_code == 200
+        assert {"backend", "hits", "misses"} <= set(response.json())
+
+    def test_should_reject_time_range_ending_before_its_start(
+        self, test_client: TestClient
+    ):
+        params = {
+            "model_id": METRICS_MODEL_ID,
+            "model_version_id": METRICS_MODEL_VERSION_ID_V1,
+            "start_time": "2022-12-30T00:00:00",
+            "end_time": "2022-11-30T00:00:00",
+        }
+        response = test_client.get(url="/v1/metric.performance", params=params)
+
+        assert response.status_code == 422
+
+
+@pytest.mark.usefixtures("test_client")
+class TestClassPerformance:
+    def test_should_report_numeric_classes_as_stored_in_prediction_cf(
+        self, test_client: TestClient
+    ):
+        model_id = test_client.post(
+            url="/v1/model.register", json={"model_name": "numeric classes"}
+        ).json()["model_id"]
+        model_version_id = test_client.post(
+            url="/v1/model.version.register",
+            json={
+                "model_id": model_id,
+                "model_version": "v1",
+                "task_type": "BINARY",
+                "version_schema": {
+                    "features": {"f1": "NUMERIC"},
+                    "predictions": {"p1": "NUMERIC"},
+                },
+            },
+        ).json()["model_version_id"]
+        response = test_client.post(
+            url="/v1/log.events",
+            json={
+                "model_version_id": model_version_id,
+                "timestamp": "2022-12-20 10:00:00",
+                "events": [
+                    {
+                        "features": {"f1": 1},
+                        "predictions": {"p1": 1},
+                        "actuals": {"p1": 1},
+                    },
+                    {
+                        "features": {"f1": 2},
+                        "predictions": {"p1": 0},
+                        "actuals": {"p1": 1},
+                    },
+                ],
+            },
+        )
+        assert response.status_code == 200
+
+        response = test_client.get(
+            url="/v1/metric.performance.classes",
+            params={
+                "model_id": model_id,
+                "model_version_id": model_version_id,
+                "start_time": "2022-12-19T00:00:00",
+                "end_time": "2022-12-21T00:00:00",
+            },
+        )
+
+        assert response.status_code == 200
+        classes = response.json()["positions"][0]["classes"]
+        assert [c["class_name"] for c in classes] == ["0.0", "1.0"]
+        assert [c["support"] for c in classes] == [0, 2]
+        assert [c["tp"] for c in classes] == [0, 1]
+
+        assert (
+            test_client.post(url="/v1/model.delete", json=model_id).status_code == 200
+        )
@@ -0,0 +1,80 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+
+import pytest
+
+from waterdip.core.commons.models import BaselineFileFormat
+from waterdip.server.commons.baseline_files import file_format_of, read_column_batches
+
+CSV_FILE = b"f1,f2,p1\n1.5,red,0\n,yellow,1\n\n3,,1\n"
+
+
+def test_should_read_csv_in_column_batches():
+    batches = list(
+        read_column_batches(io.BytesIO(CSV_FILE), BaselineFileFormat.CSV, batch_size=2)
+    )
+
+    assert batches == [
+        {"f1": ["1.5", None], "f2": ["red", "yellow"], "p1": ["0", "1"]},
+        {"f1": ["3"], "f2": [None], "p1": ["1"]},
+    ]
+
+
+def test_should_raise_error_for_incomplete_csv_line():
+    with pytest.raises(ValueError):
+        list(read_column_batches(io.BytesIO(b"f1,f2\n1\n"), BaselineFileFormat.CSV))
+
+
+@pytest.mark.parametrize(
+    "path, file_format",
+    [
+        ("train.csv", BaselineFileFormat.CSV),
+        ("train.PARQUET", BaselineFileFormat.PARQUET),
+        ("/data/train.feather", BaselineFileFormat.ARROW),
+    ],
+)
+def test_should_infer_file_format_of_path(path, file_format):
+    assert file_format_of(path) == file_format
+
+
+def test_should_read_parquet_in_column_batches():
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as parquet
+
+    file = io.BytesIO()
+    parquet.write_table(
+        pyarrow.table({"f1": [1.5, None, 3.0], "f2": ["red", "yellow", None]}), file
+    )
+    file.seek(0)
+
+    batches = list(read_column_batches(file, BaselineFileFormat.PARQUET, batch_size=2))
+
+    assert batches == [
+        {"f1": [1.5, None], "f2": ["red", "yellow"]},
+        {"f1": [3.0], "f2": [None]},
+    ]
+
+
+def test_should_require_pyarrow_for_parquet():
+    try:
+        import pyarrow  # noqa: F401
+
+        pytest.skip("pyarrow is installed")
+    except ImportError:
+        pass
+
+    with pytest.raises(ValueError):
+        read_column_batches(io.BytesIO(b""), BaselineFileFormat.PARQUET)
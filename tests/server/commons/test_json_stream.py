@@ -0,0 +1,78 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+
+import pytest
+
+from waterdip.server.commons.json_stream import JSONStreamError, iter_json_values
+
+ROWS = [{"features": {"f1": 1.5, "f2": "é"}}, {"features": {"f1": 12}}, 3]
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+def _values(parts):
+    async def collect():
+        return [value async for value in iter_json_values(_chunks(parts))]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'[{"features": {"f1": 1.5, "f2": "\xc3\xa9"}}, {"features": {"f1": 12}}, 3]',
+        b'{"features": {"f1": 1.5, "f2": "\xc3\xa9"}}\n{"features": {"f1": 12}}\n3\n',
+    ],
+)
+def test_should_decode_values_split_at_any_byte(body):
+    for split in range(1, len(body)):
+        assert _values([body[:split], body[split:]]) == ROWS
+
+
+def test_should_raise_error_for_incomplete_body():
+    with pytest.raises(JSONStreamError):
+        _values([b'{"features": {"f1": 1}}\n{"features": '])
+
+
+def test_should_decode_literals_and_numbers_split_at_any_byte():
+    body = b'[true, null, false, -1.5e-3, "a\\u00e9"]'
+    for split in range(1, len(body)):
+        assert _values([body[:split], body[split:]]) == [
+            True,
+            None,
+            False,
+            -1.5e-3,
+            "aé",
+        ]
+
+
+def test_should_raise_error_for_garbage_before_the_end_of_body():
+    consumed = []
+
+    async def chunks():
+        for part in [b'{"f1": 1}\n{"f1": x', b"yz}\n", b'{"f1": 2}\n']:
+            consumed.append(part)
+            yield part
+
+    async def collect():
+        return [value async for value in iter_json_values(chunks())]
+
+    with pytest.raises(JSONStreamError):
+        asyncio.run(collect())
+    assert len(consumed) == 1
@@ -66,3 +66,22 @@ class TestDatasetsRepository:
             {"model_id": str(model_id)}
         )
         assert count == 0
+
+    def test_should_increment_ingested_rows(self, mock_mongo_backend: MongodbBackend):
+        dataset_repo = DatasetRepository(mongodb=mock_mongo_backend)
+        dataset_id = uuid.uuid4()
+        dataset = BaseDatasetDB(
+            dataset_id=dataset_id,
+            dataset_name="dataset",
+            model_id=uuid.uuid4(),
+            model_version_id=uuid.uuid4(),
+            dataset_type=DatasetType.EVENT,
+            environment=Environment.PRODUCTION,
+        )
+        dataset_repo.create_dataset(dataset=dataset)
+
+        dataset_repo.increment_ingested_rows({str(dataset_id): 3})
+        dataset_repo.increment_ingested_rows({str(dataset_id): 2})
+
+        updated = dataset_repo.find_datasets(filters={"dataset_id": str(dataset_id)})
+        assert updated[0].ingested_rows == 5
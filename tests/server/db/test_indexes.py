@@ -0,0 +1,144 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import mongomock
+import pytest
+
+from waterdip.server.db.indexes import INDEXES, IndexSpec, ensure_indexes
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_ALERTS,
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_EVENT_ROLLUPS,
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+    MONGO_COLLECTION_MODELS,
+    MONGO_COLLECTION_MONITOR_WINDOWS,
+    MONGO_COLLECTION_MONITORS,
+    MONGO_COLLECTION_PENDING_ACTUALS,
+)
+
+# (collection, equality fields, sort or range field) of the repository queries
+QUERY_SHAPES = [
+    (MONGO_COLLECTION_MODELS, ["model_id"], None),
+    (MONGO_COLLECTION_MODEL_VERSIONS, ["model_version_id"], None),
+    (MONGO_COLLECTION_MODEL_VERSIONS, ["model_id"], "created_at"),
+    (MONGO_COLLECTION_DATASETS, ["dataset_id"], None),
+    (MONGO_COLLECTION_DATASETS, ["model_version_id", "dataset_type"], None),
+    (MONGO_COLLECTION_DATASETS, ["model_id"], None),
+    (MONGO_COLLECTION_EVENT_ROWS, ["dataset_id"], "created_at"),
+    (MONGO_COLLECTION_EVENT_ROWS, ["model_id"], "created_at"),
+    (MONGO_COLLECTION_EVENT_ROWS, ["model_version_id"], None),
+    (MONGO_COLLECTION_EVENT_ROWS, ["model_version_id", "event_id"], None),
+    (MONGO_COLLECTION_BATCH_ROWS, ["dataset_id"], None),
+    (MONGO_COLLECTION_BATCH_ROWS, ["model_id"], None),
+    (MONGO_COLLECTION_MONITORS, ["monitor_id"], None),
+    (MONGO_COLLECTION_MONITORS, ["monitor_identification.model_id"], None),
+    (MONGO_COLLECTION_MONITORS, ["monitor_identification.model_version_id"], None),
+    (MONGO_COLLECTION_MONITORS, [], "next_run_at"),
+    (MONGO_COLLECTION_ALERTS, ["model_id"], "created_at"),
+    (MONGO_COLLECTION_EVENT_ROLLUPS, ["dataset_id"], "day"),
+    (MONGO_COLLECTION_EVENT_ROLLUPS, ["model_id"], None),
+    (MONGO_COLLECTION_PENDING_ACTUALS, ["model_version_id", "event_id"], None),
+    (MONGO_COLLECTION_MONITOR_WINDOWS, ["window_id"], "bucket"),
+    (MONGO_COLLECTION_MONITOR_WINDOWS, ["model_id"], None),
+    (MONGO_COLLECTION_MONITOR_WINDOWS, ["dataset_id"], "bucket"),
+]
+
+
+def _covers(index: IndexSpec, equality, sort_field) -> bool:
+    wanted = len(equality) + (1 if sort_field else 0)
+    prefix = index.fields[:wanted]
+    if set(prefix[: len(equality)]) != set(equality):
+        return False
+    return sort_field is None or prefix[len(equality) :] == [sort_field]
+
+
+@pytest.mark.parametrize("collection, equality, sort_field", QUERY_SHAPES)
+def test_query_shapes_should_be_covered_by_an_index(collection, equality, sort_field):
+    assert any(
+        _covers(index, equality, sort_field)
+        for index in INDEXES
+        if index.collection == collection
+    )
+
+
+def test_ensure_indexes_should_be_idempotent():
+    database = mongomock.MongoClient().db
+
+    ensured = ensure_indexes(database)
+    assert ensure_indexes(database) == ensured
+
+    assert sum(len(names) for names in ensured.values()) == len(INDEXES)
+    event_row_indexes = database[MONGO_COLLECTION_EVENT_ROWS].index_information()
+    assert event_row_indexes["wd_dataset_id_1_created_at_1"]["key"] == [
+        ("dataset_id", 1),
+        ("created_at", 1),
+    ]
+    assert database[MONGO_COLLECTION_MODELS].index_information()["wd_model_id_1"][
+        "unique"
+    ]
+    event_id_index = event_row_indexes["wd_model_version_id_1_event_id_1"]
+    assert event_id_index["unique"]
+    assert event_id_index["partialFilterExpression"] == {
+        "event_id": {"$type": "string"}
+    }
+
+
+def test_ensure_indexes_should_skip_failing_index():
+    database = mongomock.MongoClient().db
+    database[MONGO_COLLECTION_MODELS].insert_many(
+        [{"model_id": "duplicated"}, {"model_id": "duplicated"}]
+    )
+
+    ensured = ensure_indexes(database)
+
+    assert MONGO_COLLECTION_MODELS not in ensured
+    assert "wd_model_version_id_1" in ensured[MONGO_COLLECTION_MODEL_VERSIONS]
+
+
+def test_ensure_indexes_should_leave_heavy_indexes_of_filled_collections():
+    database = mongomock.MongoClient().db
+    database[MONGO_COLLECTION_EVENT_ROWS].insert_one({"dataset_id": "d1"})
+
+    ensured = ensure_indexes(database, skip_heavy=True)
+
+    assert MONGO_COLLECTION_EVENT_ROWS not in ensured
+    assert "wd_dataset_id_1" in ensured[MONGO_COLLECTION_BATCH_ROWS]
+    assert len(ensure_indexes(database)[MONGO_COLLECTION_EVENT_ROWS]) == 3
+
+
+def test_ensure_indexes_should_change_expiration_of_ttl_index(mocker):
+    database = mongomock.MongoClient().db
+    ttl_index = IndexSpec(
+        MONGO_COLLECTION_MODELS, (("created_at", 1),), expire_after_seconds=10
+    )
+    ensure_indexes(database, [ttl_index])
+    command = mocker.patch.object(database, "command")
+
+    ensured = ensure_indexes(
+        database,
+        [
+            IndexSpec(
+                MONGO_COLLECTION_MODELS, (("created_at", 1),), expire_after_seconds=20
+            )
+        ],
+    )
+
+    assert ensured == {MONGO_COLLECTION_MODELS: [ttl_index.name]}
+    command.assert_called_once_with(
+        "collMod",
+        MONGO_COLLECTION_MODELS,
+        index={"name": ttl_index.name, "expireAfterSeconds": 20},
+    )
@@ -55,6 +55,19 @@ class TestModelsRepository:
             == 0
         )
 
+    def test_should_add_prediction_classes(self, mock_mongo_backend: MongodbBackend):
+        model_repo = ModelRepository(mongodb=mock_mongo_backend)
+        model_uuid = uuid.uuid4()
+        model_repo.register_model(
+            BaseModelDB(model_id=model_uuid, model_name="test_model")
+        )
+
+        model_repo.add_prediction_classes(model_uuid, ["yes", "no"])
+        model_repo.add_prediction_classes(model_uuid, ["no", "maybe"])
+
+        model = model_repo.find_by_id(model_id=model_uuid)
+        assert model.prediction_classes == ["yes", "no", "maybe"]
+
 
 @pytest.mark.usefixtures("mock_mongo_backend")
 class TestModelVersionsRepository:
@@ -197,3 +197,55 @@ class TestMonitorRepository:
         ].find_one(filter={"monitor_id": str(monitor_id)})
 
         assert created_monitor_version_in_db is None
+
+    def test_should_claim_due_monitors_once(
+        self, mock_mongo_backend: MongodbBackendTesting
+    ):
+        monitor_repo = MonitorRepository(mongodb=mock_mongo_backend)
+        now = datetime.datetime(2022, 10, 1, 10, 0, 30)
+        monitor_ids = {}
+        for name, next_run_at, skip_period in [
+            ("new", None, "1d"),
+            ("due", now - datetime.timedelta(hours=1), "2d"),
+            ("due_now", now, "1d"),
+            ("not_due", now + datetime.timedelta(minutes=1), "1d"),
+        ]:
+            monitor_ids[name] = uuid.uuid4()
+            monitor_repo.insert_monitor(
+                BaseMonitorDB(
+                    monitor_id=monitor_ids[name],
+                    monitor_name=name,
+                    monitor_identification=self.monitor_identification,
+                    monitor_condition=DataQualityBaseMonitorCondition(
+                        threshold=self.monitor_threshold,
+                        evaluation_metric=DataQualityMetric.EMPTY_VALUE,
+                        dimensions=MonitorDimensions(features=["f1"]),
+                        skip_period=skip_period,
+                    ),
+                    monitor_type=MonitorType.DATA_QUALITY,
+                    created_at=now,
+                    next_run_at=next_run_at,
+                )
+            )
+
+        batches = list(monitor_repo.claim_due_monitors(now, batch_size=2))
+
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert sorted(
+            monitor.monitor_name for batch in batches for monitor in batch
+        ) == [
+            "due",
+            "due_now",
+            "new",
+        ]
+        next_runs = {
+            monitor["monitor_name"]: monitor["next_run_at"]
+            for monitor in mock_mongo_backend.database[MONGO_COLLECTION_MONITORS].find(
+                {"monitor_id": {"$in": [str(i) for i in monitor_ids.values()]}}
+            )
+        }
+        assert next_runs["due"] == datetime.datetime(2022, 10, 3, 10, 0)
+        assert next_runs["new"] == datetime.datetime(2022, 10, 2, 10, 0)
+        assert next_runs["not_due"] == now + datetime.timedelta(minutes=1)
+        # claimed monitors are not due anymore for a concurrent scheduler
+        assert list(monitor_repo.claim_due_monitors(now)) == []
@@ -0,0 +1,151 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from waterdip.server.services.ingestion_queue import EventIngestionQueue
+
+
+class TestEventIngestionQueue:
+    @staticmethod
+    def _queue(mocker, **kwargs) -> EventIngestionQueue:
+        queue = EventIngestionQueue(
+            row_service=mocker.Mock(), model_service=mocker.Mock(), **kwargs
+        )
+        # flushes are triggered by the tests
+        mocker.patch.object(queue, "start")
+        return queue
+
+    def test_should_coalesce_documents_of_multiple_submits(self, mocker):
+        queue = self._queue(mocker, flush_size=10)
+        model_id = uuid.uuid4()
+
+        queue.submit([{"row_id": 1}, {"row_id": 2}], model_id, ["a", "b"])
+        queue.submit([{"row_id": 3}], model_id, ["b", "c"])
+        assert queue.depth == 3
+
+        assert queue.flush() == 3
+        queue._row_service.insert_documents.assert_called_once_with(
+            [{"row_id": 1}, {"row_id": 2}, {"row_id": 3}], ordered=False
+        )
+        update_call = queue._model_service.update_prediction_classes.call_args
+        assert update_call.args[0] == model_id
+        assert sorted(update_call.args[1]) == ["a", "b", "c"]
+        assert queue.depth == 0
+        assert queue.stats()["flushed_rows"] == 3
+        assert queue.stats()["last_flush_latency_ms"] is not None
+
+    def test_should_release_pending_actuals_of_inserted_rows(self, mocker):
+        pending_repository = mocker.Mock()
+        queue = self._queue(mocker, pending_repository=pending_repository)
+        queue._row_service.insert_documents.side_effect = BulkWriteError(
+            {"nInserted": 1, "writeErrors": [{"index": 1, "code": 1}]}
+        )
+        documents = [
+            {"model_version_id": "v1", "event_id": "e1"},
+            {"model_version_id": "v1", "event_id": "e2"},
+            {"model_version_id": "v1", "event_id": "e3"},
+        ]
+
+        queue.submit(documents, uuid.uuid4(), [], claimed_actuals=["e1", "e2"])
+        pending_repository.delete_many.assert_not_called()
+        queue.flush()
+
+        pending_repository.delete_many.assert_called_once_with("v1", ["e1"])
+        assert queue._claimed_actuals == set()
+
+    def test_should_put_documents_back_when_flush_fails(self, mocker):
+        pending_repository = mocker.Mock()
+        queue = self._queue(
+            mocker, pending_repository=pending_repository, flush_interval=0.5
+        )
+        queue._row_service.insert_documents.side_effect = [
+            ConnectionError("database is not reachable"),
+            None,
+        ]
+        model_id = uuid.uuid4()
+        documents = [
+            {"model_version_id": "v1", "event_id": "e1"},
+            {"model_version_id": "v1", "event_id": "e2"},
+        ]
+
+        queue.submit(documents, model_id, ["a"], claimed_actuals=["e1"])
+        assert queue.flush() == 0
+        assert queue.depth == 2
+        assert queue.stats()["failed_flushes"] == 1
+        assert queue._backoff == 0.5
+        queue._model_service.update_prediction_classes.assert_not_called()
+
+        assert queue.flush() == 2
+        assert queue.depth == 0
+        assert queue._backoff == 0
+        assert queue._row_service.insert_documents.call_args.args[0] == documents
+        queue._model_service.update_prediction_classes.assert_called_once_with(
+            model_id, ["a"]
+        )
+        pending_repository.delete_many.assert_called_once_with("v1", ["e1"])
+
+    def test_should_reject_events_once_stopped(self, mocker):
+        queue = self._queue(mocker)
+
+        queue.stop(drain=False)
+        with pytest.raises(HTTPException) as error:
+            queue.submit([{"row_id": 1}], uuid.uuid4(), [])
+
+        assert error.value.status_code == 503
+        assert queue.depth == 0
+        queue.start.assert_not_called()
+
+    def test_should_reject_events_when_buffer_is_full(self, mocker):
+        queue = self._queue(mocker, max_size=2)
+
+        queue.submit([{"row_id": 1}, {"row_id": 2}], uuid.uuid4(), [])
+        with pytest.raises(HTTPException) as error:
+            queue.submit([{"row_id": 3}], uuid.uuid4(), [])
+
+        assert error.value.status_code == 429
+        assert queue.depth == 2
+        assert queue.stats()["rejected_rows"] == 1
+
+    def test_should_drain_buffer_on_stop(self, mocker):
+        queue = self._queue(mocker, flush_size=2)
+
+        queue.submit([{"row_id": i} for i in range(5)], uuid.uuid4(), [])
+        queue.stop(drain=True)
+
+        assert queue.depth == 0
+        assert queue._row_service.insert_documents.call_count == 3
+
+    def test_should_flush_from_background_thread(self, mocker):
+        queue = EventIngestionQueue(
+            row_service=mocker.Mock(),
+            model_service=mocker.Mock(),
+            flush_size=2,
+            flush_interval=0.01,
+        )
+
+        queue.submit([{"row_id": 1}], uuid.uuid4(), [])
+        for _ in range(100):
+            if queue.stats()["flushed_rows"] == 1:
+                break
+            time.sleep(0.01)
+        queue.stop(drain=False)
+
+        assert queue.depth == 0
+        queue._row_service.insert_documents.assert_called_once()
@@ -27,7 +27,7 @@ from tests.testing_helpers import (
     MODEL_VERSION_ID_V2,
     MongodbBackendTesting,
 )
-from waterdip.core.commons.models import TimeRange
+from waterdip.core.commons.models import TimeGrain, TimeRange
 from waterdip.server.apis.models.metrics import PerfomanceMetricResponse
 from waterdip.server.db.models.dataset_rows import BaseEventRowDB, EventDataColumnDB
 from waterdip.server.db.mongodb import (
@@ -38,11 +38,14 @@ from waterdip.server.db.repositories.dataset_repository import DatasetRepository
 from waterdip.server.db.repositories.dataset_row_repository import (
     EventDatasetRowRepository,
 )
-from waterdip.server.db.repositories.model_repository import ModelRepository
+from waterdip.server.db.repositories.model_repository import (
+    ModelRepository,
+    ModelVersionRepository,
+)
 from waterdip.server.errors.base_errors import EntityNotFoundError
 from waterdip.server.services.dataset_service import DatasetService
 from waterdip.server.services.metrics_service import ClassificationPerformance
-from waterdip.server.services.model_service import ModelService
+from waterdip.server.services.model_service import ModelService, ModelVersionService
 
 
 @pytest.mark.usefixtures("mock_mongo_backend")
@@ -59,6 +62,12 @@ class TestMetricService:
                 DatasetRepository.get_instance(self.mock_mongo_backend)
             ),
             event_repo=EventDatasetRowRepository.get_instance(self.mock_mongo_backend),
+            model_version_service=ModelVersionService.get_instance(
+                repository=ModelVersionRepository.get_instance(self.mock_mongo_backend),
+                dataset_service=DatasetService.get_instance(
+                    DatasetRepository.get_instance(self.mock_mongo_backend)
+                ),
+            ),
         )
 
         model = {
@@ -100,36 +109,17 @@ class TestMetricService:
             [model_version, model_version_2]
         )
         self.metricResponse = {
-            "accuracy": {
-                "29-01-2023": 0.5,
-            },
-            "true_positive": {
-                "29-01-2023": 0.5,
-            },
-            "false_negative": {
-                "29-01-2023": 0.5,
-            },
-            "true_negative": {
-                "29-01-2023": 0.5,
-            },
-            "false_positive": {
-                "29-01-2023": 0.5,
-            },
-            "precision": {
-                "29-01-2023": 0.5,
-            },
-            "recall": {
-                "29-01-2023": 0.5,
-            },
-            "sensitivity": {
-                "29-01-2023": 0.5,
-            },
-            "specificity": {
-                "29-01-2023": 0.5,
-            },
-            "f1": {
-                "29-01-2023": 0.5,
-            },
+            "buckets": [datetime(2023, 1, 29)],
+            "accuracy": [0.5],
+            "true_positive": [0.5],
+            "false_negative": [0.5],
+            "true_negative": [0.5],
+            "false_positive": [0.5],
+            "precision": [0.5],
+            "recall": [0.5],
+            "sensitivity": [0.5],
+            "specificity": [0.5],
+            "f1": [0.5],
         }
 
     def test_should_return_model_performance(self, mocker, mock_mongo_backend):
@@ -236,6 +226,42 @@ class TestMetricService:
         finally:
             assert model_performance is None
 
+    def test_should_label_hourly_model_performance(self, mocker, mock_mongo_backend):
+        mocker.patch(
+            "waterdip.core.metrics.classification_metrics.ClassificationDateHistogramDBMetrics.aggregation_result",
+            return_value={
+                **self.metricResponse,
+                "buckets": [datetime(2023, 1, 29, 9)],
+            },
+        )
+        mocker.patch(
+            "waterdip.server.services.dataset_service.DatasetService.find_event_dataset_by_model_version_id",
+            return_value=mocker.MagicMock(dataset_id=uuid.uuid4()),
+        )
+        model_performance = self.metric_service.model_performance(
+            model_id=MODEL_ID,
+            model_version_id=MODEL_VERSION_ID_V1,
+            time_range=TimeRange(
+                start_time=datetime(2023, 1, 29, 9),
+                end_time=datetime(2023, 1, 29, 10),
+            ),
+            granularity=TimeGrain.HOUR,
+        )
+
+        assert model_performance["f1"] == {"date": ["29-01-2023 09:00"], "value": [0.5]}
+
+    def test_should_reject_too_many_performance_buckets(self, mock_mongo_backend):
+        with pytest.raises(HTTPException) as error:
+            self.metric_service.model_performance(
+                model_id=MODEL_ID,
+                model_version_id=MODEL_VERSION_ID_V1,
+                time_range=TimeRange(
+                    start_time=datetime(2023, 1, 1), end_time=datetime(2023, 2, 1)
+                ),
+                granularity=TimeGrain.MINUTE,
+            )
+        assert error.value.status_code == 400
+
     @classmethod
     def teardown_class(self):
         self.mock_mongo_backend.database[MONGO_COLLECTION_MODELS].delete_many({})
@@ -0,0 +1,223 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import uuid
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from waterdip.core.commons.models import (
+    ColumnDataType,
+    DatasetType,
+    Environment,
+    TimeRange,
+)
+from waterdip.server.apis.models.metrics import (
+    CategoricalColumnStats,
+    DatasetMetricsResponse,
+)
+from waterdip.server.db.models.datasets import BaseDatasetDB
+from waterdip.server.db.models.models import (
+    BaseModelVersionDB,
+    ModelVersionSchemaFieldDetails,
+    ModelVersionSchemaInDB,
+)
+from waterdip.server.services.metrics_cache import (
+    MemoryMetricsCache,
+    MetricsCache,
+    RedisMetricsCache,
+    dataset_metrics_key,
+)
+from waterdip.server.services.metrics_service import DatasetMetricsService
+
+TIME_RANGE = TimeRange(start_time=datetime(2023, 1, 1), end_time=datetime(2023, 1, 8))
+
+
+def _dataset(dataset_type: DatasetType = DatasetType.EVENT, ingested_rows: int = 0):
+    return BaseDatasetDB(
+        dataset_id=uuid.UUID("00000000-0000-0000-0000-000000000001"),
+        dataset_type=dataset_type,
+        model_id=uuid.uuid4(),
+        model_version_id=uuid.uuid4(),
+        environment=Environment.PRODUCTION,
+        ingested_rows=ingested_rows,
+    )
+
+
+def _schema(*features: str) -> ModelVersionSchemaInDB:
+    return ModelVersionSchemaInDB(
+        features={
+            feature: ModelVersionSchemaFieldDetails(data_type=ColumnDataType.NUMERIC)
+            for feature in features
+        },
+        predictions={},
+    )
+
+
+def _metrics(column_name: str = "f1") -> DatasetMetricsResponse:
+    return DatasetMetricsResponse(
+        numeric_column_stats=[],
+        categorical_column_stats=[
+            CategoricalColumnStats(column_name=column_name, unique=2, top="a")
+        ],
+    )
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values, self.expiry = {}, {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key], self.expiry[key] = value.encode("utf-8"), ex
+
+
+def test_key_should_change_with_watermark_schema_and_time_range():
+    key = dataset_metrics_key(_dataset(), _schema("f1"), TIME_RANGE)
+
+    assert key == dataset_metrics_key(_dataset(), _schema("f1"), TIME_RANGE)
+    assert key != dataset_metrics_key(
+        _dataset(ingested_rows=1), _schema("f1"), TIME_RANGE
+    )
+    assert key != dataset_metrics_key(_dataset(), _schema("f1", "f2"), TIME_RANGE)
+    assert key != dataset_metrics_key(
+        _dataset(),
+        _schema("f1"),
+        TimeRange(start_time=TIME_RANGE.start_time, end_time=datetime(2023, 1, 9)),
+    )
+
+
+def test_key_of_batch_dataset_should_not_depend_on_time_range():
+    batch = _dataset(dataset_type=DatasetType.BATCH)
+
+    assert dataset_metrics_key(batch, _schema("f1"), TIME_RANGE) == (
+        dataset_metrics_key(batch, _schema("f1"), None)
+    )
+
+
+def test_metrics_cache_should_require_a_backend():
+    class IncompleteMetricsCache(MetricsCache):
+        def _get(self, key: str):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteMetricsCache()
+
+
+def test_memory_cache_should_count_hits_and_misses():
+    cache = MemoryMetricsCache(max_size=4)
+
+    assert cache.get("k") is None
+    cache.put("k", _metrics())
+
+    assert cache.get("k") == _metrics()
+    assert cache.stats() == {
+        "backend": "memory",
+        "hits": 1,
+        "misses": 1,
+        "hit_ratio": 0.5,
+        "size": 1,
+    }
+
+
+def test_memory_cache_should_evict_least_recently_used():
+    cache = MemoryMetricsCache(max_size=2)
+    cache.put("k1", _metrics("f1"))
+    cache.put("k2", _metrics("f2"))
+    cache.get("k1")
+    cache.put("k3", _metrics("f3"))
+
+    assert cache.get("k2") is None
+    assert cache.get("k1") == _metrics("f1")
+    assert cache.get("k3") == _metrics("f3")
+
+
+def test_memory_cache_should_expire_event_datasets_only():
+    cache = MemoryMetricsCache(ttl=0)
+    cache.put("event", _metrics(), dataset_type=DatasetType.EVENT)
+    cache.put("batch", _metrics(), dataset_type=DatasetType.BATCH)
+
+    assert cache.get("event") is None
+    assert cache.get("batch") == _metrics()
+
+
+def test_redis_cache_should_round_trip_metrics():
+    client = FakeRedis()
+    cache = RedisMetricsCache(url="redis://localhost", ttl=60, client=client)
+    cache.put("event", _metrics(), dataset_type=DatasetType.EVENT)
+    cache.put("batch", _metrics(), dataset_type=DatasetType.BATCH)
+
+    assert cache.get("event") == _metrics()
+    assert client.expiry == {"event": 60, "batch": None}
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_redis_cache_should_miss_when_redis_is_unavailable():
+    client = MagicMock()
+    client.get.side_effect = ConnectionError("redis is down")
+    client.set.side_effect = ConnectionError("redis is down")
+    cache = RedisMetricsCache(url="redis://localhost", client=client)
+
+    cache.put("k", _metrics())
+    assert cache.get("k") is None
+    assert cache.stats()["misses"] == 1
+
+
+class CountingMetricsService(DatasetMetricsService):
+    def __init__(self, dataset, model_version, metrics_cache):
+        dataset_service, model_version_service = MagicMock(), MagicMock()
+        dataset_service.find_dataset_by_id.side_effect = lambda _: self.dataset
+        model_version_service.find_by_id.return_value = model_version
+        super().__init__(
+            event_repo=MagicMock(),
+            batch_repo=MagicMock(),
+            dataset_service=dataset_service,
+            model_version_service=model_version_service,
+            metrics_cache=metrics_cache,
+        )
+        self.dataset = dataset
+        self.computed = 0
+
+    def _combined_metrics(self, dataset, model_version, time_range):
+        self.computed += 1
+        return _metrics()
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_combined_metrics_should_be_recomputed_after_ingestion(cached):
+    model_version = BaseModelVersionDB(version_schema=_schema("f1"))
+    service = CountingMetricsService(
+        dataset=_dataset(),
+        model_version=model_version,
+        metrics_cache=MemoryMetricsCache() if cached else None,
+    )
+    params = {
+        "model_id": uuid.uuid4(),
+        "model_version_id": uuid.uuid4(),
+        "dataset_id": service.dataset.dataset_id,
+        "time_range": TIME_RANGE,
+    }
+
+    assert service.combined_metrics(**params) == _metrics()
+    service.combined_metrics(**params)
+    assert service.computed == (1 if cached else 2)
+
+    service.dataset = _dataset(ingested_rows=10)
+    service.combined_metrics(**params)
+    assert service.computed == (2 if cached else 3)
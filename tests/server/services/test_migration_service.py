@@ -0,0 +1,124 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from tests.testing_helpers import MODEL_VERSION_V1_SCHEMA, MongodbBackendTesting
+from waterdip.core.commons.models import RowStorageFormat
+from waterdip.server.db.models.models import BaseModelVersionDB, ModelVersionSchemaInDB
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+)
+from waterdip.server.db.repositories.dataset_row_repository import (
+    BatchDatasetRowRepository,
+    EventDatasetRowRepository,
+)
+from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+from waterdip.server.services.migration_service import RowStorageMigrationService
+
+
+@pytest.mark.usefixtures("mock_mongo_backend")
+class TestRowStorageMigrationService:
+    MODEL_VERSION_ID = uuid.uuid4()
+
+    @classmethod
+    def setup_class(cls):
+        mock_mongo_backend = MongodbBackendTesting.get_instance()
+        cls.database = mock_mongo_backend.database
+        cls.database[MONGO_COLLECTION_MODEL_VERSIONS].insert_one(
+            BaseModelVersionDB(
+                model_id=uuid.uuid4(),
+                model_version_id=cls.MODEL_VERSION_ID,
+                model_version="v1",
+                created_at=datetime.utcnow(),
+                version_schema=ModelVersionSchemaInDB(**MODEL_VERSION_V1_SCHEMA),
+            ).dict()
+        )
+        columns = [
+            {
+                "name": "f1",
+                "value_numeric": 10.0,
+                "value_categorical": None,
+                "data_type": "NUMERIC",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "p1",
+                "value_numeric": None,
+                "value_categorical": "1",
+                "data_type": "CATEGORICAL",
+                "mapping_type": "PREDICTION",
+            },
+        ]
+        actual = {**columns[1], "mapping_type": "ACTUAL"}
+        cls.database[MONGO_COLLECTION_EVENT_ROWS].insert_many(
+            [
+                {"model_version_id": str(cls.MODEL_VERSION_ID), "columns": columns},
+                {
+                    "model_version_id": str(cls.MODEL_VERSION_ID),
+                    "columns": [*columns, actual],
+                },
+            ]
+        )
+        cls.database[MONGO_COLLECTION_BATCH_ROWS].insert_one(
+            {"model_version_id": str(cls.MODEL_VERSION_ID), "columns": columns}
+        )
+        cls.migration_service = RowStorageMigrationService(
+            model_version_repository=ModelVersionRepository(mongodb=mock_mongo_backend),
+            event_row_repository=EventDatasetRowRepository(mongodb=mock_mongo_backend),
+            batch_row_repository=BatchDatasetRowRepository(mongodb=mock_mongo_backend),
+            plan_refresh_seconds=0,
+        )
+
+    @classmethod
+    def teardown_class(cls):
+        filters = {"model_version_id": str(cls.MODEL_VERSION_ID)}
+        for collection in [
+            MONGO_COLLECTION_MODEL_VERSIONS,
+            MONGO_COLLECTION_EVENT_ROWS,
+            MONGO_COLLECTION_BATCH_ROWS,
+        ]:
+            cls.database[collection].delete_many(filters)
+
+    def test_should_migrate_rows_to_column_map(self):
+        filters = {"model_version_id": str(self.MODEL_VERSION_ID)}
+
+        converted = self.migration_service.migrate_to_column_map(
+            self.MODEL_VERSION_ID, batch_size=1
+        )
+
+        assert converted == {"event_rows": 2, "batch_rows": 1}
+        model_version = self.database[MONGO_COLLECTION_MODEL_VERSIONS].find_one(filters)
+        assert model_version["storage_format"] == RowStorageFormat.COLUMN_MAP.value
+
+        event_rows = list(self.database[MONGO_COLLECTION_EVENT_ROWS].find(filters))
+        assert all("columns" not in row for row in event_rows)
+        assert event_rows[0]["features"] == {"f1": 10.0}
+        assert event_rows[0]["predictions"] == {"p1": "1"}
+        assert event_rows[0]["actuals"] is None
+        assert event_rows[1]["actuals"] == {"p1": "1"}
+
+        batch_row = self.database[MONGO_COLLECTION_BATCH_ROWS].find_one(filters)
+        assert "actuals" not in batch_row
+        assert batch_row["features"] == {"f1": 10.0}
+
+        assert self.migration_service.migrate_to_column_map(self.MODEL_VERSION_ID) == {
+            "event_rows": 0,
+            "batch_rows": 0,
+        }
@@ -17,11 +17,32 @@ from datetime import datetime, timedelta
 
 import pytest
 
-from tests.testing_helpers import MODEL_ID, MODEL_ID_2, MongodbBackendTesting
-from waterdip.server.db.models.models import BaseModelDB
-from waterdip.server.db.mongodb import MONGO_COLLECTION_MODELS
-from waterdip.server.db.repositories.model_repository import ModelRepository
-from waterdip.server.services.model_service import ModelService
+from tests.testing_helpers import (
+    MODEL_ID,
+    MODEL_ID_2,
+    MODEL_VERSION_V1_SCHEMA,
+    MongodbBackendTesting,
+)
+from waterdip.core.commons.models import DatasetType, Environment, RowStorageFormat
+from waterdip.server.commons.config import settings
+from waterdip.server.db.models.datasets import BaseDatasetDB
+from waterdip.server.db.models.models import (
+    BaseModelDB,
+    BaseModelVersionDB,
+    ModelVersionSchemaInDB,
+)
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+    MONGO_COLLECTION_MODELS,
+)
+from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+from waterdip.server.db.repositories.model_repository import (
+    ModelRepository,
+    ModelVersionRepository,
+)
+from waterdip.server.services.dataset_service import DatasetService
+from waterdip.server.services.model_service import ModelService, ModelVersionService
 
 
 @pytest.mark.usefixtures("mock_mongo_backend")
@@ -82,6 +103,139 @@ class TestModelService:
         assert self.prediction_classes_output_2[1] in model["prediction_classes"]
         assert self.prediction_classes_output_2[2] in model["prediction_classes"]
 
+    def test_should_skip_update_when_prediction_classes_are_known(self, mocker):
+        model_id = uuid.uuid4()
+        self.model_service.register_model(
+            model_name="known classes", model_id=model_id
+        )
+        add_classes = mocker.spy(
+            self.model_service._repository, "add_prediction_classes"
+        )
+
+        new_classes = self.model_service.update_prediction_classes(
+            model_id=model_id, prediction_classes=["a", "b", "a"]
+        )
+        known_classes = self.model_service.update_prediction_classes(
+            model_id=model_id, prediction_classes=["b", "a"]
+        )
+
+        assert new_classes == ["a", "b"]
+        assert known_classes == []
+        assert add_classes.call_count == 1
+        model = self.mock_mongo_backend.database[MONGO_COLLECTION_MODELS].find_one(
+            {"model_id": str(model_id)}
+        )
+        assert model["prediction_classes"] == ["a", "b"]
+
     @classmethod
     def teardown_class(cls):
         cls.mock_mongo_backend.database[MONGO_COLLECTION_MODELS].drop()
+
+
+@pytest.mark.usefixtures("mock_mongo_backend")
+class TestModelVersionService:
+    LOCAL_MODEL_ID = uuid.uuid4()
+    LOCAL_MODEL_VERSION_ID = uuid.uuid4()
+
+    @classmethod
+    def setup_class(cls):
+        mock_mongo_backend = MongodbBackendTesting.get_instance()
+        mock_mongo_backend.database[MONGO_COLLECTION_MODEL_VERSIONS].insert_one(
+            BaseModelVersionDB(
+                model_id=cls.LOCAL_MODEL_ID,
+                model_version_id=cls.LOCAL_MODEL_VERSION_ID,
+                model_version="v1",
+                created_at=datetime.utcnow(),
+                version_schema=ModelVersionSchemaInDB(**MODEL_VERSION_V1_SCHEMA),
+            ).dict()
+        )
+        mock_mongo_backend.database[MONGO_COLLECTION_DATASETS].insert_one(
+            BaseDatasetDB(
+                dataset_id=uuid.uuid4(),
+                model_id=cls.LOCAL_MODEL_ID,
+                model_version_id=cls.LOCAL_MODEL_VERSION_ID,
+                dataset_type=DatasetType.EVENT,
+                dataset_name=Environment.PRODUCTION.value,
+                environment=Environment.PRODUCTION,
+                created_at=datetime.utcnow(),
+            ).dict()
+        )
+        cls.repository = ModelVersionRepository(mongodb=mock_mongo_backend)
+        cls.dataset_service = DatasetService(
+            repository=DatasetRepository(mongodb=mock_mongo_backend),
+            model_version_repository=cls.repository,
+        )
+
+    def test_should_serve_schema_plan_from_cache(self, mocker):
+        model_version_service = ModelVersionService(
+            repository=self.repository, dataset_service=self.dataset_service
+        )
+        find_version = mocker.spy(self.repository, "find_by_id")
+        find_dataset = mocker.spy(
+            self.dataset_service, "find_event_dataset_by_model_version_id"
+        )
+
+        plan = model_version_service.find_schema_plan(
+            self.LOCAL_MODEL_VERSION_ID, with_event_dataset=True
+        )
+        cached_plan = model_version_service.find_schema_plan(
+            self.LOCAL_MODEL_VERSION_ID, with_event_dataset=True
+        )
+
+        assert cached_plan is plan
+        assert plan.model_id == self.LOCAL_MODEL_ID
+        assert plan.event_dataset_id is not None
+        assert find_version.call_count == 1
+        assert find_dataset.call_count == 1
+
+    def test_should_recompile_schema_plan_on_storage_format_change(self, mocker):
+        mocker.patch.object(settings, "schema_plan_refresh_seconds", 0)
+        model_version_service = ModelVersionService(
+            repository=self.repository, dataset_service=self.dataset_service
+        )
+
+        plan = model_version_service.find_schema_plan(self.LOCAL_MODEL_VERSION_ID)
+        self.repository.update_storage_format(
+            self.LOCAL_MODEL_VERSION_ID, RowStorageFormat.COLUMN_MAP
+        )
+        migrated_plan = model_version_service.find_schema_plan(
+            self.LOCAL_MODEL_VERSION_ID
+        )
+        self.repository.update_storage_format(
+            self.LOCAL_MODEL_VERSION_ID, RowStorageFormat.COLUMN_LIST
+        )
+
+        assert plan.storage_format == RowStorageFormat.COLUMN_LIST
+        assert migrated_plan is not plan
+        assert migrated_plan.storage_format == RowStorageFormat.COLUMN_MAP
+
+    def test_should_not_read_storage_format_before_plan_refresh(self, mocker):
+        model_version_service = ModelVersionService(
+            repository=self.repository, dataset_service=self.dataset_service
+        )
+        find_storage_format = mocker.spy(self.repository, "find_storage_format")
+
+        for _ in range(3):
+            model_version_service.find_schema_plan(self.LOCAL_MODEL_VERSION_ID)
+
+        assert find_storage_format.call_count == 0
+
+    def test_should_invalidate_schema_plan_on_version_delete(self, mocker):
+        model_version_service = ModelVersionService(
+            repository=self.repository, dataset_service=self.dataset_service
+        )
+        mocker.patch.object(self.repository, "delete_versions_by_model_id")
+        find_version = mocker.spy(self.repository, "find_by_id")
+
+        model_version_service.find_schema_plan(self.LOCAL_MODEL_VERSION_ID)
+        model_version_service.delete_versions_by_model_id(self.LOCAL_MODEL_ID)
+        model_version_service.find_schema_plan(self.LOCAL_MODEL_VERSION_ID)
+
+        assert find_version.call_count == 2
+
+    @classmethod
+    def teardown_class(cls):
+        database = MongodbBackendTesting.get_instance().database
+        filters = {"model_version_id": str(cls.LOCAL_MODEL_VERSION_ID)}
+        database[MONGO_COLLECTION_MODEL_VERSIONS].delete_many(filters)
+        database[MONGO_COLLECTION_DATASETS].delete_many(filters)
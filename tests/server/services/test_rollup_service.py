@@ -0,0 +1,235 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.testing_helpers import MODEL_VERSION_V1_SCHEMA, MongodbBackendTesting
+from waterdip.core.commons.models import DatasetType, Environment, RowStorageFormat
+from waterdip.core.metrics.rollups import RowStats, day_floor
+from waterdip.server.db.models.datasets import BaseDatasetDB
+from waterdip.server.db.models.models import BaseModelVersionDB, ModelVersionSchemaInDB
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_EVENT_ROLLUPS,
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+)
+from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+from waterdip.server.db.repositories.dataset_row_repository import (
+    EventDatasetRowRepository,
+)
+from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+from waterdip.server.db.repositories.rollup_repository import EventRollupRepository
+from waterdip.server.services.rollup_service import EventRollupService
+
+
+@pytest.mark.usefixtures("mock_mongo_backend")
+class TestEventRollupService:
+    MODEL_ID = uuid.uuid4()
+    MODEL_VERSION_ID = uuid.uuid4()
+    DATASET_ID = uuid.uuid4()
+
+    @classmethod
+    def setup_class(cls):
+        mock_mongo_backend = MongodbBackendTesting.get_instance()
+        cls.database = mock_mongo_backend.database
+        cls.database[MONGO_COLLECTION_MODEL_VERSIONS].insert_one(
+            BaseModelVersionDB(
+                model_id=cls.MODEL_ID,
+                model_version_id=cls.MODEL_VERSION_ID,
+                model_version="v1",
+                created_at=datetime.utcnow(),
+                version_schema=ModelVersionSchemaInDB(**MODEL_VERSION_V1_SCHEMA),
+                storage_format=RowStorageFormat.COLUMN_MAP,
+            ).dict()
+        )
+        cls.database[MONGO_COLLECTION_DATASETS].insert_one(
+            BaseDatasetDB(
+                dataset_id=cls.DATASET_ID,
+                model_id=cls.MODEL_ID,
+                model_version_id=cls.MODEL_VERSION_ID,
+                dataset_type=DatasetType.EVENT,
+                dataset_name="v1_events",
+                environment=Environment.PRODUCTION,
+                created_at=datetime.utcnow(),
+            ).dict()
+        )
+        cls.rollup_service = EventRollupService(
+            repository=EventRollupRepository(mongodb=mock_mongo_backend),
+            dataset_repository=DatasetRepository(mongodb=mock_mongo_backend),
+            model_version_repository=ModelVersionRepository(mongodb=mock_mongo_backend),
+            row_repository=EventDatasetRowRepository(mongodb=mock_mongo_backend),
+        )
+
+    @classmethod
+    def teardown_class(cls):
+        for collection in [
+            MONGO_COLLECTION_DATASETS,
+            MONGO_COLLECTION_EVENT_ROLLUPS,
+            MONGO_COLLECTION_EVENT_ROWS,
+        ]:
+            cls.database[collection].delete_many({"dataset_id": str(cls.DATASET_ID)})
+        cls.database[MONGO_COLLECTION_MODEL_VERSIONS].delete_many(
+            {"model_version_id": str(cls.MODEL_VERSION_ID)}
+        )
+
+    def _documents(self, created_at, count):
+        return [
+            {
+                "dataset_id": str(self.DATASET_ID),
+                "model_id": str(self.MODEL_ID),
+                "model_version_id": str(self.MODEL_VERSION_ID),
+                "created_at": created_at,
+                "features": {"f1": float(i), "f2": "red"},
+                "predictions": {"p1": 1.0},
+            }
+            for i in range(count)
+        ]
+
+    def _rollup_from(self):
+        return self.database[MONGO_COLLECTION_DATASETS].find_one(
+            {"dataset_id": str(self.DATASET_ID)}
+        )["rollup_from"]
+
+    def _pending_dataset_ids(self):
+        return [d.dataset_id for d in self.rollup_service.pending_datasets()]
+
+    def _rows_rollup(self, day):
+        return self.database[MONGO_COLLECTION_EVENT_ROLLUPS].find_one(
+            {"dataset_id": str(self.DATASET_ID), "day": day, "column": None}
+        )
+
+    def test_should_increment_rollups_and_mark_them_complete_from_tomorrow(self):
+        today = day_floor(datetime.utcnow())
+        documents = self._documents(datetime.utcnow(), 3)
+        self.database[MONGO_COLLECTION_EVENT_ROWS].insert_many(documents)
+
+        self.rollup_service.increment(documents)
+        self.rollup_service.increment(documents[:1])
+
+        assert self._rows_rollup(today)["rows"] == 4
+        assert self._rollup_from() == today + timedelta(days=1)
+        assert self.DATASET_ID in self._pending_dataset_ids()
+
+    def test_should_rebuild_past_days_from_rows(self):
+        today = day_floor(datetime.utcnow())
+        first_day = today - timedelta(days=10)
+        self.database[MONGO_COLLECTION_EVENT_ROWS].insert_many(
+            self._documents(first_day + timedelta(hours=5), 2)
+        )
+
+        stored = self.rollup_service.rebuild(self.DATASET_ID)
+
+        # rows and f1, f2, p1 of the first day
+        assert stored == 4
+        assert self._rows_rollup(first_day)["rows"] == 2
+        # the current day is not complete until it is rebuilt the next day
+        assert self._rollup_from() == today + timedelta(days=1)
+
+        # as if the first increment happened the day before
+        DatasetRepository(
+            mongodb=MongodbBackendTesting.get_instance()
+        ).update_rollup_from(self.DATASET_ID, today)
+        self.rollup_service.rebuild(self.DATASET_ID)
+
+        assert self._rollup_from() == first_day
+        assert self.DATASET_ID not in self._pending_dataset_ids()
+
+    def test_should_move_rolled_up_rows_to_delayed_actuals(self):
+        today = day_floor(datetime.utcnow())
+        day = today - timedelta(days=20)
+        row = {
+            **self._documents(day + timedelta(hours=1), 1)[0],
+            "prediction_cf": ["1.0"],
+            "actual_cf": None,
+            "is_match": None,
+        }
+        self.rollup_service.increment([row])
+
+        fields = {"actual_cf": ["1.0"], "is_match": True, "actuals": {"p1": 1.0}}
+        self.rollup_service.move_actuals([(row, fields)])
+
+        stats = RowStats.from_document(self._rows_rollup(day))
+        assert stats.rows == 1
+        assert stats.matches == 1
+        assert +stats.cells == {("1.0", "1.0"): 1}
+
+        # replaced ACTUAL columns can not be subtracted from the rollups
+        row = {**row, **fields}
+        self.rollup_service.move_actuals(
+            [(row, {"actual_cf": ["0.0"], "is_match": False, "columns": []})]
+        )
+
+        stats = RowStats.from_document(self._rows_rollup(day))
+        assert stats.matches == 0
+        assert +stats.cells == {("1.0", "0.0"): 1}
+        assert self._rollup_from() == today + timedelta(days=1)
+
+    def test_should_leave_rollups_incomplete_when_rebuilt_day_is_incremented(
+        self, monkeypatch
+    ):
+        today = day_floor(datetime.utcnow())
+        day = today - timedelta(days=5)
+        rows = self.database[MONGO_COLLECTION_EVENT_ROWS]
+        rows.insert_many(self._documents(day + timedelta(hours=1), 2))
+        dataset_repository = DatasetRepository(
+            mongodb=MongodbBackendTesting.get_instance()
+        )
+        dataset_repository.update_rollup_from(self.DATASET_ID, today)
+        replace_days = self.rollup_service._repository.replace_days
+
+        def replace_days_after_late_row(**kwargs):
+            # a row of the day is logged between the read and the replace
+            if kwargs["first_day"] <= day < kwargs["end_day"]:
+                late_row = self._documents(day + timedelta(hours=2), 1)
+                rows.insert_many(late_row)
+                self.rollup_service.increment(late_row)
+            return replace_days(**kwargs)
+
+        monkeypatch.setattr(
+            self.rollup_service._repository,
+            "replace_days",
+            replace_days_after_late_row,
+        )
+        self.rollup_service.rebuild(self.DATASET_ID)
+
+        assert self._rows_rollup(day)["rows"] == 2
+        assert self._rollup_from() == today + timedelta(days=1)
+
+        monkeypatch.setattr(
+            self.rollup_service._repository, "replace_days", replace_days
+        )
+        dataset_repository.update_rollup_from(self.DATASET_ID, today)
+        self.rollup_service.rebuild(self.DATASET_ID)
+
+        assert self._rows_rollup(day)["rows"] == 3
+        assert self._rollup_from() < today
+
+    def test_should_read_rollups_from_rows_when_increment_fails(self, monkeypatch):
+        today = day_floor(datetime.utcnow())
+        DatasetRepository(
+            mongodb=MongodbBackendTesting.get_instance()
+        ).update_rollup_from(self.DATASET_ID, today - timedelta(days=30))
+
+        def fail(**kwargs):
+            raise ConnectionError("rollups are not reachable")
+
+        monkeypatch.setattr(self.rollup_service._repository, "increment", fail)
+        with pytest.raises(ConnectionError):
+            self.rollup_service.increment(self._documents(datetime.utcnow(), 1))
+
+        assert self._rollup_from() == today + timedelta(days=1)
@@ -0,0 +1,297 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from waterdip.core.commons.models import ColumnDataType, RowStorageFormat
+from waterdip.server.db.models.models import (
+    ModelVersionSchemaFieldDetails,
+    ModelVersionSchemaInDB,
+)
+from waterdip.server.services.logging_service import ServiceLogEvent, ServiceLogRow
+from waterdip.server.services.row_service import ServiceClassificationEventRow
+from waterdip.server.services.schema_plan import SchemaPlan, SchemaPlanCache
+
+
+class TestSchemaPlan:
+    @classmethod
+    def setup_class(self):
+        self.version_schema = ModelVersionSchemaInDB(
+            features={
+                "f1": ModelVersionSchemaFieldDetails(data_type=ColumnDataType.NUMERIC),
+                "f2": ModelVersionSchemaFieldDetails(
+                    data_type=ColumnDataType.CATEGORICAL
+                ),
+            },
+            predictions={
+                "p1": ModelVersionSchemaFieldDetails(
+                    data_type=ColumnDataType.CATEGORICAL, list_index=1
+                ),
+                "p2": ModelVersionSchemaFieldDetails(
+                    data_type=ColumnDataType.NUMERIC, list_index=0
+                ),
+            },
+        )
+        self.plan = SchemaPlan.compile(self.version_schema)
+        self.model_id = uuid.uuid4()
+        self.model_version_id = uuid.uuid4()
+        self.dataset_id = uuid.uuid4()
+
+    def _documents(self, events):
+        return self.plan.classification_event_documents(
+            events=events,
+            timestamps=[datetime(2022, 12, 23)] * len(events),
+            model_id=self.model_id,
+            model_version_id=self.model_version_id,
+            dataset_id=self.dataset_id,
+        )
+
+    def test_should_match_event_row_model_structure(self):
+        event = ServiceLogEvent(
+            features={"f1": 2.5, "f2": "red"},
+            predictions={"p1": "yes", "p2": 1},
+            actuals={"p1": "no", "p2": 1},
+            event_id="event-1",
+        )
+        documents, classes = self._documents([event])
+        document = documents[0]
+
+        expected = ServiceClassificationEventRow(
+            row_id=document["row_id"],
+            event_id=document["event_id"],
+            model_id=self.model_id,
+            model_version_id=self.model_version_id,
+            dataset_id=self.dataset_id,
+            columns=document["columns"],
+            prediction_cf=document["prediction_cf"],
+            actual_cf=document["actual_cf"],
+            created_at=document["created_at"],
+            is_match=document["is_match"],
+        ).dict()
+
+        assert list(document.keys()) == list(expected.keys())
+        assert [list(column.keys()) for column in document["columns"]] == [
+            list(column.keys()) for column in expected["columns"]
+        ]
+        assert [column["name"] for column in document["columns"]] == [
+            "f1",
+            "f2",
+            "p1",
+            "p2",
+            "p1",
+            "p2",
+        ]
+        assert document["columns"][2]["mapping_type"] == "PREDICTION"
+        assert document["columns"][4]["mapping_type"] == "ACTUAL"
+        assert document["columns"][0]["value_numeric"] == 2.5
+        assert document["prediction_cf"] == ["1.0", "yes"]
+        assert document["actual_cf"] == ["1.0", "no"]
+        assert document["is_match"] is False
+        assert document["event_id"] == "event-1"
+        assert classes == ["yes", 1]
+
+    def test_should_skip_actuals_when_not_logged(self):
+        event = ServiceLogEvent(
+            features={"f1": None, "f2": "red"}, predictions={"p1": "yes", "p2": 0}
+        )
+        documents, _ = self._documents([event])
+
+        assert len(documents[0]["columns"]) == 4
+        assert documents[0]["columns"][0]["value_numeric"] is None
+        assert documents[0]["actual_cf"] is None
+        assert documents[0]["is_match"] is None
+        assert documents[0]["event_id"]
+
+    def test_should_raise_error_for_unknown_column(self):
+        event = ServiceLogEvent(features={"f3": 1}, predictions={"p1": "yes", "p2": 0})
+        with pytest.raises(ValueError):
+            self._documents([event])
+
+    def test_should_leave_missing_predictions_none(self):
+        event = ServiceLogEvent(
+            features={"f1": 1}, predictions={"p1": "yes"}, actuals={"p2": 0}
+        )
+        documents, _ = self._documents([event])
+
+        assert documents[0]["prediction_cf"] == [None, "yes"]
+        assert documents[0]["actual_cf"] == ["0.0", None]
+        assert documents[0]["is_match"] is False
+
+    def test_should_key_prediction_classes_by_prediction_column(self):
+        assert self.plan.class_keys(["1", "yes", 0.5]) == {
+            0: ["1.0", "0.5"],
+            1: ["1", "yes", "0.5"],
+        }
+
+    def test_should_build_actual_fields_of_delayed_actuals(self):
+        fields = self.plan.actual_fields({"p1": "no", "p2": 1}, ["1.0", "yes"])
+
+        assert fields["actual_cf"] == ["1.0", "no"]
+        assert fields["is_match"] is False
+        assert [(c["name"], c["mapping_type"]) for c in fields["columns"]] == [
+            ("p1", "ACTUAL"),
+            ("p2", "ACTUAL"),
+        ]
+        fields = self.plan.actual_fields({"p1": "no"}, ["1.0", "yes"])
+        assert fields["actual_cf"] == [None, "no"]
+        assert fields["is_match"] is False
+
+    def test_should_convert_batch_rows(self):
+        row = ServiceLogRow(features={"f1": 10, "f2": "red"}, predictions={"p1": "yes"})
+        documents = self.plan.batch_row_documents(
+            rows=[row],
+            model_id=self.model_id,
+            model_version_id=self.model_version_id,
+            dataset_id=self.dataset_id,
+            created_at=datetime(2022, 12, 23),
+        )
+
+        assert documents[0]["dataset_id"] == str(self.dataset_id)
+        assert documents[0]["columns"] == [
+            {
+                "name": "f1",
+                "value_numeric": 10.0,
+                "value_categorical": None,
+                "data_type": "NUMERIC",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "f2",
+                "value_numeric": None,
+                "value_categorical": "red",
+                "data_type": "CATEGORICAL",
+                "mapping_type": "FEATURE",
+            },
+            {
+                "name": "p1",
+                "value_numeric": None,
+                "value_categorical": "yes",
+                "data_type": "CATEGORICAL",
+                "mapping_type": "PREDICTION",
+            },
+        ]
+
+
+@pytest.mark.parametrize(
+    "storage_format", [RowStorageFormat.COLUMN_LIST, RowStorageFormat.COLUMN_MAP]
+)
+def test_should_convert_column_batch_as_rows(storage_format):
+    plan = SchemaPlan.compile(
+        TestSchemaPlan.version_schema, storage_format=storage_format
+    )
+    rows = [
+        ServiceLogRow(features={"f1": "1.5", "f2": "red"}, predictions={"p1": "yes"}),
+        ServiceLogRow(features={"f1": None, "f2": None}, predictions={"p1": "no"}),
+    ]
+    columns = {
+        "p1": ["yes", "no"],
+        "f1": ["1.5", None],
+        "id": [1, 2],
+        "f2": ["red", None],
+    }
+    ids = dict(
+        model_id=uuid.uuid4(),
+        model_version_id=uuid.uuid4(),
+        dataset_id=uuid.uuid4(),
+        created_at=datetime(2022, 12, 23),
+    )
+
+    column_documents = plan.batch_column_documents(columns, **ids)
+    row_documents = plan.batch_row_documents(rows, **ids)
+
+    for document in column_documents + row_documents:
+        document.pop("row_id")
+    assert column_documents == row_documents
+
+
+class TestColumnMapSchemaPlan:
+    def test_should_build_column_maps(self):
+        plan = SchemaPlan.compile(
+            TestSchemaPlan.version_schema,
+            storage_format=RowStorageFormat.COLUMN_MAP,
+        )
+        event = ServiceLogEvent(
+            features={"f1": 2, "f2": "red"},
+            predictions={"p1": "yes", "p2": 1},
+            actuals={"p1": "yes", "p2": 1},
+        )
+        documents, _ = plan.classification_event_documents(
+            events=[event],
+            timestamps=[datetime(2022, 12, 23)],
+            model_id=uuid.uuid4(),
+            model_version_id=uuid.uuid4(),
+            dataset_id=uuid.uuid4(),
+        )
+
+        assert "columns" not in documents[0]
+        assert documents[0]["features"] == {"f1": 2.0, "f2": "red"}
+        assert documents[0]["predictions"] == {"p1": "yes", "p2": 1.0}
+        assert documents[0]["actuals"] == {"p1": "yes", "p2": 1.0}
+        assert documents[0]["prediction_cf"] == ["1.0", "yes"]
+        assert documents[0]["is_match"] is True
+
+        fields = plan.actual_fields({"p1": "yes", "p2": 1}, ["1.0", "yes"])
+        assert fields == {
+            "actual_cf": ["1.0", "yes"],
+            "is_match": True,
+            "actuals": {"p1": "yes", "p2": 1.0},
+        }
+
+
+class TestSchemaPlanCache:
+    @staticmethod
+    def _plan(model_id):
+        return SchemaPlan(features={}, predictions={}, model_id=model_id)
+
+    def test_should_evict_least_recently_used_plan(self):
+        cache = SchemaPlanCache(max_size=2)
+        model_id = uuid.uuid4()
+        versions = [uuid.uuid4() for _ in range(3)]
+
+        cache.put(versions[0], self._plan(model_id))
+        cache.put(versions[1], self._plan(model_id))
+        cache.get(versions[0])
+        cache.put(versions[2], self._plan(model_id))
+
+        assert len(cache) == 2
+        assert cache.get(versions[0]) is not None
+        assert cache.get(versions[1]) is None
+
+    def test_should_invalidate_all_plans_of_model(self):
+        cache = SchemaPlanCache()
+        model_id, other_model_id = uuid.uuid4(), uuid.uuid4()
+        versions = [uuid.uuid4() for _ in range(3)]
+
+        cache.put(versions[0], self._plan(model_id))
+        cache.put(versions[1], self._plan(model_id))
+        cache.put(versions[2], self._plan(other_model_id))
+        cache.invalidate_model(model_id)
+
+        assert cache.get(versions[0]) is None
+        assert cache.get(versions[1]) is None
+        assert cache.get(versions[2]) is not None
+
+    def test_should_claim_refresh_of_plan_once_per_interval(self):
+        cache = SchemaPlanCache(refresh_seconds=0)
+        version = uuid.uuid4()
+
+        assert cache.claim_refresh(version) is False
+        cache.put(version, self._plan(uuid.uuid4()))
+        assert cache.claim_refresh(version) is True
+
+        cache.refresh_seconds = 60
+        assert cache.claim_refresh(version) is False
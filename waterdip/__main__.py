@@ -13,11 +13,6 @@
 #  limitations under the License.
 
 if __name__ == "__main__":
-    import uvicorn
+    from waterdip.cli import main
 
-    uvicorn.run(
-        "waterdip:app",
-        port=4422,
-        host="0.0.0.0",
-        access_log=True,
-    )
+    main()
@@ -0,0 +1,163 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import argparse
+from typing import List, Optional
+from uuid import UUID
+
+
+def run_server(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "waterdip:app",
+        port=args.port,
+        host=args.host,
+        access_log=True,
+    )
+
+
+def migrate_storage(args: argparse.Namespace) -> None:
+    from waterdip.server.db.mongodb import MongodbBackend
+    from waterdip.server.db.repositories.dataset_row_repository import (
+        BatchDatasetRowRepository,
+        EventDatasetRowRepository,
+    )
+    from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+    from waterdip.server.services.migration_service import RowStorageMigrationService
+
+    mongodb = MongodbBackend.get_instance()
+    migration_service = RowStorageMigrationService(
+        model_version_repository=ModelVersionRepository(mongodb=mongodb),
+        event_row_repository=EventDatasetRowRepository(mongodb=mongodb),
+        batch_row_repository=BatchDatasetRowRepository(mongodb=mongodb),
+    )
+    for model_version_id in args.model_version_id:
+        converted = migration_service.migrate_to_column_map(
+            model_version_id=model_version_id, batch_size=args.batch_size
+        )
+        print(
+            f"model version [{model_version_id}]: "
+            f"{converted['event_rows']} event rows, "
+            f"{converted['batch_rows']} batch rows converted"
+        )
+
+
+def ensure_indexes(args: argparse.Namespace) -> None:
+    from waterdip.server.db.mongodb import MongodbBackend
+
+    ensured = MongodbBackend.get_instance().ensure_indexes()
+    for collection, names in ensured.items():
+        print(f"{collection}: {', '.join(names)}")
+
+
+def ingest_baseline(args: argparse.Namespace) -> None:
+    from waterdip.core.commons.models import BaselineFileFormat
+    from waterdip.server.commons.baseline_files import file_format_of
+    from waterdip.server.commons.config import settings
+    from waterdip.server.db.mongodb import MongodbBackend
+    from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+    from waterdip.server.db.repositories.dataset_row_repository import (
+        BatchDatasetRowRepository,
+    )
+    from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+    from waterdip.server.db.repositories.profile_repository import (
+        DatasetProfileRepository,
+    )
+    from waterdip.server.services.dataset_service import DatasetService
+    from waterdip.server.services.logging_service import BatchLoggingService
+    from waterdip.server.services.model_service import ModelVersionService
+    from waterdip.server.services.row_service import BatchDatasetRowService
+
+    mongodb = MongodbBackend.get_instance()
+    dataset_service = DatasetService(
+        repository=DatasetRepository(mongodb=mongodb),
+        model_version_repository=ModelVersionRepository(mongodb=mongodb),
+    )
+    logging_service = BatchLoggingService(
+        model_version_service=ModelVersionService(
+            repository=ModelVersionRepository(mongodb=mongodb),
+            dataset_service=dataset_service,
+        ),
+        dataset_service=dataset_service,
+        row_service=BatchDatasetRowService(
+            repository=BatchDatasetRowRepository(mongodb=mongodb)
+        ),
+        profile_repository=DatasetProfileRepository(mongodb=mongodb)
+        if settings.dataset_profiles_enabled
+        else None,
+    )
+    file_format = (
+        BaselineFileFormat(args.format) if args.format else file_format_of(args.path)
+    )
+    with open(args.path, "rb") as file:
+        logged = logging_service.log_file(
+            model_version_id=args.model_version_id,
+            environment=args.environment,
+            file=file,
+            file_format=file_format,
+            batch_size=args.batch_size,
+        )
+    print(
+        f"dataset [{logged['dataset_id']}]: {logged['total']} rows "
+        f"of {args.environment} ingested from {args.path}"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="waterdip", description="Waterdip server")
+    parser.set_defaults(handler=run_server, host="0.0.0.0", port=4422)
+    commands = parser.add_subparsers(title="commands")
+
+    server = commands.add_parser("server", help="run the waterdip server")
+    server.add_argument("--host", default="0.0.0.0")
+    server.add_argument("--port", type=int, default=4422)
+    server.set_defaults(handler=run_server)
+
+    migrate = commands.add_parser(
+        "migrate-storage",
+        help="rewrite the rows of model versions to the COLUMN_MAP storage format",
+    )
+    migrate.add_argument("--model-version-id", type=UUID, nargs="+", required=True)
+    migrate.add_argument("--batch-size", type=int, default=1000)
+    migrate.set_defaults(handler=migrate_storage)
+
+    indexes = commands.add_parser(
+        "ensure-indexes", help="create the missing indexes of the waterdip collections"
+    )
+    indexes.set_defaults(handler=ensure_indexes)
+
+    baseline = commands.add_parser(
+        "ingest-baseline",
+        help="create a batch dataset from a CSV, Parquet or Arrow file",
+    )
+    baseline.add_argument("path", help="baseline file")
+    baseline.add_argument("--model-version-id", type=UUID, required=True)
+    baseline.add_argument(
+        "--environment", choices=["TRAINING", "TESTING", "VALIDATION"], required=True
+    )
+    baseline.add_argument(
+        "--format",
+        choices=["CSV", "PARQUET", "ARROW"],
+        help="file format, by the file extension by default",
+    )
+    baseline.add_argument("--batch-size", type=int, default=5000)
+    baseline.set_defaults(handler=ingest_baseline)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    args.handler(args)
@@ -82,6 +82,24 @@ class PerformanceMetric(str, Enum):
     F1 = "F1"
 
 
+class BaselineFileFormat(str, Enum):
+    """
+    File formats of baseline dataset files
+    Attributes:
+    ------------------
+    CSV:
+        comma separated values with a header row
+    PARQUET:
+        Apache Parquet file
+    ARROW:
+        Apache Arrow IPC file or stream, e.g. a Feather v2 file
+    """
+
+    CSV = "CSV"
+    PARQUET = "PARQUET"
+    ARROW = "ARROW"
+
+
 class TimeRange(BaseModel):
     """
     Attributes:
@@ -96,6 +114,27 @@ class TimeRange(BaseModel):
     end_time: datetime
 
 
+class TimeGrain(str, Enum):
+    """
+    Time bucket size of metric time ranges and date histograms
+    Attributes:
+    ------------------
+    MINUTE:
+        full minutes
+    HOUR:
+        full hours
+    DAY:
+        full UTC days
+    WEEK:
+        full UTC weeks, starting on monday
+    """
+
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+
+
 class ModelBaselineTimeWindowType(str, Enum):
     """
     Model baseline time window type.
@@ -300,6 +339,25 @@ class ColumnMappingType(str, Enum):
     ACTUAL_SCORE = "ACTUAL_SCORE"
 
 
+class RowStorageFormat(str, Enum):
+    """
+    storage layout of the dataset rows of a model version
+
+    Attributes:
+    ------------------
+    COLUMN_LIST:
+        every row holds a `columns` list of column documents, with the name, data type
+        and mapping type repeated in each of them
+    COLUMN_MAP:
+        every row holds flat `features`, `predictions` and `actuals` maps of column name
+        to value. Data types are kept once in the model version schema
+
+    """
+
+    COLUMN_LIST = "COLUMN_LIST"
+    COLUMN_MAP = "COLUMN_MAP"
+
+
 class MonitorSeverity(str, Enum):
     """
     severity of the monitor
@@ -0,0 +1,106 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from waterdip.core.commons.models import TimeGrain, TimeRange
+
+ONE_MILLISECOND = timedelta(milliseconds=1)
+DEFAULT_TIME_WINDOW = timedelta(days=7)
+
+GRAIN_DURATIONS = {
+    TimeGrain.MINUTE: timedelta(minutes=1),
+    TimeGrain.HOUR: timedelta(hours=1),
+    TimeGrain.DAY: timedelta(days=1),
+    TimeGrain.WEEK: timedelta(weeks=1),
+}
+# a monday midnight, every grain bucket starts a whole number of grains after it
+GRAIN_ORIGIN = datetime(1970, 1, 5)
+
+
+def grain_floor(moment: datetime, grain: TimeGrain) -> datetime:
+    """Start of the grain bucket the moment falls in"""
+    duration = GRAIN_DURATIONS[grain]
+    return moment - (moment - GRAIN_ORIGIN) % duration
+
+
+def grain_ceil(moment: datetime, grain: TimeGrain) -> datetime:
+    """First grain boundary at or after the moment"""
+    floor = grain_floor(moment, grain)
+    return floor if floor == moment else floor + GRAIN_DURATIONS[grain]
+
+
+def grain_buckets(time_range: TimeRange, grain: TimeGrain) -> List[datetime]:
+    """Start of every grain bucket touched by the time range, in order"""
+    bucket, duration = grain_floor(time_range.start_time, grain), GRAIN_DURATIONS[grain]
+    buckets = []
+    while bucket <= time_range.end_time:
+        buckets.append(bucket)
+        bucket += duration
+    return buckets
+
+
+def grain_bucket_expression(field: str, grain: TimeGrain) -> Dict:
+    """
+    Mongodb expression of the start of the grain bucket of a date field. It matches
+    `$dateTrunc` for UTC dates, using date arithmetic which any mongodb supports
+    """
+    duration_ms = GRAIN_DURATIONS[grain] // timedelta(milliseconds=1)
+    return {
+        "$subtract": [
+            field,
+            {"$mod": [{"$subtract": [field, GRAIN_ORIGIN]}, duration_ms]},
+        ]
+    }
+
+
+def normalize_time_range(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    grain: TimeGrain = TimeGrain.HOUR,
+    default_window: timedelta = DEFAULT_TIME_WINDOW,
+    now: Optional[datetime] = None,
+) -> TimeRange:
+    """
+    Snaps a metric time range to whole grain buckets.
+
+    The start is moved back to the start of its bucket and the end forward to the last
+    millisecond of its bucket, as metric queries include the end time. A missing end
+    defaults to the current time and a missing start to `default_window` before the
+    end, both evaluated per call. Timezone aware bounds are converted to naive UTC,
+    which is how the rows are stored.
+
+    Every range ending in the same bucket gets the same bounds, so the snapped range
+    is a stable cache key and the date histogram buckets are whole buckets.
+    """
+    end_time = _naive_utc(end_time) if end_time is not None else None
+    if end_time is None:
+        end_time = now if now is not None else datetime.utcnow()
+    start_time = (
+        _naive_utc(start_time) if start_time is not None else end_time - default_window
+    )
+    if start_time > end_time:
+        raise ValueError("start time of the time range is after its end time")
+    return TimeRange(
+        start_time=grain_floor(start_time, grain),
+        end_time=grain_ceil(end_time + ONE_MILLISECOND, grain) - ONE_MILLISECOND,
+    )
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment
+    return (moment - moment.utcoffset()).replace(tzinfo=None)
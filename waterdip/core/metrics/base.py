@@ -13,7 +13,7 @@
 #  limitations under the License.
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, Hashable, List
 
 from pymongo.collection import Collection
 
@@ -48,3 +48,77 @@ class MongoMetric(ABC):
                 }
             }
         return time_filter
+
+
+class SharedMetric(MongoMetric):
+    """
+    Metric which result is computed once and read by several monitor evaluators.
+    The first aggregation_result computes the result of the wrapped metric, the
+    next ones return the same result whatever their arguments, so a shared metric
+    must only be read by evaluators asking for the same data.
+
+    Attributes:
+    ------------------
+    metric:
+        wrapped metric
+    reads:
+        number of aggregation_result calls
+    """
+
+    def __init__(self, metric: MongoMetric):
+        super().__init__(metric._collection)
+        self.metric = metric
+        self.reads = 0
+        self._result = None
+        self._computed = False
+
+    @property
+    def metric_name(self) -> str:
+        return self.metric.metric_name
+
+    @property
+    def computed(self) -> bool:
+        return self._computed
+
+    def aggregation_result(self, **kwargs) -> Dict[str, Any]:
+        self.reads += 1
+        if not self._computed:
+            self._result = self.metric.aggregation_result(**kwargs)
+            self._computed = True
+        return self._result
+
+    def _aggregation_query(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        return self.metric._aggregation_query(*args, **kwargs)
+
+
+class SharedMetrics:
+    """
+    Shared metrics of a group of monitors evaluated together, by key. The key
+    identifies the data read by the metric, monitors with the same key read the
+    result of one aggregation.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[Hashable, SharedMetric] = {}
+
+    def get(self, key: Hashable, factory: Callable[[], MongoMetric]) -> SharedMetric:
+        """
+        Shared metric of the key, the metric is built by the factory the first
+        time the key is seen
+        """
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = SharedMetric(factory())
+        return metric
+
+    @property
+    def scans(self) -> int:
+        """Number of computed metric results"""
+        return sum(1 for metric in self._metrics.values() if metric.computed)
+
+    @property
+    def saved_scans(self) -> int:
+        """Number of metric reads served by an already computed result"""
+        return sum(
+            metric.reads - 1 for metric in self._metrics.values() if metric.computed
+        )
@@ -11,32 +11,63 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from datetime import timedelta
-from typing import Any, Dict, List
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 
 from pymongo.collection import Collection
 
-from waterdip.core.commons.models import TimeRange
+from waterdip.core.commons.models import TimeGrain, TimeRange
+from waterdip.core.commons.time_ranges import (
+    grain_bucket_expression,
+    grain_buckets,
+    grain_floor,
+)
 from waterdip.core.metrics.base import MongoMetric
+from waterdip.core.metrics.confusion import (
+    ClassCounts,
+    averages,
+    class_counts,
+    class_report,
+)
+from waterdip.core.metrics.rollups import DailyRollups, RowStats
 
 
 class ClassificationDateHistogramDBMetrics(MongoMetric):
     """
+    Classification performance metrics per time bucket. All the metrics are
+    returned as lists aligned with the sorted list of bucket start times.
+
     Attributes:
     -----
     collection: Collection
         mongo collection
     dataset_id: UUID
         dataset id on which the metric calculation will be applied
+    rollups: DailyRollups, optional
+        daily rollups of the dataset. When provided and the granularity is at least
+        a day, the whole days of the time range are read from the rollups instead of
+        the rows
+    granularity: TimeGrain
+        size of the time buckets, a day by default
 
     """
 
-    def __init__(self, collection: Collection, dataset_id: UUID, positive_class: str):
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        positive_class: str,
+        rollups: Optional[DailyRollups] = None,
+        granularity: TimeGrain = TimeGrain.DAY,
+    ):
         super().__init__(collection)
         self._dataset_id = dataset_id
         self._positive_class = positive_class
         self._class_position = 0
+        self._rollups = rollups
+        self._granularity = granularity
 
     @staticmethod
     def _time_filter_builder(time_range: TimeRange = None):
@@ -51,255 +82,204 @@ class ClassificationDateHistogramDBMetrics(MongoMetric):
         return time_filter
 
     @staticmethod
-    def _dict_day_ratio(cnt, total) -> Dict:
-        dct = {}
-        for key in set(cnt.keys()) & set(total.keys()):
-            if total[key] != 0:
-                dct[key] = round(cnt[key] / total[key], 2)
-            else:
-                dct[key] = None
-        return dct
-
-    def _date_histogram_converter(
-        self, histograms: List, histogram_buckets: List[str]
-    ) -> Dict:
-        date_histogram = {}
-        for item in histograms:
-            date_id = item["_id"]
-            date_key = self._date_histogram_bucket_format(
-                day=date_id["day"], month=date_id["month"], year=date_id["year"]
-            )
-            date_histogram[date_key] = item["count"]
-
-        for histogram_bucket in histogram_buckets:
-            if histogram_bucket not in date_histogram:
-                date_histogram[histogram_bucket] = 0
-
-        return date_histogram
-
-    @staticmethod
-    def _date_histogram_bucket_format(day: int, month: int, year: int):
-        hist_bin_day = f"{'0' if day < 10 else ''}{day}"
-        hist_bin_month = f"{'0' if month < 10 else ''}{month}"
-        return f"{hist_bin_day}-{hist_bin_month}-{year}"
+    def _rate(count: int, total: int) -> Optional[float]:
+        return round(count / total, 2) if total != 0 else None
 
-    def _get_date_hist_buckets(self, time_range: TimeRange) -> List[str]:
-        buckets: List[str] = []
-        delta = time_range.end_time - time_range.start_time
-        for i in range(delta.days + 1):
-            delta_day = time_range.start_time + timedelta(days=i)
-            bucket = self._date_histogram_bucket_format(
-                day=delta_day.day, month=delta_day.month, year=delta_day.year
-            )
-            buckets.append(bucket)
-
-        return buckets
+    def _get_date_hist_buckets(self, time_range: TimeRange) -> List[datetime]:
+        """Start of every time bucket touched by the time range"""
+        return grain_buckets(time_range, self._granularity)
 
     @property
     def metric_name(self) -> str:
         return "classification_date_hist"
 
-    def _histogram_ratio(
-        self, numerators: List, denominators: List, histogram_buckets: List[str]
-    ) -> Dict:
-        is_match_count_date_hist = self._date_histogram_converter(
-            numerators, histogram_buckets
-        )
-        total_hist_date_hist = self._date_histogram_converter(
-            denominators, histogram_buckets
-        )
-        return self._dict_day_ratio(is_match_count_date_hist, total_hist_date_hist)
-
-    @staticmethod
-    def _precision(true_positive_hist: Dict, false_positive_hist: Dict) -> Dict:
-        precision_hist = {}
-        for key, tp_value in true_positive_hist.items():
-            fp_value = false_positive_hist[key]
-            if tp_value is not None and fp_value is not None:
-                numerator = tp_value + fp_value
-                if numerator != 0:
-                    precision = tp_value / (tp_value + fp_value)
-                    precision_hist[key] = precision
-                else:
-                    precision_hist[key] = None
-            else:
-                precision_hist[key] = None
-        return precision_hist
-
-    @staticmethod
-    def _recall(true_positive_hist: Dict, false_negative_hist: Dict) -> Dict:
-        precision_hist = {}
-        for key, tp_value in true_positive_hist.items():
-            fn_value = false_negative_hist[key]
-            if tp_value is not None and fn_value is not None:
-                numerator = tp_value + fn_value
-                if numerator != 0:
-                    precision = tp_value / (tp_value + fn_value)
-                    precision_hist[key] = precision
-                else:
-                    precision_hist[key] = None
-            else:
-                precision_hist[key] = None
-        return precision_hist
-
-    @staticmethod
-    def _sensitivity(true_positive_hist: Dict, false_negative_hist: Dict) -> Dict:
-        precision_hist = {}
-        for key, tp_value in true_positive_hist.items():
-            fn_value = false_negative_hist[key]
-            if tp_value is not None and fn_value is not None:
-                numerator = tp_value + fn_value
-                if numerator != 0:
-                    precision = tp_value / (tp_value + fn_value)
-                    precision_hist[key] = precision
-                else:
-                    precision_hist[key] = None
-            else:
-                precision_hist[key] = None
-        return precision_hist
-
-    @staticmethod
-    def _specificity(true_negative_hist: Dict, false_positive_hist: Dict) -> Dict:
-        precision_hist = {}
-        for key, tn_value in true_negative_hist.items():
-            fp_value = false_positive_hist[key]
-            if tn_value is not None and fp_value is not None:
-                numerator = tn_value + fp_value
-                if numerator != 0:
-                    precision = tn_value / (tn_value + fp_value)
-                    precision_hist[key] = precision
-                else:
-                    precision_hist[key] = None
-            else:
-                precision_hist[key] = None
-        return precision_hist
-
-    @staticmethod
-    def _f1(precision_hist: Dict, recall_hist: Dict) -> Dict:
-        f1_hist = {}
-        for key, precision_value in precision_hist.items():
-            recall_value = recall_hist[key]
-            if precision_value is not None and recall_value is not None:
-                numerator = precision_value + recall_value
-                if numerator != 0:
-                    f1 = 2 * (precision_value * recall_value) / numerator
-                    f1_hist[key] = round(f1, 2)
-                else:
-                    f1_hist[key] = None
-            else:
-                f1_hist[key] = None
-        return f1_hist
+    def _bucket_metrics(self, stats: RowStats) -> Dict[str, Optional[float]]:
+        """Every metric of a time bucket, derived from its confusion cells"""
+        positive = class_counts(stats.cells).get(self._positive_class, ClassCounts())
+        positive.tn = stats.rows - positive.tp - positive.fp - positive.fn
+        return {
+            "accuracy": self._rate(stats.matches, stats.rows),
+            "true_positive": self._rate(positive.tp, stats.rows),
+            "false_negative": self._rate(positive.fn, stats.rows),
+            "true_negative": self._rate(positive.tn, stats.rows),
+            "false_positive": self._rate(positive.fp, stats.rows),
+            "precision": positive.precision,
+            "recall": positive.recall,
+            "sensitivity": positive.recall,
+            "specificity": positive.specificity,
+            "f1": round(positive.f1, 2) if positive.f1 is not None else None,
+            **averages(stats.cells),
+        }
 
-    def aggregation_result(self, time_range: TimeRange, **kwargs) -> Dict[str, Any]:
-        hist_buckets = self._get_date_hist_buckets(time_range=time_range)
+    def _raw_bucket_stats(
+        self, time_range: TimeRange, **kwargs
+    ) -> Dict[datetime, RowStats]:
         agg_query = self._aggregation_query(
-            positive_class=self._positive_class,
             time_filter=self._time_filter_builder(time_range=time_range),
             **kwargs,
         )
+        bucket_stats: Dict[datetime, RowStats] = {}
+        for cell in self._collection.aggregate(agg_query):
+            key = cell["_id"]
+            stats = bucket_stats.setdefault(key["bucket"], RowStats())
+            stats.rows += cell["count"]
+            stats.matches += cell["matches"]
+            stats.cells[(key.get("prediction"), key.get("actual"))] += cell["count"]
+        return bucket_stats
 
-        facets = self._collection.aggregate(agg_query).next()
+    def _bucket_stats(
+        self, time_range: TimeRange, **kwargs
+    ) -> Dict[datetime, RowStats]:
+        """
+        Confusion cells per time bucket. With rollups, the whole days are read from
+        the rollups and only the partial days at the edges from the rows
+        """
+        days = None
+        if (
+            self._rollups is not None
+            and kwargs.get("class_position", 0) == 0
+            and self._granularity in (TimeGrain.DAY, TimeGrain.WEEK)
+        ):
+            days, raw_ranges = self._rollups.split(time_range)
+        if days is None:
+            return self._raw_bucket_stats(time_range, **kwargs)
 
-        total_hist = facets["total_hist"]
+        bucket_stats: Dict[datetime, RowStats] = {}
+        for raw_range in raw_ranges:
+            for bucket, stats in self._raw_bucket_stats(raw_range, **kwargs).items():
+                bucket_stats.setdefault(bucket, RowStats()).merge(stats)
+        for day, stats in self._rollups.stored_stats(*days).rows.items():
+            bucket = grain_floor(day, self._granularity)
+            bucket_stats.setdefault(bucket, RowStats()).merge(stats)
+        return bucket_stats
 
-        accuracy = self._histogram_ratio(
-            facets["is_match_count_hist"], total_hist, hist_buckets
-        )
-        true_positive = self._histogram_ratio(
-            facets["tp_count_hist"], total_hist, hist_buckets
-        )
-        false_negative = self._histogram_ratio(
-            facets["fn_count_hist"], total_hist, hist_buckets
-        )
-        true_negative = self._histogram_ratio(
-            facets["tn_count_hist"], total_hist, hist_buckets
-        )
-        false_positive = self._histogram_ratio(
-            facets["fp_count_hist"], total_hist, hist_buckets
-        )
-        precision = self._precision(
-            true_positive_hist=true_positive, false_positive_hist=false_positive
-        )
-        recall = self._recall(
-            true_positive_hist=true_positive, false_negative_hist=false_negative
-        )
-        sensitivity = self._sensitivity(
-            true_positive_hist=true_positive, false_negative_hist=false_negative
-        )
-        specificity = self._specificity(
-            true_negative_hist=true_negative, false_positive_hist=false_positive
-        )
-        f1 = self._f1(precision_hist=precision, recall_hist=recall)
-
-        date_hist_metrics: Dict[str, Dict] = {
-            "accuracy": accuracy,
-            "true_positive": true_positive,
-            "false_negative": false_negative,
-            "true_negative": true_negative,
-            "false_positive": false_positive,
-            "precision": precision,
-            "recall": recall,
-            "sensitivity": sensitivity,
-            "specificity": specificity,
-            "f1": f1,
-        }
+    def aggregation_result(self, time_range: TimeRange, **kwargs) -> Dict[str, Any]:
+        """
+        Returns
+        -------
+        Sorted bucket start times under "buckets" and the metric values of the
+        buckets by metric name: Dict[str, List]
+        """
+        buckets = self._get_date_hist_buckets(time_range=time_range)
+        bucket_stats = self._bucket_stats(time_range, **kwargs)
+        bucket_metrics = [
+            self._bucket_metrics(bucket_stats.get(bucket, RowStats()))
+            for bucket in buckets
+        ]
 
+        date_hist_metrics: Dict[str, List] = {"buckets": buckets}
+        for metric in self._bucket_metrics(RowStats()):
+            date_hist_metrics[metric] = [metrics[metric] for metrics in bucket_metrics]
         return date_hist_metrics
 
     def _aggregation_query(
         self,
         time_filter: Dict,
-        positive_class: str,
         class_position: int = 0,
         **kwargs,
     ) -> List[Dict[str, Any]]:
-        count_group_query = {
-            "$group": {
-                "_id": {"year": "$year", "month": "$month", "day": "$day"},
-                "count": {"$sum": 1},
-            }
-        }
-        facets = {
-            "total_hist": [count_group_query],
-            "is_match_count_hist": [{"$match": {"is_match": True}}, count_group_query],
-            "tp_count_hist": [
-                {
-                    "$match": {
-                        f"prediction_cf.{class_position}": positive_class,
-                        f"actual_cf.{class_position}": positive_class,
-                    }
-                },
-                count_group_query,
-            ],
-            "fn_count_hist": [
-                {
-                    "$match": {
-                        f"prediction_cf.{class_position}": {"$ne": positive_class},
-                        f"actual_cf.{class_position}": positive_class,
-                    }
-                },
-                count_group_query,
-            ],
-            "tn_count_hist": [
-                {
-                    "$match": {
-                        f"prediction_cf.{class_position}": {"$ne": positive_class},
-                        f"actual_cf.{class_position}": {"$ne": positive_class},
-                    }
-                },
-                count_group_query,
-            ],
-            "fp_count_hist": [
+        """One confusion cell count per time bucket"""
+        return [
+            {
+                "$match": {
+                    "dataset_id": str(self._dataset_id),
+                    **(time_filter if time_filter is not None else {}),
+                }
+            },
+            {
+                "$group": {
+                    "_id": {
+                        "bucket": grain_bucket_expression(
+                            "$created_at", self._granularity
+                        ),
+                        "prediction": {
+                            "$arrayElemAt": [
+                                {"$ifNull": ["$prediction_cf", []]},
+                                class_position,
+                            ]
+                        },
+                        "actual": {
+                            "$arrayElemAt": [
+                                {"$ifNull": ["$actual_cf", []]},
+                                class_position,
+                            ]
+                        },
+                    },
+                    "count": {"$sum": 1},
+                    "matches": {
+                        "$sum": {"$cond": [{"$eq": ["$is_match", True]}, 1, 0]}
+                    },
+                }
+            },
+        ]
+
+
+class ClassificationClassMetrics(MongoMetric):
+    """
+    Per class performance of every prediction position. The confusion cells of all
+    the positions are counted by one aggregation, which unwinds prediction_cf with
+    its array index and pairs every prediction with the actual at the same index.
+
+    Attributes:
+    -----
+    collection: Collection
+        mongo collection
+    dataset_id: UUID
+        dataset id on which the metric calculation will be applied
+    """
+
+    def __init__(self, collection: Collection, dataset_id: UUID):
+        super().__init__(collection)
+        self._dataset_id = dataset_id
+
+    @property
+    def metric_name(self) -> str:
+        return "classification_class_metrics"
+
+    def _position_cells(self, time_range: TimeRange = None) -> Dict[int, Counter]:
+        agg_query = self._aggregation_query(
+            time_filter=self._time_filter_builder(time_range=time_range)
+        )
+        position_cells: Dict[int, Counter] = {}
+        for cell in self._collection.aggregate(agg_query):
+            key = cell["_id"]
+            cells = position_cells.setdefault(key["position"], Counter())
+            cells[(key.get("prediction"), key.get("actual"))] += cell["count"]
+        return position_cells
+
+    def aggregation_result(
+        self,
+        time_range: TimeRange = None,
+        classes: Optional[List[str]] = None,
+        position_classes: Optional[Dict[int, List[str]]] = None,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Parameters
+        ----------
+        time_range:
+            time range of the rows, all the rows by default
+        classes:
+            known prediction classes, reported even when no row has them
+        position_classes:
+            known prediction classes by prediction position, used instead of classes
+            for the positions it has
+        Returns
+        -------
+        "positions" with the class report of every prediction position
+        """
+        position_classes = position_classes or {}
+        return {
+            "positions": [
                 {
-                    "$match": {
-                        f"prediction_cf.{class_position}": positive_class,
-                        f"actual_cf.{class_position}": {"$ne": positive_class},
-                    }
-                },
-                count_group_query,
-            ],
+                    "position": position,
+                    **class_report(cells, position_classes.get(position, classes)),
+                }
+                for position, cells in sorted(self._position_cells(time_range).items())
+            ]
         }
 
+    def _aggregation_query(self, time_filter: Dict, **kwargs) -> List[Dict[str, Any]]:
         return [
             {
                 "$match": {
@@ -307,12 +287,21 @@ class ClassificationDateHistogramDBMetrics(MongoMetric):
                     **(time_filter if time_filter is not None else {}),
                 }
             },
+            {"$project": {"prediction_cf": 1, "actual_cf": 1}},
+            {"$unwind": {"path": "$prediction_cf", "includeArrayIndex": "position"}},
             {
-                "$addFields": {
-                    "year": {"$year": "$created_at"},
-                    "month": {"$month": "$created_at"},
-                    "day": {"$dayOfMonth": "$created_at"},
+                "$group": {
+                    "_id": {
+                        "position": "$position",
+                        "prediction": "$prediction_cf",
+                        "actual": {
+                            "$arrayElemAt": [
+                                {"$ifNull": ["$actual_cf", []]},
+                                "$position",
+                            ]
+                        },
+                    },
+                    "count": {"$sum": 1},
                 }
             },
-            {"$facet": facets},
         ]
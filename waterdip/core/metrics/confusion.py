@@ -0,0 +1,193 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+# (predicted class, actual class) -> number of rows
+ConfusionCells = Counter
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return numerator / denominator if denominator != 0 else None
+
+
+def _f1(precision: Optional[float], recall: Optional[float]) -> Optional[float]:
+    if precision is None or recall is None or precision + recall == 0:
+        return None
+    return 2 * precision * recall / (precision + recall)
+
+
+@dataclass
+class ClassCounts:
+    """
+    One-vs-rest confusion counts of a class
+
+    Attributes:
+    ------------------
+    tp:
+        rows predicted and labelled as the class
+    fp:
+        rows predicted as the class, labelled otherwise
+    fn:
+        rows labelled as the class, predicted otherwise
+    tn:
+        rows neither predicted nor labelled as the class
+    """
+
+    tp: int = 0
+    fp: int = 0
+    fn: int = 0
+    tn: int = 0
+
+    @property
+    def precision(self) -> Optional[float]:
+        return _ratio(self.tp, self.tp + self.fp)
+
+    @property
+    def recall(self) -> Optional[float]:
+        return _ratio(self.tp, self.tp + self.fn)
+
+    @property
+    def specificity(self) -> Optional[float]:
+        return _ratio(self.tn, self.tn + self.fp)
+
+    @property
+    def f1(self) -> Optional[float]:
+        return _f1(self.precision, self.recall)
+
+    @property
+    def support(self) -> int:
+        return self.tp + self.fn
+
+
+def class_counts(cells: ConfusionCells) -> Dict[Optional[str], ClassCounts]:
+    """
+    One-vs-rest counts of every predicted or actual class of the confusion cells.
+
+    Derived from the per class totals of predictions and actuals, so the cost grows
+    with the number of cells and classes, not with their product.
+    """
+    rows = sum(cells.values())
+    predicted: Counter = Counter()
+    actual: Counter = Counter()
+    true_positives: Counter = Counter()
+    for (prediction, label), n in cells.items():
+        predicted[prediction] += n
+        actual[label] += n
+        if prediction == label:
+            true_positives[prediction] += n
+
+    counts = {}
+    for cls in predicted.keys() | actual.keys():
+        tp = true_positives[cls]
+        fp, fn = predicted[cls] - tp, actual[cls] - tp
+        counts[cls] = ClassCounts(tp=tp, fp=fp, fn=fn, tn=rows - tp - fp - fn)
+    return counts
+
+
+def labelled_cells(cells: ConfusionCells) -> ConfusionCells:
+    """Cells of the rows with an actual class, other rows have no ground truth yet"""
+    return Counter({cell: n for cell, n in cells.items() if cell[1] is not None and n})
+
+
+def _mean(values: List[Optional[float]]) -> Optional[float]:
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def averages(cells: ConfusionCells) -> Dict[str, Optional[float]]:
+    """
+    Macro and micro averaged precision, recall and F1 over the classes of the
+    labelled rows. Macro averages are the means over the classes with a defined
+    value, micro averages are computed from the summed class counts.
+    """
+    counts = [
+        count
+        for cls, count in class_counts(labelled_cells(cells)).items()
+        if cls is not None
+    ]
+
+    total = ClassCounts()
+    for count in counts:
+        total.tp, total.fp, total.fn = (
+            total.tp + count.tp,
+            total.fp + count.fp,
+            total.fn + count.fn,
+        )
+
+    result = {
+        "micro_precision": total.precision,
+        "micro_recall": total.recall,
+        "micro_f1": total.f1,
+    }
+    for metric in ("precision", "recall", "f1"):
+        result[f"macro_{metric}"] = _mean([getattr(count, metric) for count in counts])
+    return result
+
+
+def class_report(
+    cells: ConfusionCells, classes: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    Per class one-vs-rest counts, precision, recall and F1 of the labelled rows,
+    with their macro and support weighted averages.
+
+    Parameters
+    ----------
+    cells:
+        confusion cells of one prediction position
+    classes:
+        known classes reported even without any row
+    Returns
+    -------
+    "classes" with the metrics per class sorted by class, and the averages
+    """
+    labelled = labelled_cells(cells)
+    rows = sum(labelled.values())
+    counts = {
+        cls: count for cls, count in class_counts(labelled).items() if cls is not None
+    }
+    for cls in classes or []:
+        counts.setdefault(cls, ClassCounts(tn=rows))
+
+    report: Dict[str, Any] = {
+        "classes": [
+            {
+                "class_name": cls,
+                "support": count.support,
+                "tp": count.tp,
+                "fp": count.fp,
+                "fn": count.fn,
+                "tn": count.tn,
+                "precision": count.precision,
+                "recall": count.recall,
+                "f1": count.f1,
+            }
+            for cls, count in sorted(counts.items())
+        ]
+    }
+    for metric in ("precision", "recall", "f1"):
+        values = [(getattr(count, metric), count.support) for count in counts.values()]
+        report[f"macro_{metric}"] = _mean([value for value, _ in values])
+        weighted = [(value, support) for value, support in values if value is not None]
+        support = sum(support for _, support in weighted)
+        report[f"weighted_{metric}"] = (
+            sum(value * support for value, support in weighted) / support
+            if support
+            else None
+        )
+    return report
@@ -12,13 +12,20 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 from abc import ABC
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 from uuid import UUID
 
 from pymongo.collection import Collection
 
-from waterdip.core.commons.models import TimeRange
+from waterdip.core.commons.models import ColumnDataType, TimeRange
 from waterdip.core.metrics.base import MongoMetric
+from waterdip.core.metrics.profiles import DatasetProfile
+from waterdip.core.metrics.rollups import (
+    MAP_FIELD_MAPPING_TYPES,
+    ColumnStats,
+    DailyRollups,
+)
+from waterdip.core.metrics.windows import SlidingWindowStats
 
 
 class DataMetrics(MongoMetric, ABC):
@@ -29,12 +36,186 @@ class DataMetrics(MongoMetric, ABC):
         mongo collection
     dataset_id: UUID
         dataset id on which the metric calculation will be applied
+    column_map: Dict[str, Dict[str, ColumnDataType]], optional
+        data types of the row maps, i.e. {"features": {"f1": "NUMERIC"}}, when the rows
+        are stored in the COLUMN_MAP format. Rows are read from the `columns` list
+        when it is not provided
+    rollups: DailyRollups, DatasetProfile or SlidingWindowStats, optional
+        daily rollups of the dataset. When provided, the whole days of a time range are
+        read from the rollups instead of the rows. The stored profile of a batch
+        dataset serves every time range, the sliding window of a monitor serves its
+        evaluation window
 
     """
 
-    def __init__(self, collection: Collection, dataset_id: UUID):
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        column_map: Optional[Dict[str, Dict[str, ColumnDataType]]] = None,
+        rollups: Optional[
+            Union[DailyRollups, DatasetProfile, SlidingWindowStats]
+        ] = None,
+    ):
         super().__init__(collection)
         self._dataset_id = dataset_id
+        self._column_map = column_map
+        self._rollups = rollups
+
+    def _rollup_column_stats(
+        self, time_range: TimeRange = None
+    ) -> Optional[Dict[str, ColumnStats]]:
+        """
+        Statistics of every column in the time range read from the rollups, None when
+        the time range can not be served by the rollups
+        """
+        if self._rollups is None:
+            return None
+        daily_stats = self._rollups.daily_stats(time_range)
+        return daily_stats.column_totals() if daily_stats is not None else None
+
+    def _dataset_match(self, time_filter: Dict = None) -> Dict:
+        return {
+            "$match": {
+                "dataset_id": str(self._dataset_id),
+                **(time_filter if time_filter is not None else {}),
+            }
+        }
+
+    def _key_value_stages(self) -> List[Dict]:
+        """Stages turning every column of a row into one {k, v} document"""
+        if self._column_map is None:
+            return [
+                {"$project": {"columns": 1}},
+                {"$unwind": "$columns"},
+                {
+                    "$project": {
+                        "k": "$columns.name",
+                        "v": {
+                            "$ifNull": [
+                                "$columns.value_numeric",
+                                "$columns.value_categorical",
+                            ]
+                        },
+                    }
+                },
+            ]
+        key_values = {
+            "$concatArrays": [
+                {"$objectToArray": {"$ifNull": [f"${field}", {}]}}
+                for field in MAP_FIELD_MAPPING_TYPES
+                if field in self._column_map
+            ]
+        }
+        return [
+            {"$project": {"kv": key_values}},
+            {"$unwind": "$kv"},
+            {"$project": {"k": "$kv.k", "v": "$kv.v"}},
+        ]
+
+    def _map_columns(self, data_type: ColumnDataType = None) -> List[Tuple[str, str]]:
+        """
+        Returns (column name, row field path) of the COLUMN_MAP columns,
+        optionally only the columns of the data type
+        """
+        return [
+            (name, f"{mapping}.{name}")
+            for mapping, columns in self._column_map.items()
+            for name, column_type in columns.items()
+            if data_type is None or column_type == data_type
+        ]
+
+    def _map_categorical_value_counts(
+        self, time_filter: Dict = None
+    ) -> Dict[str, List[Tuple[Any, int]]]:
+        """
+        Counts the values of every categorical COLUMN_MAP column. The rows are
+        unwound over the key / value pairs of their maps and the counts are read
+        from a cursor, so high cardinality columns are not bound by the size of a
+        single result document
+        """
+        conditions = [
+            {
+                "kv.t": field,
+                "kv.k": {
+                    "$in": [
+                        name
+                        for name, data_type in columns.items()
+                        if data_type == ColumnDataType.CATEGORICAL
+                    ]
+                },
+            }
+            for field, columns in self._column_map.items()
+            if ColumnDataType.CATEGORICAL in columns.values()
+        ]
+        if not conditions:
+            return {}
+
+        key_values = {
+            "$concatArrays": [
+                {
+                    "$map": {
+                        "input": {"$objectToArray": {"$ifNull": [f"${field}", {}]}},
+                        "as": "c",
+                        "in": {"k": "$$c.k", "v": "$$c.v", "t": {"$literal": field}},
+                    }
+                }
+                for field in self._column_map
+            ]
+        }
+        value_counts: Dict[str, List[Tuple[Any, int]]] = {}
+        for doc in self._collection.aggregate(
+            [
+                self._dataset_match(time_filter),
+                {"$project": {"_id": 0, "kv": key_values}},
+                {"$unwind": "$kv"},
+                {"$match": {"$or": conditions, "kv.v": {"$ne": None}}},
+                {
+                    "$group": {
+                        "_id": {"name": "$kv.k", "value": "$kv.v"},
+                        "count": {"$sum": 1},
+                    }
+                },
+            ]
+        ):
+            value_counts.setdefault(doc["_id"]["name"], []).append(
+                (doc["_id"]["value"], doc["count"])
+            )
+        return value_counts
+
+    def _categorical_value_counts(
+        self, time_filter: Dict = None
+    ) -> Dict[str, List[Tuple[Any, int]]]:
+        """(value, count) pairs of every categorical column of the matched rows"""
+        if self._column_map is not None:
+            return self._map_categorical_value_counts(time_filter)
+
+        value_counts: Dict[str, List[Tuple[Any, int]]] = {}
+        for doc in self._collection.aggregate(
+            [
+                self._dataset_match(time_filter),
+                {"$unwind": "$columns"},
+                {
+                    "$match": {
+                        "columns.data_type": ColumnDataType.CATEGORICAL.value,
+                        "columns.value_categorical": {"$ne": None},
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": {
+                            "name": "$columns.name",
+                            "value": "$columns.value_categorical",
+                        },
+                        "count": {"$sum": 1},
+                    }
+                },
+            ]
+        ):
+            value_counts.setdefault(doc["_id"]["name"], []).append(
+                (doc["_id"]["value"], doc["count"])
+            )
+        return value_counts
 
 
 class CategoricalCountHistogram(DataMetrics):
@@ -67,10 +248,23 @@ class CategoricalCountHistogram(DataMetrics):
 
     def aggregation_result(self, time_range: TimeRange = None) -> Dict[str, Dict]:
         hist = {}
+        time_filter = self._time_filter_builder(time_range=time_range)
 
-        agg_query = self._aggregation_query(
-            time_filter=self._time_filter_builder(time_range=time_range)
-        )
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            for column_name, stats in column_stats.items():
+                if stats.data_type == ColumnDataType.CATEGORICAL and stats.values:
+                    hist[column_name] = {
+                        "type": "CATEGORICAL",
+                        "bins": list(stats.values.keys()),
+                        "count": list(stats.values.values()),
+                    }
+            return hist
+
+        if self._column_map is not None:
+            return self._histogram(self._map_categorical_value_counts(time_filter))
+
+        agg_query = self._aggregation_query(time_filter=time_filter)
 
         for doc in self._collection.aggregate(agg_query):
             column_name = doc["_id"]["column_name"]
@@ -82,8 +276,19 @@ class CategoricalCountHistogram(DataMetrics):
             hist[column_name]["count"].append(count)
         return hist
 
-    def _aggregation_query(self, time_filter: Dict = None) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _histogram(value_counts: Dict[str, List[Tuple[Any, int]]]) -> Dict[str, Dict]:
+        """Histograms of the (value, count) pairs of every column"""
+        return {
+            column_name: {
+                "type": "CATEGORICAL",
+                "bins": [value for value, _ in column_value_counts],
+                "count": [count for _, count in column_value_counts],
+            }
+            for column_name, column_value_counts in value_counts.items()
+        }
 
+    def _aggregation_query(self, time_filter: Dict = None) -> List[Dict[str, Any]]:
         return [
             {
                 "$match": {
@@ -111,6 +316,16 @@ class CategoricalCountHistogram(DataMetrics):
 
 
 class NumericCountHistogram(DataMetrics):
+    """
+    Equal frequency histogram of the numeric columns.
+
+    Rows are bucketed with $bucketAuto. When the dataset has daily rollups, the
+    histogram is computed from the merged quantile sketches of the days instead, so
+    the bin edges are within the relative accuracy of the sketches.
+    """
+
+    BUCKETS = 9
+
     @property
     def metric_name(self) -> str:
         return "numeric_count_hist"
@@ -119,37 +334,76 @@ class NumericCountHistogram(DataMetrics):
         self, numeric_columns: List, time_range: TimeRange = None, **kwargs
     ) -> Dict[str, Any]:
         hist: Dict[str, Any] = {}
+        numeric_columns = list(numeric_columns)
+        time_filter = self._time_filter_builder(time_range=time_range)
+
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            for numeric_column in numeric_columns:
+                stats = column_stats.get(numeric_column) or ColumnStats(
+                    ColumnDataType.NUMERIC.value
+                )
+                bins, count = stats.sketch.histogram(
+                    self.BUCKETS, min_value=stats.min, max_value=stats.max
+                )
+                hist[numeric_column] = {"bins": bins, "count": count}
+            return hist
+
+        if self._column_map is not None:
+            if not numeric_columns:
+                return hist
+            agg_query = self._column_map_aggregation_query(
+                numeric_columns=numeric_columns, time_filter=time_filter
+            )
+            facet_columns = {f"c{i}": name for i, name in enumerate(numeric_columns)}
+        else:
+            agg_query = self._aggregation_query(
+                numeric_columns=numeric_columns, time_filter=time_filter
+            )
+            facet_columns = {name: name for name in numeric_columns}
 
-        agg_query = self._aggregation_query(
-            numeric_columns=numeric_columns,
-            time_filter=self._time_filter_builder(time_range=time_range),
-        )
         facets = self._collection.aggregate(agg_query).next()
-        for numeric_column in facets:
-            hist[numeric_column] = {}
-            nbins = []
-            count = []
-            for k, doc in enumerate(facets[numeric_column]):
-                count.append(doc["count"])
-                lower_limit = 0 if not doc["_id"]["min"] else doc["_id"]["min"]
-                nbins.append(lower_limit)
-                if k == len(facets[numeric_column]) - 1:
-                    nbins[k] = doc["_id"]["max"]
-
-            hist[numeric_column]["bins"] = nbins
-            hist[numeric_column]["count"] = count
+        for facet_key in facets:
+            hist[facet_columns[facet_key]] = self._histogram(facets[facet_key])
         return hist
 
+    @staticmethod
+    def _histogram(buckets: List[Dict]) -> Dict[str, List]:
+        """Histogram of the $bucketAuto buckets of a column"""
+        nbins = []
+        count = []
+        for k, doc in enumerate(buckets):
+            count.append(doc["count"])
+            lower_limit = 0 if not doc["_id"]["min"] else doc["_id"]["min"]
+            nbins.append(lower_limit)
+            if k == len(buckets) - 1:
+                nbins[k] = doc["_id"]["max"]
+        return {"bins": nbins, "count": count}
+
+    def _bucket_auto_facet(self, numeric_column: str) -> List[Dict[str, Any]]:
+        """$facet pipeline bucketing a numeric column of the matched rows"""
+        if self._column_map is not None:
+            path = dict(self._map_columns(ColumnDataType.NUMERIC))[numeric_column]
+            return [
+                {"$match": {path: {"$ne": None}}},
+                {"$bucketAuto": {"groupBy": f"${path}", "buckets": self.BUCKETS}},
+            ]
+        return [
+            {"$match": {"columns.name": numeric_column}},
+            {
+                "$bucketAuto": {
+                    "groupBy": "$columns.value_numeric",
+                    "buckets": self.BUCKETS,
+                }
+            },
+        ]
+
     def _aggregation_query(
         self, numeric_columns: List, time_filter: Dict = None, **kwargs
     ) -> List[Dict[str, Any]]:
-        facet_query = {}
-
-        for column in numeric_columns:
-            facet_query[column] = [
-                {"$match": {"columns.name": column}},
-                {"$bucketAuto": {"groupBy": "$columns.value_numeric", "buckets": 9}},
-            ]
+        facet_query = {
+            column: self._bucket_auto_facet(column) for column in numeric_columns
+        }
 
         return [
             {
@@ -163,6 +417,15 @@ class NumericCountHistogram(DataMetrics):
             {"$facet": facet_query},
         ]
 
+    def _column_map_aggregation_query(
+        self, numeric_columns: List, time_filter: Dict = None
+    ) -> List[Dict[str, Any]]:
+        facet_query = {
+            f"c{i}": self._bucket_auto_facet(column)
+            for i, column in enumerate(numeric_columns)
+        }
+        return [self._dataset_match(time_filter), {"$facet": facet_query}]
+
 
 class CountEmptyHistogram(DataMetrics):
     """
@@ -183,10 +446,24 @@ class CountEmptyHistogram(DataMetrics):
 
     def aggregation_result(self, time_range: TimeRange = None) -> Dict[str, Any]:
         hist: Dict[str, Any] = {}
+        time_filter = self._time_filter_builder(time_range=time_range)
 
-        agg_query = self._aggregation_query(
-            time_filter=self._time_filter_builder(time_range=time_range)
-        )
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            for column_name, stats in column_stats.items():
+                if stats.count:
+                    hist[column_name] = {
+                        "empty_count": stats.null_count,
+                        "empty_percentage": float(stats.null_count)
+                        * (100.0 / float(stats.count)),
+                        "total_count": stats.count,
+                    }
+            return hist
+
+        if self._column_map is not None:
+            return self._column_map_aggregation_result(time_filter)
+
+        agg_query = self._aggregation_query(time_filter=time_filter)
         facets = self._collection.aggregate(agg_query).next()
 
         empty_columns, total_sum = facets["empty_columns"], facets["total_sum"]
@@ -203,13 +480,40 @@ class CountEmptyHistogram(DataMetrics):
             for empty_column in empty_columns:
                 empty_column_name = empty_column["_id"]["column_name"]
                 total_count = hist[empty_column_name].get("total_count")
-                empty_count = empty_column["count"]
-                empty_percentage = float(empty_count) * (100.0 / float(total_count))
-                hist[empty_column_name]["empty_count"] = empty_count
-                hist[empty_column_name]["empty_percentage"] = empty_percentage
+                hist[empty_column_name] = self._empty_counts(
+                    empty_column["count"], total_count
+                )
 
         return hist
 
+    @staticmethod
+    def _empty_counts(empty_count: int, total_count: int) -> Dict[str, Any]:
+        return {
+            "empty_count": empty_count,
+            "empty_percentage": float(empty_count) * (100.0 / float(total_count)),
+            "total_count": total_count,
+        }
+
+    @staticmethod
+    def _is_empty_column(data_type: Any, numeric: Any, categorical: Any) -> Dict:
+        """Expression of a list column being empty, a null value of its data type"""
+        return {
+            "$or": [
+                {
+                    "$and": [
+                        {"$eq": [data_type, ColumnDataType.CATEGORICAL.value]},
+                        {"$eq": [{"$ifNull": [categorical, None]}, None]},
+                    ]
+                },
+                {
+                    "$and": [
+                        {"$eq": [data_type, ColumnDataType.NUMERIC.value]},
+                        {"$eq": [{"$ifNull": [numeric, None]}, None]},
+                    ]
+                },
+            ]
+        }
+
     def _aggregation_query(self, time_filter: Dict = None) -> List[Dict[str, Any]]:
         return [
             {
@@ -255,6 +559,42 @@ class CountEmptyHistogram(DataMetrics):
             },
         ]
 
+    def _column_map_aggregation_result(self, time_filter: Dict = None) -> Dict:
+        """
+        A COLUMN_MAP column is empty in a row when its value is null or the column was
+        not logged at all, so every row of the dataset counts to the total
+        """
+        hist: Dict[str, Any] = {}
+        columns = self._map_columns()
+        if not columns:
+            return hist
+
+        group: Dict[str, Any] = {"_id": None, "total": {"$sum": 1}}
+        group.update(self._map_empty_accumulators(columns))
+        result = list(
+            self._collection.aggregate(
+                [self._dataset_match(time_filter), {"$group": group}]
+            )
+        )
+        if not result:
+            return hist
+
+        total_count = result[0]["total"]
+        for i, (name, _) in enumerate(columns):
+            hist[name] = self._empty_counts(result[0][f"e{i}"], total_count)
+        return hist
+
+    @staticmethod
+    def _map_empty_accumulators(columns: List[Tuple[str, str]]) -> Dict[str, Any]:
+        return {
+            f"e{i}": {
+                "$sum": {
+                    "$cond": [{"$eq": [{"$ifNull": [f"${path}", None]}, None]}, 1, 0]
+                }
+            }
+            for i, (_, path) in enumerate(columns)
+        }
+
 
 class CardinalityCategorical(DataMetrics):
     @property
@@ -263,21 +603,55 @@ class CardinalityCategorical(DataMetrics):
 
     def aggregation_result(self, time_range: TimeRange = None) -> Dict[str, Any]:
         cardinality = {}
+        time_filter = self._time_filter_builder(time_range=time_range)
 
-        agg_query = self._aggregation_query(
-            time_filter=self._time_filter_builder(time_range=time_range)
-        )
-        for doc in self._collection.aggregate(agg_query):
-            column, values = doc["_id"], doc["value_counts"]
-            values.sort(key=lambda x: x["count"], reverse=True)
-            cardinality[column] = {
-                "values": values,
-                "unique_values": len(values),
-                "top_value": values[0]["value"],
-                "top_value_count": values[0]["count"],
-            }
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            docs = [
+                {
+                    "_id": column,
+                    "value_counts": [
+                        {"value": value, "count": count}
+                        for value, count in stats.values.items()
+                    ],
+                }
+                for column, stats in column_stats.items()
+                if stats.data_type == ColumnDataType.CATEGORICAL and stats.values
+            ]
+        elif self._column_map is not None:
+            return self._value_counts_cardinality(
+                self._map_categorical_value_counts(time_filter)
+            )
+        else:
+            docs = self._collection.aggregate(
+                self._aggregation_query(time_filter=time_filter)
+            )
+
+        for doc in docs:
+            cardinality[doc["_id"]] = self._cardinality(doc["value_counts"])
         return cardinality
 
+    @staticmethod
+    def _value_counts_cardinality(
+        value_counts: Dict[str, List[Tuple[Any, int]]]
+    ) -> Dict[str, Any]:
+        return {
+            column: CardinalityCategorical._cardinality(
+                [{"value": value, "count": count} for value, count in column_counts]
+            )
+            for column, column_counts in value_counts.items()
+        }
+
+    @staticmethod
+    def _cardinality(values: List[Dict[str, Any]]) -> Dict[str, Any]:
+        values.sort(key=lambda x: x["count"], reverse=True)
+        return {
+            "values": values,
+            "unique_values": len(values),
+            "top_value": values[0]["value"],
+            "top_value_count": values[0]["count"],
+        }
+
     def _aggregation_query(self, time_filter: Dict = None) -> List[Dict[str, Any]]:
         return [
             {
@@ -313,6 +687,143 @@ class CardinalityCategorical(DataMetrics):
         ]
 
 
+class CategoricalVocabularyDiff(DataMetrics):
+    """
+    Differences between the categorical values of a dataset and a baseline
+    vocabulary of every column: the values which are not in the vocabulary and the
+    vocabulary values which do not occur.
+
+    With rollups the values are read from the rollups. Otherwise the difference is
+    computed by one aggregation: new values are only counted per column, with a
+    bounded sample, and only the vocabulary values which occur are returned, so high
+    cardinality columns never return all their values.
+
+    Attributes:
+    -----
+    sample_size: int
+        maximum number of new and missing values returned per column
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        column_map: Optional[Dict[str, Dict[str, ColumnDataType]]] = None,
+        rollups: Optional[
+            Union[DailyRollups, DatasetProfile, SlidingWindowStats]
+        ] = None,
+        sample_size: int = 10,
+    ):
+        super().__init__(collection, dataset_id, column_map, rollups)
+        self.sample_size = sample_size
+
+    @property
+    def metric_name(self) -> str:
+        return "categorical_vocabulary_diff"
+
+    def aggregation_result(
+        self,
+        vocabulary: Dict[str, Set[str]],
+        time_range: TimeRange = None,
+        **kwargs,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Parameters
+        ----------
+        vocabulary:
+            baseline values of every compared column, by column name
+        time_range:
+            time range of the rows, all the rows by default
+        Returns
+        -------
+        "new_count" and a sample of the "new_values", "missing_count" and a sample of
+        the "missing_values" of every compared column, by column name
+        """
+        new_values: Dict[str, Tuple[int, List]] = {}
+        seen: Dict[str, Set[str]] = {name: set() for name in vocabulary}
+
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            for name, values in vocabulary.items():
+                stats = column_stats.get(name)
+                occurring = (
+                    {v for v, n in stats.values.items() if n} if stats else set()
+                )
+                new = sorted(str(v) for v in occurring - values)
+                new_values[name] = (len(new), new[: self.sample_size])
+                seen[name] = occurring & values
+        elif vocabulary:
+            agg_query = self._aggregation_query(
+                vocabulary=vocabulary,
+                time_filter=self._time_filter_builder(time_range),
+            )
+            for facets in self._collection.aggregate(agg_query):
+                for doc in facets["new"]:
+                    new_values[doc["_id"]] = (doc["count"], doc["sample"])
+                for doc in facets["seen"]:
+                    seen[doc["_id"]["k"]].add(doc["_id"]["v"])
+
+        diff: Dict[str, Dict[str, Any]] = {}
+        for name, values in vocabulary.items():
+            new_count, new_sample = new_values.get(name, (0, []))
+            missing = sorted(values - seen[name])
+            diff[name] = {
+                "new_count": new_count,
+                "new_values": new_sample,
+                "missing_count": len(missing),
+                "missing_values": missing[: self.sample_size],
+            }
+        return diff
+
+    def _aggregation_query(
+        self, vocabulary: Dict[str, Set[str]], time_filter: Dict = None, **kwargs
+    ) -> List[Dict[str, Any]]:
+        return [
+            self._dataset_match(time_filter),
+            *self._key_value_stages(),
+            {"$match": {"k": {"$in": list(vocabulary)}, "v": {"$ne": None}}},
+            {
+                "$facet": {
+                    "new": [
+                        {
+                            "$match": {
+                                "$or": [
+                                    {"k": name, "v": {"$nin": sorted(values)}}
+                                    for name, values in vocabulary.items()
+                                ]
+                            }
+                        },
+                        {"$group": {"_id": {"k": "$k", "v": "$v"}}},
+                        {
+                            "$group": {
+                                "_id": "$_id.k",
+                                "count": {"$sum": 1},
+                                "values": {"$push": "$_id.v"},
+                            }
+                        },
+                        {
+                            "$project": {
+                                "count": 1,
+                                "sample": {"$slice": ["$values", self.sample_size]},
+                            }
+                        },
+                    ],
+                    "seen": [
+                        {
+                            "$match": {
+                                "$or": [
+                                    {"k": name, "v": {"$in": sorted(values)}}
+                                    for name, values in vocabulary.items()
+                                ]
+                            }
+                        },
+                        {"$group": {"_id": {"k": "$k", "v": "$v"}}},
+                    ],
+                }
+            },
+        ]
+
+
 class NumericBasicMetrics(DataMetrics):
     @property
     def metric_name(self) -> str:
@@ -322,6 +833,15 @@ class NumericBasicMetrics(DataMetrics):
         self, time_range: TimeRange = None, **kwargs
     ) -> Dict[str, Any]:
         basic_metrics: Dict[str, Dict] = {}
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            return self._rollup_aggregation_result(column_stats, **kwargs)
+
+        if self._column_map is not None:
+            return self._column_map_aggregation_result(
+                time_filter=self._time_filter_builder(time_range=time_range), **kwargs
+            )
+
         agg_query = self._aggregation_query(
             time_filter=self._time_filter_builder(time_range=time_range), **kwargs
         )
@@ -333,7 +853,7 @@ class NumericBasicMetrics(DataMetrics):
         zero_values = facets["zero_values"]
         std_dev_values = facets["std_dev_values"] if "std_dev_values" in facets else []
 
-        for (average_value, total_value) in zip(average_values, total_values):
+        for average_value, total_value in zip(average_values, total_values):
             basic_metrics[average_value["_id"]["column_name"]] = {
                 "avg": round(average_value["avg"], 2)
             }
@@ -362,7 +882,6 @@ class NumericBasicMetrics(DataMetrics):
     def _aggregation_query(
         self, time_filter: Dict = None, **kwargs
     ) -> List[Dict[str, Any]]:
-
         facets = {
             "total": [
                 {
@@ -432,3 +951,323 @@ class NumericBasicMetrics(DataMetrics):
             },
             {"$facet": facets},
         ]
+
+    def _column_map_aggregation_result(
+        self, time_filter: Dict = None, **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Computes the basic metrics of all the numeric COLUMN_MAP columns with a single
+        $group stage, without unwinding the rows
+        """
+        basic_metrics: Dict[str, Dict] = {}
+        columns = self._map_columns(ColumnDataType.NUMERIC)
+        if not columns:
+            return basic_metrics
+
+        std_dev_enabled = kwargs.get("std_dev_disable", "false") == "false"
+        group: Dict[str, Any] = {"_id": None}
+        for i, (_, path) in enumerate(columns):
+            group.update(self._accumulators(f"${path}", str(i), std_dev_enabled))
+
+        result = list(
+            self._collection.aggregate(
+                [self._dataset_match(time_filter), {"$group": group}]
+            )
+        )
+        if not result:
+            return basic_metrics
+
+        for i, (name, _) in enumerate(columns):
+            column_metrics = self._basic_metrics(result[0], str(i), std_dev_enabled)
+            if column_metrics is not None:
+                basic_metrics[name] = column_metrics
+
+        return basic_metrics
+
+    @staticmethod
+    def _accumulators(
+        value: Any, suffix: str = "", std_dev_enabled: bool = True
+    ) -> Dict[str, Any]:
+        """$group accumulators of the basic metrics of a numeric value"""
+        accumulators = {
+            f"total{suffix}": {
+                "$sum": {"$cond": [{"$eq": [{"$ifNull": [value, None]}, None]}, 0, 1]}
+            },
+            f"avg{suffix}": {"$avg": value},
+            f"min{suffix}": {"$min": value},
+            f"max{suffix}": {"$max": value},
+            f"zeros{suffix}": {"$sum": {"$cond": [{"$eq": [value, 0]}, 1, 0]}},
+        }
+        if std_dev_enabled:
+            accumulators[f"std_dev{suffix}"] = {"$stdDevPop": value}
+        return accumulators
+
+    @staticmethod
+    def _basic_metrics(
+        metrics: Dict[str, Any], suffix: str = "", std_dev_enabled: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """Basic metrics of the `_accumulators` results, None without values"""
+        if not metrics[f"total{suffix}"]:
+            return None
+        basic_metrics = {
+            "avg": round(metrics[f"avg{suffix}"], 2),
+            "total": metrics[f"total{suffix}"],
+            "min": metrics[f"min{suffix}"],
+            "max": metrics[f"max{suffix}"],
+        }
+        if metrics[f"zeros{suffix}"]:
+            basic_metrics["zeros"] = metrics[f"zeros{suffix}"]
+        if std_dev_enabled:
+            basic_metrics["std_dev"] = round(metrics[f"std_dev{suffix}"], 2)
+            basic_metrics["variance"] = round(metrics[f"std_dev{suffix}"] ** 2)
+        return basic_metrics
+
+    @staticmethod
+    def _rollup_aggregation_result(
+        column_stats: Dict[str, ColumnStats], **kwargs
+    ) -> Dict[str, Any]:
+        basic_metrics: Dict[str, Dict] = {}
+        std_dev_enabled = kwargs.get("std_dev_disable", "false") == "false"
+        for name, stats in column_stats.items():
+            if stats.data_type != ColumnDataType.NUMERIC or not stats.non_null:
+                continue
+            basic_metrics[name] = {
+                "avg": round(stats.mean, 2),
+                "total": stats.non_null,
+                "min": stats.min,
+                "max": stats.max,
+            }
+            if stats.zeros:
+                basic_metrics[name]["zeros"] = stats.zeros
+            if std_dev_enabled:
+                basic_metrics[name]["std_dev"] = round(stats.std_dev, 2)
+                basic_metrics[name]["variance"] = round(stats.std_dev**2)
+        return basic_metrics
+
+
+class DatasetProfileMetric(DataMetrics):
+    """
+    Computes the results of CategoricalCountHistogram, NumericCountHistogram,
+    CountEmptyHistogram, CardinalityCategorical and NumericBasicMetrics with a single
+    scan of the rows.
+
+    The matched rows, unwound for the COLUMN_LIST format, go through one $facet stage
+    with a sub pipeline per result set instead of one aggregation per metric. The
+    categorical value counts, which grow with the cardinality of the columns, are read
+    by a separate cursor aggregation so the $facet result stays within the document
+    size limit. When the time range can be served by the rollups, the metrics read
+    the rollups as they do individually.
+
+    Methods:
+    --------
+    aggregation_result()
+        returns the result of every fused metric by its metric name, in the shape of
+        the metric's own aggregation_result
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        column_map: Optional[Dict[str, Dict[str, ColumnDataType]]] = None,
+        rollups: Optional[
+            Union[DailyRollups, DatasetProfile, SlidingWindowStats]
+        ] = None,
+    ):
+        super().__init__(collection, dataset_id, column_map, rollups)
+        metric_args = (collection, dataset_id, column_map, rollups)
+        self._categorical_histogram = CategoricalCountHistogram(*metric_args)
+        self._numeric_histogram = NumericCountHistogram(*metric_args)
+        self._empty_histogram = CountEmptyHistogram(*metric_args)
+        self._cardinality = CardinalityCategorical(*metric_args)
+        self._numeric_basic = NumericBasicMetrics(*metric_args)
+
+    @property
+    def metric_name(self) -> str:
+        return "dataset_profile"
+
+    def aggregation_result(
+        self, numeric_columns: List, time_range: TimeRange = None, **kwargs
+    ) -> Dict[str, Dict]:
+        numeric_columns = list(numeric_columns)
+        if self._rollup_column_stats(time_range) is not None:
+            return self._results(
+                categorical_hist=self._categorical_histogram.aggregation_result(
+                    time_range=time_range
+                ),
+                numeric_hist=self._numeric_histogram.aggregation_result(
+                    numeric_columns=numeric_columns, time_range=time_range
+                ),
+                empty_hist=self._empty_histogram.aggregation_result(
+                    time_range=time_range
+                ),
+                cardinality=self._cardinality.aggregation_result(time_range=time_range),
+                numeric_basic=self._numeric_basic.aggregation_result(
+                    time_range=time_range, **kwargs
+                ),
+            )
+
+        std_dev_enabled = kwargs.get("std_dev_disable", "false") == "false"
+        time_filter = self._time_filter_builder(time_range=time_range)
+        agg_query = self._aggregation_query(
+            numeric_columns=numeric_columns,
+            time_filter=time_filter,
+            std_dev_enabled=std_dev_enabled,
+        )
+        facets = self._collection.aggregate(agg_query).next()
+        value_counts = self._categorical_value_counts(time_filter)
+        if self._column_map is not None:
+            return self._column_map_results(
+                numeric_columns, facets, value_counts, std_dev_enabled
+            )
+        return self._column_list_results(
+            numeric_columns, facets, value_counts, std_dev_enabled
+        )
+
+    def _aggregation_query(
+        self,
+        numeric_columns: List,
+        time_filter: Dict = None,
+        std_dev_enabled: bool = True,
+    ) -> List[Dict[str, Any]]:
+        if self._column_map is not None:
+            return [
+                self._dataset_match(time_filter),
+                {"$facet": self._column_map_facets(numeric_columns, std_dev_enabled)},
+            ]
+        return [
+            self._dataset_match(time_filter),
+            {"$unwind": "$columns"},
+            {"$facet": self._column_list_facets(numeric_columns, std_dev_enabled)},
+        ]
+
+    def _results(
+        self,
+        categorical_hist: Dict,
+        numeric_hist: Dict,
+        empty_hist: Dict,
+        cardinality: Dict,
+        numeric_basic: Dict,
+    ) -> Dict[str, Dict]:
+        return {
+            self._categorical_histogram.metric_name: categorical_hist,
+            self._numeric_histogram.metric_name: numeric_hist,
+            self._empty_histogram.metric_name: empty_hist,
+            self._cardinality.metric_name: cardinality,
+            self._numeric_basic.metric_name: numeric_basic,
+        }
+
+    def _column_list_facets(
+        self, numeric_columns: List, std_dev_enabled: bool
+    ) -> Dict[str, List]:
+        data_type = "$columns.data_type"
+        numeric, categorical = "$columns.value_numeric", "$columns.value_categorical"
+        numeric_value = {
+            "$cond": [{"$eq": [data_type, ColumnDataType.NUMERIC.value]}, numeric, None]
+        }
+        is_empty = CountEmptyHistogram._is_empty_column(data_type, numeric, categorical)
+        return {
+            "columns": [
+                {
+                    "$group": {
+                        "_id": "$columns.name",
+                        "total": {"$sum": 1},
+                        "empty": {"$sum": {"$cond": [is_empty, 1, 0]}},
+                        **NumericBasicMetrics._accumulators(
+                            numeric_value, "_numeric", std_dev_enabled
+                        ),
+                    }
+                }
+            ],
+            **{
+                f"h{i}": [
+                    {"$match": {"columns.data_type": ColumnDataType.NUMERIC.value}},
+                    *self._numeric_histogram._bucket_auto_facet(column),
+                ]
+                for i, column in enumerate(numeric_columns)
+            },
+        }
+
+    def _column_list_results(
+        self,
+        numeric_columns: List,
+        facets: Dict[str, List],
+        value_counts: Dict[str, List[Tuple[Any, int]]],
+        std_dev_enabled: bool,
+    ) -> Dict[str, Dict]:
+        empty_hist, numeric_basic = {}, {}
+        for doc in facets["columns"]:
+            empty_hist[doc["_id"]] = CountEmptyHistogram._empty_counts(
+                doc["empty"], doc["total"]
+            )
+            column_metrics = NumericBasicMetrics._basic_metrics(
+                doc, "_numeric", std_dev_enabled
+            )
+            if column_metrics is not None:
+                numeric_basic[doc["_id"]] = column_metrics
+
+        return self._results(
+            categorical_hist=CategoricalCountHistogram._histogram(value_counts),
+            numeric_hist={
+                column: NumericCountHistogram._histogram(facets[f"h{i}"])
+                for i, column in enumerate(numeric_columns)
+            },
+            empty_hist=empty_hist,
+            cardinality=CardinalityCategorical._value_counts_cardinality(value_counts),
+            numeric_basic=numeric_basic,
+        )
+
+    def _column_map_facets(
+        self, numeric_columns: List, std_dev_enabled: bool
+    ) -> Dict[str, List]:
+        group: Dict[str, Any] = {
+            "_id": None,
+            "total": {"$sum": 1},
+            **CountEmptyHistogram._map_empty_accumulators(self._map_columns()),
+        }
+        for i, (_, path) in enumerate(self._map_columns(ColumnDataType.NUMERIC)):
+            group.update(
+                NumericBasicMetrics._accumulators(f"${path}", f"_n{i}", std_dev_enabled)
+            )
+        return {
+            "columns": [{"$group": group}],
+            **{
+                f"h{i}": self._numeric_histogram._bucket_auto_facet(column)
+                for i, column in enumerate(numeric_columns)
+            },
+        }
+
+    def _column_map_results(
+        self,
+        numeric_columns: List,
+        facets: Dict[str, List],
+        value_counts: Dict[str, List[Tuple[Any, int]]],
+        std_dev_enabled: bool,
+    ) -> Dict[str, Dict]:
+        columns = self._map_columns()
+        numeric_map_columns = self._map_columns(ColumnDataType.NUMERIC)
+
+        empty_hist, numeric_basic = {}, {}
+        if facets["columns"]:
+            metrics = facets["columns"][0]
+            for i, (name, _) in enumerate(columns):
+                empty_hist[name] = CountEmptyHistogram._empty_counts(
+                    metrics[f"e{i}"], metrics["total"]
+                )
+            for i, (name, _) in enumerate(numeric_map_columns):
+                column_metrics = NumericBasicMetrics._basic_metrics(
+                    metrics, f"_n{i}", std_dev_enabled
+                )
+                if column_metrics is not None:
+                    numeric_basic[name] = column_metrics
+
+        return self._results(
+            categorical_hist=CategoricalCountHistogram._histogram(value_counts),
+            numeric_hist={
+                column: NumericCountHistogram._histogram(facets[f"h{i}"])
+                for i, column in enumerate(numeric_columns)
+            },
+            empty_hist=empty_hist,
+            cardinality=CardinalityCategorical._value_counts_cardinality(value_counts),
+            numeric_basic=numeric_basic,
+        )
@@ -0,0 +1,344 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import math
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Union
+from uuid import UUID
+
+from pymongo.collection import Collection
+
+from waterdip.core.commons.models import ColumnDataType, TimeRange
+from waterdip.core.metrics.data_metrics import DataMetrics
+from waterdip.core.metrics.profiles import DatasetProfile
+from waterdip.core.metrics.rollups import ColumnStats, DailyRollups
+from waterdip.core.metrics.sketches import bucket_id, bucket_key
+from waterdip.core.metrics.windows import SlidingWindowStats
+
+# proportions of empty bins are floored, so that the PSI of a bin stays finite
+PSI_EPSILON = 1e-4
+# label of the categorical bin of the values which are not in the baseline
+OTHER_CATEGORY = "__other__"
+
+
+def population_stability_index(expected: List[float], actual: List[float]) -> float:
+    """PSI of two binned distributions given as proportions of the same bins"""
+    psi = 0.0
+    for e, a in zip(expected, actual):
+        e, a = max(e, PSI_EPSILON), max(a, PSI_EPSILON)
+        psi += (a - e) * math.log(a / e)
+    return psi
+
+
+def _proportions(counts: List[int]) -> Optional[List[float]]:
+    total = sum(counts)
+    return [count / total for count in counts] if total else None
+
+
+class BaselineDistribution:
+    """
+    Binned distribution of a baseline column, the reference of the drift metrics.
+
+    Numeric columns are binned by the quantile edges of the baseline, categorical
+    columns by the categories of the baseline and one more bin for the values which
+    are not in the baseline. Values are binned by their quantile sketch bucket, so a
+    bin edge falls on the bucket of the quantile and the values of a sketch bucket
+    always fall in the same bin for the baseline and the compared data.
+
+    Attributes:
+    ------------------
+    data_type:
+        data type of the column
+    edges:
+        inner bin edges of a numeric column, a value falls in the bin of the number
+        of edges lower or equal to it
+    categories:
+        categories of a categorical column, followed by OTHER_CATEGORY
+    proportions:
+        proportion of the non empty baseline values in every bin
+    """
+
+    def __init__(
+        self,
+        data_type: str,
+        proportions: List[float],
+        edges: Optional[List[float]] = None,
+        categories: Optional[List[str]] = None,
+    ):
+        self.data_type = data_type
+        self.proportions = proportions
+        self.edges = edges or []
+        self.categories = categories or []
+
+    @classmethod
+    def from_stats(
+        cls, stats: ColumnStats, bins: int = 10
+    ) -> Optional["BaselineDistribution"]:
+        """
+        Distribution of the column statistics of a baseline, None when the baseline
+        has no value of the column
+        """
+        if stats.data_type == ColumnDataType.NUMERIC.value:
+            edges = sorted(
+                {stats.sketch.quantile(i / bins) for i in range(1, bins)} - {None}
+            )
+            distribution = cls(stats.data_type, [], edges=edges)
+        else:
+            categories = [value for value, _ in stats.values.most_common()]
+            distribution = cls(
+                stats.data_type, [], categories=categories + [OTHER_CATEGORY]
+            )
+        proportions = _proportions(distribution.counts(stats))
+        if proportions is None:
+            return None
+        distribution.proportions = proportions
+        return distribution
+
+    @property
+    def vocabulary(self) -> Set[str]:
+        """Categories of the baseline of a categorical column"""
+        return set(self.categories[:-1])
+
+    @property
+    def bins(self) -> List[str]:
+        """Label of every bin, the lower edge of the numeric bins"""
+        if self.data_type == ColumnDataType.NUMERIC.value:
+            return ["-inf"] + [str(edge) for edge in self.edges]
+        return [str(category) for category in self.categories]
+
+    def counts(self, stats: ColumnStats) -> List[int]:
+        """Number of non empty values of the column statistics in every bin"""
+        if self.data_type == ColumnDataType.NUMERIC.value:
+            counts = [0] * (len(self.edges) + 1)
+            for value, n in stats.sketch.sorted_buckets():
+                counts[bisect_right(self.edges, value)] += n
+            return counts
+
+        positions = {category: i for i, category in enumerate(self.categories[:-1])}
+        counts = [0] * len(self.categories)
+        for value, n in stats.values.items():
+            if value is not None:
+                counts[positions.get(value, len(counts) - 1)] += n
+        counts[-1] += stats.other_count
+        return counts
+
+    def psi(self, stats: ColumnStats) -> Optional[Dict[str, Any]]:
+        """
+        PSI of the column statistics against the baseline, None when the statistics
+        have no value of the column
+        """
+        actual = _proportions(self.counts(stats))
+        if actual is None:
+            return None
+        return {
+            "psi": round(population_stability_index(self.proportions, actual), 4),
+            "bins": self.bins,
+            "expected": self.proportions,
+            "actual": actual,
+        }
+
+
+class ColumnDistributionMetric(DataMetrics):
+    """
+    Value distributions of the columns of a dataset, as the quantile sketches of
+    the numeric columns and the value counts of the categorical columns.
+
+    With rollups, or the stored profile of a batch dataset, the distributions are
+    read from the precomputed statistics. Otherwise all the columns are counted by
+    one aggregation, whatever the number of columns.
+    """
+
+    @property
+    def metric_name(self) -> str:
+        return "column_distribution"
+
+    def aggregation_result(
+        self, columns: Dict[str, str], time_range: TimeRange = None, **kwargs
+    ) -> Dict[str, ColumnStats]:
+        """
+        Parameters
+        ----------
+        columns:
+            data type of every column to count, by column name
+        time_range:
+            time range of the rows, all the rows by default
+        Returns
+        -------
+        statistics with the sketch or the value counts of every column by column
+        name, columns without values are left out: Dict[str, ColumnStats]
+        """
+        column_stats = self._rollup_column_stats(time_range)
+        if column_stats is not None:
+            return {
+                name: stats
+                for name, stats in column_stats.items()
+                if name in columns and stats.non_null
+            }
+
+        column_stats = {}
+        agg_query = self._aggregation_query(
+            columns=columns, time_filter=self._time_filter_builder(time_range)
+        )
+        for facets in self._collection.aggregate(agg_query):
+            for doc in facets["numeric"]:
+                name = doc["_id"]["k"]
+                stats = column_stats.setdefault(name, ColumnStats(columns[name]))
+                stats.sketch.buckets[
+                    bucket_key(doc["_id"]["s"], int(doc["_id"]["i"]))
+                ] += doc["count"]
+            for doc in facets["categorical"]:
+                name = doc["_id"]["k"]
+                stats = column_stats.setdefault(name, ColumnStats(columns[name]))
+                stats.values[doc["_id"]["v"]] += doc["count"]
+        return column_stats
+
+    def _aggregation_query(
+        self, columns: Dict[str, str], time_filter: Dict = None, **kwargs
+    ) -> List[Dict[str, Any]]:
+        numeric = [n for n, t in columns.items() if t == ColumnDataType.NUMERIC.value]
+        categorical = [n for n in columns if n not in numeric]
+        return [
+            self._dataset_match(time_filter),
+            *self._key_value_stages(),
+            {"$match": {"k": {"$in": list(columns)}, "v": {"$ne": None}}},
+            {
+                "$facet": {
+                    "numeric": [
+                        {"$match": {"k": {"$in": numeric}}},
+                        {
+                            "$group": {
+                                "_id": {"k": "$k", **bucket_id("$v")},
+                                "count": {"$sum": 1},
+                            }
+                        },
+                    ],
+                    "categorical": [
+                        {"$match": {"k": {"$in": categorical}}},
+                        {
+                            "$group": {
+                                "_id": {"k": "$k", "v": "$v"},
+                                "count": {"$sum": 1},
+                            }
+                        },
+                    ],
+                }
+            },
+        ]
+
+
+class PSIDriftMetric(DataMetrics):
+    """
+    Population stability index of every column of a dataset against the binned
+    distributions of a baseline. The distributions of all the columns are read at
+    once by ColumnDistributionMetric and binned with the fixed bins of the baseline.
+
+    Attributes:
+    -----
+    baseline: Dict[str, BaselineDistribution]
+        baseline distribution of every column to compare, by column name
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        baseline: Dict[str, BaselineDistribution],
+        column_map: Optional[Dict[str, Dict[str, ColumnDataType]]] = None,
+        rollups: Optional[
+            Union[DailyRollups, DatasetProfile, SlidingWindowStats]
+        ] = None,
+    ):
+        super().__init__(collection, dataset_id, column_map, rollups)
+        self._baseline = baseline
+        self._distributions = ColumnDistributionMetric(
+            collection, dataset_id, column_map, rollups
+        )
+
+    @property
+    def metric_name(self) -> str:
+        return "psi_drift"
+
+    def aggregation_result(
+        self, time_range: TimeRange = None, **kwargs
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns
+        -------
+        "psi", the "bins" labels and the "expected" and "actual" proportions of the
+        bins of every column with values, by column name
+        """
+        column_stats = self._distributions.aggregation_result(
+            columns={
+                name: distribution.data_type
+                for name, distribution in self._baseline.items()
+            },
+            time_range=time_range,
+        )
+        drift: Dict[str, Dict[str, Any]] = {}
+        for name, distribution in self._baseline.items():
+            stats = column_stats.get(name)
+            result = distribution.psi(stats) if stats is not None else None
+            if result is not None:
+                drift[name] = result
+        return drift
+
+    def _aggregation_query(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        return self._distributions._aggregation_query(*args, **kwargs)
+
+
+class BaselineCache:
+    """
+    Process local LRU cache of baseline distributions. The key of a baseline has to
+    change with its data, e.g. the dataset watermark of a dataset baseline or the
+    days of a time window baseline.
+
+    Attributes:
+    ------------------
+    max_size:
+        maximum number of baselines kept, the least recently used one gets evicted
+        first
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._baselines: "OrderedDict[Hashable, Dict[str, BaselineDistribution]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._baselines)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, BaselineDistribution]]:
+        with self._lock:
+            baseline = self._baselines.get(key)
+            if baseline is not None:
+                self._baselines.move_to_end(key)
+            return baseline
+
+    def put(self, key: Hashable, baseline: Dict[str, BaselineDistribution]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._baselines[key] = baseline
+            self._baselines.move_to_end(key)
+            while len(self._baselines) > self.max_size:
+                self._baselines.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._baselines.clear()
@@ -0,0 +1,88 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from uuid import UUID
+
+from pymongo.collection import Collection
+
+from waterdip.core.commons.models import TimeRange
+from waterdip.core.metrics.rollups import ColumnStats, DailyStats
+
+# profiles are not split by days, all the rows are added to this single day
+PROFILE_DAY = datetime(1970, 1, 1)
+
+
+def profile_stats(
+    documents: Iterable[Dict],
+    column_map: Optional[Dict[str, Dict[str, str]]] = None,
+    daily_stats: Optional[DailyStats] = None,
+) -> DailyStats:
+    """
+    Adds batch row documents to the statistics of a profile, new statistics by
+    default
+    """
+    if daily_stats is None:
+        daily_stats = DailyStats(column_map=column_map)
+    for document in documents:
+        daily_stats.add_document(document, day=PROFILE_DAY)
+    return daily_stats
+
+
+class DatasetProfile:
+    """
+    Reads the stored profile of a batch dataset. A profile holds the mergeable
+    statistics of every column, stored per upload chunk of the dataset, and is served
+    to the data metrics in place of the daily rollups of event datasets. It covers
+    the whole dataset, so the time range of the metrics is ignored.
+
+    Attributes:
+    ------------------
+    collection:
+        profiles collection
+    dataset_id:
+        dataset id
+    column_map:
+        data types of the row maps when the rows are stored in the COLUMN_MAP format
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        column_map: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        self._collection = collection
+        self._dataset_id = dataset_id
+        self._column_map = column_map
+        self._daily_stats: Optional[DailyStats] = None
+        self._loaded = False
+
+    def daily_stats(
+        self, time_range: Optional[TimeRange] = None
+    ) -> Optional[DailyStats]:
+        """Statistics of the dataset, None when the dataset has no stored profile"""
+        if self._loaded:
+            return self._daily_stats
+        daily_stats = DailyStats(column_map=self._column_map)
+        for document in self._collection.find({"dataset_id": str(self._dataset_id)}):
+            daily_stats.column(
+                (PROFILE_DAY, document["mapping"], document["column"]),
+                document["data_type"],
+            ).merge(ColumnStats.from_document(document))
+        self._daily_stats = daily_stats if daily_stats.columns else None
+        self._loaded = True
+        return self._daily_stats
@@ -0,0 +1,838 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from pymongo.collection import Collection
+
+from waterdip.core.commons.models import ColumnDataType, ColumnMappingType, TimeRange
+from waterdip.core.metrics.sketches import LogBucketSketch, bucket_id, bucket_key
+
+ONE_DAY = timedelta(days=1)
+ONE_MILLISECOND = timedelta(milliseconds=1)
+
+# maximum number of categorical values stored per column statistics, the counts of
+# the least frequent values are folded into other_count
+MAX_TRACKED_VALUES = 1000
+
+# COLUMN_MAP row field -> mapping type of its columns
+MAP_FIELD_MAPPING_TYPES = {
+    "features": ColumnMappingType.FEATURE.value,
+    "predictions": ColumnMappingType.PREDICTION.value,
+}
+
+_ESCAPES = {"\\": "\\\\", ".": "\\d", "$": "\\s", "\x00": "\\z"}
+_UNESCAPES = {"\\": "\\", "d": ".", "s": "$", "z": "\x00"}
+_NONE_KEY = "\\0"
+_EMPTY_KEY = "\\e"
+
+# (day, mapping type, column name)
+ColumnKey = Tuple[datetime, str, str]
+
+
+def escape_key(value: Optional[str]) -> str:
+    """
+    Escapes a logged value to be used as a mongodb document key. Keys can not contain
+    '.', start with '$' or be empty, None is stored as a key as well
+    """
+    if value is None:
+        return _NONE_KEY
+    if value == "":
+        return _EMPTY_KEY
+    return "".join(_ESCAPES.get(char, char) for char in str(value))
+
+
+def unescape_key(key: str) -> Optional[str]:
+    if key == _NONE_KEY:
+        return None
+    if key == _EMPTY_KEY:
+        return ""
+    chars: List[str] = []
+    escaped = False
+    for char in key:
+        if escaped:
+            chars.append(_UNESCAPES[char])
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+
+def fold_values(
+    values: Dict[str, int], max_values: int = MAX_TRACKED_VALUES
+) -> Tuple[Dict[str, int], int]:
+    """Keeps the max_values most frequent values, returns them and the folded count"""
+    if len(values) <= max_values:
+        return values, 0
+    kept = dict(Counter(values).most_common(max_values))
+    return kept, sum(values.values()) - sum(kept.values())
+
+
+def day_floor(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def day_ceil(moment: datetime) -> datetime:
+    day = day_floor(moment)
+    return day if day == moment else day + ONE_DAY
+
+
+class ColumnStats:
+    """
+    Mergeable sufficient statistics of one column
+
+    Attributes:
+    ------------------
+    data_type:
+        data type of the column
+    count:
+        number of rows of the column, including the empty ones
+    null_count:
+        number of rows where the column is empty
+    sum, sum_sq, min, max, zeros:
+        sum, sum of squares, minimum, maximum and number of zeros of the numeric values
+    values:
+        count of every categorical value
+    other_count:
+        number of categorical values folded out of values, see MAX_TRACKED_VALUES
+    sketch:
+        quantile sketch of the numeric values
+    """
+
+    def __init__(self, data_type: str):
+        self.data_type = data_type
+        self.count = 0
+        self.null_count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.zeros = 0
+        self.values: Counter = Counter()
+        self.other_count = 0
+        self.sketch = LogBucketSketch()
+
+    @property
+    def non_null(self) -> int:
+        return self.count - self.null_count
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.non_null if self.non_null else None
+
+    @property
+    def std_dev(self) -> Optional[float]:
+        if not self.non_null:
+            return None
+        mean = self.sum / self.non_null
+        return math.sqrt(max(self.sum_sq / self.non_null - mean * mean, 0.0))
+
+    def add(self, value: Any) -> None:
+        self.count += 1
+        if value is None:
+            self.null_count += 1
+        elif self.data_type == ColumnDataType.NUMERIC.value:
+            self.sum += value
+            self.sum_sq += value * value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+            if value == 0:
+                self.zeros += 1
+            self.sketch.add(value)
+        else:
+            self.values[value] += 1
+
+    def merge(self, other: "ColumnStats") -> "ColumnStats":
+        self.count += other.count
+        self.null_count += other.null_count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.zeros += other.zeros
+        self.values.update(other.values)
+        self.other_count += other.other_count
+        self.sketch.merge(other.sketch)
+        return self
+
+    def bounded_values(
+        self, max_values: int = MAX_TRACKED_VALUES
+    ) -> Tuple[Dict[str, int], int]:
+        """
+        Counts of the max_values most frequent values by escaped key, and other_count
+        including the counts of the rest of the values
+        """
+        values, other_count = fold_values(
+            {escape_key(value): n for value, n in self.values.items()}, max_values
+        )
+        return values, self.other_count + other_count
+
+    def to_document(self) -> Dict:
+        values, other_count = self.bounded_values()
+        return {
+            "data_type": self.data_type,
+            "count": self.count,
+            "null_count": self.null_count,
+            "sum": self.sum,
+            "sum_sq": self.sum_sq,
+            "min": self.min,
+            "max": self.max,
+            "zeros": self.zeros,
+            "values": values,
+            "other_count": other_count,
+            "sketch": self.sketch.to_document(),
+        }
+
+    def to_update(self) -> Dict:
+        """Incremental update of a stored rollup document"""
+        values, other_count = self.bounded_values()
+        update: Dict[str, Dict] = {
+            "$inc": {
+                "count": self.count,
+                "null_count": self.null_count,
+                "sum": self.sum,
+                "sum_sq": self.sum_sq,
+                "zeros": self.zeros,
+                "other_count": other_count,
+                **{f"values.{key}": n for key, n in values.items()},
+                **{f"sketch.{key}": n for key, n in self.sketch.to_document().items()},
+            },
+            "$setOnInsert": {"data_type": self.data_type},
+        }
+        if self.min is not None:
+            update["$min"] = {"min": self.min}
+            update["$max"] = {"max": self.max}
+        return update
+
+    @classmethod
+    def from_document(cls, document: Dict) -> "ColumnStats":
+        stats = cls(document["data_type"])
+        stats.count = document.get("count", 0)
+        stats.null_count = document.get("null_count", 0)
+        stats.sum = document.get("sum", 0.0)
+        stats.sum_sq = document.get("sum_sq", 0.0)
+        stats.min = document.get("min")
+        stats.max = document.get("max")
+        stats.zeros = document.get("zeros", 0)
+        stats.values = Counter(
+            {unescape_key(key): n for key, n in (document.get("values") or {}).items()}
+        )
+        stats.other_count = document.get("other_count", 0)
+        stats.sketch = LogBucketSketch.from_document(document.get("sketch"))
+        return stats
+
+
+class RowStats:
+    """
+    Mergeable row counts of one day of a dataset
+
+    Attributes:
+    ------------------
+    rows:
+        number of rows
+    matches:
+        number of rows where the predictions match the actuals
+    cells:
+        confusion matrix cells of the first prediction class,
+        (predicted class, actual class) -> number of rows
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.matches = 0
+        self.cells: Counter = Counter()
+
+    def add(
+        self, prediction: Optional[str], actual: Optional[str], is_match: bool
+    ) -> None:
+        self.rows += 1
+        if is_match:
+            self.matches += 1
+        self.cells[(prediction, actual)] += 1
+
+    def merge(self, other: "RowStats") -> "RowStats":
+        self.rows += other.rows
+        self.matches += other.matches
+        self.cells.update(other.cells)
+        return self
+
+    def to_document(self) -> Dict:
+        cells: Dict[str, Dict[str, int]] = {}
+        for (prediction, actual), n in self.cells.items():
+            cells.setdefault(escape_key(prediction), {})[escape_key(actual)] = n
+        return {"rows": self.rows, "matches": self.matches, "cells": cells}
+
+    def to_update(self) -> Dict:
+        return {
+            "$inc": {
+                "rows": self.rows,
+                "matches": self.matches,
+                **{
+                    f"cells.{escape_key(prediction)}.{escape_key(actual)}": n
+                    for (prediction, actual), n in self.cells.items()
+                },
+            }
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict) -> "RowStats":
+        stats = cls()
+        stats.rows = document.get("rows", 0)
+        stats.matches = document.get("matches", 0)
+        for prediction, actuals in (document.get("cells") or {}).items():
+            for actual, n in actuals.items():
+                stats.cells[(unescape_key(prediction), unescape_key(actual))] = n
+        return stats
+
+
+def _first_class(classes: Optional[List]) -> Optional[str]:
+    return classes[0] if classes else None
+
+
+class DailyStats:
+    """
+    Statistics of the rows of one dataset, per day and per column
+
+    Attributes:
+    ------------------
+    column_map:
+        data types of the row maps when the rows are stored in the COLUMN_MAP format
+    columns:
+        (day, mapping type, column name) -> column statistics
+    rows:
+        day -> row counts
+    """
+
+    def __init__(self, column_map: Optional[Dict[str, Dict[str, str]]] = None):
+        self.column_map = (
+            {
+                field: {name: ColumnDataType(t).value for name, t in columns.items()}
+                for field, columns in column_map.items()
+            }
+            if column_map is not None
+            else None
+        )
+        self.columns: Dict[ColumnKey, ColumnStats] = {}
+        self.rows: Dict[datetime, RowStats] = {}
+
+    @property
+    def days(self) -> List[datetime]:
+        return sorted(self.rows)
+
+    def column(self, key: ColumnKey, data_type: str) -> ColumnStats:
+        stats = self.columns.get(key)
+        if stats is None:
+            stats = self.columns[key] = ColumnStats(data_type)
+        return stats
+
+    def add_document(self, document: Dict, day: Optional[datetime] = None) -> None:
+        """
+        Adds a row document, as it is stored in the rows collection, to the day of
+        its created_at or to the given day
+        """
+        day = day_floor(document["created_at"]) if day is None else day
+        if self.column_map is not None:
+            for field, columns in self.column_map.items():
+                values = document.get(field) or {}
+                mapping_type = MAP_FIELD_MAPPING_TYPES[field]
+                for name, data_type in columns.items():
+                    self.column((day, mapping_type, name), data_type).add(
+                        values.get(name)
+                    )
+        else:
+            self._add_columns(day, document.get("columns") or [])
+
+        row_stats = self.rows.get(day)
+        if row_stats is None:
+            row_stats = self.rows[day] = RowStats()
+        row_stats.add(
+            _first_class(document.get("prediction_cf")),
+            _first_class(document.get("actual_cf")),
+            document.get("is_match") is True,
+        )
+
+    def _add_columns(self, day: datetime, columns: List[Dict]) -> None:
+        for column in columns:
+            data_type = column["data_type"]
+            value = (
+                column.get("value_numeric")
+                if data_type == ColumnDataType.NUMERIC.value
+                else column.get("value_categorical")
+            )
+            self.column((day, column["mapping_type"], column["name"]), data_type).add(
+                value
+            )
+
+    def move_actuals(
+        self,
+        document: Dict,
+        actual_cf: Optional[List],
+        is_match: Optional[bool],
+        columns: Optional[List[Dict]] = None,
+    ) -> None:
+        """
+        Moves an already added row document from its stored actuals to new ones. The
+        number of rows of the day is unchanged, the confusion cell and the match of
+        the row are moved. The COLUMN_LIST columns of the new actuals are added, as
+        the statistics of replaced columns can not be subtracted
+        """
+        day = day_floor(document["created_at"])
+        row_stats = self.rows.get(day)
+        if row_stats is None:
+            row_stats = self.rows[day] = RowStats()
+        prediction = _first_class(document.get("prediction_cf"))
+        row_stats.cells[(prediction, _first_class(document.get("actual_cf")))] -= 1
+        row_stats.cells[(prediction, _first_class(actual_cf))] += 1
+        row_stats.matches += int(is_match is True) - int(
+            document.get("is_match") is True
+        )
+        if columns:
+            self._add_columns(day, columns)
+
+    def merge(self, other: "DailyStats") -> "DailyStats":
+        for key, stats in other.columns.items():
+            self.column(key, stats.data_type).merge(stats)
+        for day, stats in other.rows.items():
+            self.rows.setdefault(day, RowStats()).merge(stats)
+        return self
+
+    def column_totals(self) -> Dict[str, ColumnStats]:
+        """Statistics of every column merged over all the days and mapping types"""
+        totals: Dict[str, ColumnStats] = {}
+        for (_, _, name), stats in self.columns.items():
+            if name not in totals:
+                totals[name] = ColumnStats(stats.data_type)
+            totals[name].merge(stats)
+        return totals
+
+
+def _day_id(field: str = "$created_at", hourly: bool = False) -> Dict:
+    day_id = {
+        "y": {"$year": field},
+        "m": {"$month": field},
+        "d": {"$dayOfMonth": field},
+    }
+    if hourly:
+        day_id["h"] = {"$hour": field}
+    return day_id
+
+
+def _day_of(group_id: Dict) -> datetime:
+    return datetime(group_id["y"], group_id["m"], group_id["d"], group_id.get("h", 0))
+
+
+def _numeric_accumulators(value: str) -> Dict:
+    return {
+        "sum": {"$sum": value},
+        "sum_sq": {
+            "$sum": {"$multiply": [{"$ifNull": [value, 0]}, {"$ifNull": [value, 0]}]}
+        },
+        "min": {"$min": value},
+        "max": {"$max": value},
+        "zeros": {"$sum": {"$cond": [{"$eq": [value, 0]}, 1, 0]}},
+    }
+
+
+def _non_null(value: Any) -> Dict:
+    return {"$sum": {"$cond": [{"$eq": [{"$ifNull": [value, None]}, None]}, 0, 1]}}
+
+
+def _set_numeric(stats: ColumnStats, doc: Dict) -> None:
+    stats.sum = doc["sum"] or 0.0
+    stats.sum_sq = doc["sum_sq"] or 0.0
+    stats.min = doc["min"]
+    stats.max = doc["max"]
+    stats.zeros = doc["zeros"]
+
+
+def _add_sketch_bucket(stats: ColumnStats, group_id: Dict, count: int) -> None:
+    stats.sketch.buckets[bucket_key(group_id["s"], int(group_id["i"]))] += count
+
+
+def _column_list_stats(
+    collection: Collection, match: Dict, daily_stats: DailyStats, hourly: bool = False
+) -> None:
+    numeric, categorical = "$columns.value_numeric", "$columns.value_categorical"
+    column_id = {
+        **_day_id(hourly=hourly),
+        "k": "$columns.name",
+        "t": "$columns.mapping_type",
+        "dt": "$columns.data_type",
+    }
+    for doc in collection.aggregate(
+        [
+            match,
+            {"$unwind": "$columns"},
+            {
+                "$group": {
+                    "_id": column_id,
+                    "count": {"$sum": 1},
+                    "non_null": _non_null({"$ifNull": [numeric, categorical]}),
+                    **_numeric_accumulators(numeric),
+                }
+            },
+        ]
+    ):
+        group_id = doc["_id"]
+        stats = daily_stats.column(
+            (_day_of(group_id), group_id["t"], group_id["k"]), group_id["dt"]
+        )
+        stats.count = doc["count"]
+        stats.null_count = doc["count"] - doc["non_null"]
+        if group_id["dt"] == ColumnDataType.NUMERIC.value:
+            _set_numeric(stats, doc)
+
+    for doc in collection.aggregate(
+        [
+            match,
+            {"$unwind": "$columns"},
+            {"$match": {"columns.value_categorical": {"$ne": None}}},
+            {
+                "$group": {
+                    "_id": {**column_id, "v": categorical},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+    ):
+        group_id = doc["_id"]
+        daily_stats.column(
+            (_day_of(group_id), group_id["t"], group_id["k"]), group_id["dt"]
+        ).values[group_id["v"]] += doc["count"]
+
+    for doc in collection.aggregate(
+        [
+            match,
+            {"$unwind": "$columns"},
+            {"$match": {"columns.value_numeric": {"$ne": None}}},
+            {
+                "$group": {
+                    "_id": {**column_id, **bucket_id(numeric)},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+    ):
+        group_id = doc["_id"]
+        _add_sketch_bucket(
+            daily_stats.column(
+                (_day_of(group_id), group_id["t"], group_id["k"]), group_id["dt"]
+            ),
+            group_id,
+            doc["count"],
+        )
+
+
+def _map_columns_filter(
+    column_map: Dict[str, Dict[str, str]], data_type: str
+) -> Optional[Dict]:
+    conditions = [
+        {
+            "kv.t": MAP_FIELD_MAPPING_TYPES[field],
+            "kv.k": {"$in": [name for name, t in columns.items() if t == data_type]},
+        }
+        for field, columns in column_map.items()
+        if data_type in columns.values()
+    ]
+    return {"$or": conditions} if conditions else None
+
+
+def _column_map_stats(
+    collection: Collection, match: Dict, daily_stats: DailyStats, hourly: bool = False
+) -> None:
+    """
+    COLUMN_MAP rows are unwound over the key / value pairs of their maps. A column
+    which was not logged in a row is counted as empty, so the number of rows of the
+    column is the number of rows of the day
+    """
+    column_map = daily_stats.column_map
+    key_values = {
+        "$concatArrays": [
+            {
+                "$map": {
+                    "input": {"$objectToArray": {"$ifNull": [f"${field}", {}]}},
+                    "as": "c",
+                    "in": {"k": "$$c.k", "v": "$$c.v", "t": {"$literal": mapping}},
+                }
+            }
+            for field, mapping in MAP_FIELD_MAPPING_TYPES.items()
+            if field in column_map
+        ]
+    }
+    unwind = [
+        match,
+        {"$project": {"created_at": 1, "kv": key_values}},
+        {"$unwind": "$kv"},
+    ]
+    column_id = {**_day_id(hourly=hourly), "k": "$kv.k", "t": "$kv.t"}
+    data_types = {
+        (MAP_FIELD_MAPPING_TYPES[field], name): data_type
+        for field, columns in column_map.items()
+        for name, data_type in columns.items()
+    }
+
+    non_null: Dict[ColumnKey, int] = {}
+    for doc in collection.aggregate(
+        [*unwind, {"$group": {"_id": column_id, "non_null": _non_null("$kv.v")}}]
+    ):
+        group_id = doc["_id"]
+        non_null[(_day_of(group_id), group_id["t"], group_id["k"])] = doc["non_null"]
+
+    for day, row_stats in daily_stats.rows.items():
+        for (mapping, name), data_type in data_types.items():
+            stats = daily_stats.column((day, mapping, name), data_type)
+            stats.count = row_stats.rows
+            stats.null_count = row_stats.rows - non_null.get((day, mapping, name), 0)
+
+    numeric_filter = _map_columns_filter(column_map, ColumnDataType.NUMERIC.value)
+    if numeric_filter is not None:
+        for doc in collection.aggregate(
+            [
+                *unwind,
+                {"$match": numeric_filter},
+                {"$group": {"_id": column_id, **_numeric_accumulators("$kv.v")}},
+            ]
+        ):
+            group_id = doc["_id"]
+            key = (_day_of(group_id), group_id["t"], group_id["k"])
+            _set_numeric(daily_stats.column(key, data_types[key[1:]]), doc)
+
+        for doc in collection.aggregate(
+            [
+                *unwind,
+                {"$match": {**numeric_filter, "kv.v": {"$ne": None}}},
+                {
+                    "$group": {
+                        "_id": {**column_id, **bucket_id("$kv.v")},
+                        "count": {"$sum": 1},
+                    }
+                },
+            ]
+        ):
+            group_id = doc["_id"]
+            key = (_day_of(group_id), group_id["t"], group_id["k"])
+            _add_sketch_bucket(
+                daily_stats.column(key, data_types[key[1:]]), group_id, doc["count"]
+            )
+
+    categorical_filter = _map_columns_filter(
+        column_map, ColumnDataType.CATEGORICAL.value
+    )
+    if categorical_filter is not None:
+        for doc in collection.aggregate(
+            [
+                *unwind,
+                {"$match": {**categorical_filter, "kv.v": {"$ne": None}}},
+                {"$group": {"_id": {**column_id, "v": "$kv.v"}, "count": {"$sum": 1}}},
+            ]
+        ):
+            group_id = doc["_id"]
+            key = (_day_of(group_id), group_id["t"], group_id["k"])
+            daily_stats.column(key, data_types[key[1:]]).values[group_id["v"]] += doc[
+                "count"
+            ]
+
+
+def raw_daily_stats(
+    collection: Collection,
+    dataset_id: UUID,
+    time_filter: Dict = None,
+    column_map: Optional[Dict[str, Dict[str, str]]] = None,
+    hourly: bool = False,
+) -> DailyStats:
+    """
+    Computes the daily statistics of the rows of a dataset with aggregations on
+    the rows collection
+
+    Parameters
+    ----------
+    collection:
+        rows collection
+    dataset_id:
+        dataset id
+    time_filter:
+        created_at filter of the rows
+    column_map:
+        data types of the row maps, when the rows are stored in the COLUMN_MAP format
+    hourly:
+        statistics per hour instead of per day, the days of the statistics are the
+        start times of the hours
+    Returns
+    -------
+    daily statistics of the rows: DailyStats
+    """
+    match = {
+        "$match": {
+            "dataset_id": str(dataset_id),
+            **(time_filter if time_filter is not None else {}),
+        }
+    }
+    daily_stats = DailyStats(column_map=column_map)
+
+    first_class = {
+        "p": {"$arrayElemAt": [{"$ifNull": ["$prediction_cf", []]}, 0]},
+        "a": {"$arrayElemAt": [{"$ifNull": ["$actual_cf", []]}, 0]},
+    }
+    for doc in collection.aggregate(
+        [
+            match,
+            {
+                "$group": {
+                    "_id": {**_day_id(hourly=hourly), **first_class},
+                    "rows": {"$sum": 1},
+                    "matches": {
+                        "$sum": {"$cond": [{"$eq": ["$is_match", True]}, 1, 0]}
+                    },
+                }
+            },
+        ]
+    ):
+        group_id = doc["_id"]
+        row_stats = daily_stats.rows.setdefault(_day_of(group_id), RowStats())
+        row_stats.rows += doc["rows"]
+        row_stats.matches += doc["matches"]
+        row_stats.cells[(group_id.get("p"), group_id.get("a"))] += doc["rows"]
+
+    if column_map is not None:
+        _column_map_stats(collection, match, daily_stats, hourly=hourly)
+    else:
+        _column_list_stats(collection, match, daily_stats, hourly=hourly)
+    return daily_stats
+
+
+class DailyRollups:
+    """
+    Reads the statistics of an event dataset from its daily rollups.
+
+    Whole days of a time range, starting from `rollup_from`, are read from the
+    rollups collection. The partial days at the edges of the time range, and the days
+    before `rollup_from`, are computed from the raw rows.
+
+    Attributes:
+    ------------------
+    collection:
+        rollups collection
+    rows_collection:
+        raw rows collection of the dataset
+    dataset_id:
+        dataset id
+    rollup_from:
+        first day from which the rollups of the dataset are complete
+    column_map:
+        data types of the row maps when the rows are stored in the COLUMN_MAP format
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        rows_collection: Collection,
+        dataset_id: UUID,
+        rollup_from: datetime,
+        column_map: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        self._collection = collection
+        self._rows_collection = rows_collection
+        self._dataset_id = dataset_id
+        self._rollup_from = rollup_from
+        self._column_map = column_map
+        self._daily_stats: Dict[Tuple[datetime, datetime], Optional[DailyStats]] = {}
+
+    def split(
+        self, time_range: TimeRange
+    ) -> Tuple[Optional[Tuple[datetime, datetime]], List[TimeRange]]:
+        """
+        Splits the time range in the whole days served by the rollups, as
+        (first day, end day exclusive), and the time ranges to read from raw rows
+        """
+        first_day = max(day_ceil(time_range.start_time), self._rollup_from)
+        # the end time is inclusive, a range ending at the last millisecond of a day
+        # covers the whole day
+        end_day = day_floor(time_range.end_time + ONE_MILLISECOND)
+        if first_day >= end_day:
+            return None, [time_range]
+
+        raw_ranges = []
+        if time_range.start_time < first_day:
+            raw_ranges.append(
+                TimeRange(
+                    start_time=time_range.start_time,
+                    end_time=first_day - ONE_MILLISECOND,
+                )
+            )
+        if end_day <= time_range.end_time:
+            raw_ranges.append(
+                TimeRange(start_time=end_day, end_time=time_range.end_time)
+            )
+        return (first_day, end_day), raw_ranges
+
+    def stored_stats(self, first_day: datetime, end_day: datetime) -> DailyStats:
+        """Statistics of the days [first_day, end_day) stored in the rollups"""
+        daily_stats = DailyStats(column_map=self._column_map)
+        for document in self._collection.find(
+            {
+                "dataset_id": str(self._dataset_id),
+                "day": {"$gte": first_day, "$lt": end_day},
+            }
+        ):
+            day = document["day"]
+            if document.get("column") is None:
+                daily_stats.rows.setdefault(day, RowStats()).merge(
+                    RowStats.from_document(document)
+                )
+            else:
+                daily_stats.column(
+                    (day, document["mapping"], document["column"]),
+                    document["data_type"],
+                ).merge(ColumnStats.from_document(document))
+        return daily_stats
+
+    def daily_stats(self, time_range: Optional[TimeRange]) -> Optional[DailyStats]:
+        """
+        Statistics of the time range, None when the time range does not contain a
+        whole day served by the rollups
+        """
+        if time_range is None:
+            return None
+        cache_key = (time_range.start_time, time_range.end_time)
+        if cache_key in self._daily_stats:
+            return self._daily_stats[cache_key]
+
+        days, raw_ranges = self.split(time_range)
+        daily_stats = None
+        if days is not None:
+            daily_stats = self.stored_stats(*days)
+            for raw_range in raw_ranges:
+                daily_stats.merge(
+                    raw_daily_stats(
+                        self._rows_collection,
+                        self._dataset_id,
+                        time_filter={
+                            "created_at": {
+                                "$gte": raw_range.start_time,
+                                "$lte": raw_range.end_time,
+                            }
+                        },
+                        column_map=self._column_map,
+                    )
+                )
+        self._daily_stats[cache_key] = daily_stats
+        return daily_stats
@@ -0,0 +1,163 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# relative accuracy of the sketches, sketches can only be merged with the same value
+SKETCH_RELATIVE_ACCURACY = 0.01
+# values closer to zero are counted in the zero bucket
+SKETCH_MIN_INDEXABLE_VALUE = 1e-9
+
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_ZERO_KEY = "z"
+
+
+def bucket_key(sign: int, index: int) -> str:
+    """Key of a sketch bucket, "p<index>" for positive and "n<index>" for negative"""
+    if sign == 0:
+        return _ZERO_KEY
+    return f"{'p' if sign > 0 else 'n'}{index}"
+
+
+def bucket_value(key: str) -> float:
+    """Value representing the bucket, within the relative accuracy of its values"""
+    if key == _ZERO_KEY:
+        return 0.0
+    magnitude = 2 * _GAMMA ** int(key[1:]) / (_GAMMA + 1)
+    return magnitude if key[0] == "p" else -magnitude
+
+
+def value_bucket_key(value: float) -> str:
+    if abs(value) < SKETCH_MIN_INDEXABLE_VALUE:
+        return _ZERO_KEY
+    return bucket_key(
+        1 if value > 0 else -1, math.ceil(math.log(abs(value)) / _LOG_GAMMA)
+    )
+
+
+def bucket_id(value: str) -> Dict:
+    """
+    Group id expression computing the (sign, index) of the sketch bucket of a value
+    in a mongodb aggregation, see `bucket_key`
+    """
+    is_zero = {"$lt": [{"$abs": value}, SKETCH_MIN_INDEXABLE_VALUE]}
+    return {
+        "s": {"$cond": [is_zero, 0, {"$cond": [{"$gt": [value, 0]}, 1, -1]}]},
+        "i": {
+            "$cond": [
+                is_zero,
+                0,
+                {"$ceil": {"$divide": [{"$ln": {"$abs": value}}, _LOG_GAMMA]}},
+            ]
+        },
+    }
+
+
+class LogBucketSketch:
+    """
+    Mergeable quantile sketch of numeric values.
+
+    Values are counted in logarithmically sized buckets, in the manner of DDSketch,
+    so any quantile is estimated within the relative accuracy. Two sketches are
+    merged by adding their bucket counts, which also allows a stored sketch to be
+    updated with $inc.
+
+    Attributes:
+    ------------------
+    buckets:
+        number of values per bucket key
+    """
+
+    def __init__(self, buckets: Optional[Dict[str, int]] = None):
+        self.buckets: Counter = Counter(buckets or {})
+
+    @property
+    def count(self) -> int:
+        return sum(self.buckets.values())
+
+    def add(self, value: float, n: int = 1) -> None:
+        self.buckets[value_bucket_key(value)] += n
+
+    def merge(self, other: "LogBucketSketch") -> "LogBucketSketch":
+        self.buckets.update(other.buckets)
+        return self
+
+    def sorted_buckets(self) -> List[Tuple[float, int]]:
+        """(bucket value, count) of the non empty buckets in ascending order"""
+        return sorted(
+            (bucket_value(key), n) for key, n in self.buckets.items() if n > 0
+        )
+
+    def quantile(self, q: float) -> Optional[float]:
+        count = self.count
+        if not count:
+            return None
+        rank = q * (count - 1)
+        seen = 0
+        for value, n in self.sorted_buckets():
+            seen += n
+            if seen > rank:
+                return value
+        return self.sorted_buckets()[-1][0]
+
+    def histogram(
+        self,
+        buckets: int,
+        min_value: Optional[float] = None,
+        max_value: Optional[float] = None,
+    ) -> Tuple[List[float], List[int]]:
+        """
+        Equal frequency histogram in the shape of $bucketAuto: the lower bound of
+        every bin, the last one being the maximum value, and the count of every bin.
+        Values of a sketch bucket are never split between two bins.
+
+        Parameters
+        ----------
+        buckets:
+            maximum number of bins
+        min_value, max_value:
+            exact minimum and maximum values, used as the outer bounds of the bins
+        """
+        count = self.count
+        bins: List[float] = []
+        counts: List[int] = []
+        seen = 0
+        for value, n in self.sorted_buckets():
+            if min_value is not None:
+                value = max(value, min_value)
+            if max_value is not None:
+                value = min(value, max_value)
+            if not bins or (
+                len(bins) < buckets and seen >= len(bins) * count / buckets
+            ):
+                bins.append(value)
+                counts.append(0)
+            counts[-1] += n
+            seen += n
+        if bins:
+            if min_value is not None:
+                bins[0] = min_value
+            last = self.sorted_buckets()[-1][0]
+            bins[-1] = max_value if max_value is not None else last
+        return bins, counts
+
+    def to_document(self) -> Dict[str, int]:
+        return {key: n for key, n in self.buckets.items() if n}
+
+    @classmethod
+    def from_document(cls, document: Optional[Dict[str, int]]) -> "LogBucketSketch":
+        return cls(document)
@@ -0,0 +1,271 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from pymongo.collection import Collection
+
+from waterdip.core.commons.models import ColumnDataType, TimeRange
+from waterdip.core.metrics.data_metrics import (
+    CardinalityCategorical,
+    CategoricalCountHistogram,
+    CountEmptyHistogram,
+    DatasetProfileMetric,
+    NumericBasicMetrics,
+    NumericCountHistogram,
+)
+from waterdip.core.metrics.rollups import DailyRollups
+
+
+def bucket_auto(values: List[Optional[float]], buckets: int) -> List[Dict[str, Any]]:
+    """
+    Buckets the values like the $bucketAuto stage of mongodb: every bucket gets about
+    the same number of values, equal values always share a bucket and the last
+    bucket takes the remaining values. Null values sort first.
+
+    Returns
+    -------
+    buckets in the shape of the $bucketAuto output, {"_id": {"min", "max"}, "count"}
+    """
+    ordered = sorted(values, key=lambda v: (v is not None, v if v is not None else 0))
+    approx_bucket_size = max(int(math.floor(len(ordered) / buckets + 0.5)), 1)
+
+    result: List[Dict[str, Any]] = []
+    position = 0
+    for bucket in range(buckets):
+        if position >= len(ordered):
+            break
+        start = position
+        if bucket == buckets - 1:
+            position = len(ordered)
+        else:
+            position = min(start + approx_bucket_size, len(ordered))
+            while (
+                position < len(ordered) and ordered[position] == ordered[position - 1]
+            ):
+                position += 1
+        result.append(
+            {
+                "_id": {
+                    "min": ordered[start],
+                    "max": ordered[position]
+                    if position < len(ordered)
+                    else ordered[position - 1],
+                },
+                "count": position - start,
+            }
+        )
+    return result
+
+
+class ColumnAccumulator:
+    """
+    Accumulates the values of one column of the streamed rows
+
+    Attributes:
+    ------------------
+    total:
+        number of rows of the column
+    empty:
+        number of rows where the column is empty
+    numeric:
+        non null numeric values
+    categorical:
+        count of every non null categorical value
+    histogram_values:
+        values bucketed by the numeric histogram, including the nulls of COLUMN_LIST
+        rows as $bucketAuto does
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.empty = 0
+        self.numeric: List[float] = []
+        self.categorical: Counter = Counter()
+        self.histogram_values: List[Optional[float]] = []
+
+    def basic_metrics(self, std_dev_enabled: bool) -> Optional[Dict[str, Any]]:
+        """Numeric basic metrics in the shape of NumericBasicMetrics"""
+        count = len(self.numeric)
+        if not count:
+            return None
+        mean = math.fsum(self.numeric) / count
+        metrics = {
+            "total": count,
+            "avg": mean,
+            "min": min(self.numeric),
+            "max": max(self.numeric),
+            "zeros": sum(1 for value in self.numeric if value == 0),
+        }
+        if std_dev_enabled:
+            metrics["std_dev"] = math.sqrt(
+                math.fsum((value - mean) ** 2 for value in self.numeric) / count
+            )
+        return NumericBasicMetrics._basic_metrics(metrics, "", std_dev_enabled)
+
+
+class StreamingDatasetProfile(DatasetProfileMetric):
+    """
+    Computes the same results as DatasetProfileMetric in the process instead of in
+    mongodb. The rows of the time range are streamed with a projected, batched cursor
+    and accumulated per column, so the database only serves a plain scan.
+
+    Attributes:
+    ------------------
+    batch_size:
+        number of rows fetched per cursor batch
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        dataset_id: UUID,
+        column_map: Optional[Dict[str, Dict[str, ColumnDataType]]] = None,
+        rollups: Optional[DailyRollups] = None,
+        batch_size: int = 5000,
+    ):
+        super().__init__(collection, dataset_id, column_map, rollups)
+        self.batch_size = batch_size
+
+    def aggregation_result(
+        self, numeric_columns: List, time_range: TimeRange = None, **kwargs
+    ) -> Dict[str, Dict]:
+        numeric_columns = list(numeric_columns)
+        if self._rollup_column_stats(time_range) is not None:
+            # the rollups are already aggregated, only the edge days read rows
+            return super().aggregation_result(
+                numeric_columns=numeric_columns, time_range=time_range, **kwargs
+            )
+
+        rows = self._collection.aggregate(
+            self._aggregation_query(
+                time_filter=self._time_filter_builder(time_range=time_range)
+            ),
+            batchSize=self.batch_size,
+        )
+        if self._column_map is not None:
+            columns = self._accumulate_column_map(rows)
+        else:
+            columns = self._accumulate_column_list(rows)
+        return self._accumulated_results(
+            columns,
+            numeric_columns,
+            std_dev_enabled=kwargs.get("std_dev_disable", "false") == "false",
+        )
+
+    def _aggregation_query(
+        self,
+        numeric_columns: List = None,
+        time_filter: Dict = None,
+        std_dev_enabled: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Projection of the streamed rows, the rows are not aggregated"""
+        if self._column_map is not None:
+            projection = {field: 1 for field in self._column_map}
+        else:
+            projection = {"columns": 1}
+        return [
+            self._dataset_match(time_filter),
+            {"$project": {"_id": 0, **projection}},
+        ]
+
+    @staticmethod
+    def _accumulate_column_list(rows: Iterable[Dict]) -> Dict[str, ColumnAccumulator]:
+        columns: Dict[str, ColumnAccumulator] = {}
+        for row in rows:
+            for column in row.get("columns") or []:
+                accumulator = columns.get(column["name"])
+                if accumulator is None:
+                    accumulator = columns[column["name"]] = ColumnAccumulator()
+                data_type = column.get("data_type")
+                numeric = column.get("value_numeric")
+                categorical = column.get("value_categorical")
+                accumulator.total += 1
+                if data_type == ColumnDataType.NUMERIC:
+                    accumulator.histogram_values.append(numeric)
+                    if numeric is None:
+                        accumulator.empty += 1
+                    else:
+                        accumulator.numeric.append(numeric)
+                elif data_type == ColumnDataType.CATEGORICAL:
+                    if categorical is None:
+                        accumulator.empty += 1
+                    else:
+                        accumulator.categorical[categorical] += 1
+        return columns
+
+    def _accumulate_column_map(
+        self, rows: Iterable[Dict]
+    ) -> Dict[str, ColumnAccumulator]:
+        """Every COLUMN_MAP column counts every row, a missing column is empty"""
+        map_columns = [
+            (field, name, data_type)
+            for field, field_columns in self._column_map.items()
+            for name, data_type in field_columns.items()
+        ]
+        columns = {name: ColumnAccumulator() for _, name, _ in map_columns}
+        for row in rows:
+            for field, name, data_type in map_columns:
+                value = (row.get(field) or {}).get(name)
+                accumulator = columns[name]
+                accumulator.total += 1
+                if value is None:
+                    accumulator.empty += 1
+                elif data_type == ColumnDataType.NUMERIC:
+                    accumulator.numeric.append(value)
+                    accumulator.histogram_values.append(value)
+                elif data_type == ColumnDataType.CATEGORICAL:
+                    accumulator.categorical[value] += 1
+        return columns
+
+    def _accumulated_results(
+        self,
+        columns: Dict[str, ColumnAccumulator],
+        numeric_columns: List,
+        std_dev_enabled: bool,
+    ) -> Dict[str, Dict]:
+        value_counts = {
+            name: list(accumulator.categorical.items())
+            for name, accumulator in columns.items()
+            if accumulator.categorical
+        }
+        numeric_basic = {}
+        for name, accumulator in columns.items():
+            metrics = accumulator.basic_metrics(std_dev_enabled)
+            if metrics is not None:
+                numeric_basic[name] = metrics
+        return self._results(
+            categorical_hist=CategoricalCountHistogram._histogram(value_counts),
+            numeric_hist={
+                column: NumericCountHistogram._histogram(
+                    bucket_auto(
+                        columns[column].histogram_values if column in columns else [],
+                        NumericCountHistogram.BUCKETS,
+                    )
+                )
+                for column in numeric_columns
+            },
+            empty_hist={
+                name: CountEmptyHistogram._empty_counts(
+                    accumulator.empty, accumulator.total
+                )
+                for name, accumulator in columns.items()
+                if accumulator.total
+            },
+            cardinality=CardinalityCategorical._value_counts_cardinality(value_counts),
+            numeric_basic=numeric_basic,
+        )
@@ -0,0 +1,255 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from pymongo import ReplaceOne
+from pymongo.collection import Collection
+
+from waterdip.core.commons.models import TimeRange
+from waterdip.core.metrics.rollups import (
+    ColumnStats,
+    DailyStats,
+    RowStats,
+    raw_daily_stats,
+)
+
+ONE_HOUR = timedelta(hours=1)
+
+
+def hour_floor(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_ceil(moment: datetime) -> datetime:
+    floor = hour_floor(moment)
+    return floor if floor == moment else floor + ONE_HOUR
+
+
+def late_hours(documents: List[Dict], now: datetime) -> Dict[str, Set[datetime]]:
+    """
+    Complete hours of the persisted row documents by dataset id. The window buckets
+    of these hours were possibly stored without the rows
+    """
+    current_hour = hour_floor(now)
+    hours: Dict[str, Set[datetime]] = {}
+    for document in documents:
+        created_at = document.get("created_at")
+        if created_at is None:
+            continue
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        hour = hour_floor(created_at)
+        if hour < current_hour:
+            hours.setdefault(str(document["dataset_id"]), set()).add(hour)
+    return hours
+
+
+class SlidingWindowStats:
+    """
+    Statistics of the evaluation window of monitors, kept between the monitor runs
+    as a ring of hourly partial aggregates of an event dataset. A run computes from
+    the raw rows only the hours which are not stored yet, expires the hours older
+    than the window and merges the stored hours. The partial hours at the edges of
+    the window are read from the raw rows on every run, so the statistics cover the
+    exact time range. It is served to the data metrics in place of the daily
+    rollups.
+
+    The stored hours of rows logged late are deleted when the rows are ingested, see
+    `late_hours`, and computed again by the next run. A run which reads an hour
+    before a late row is inserted and stores it after the hour was deleted misses
+    the row, so the latest complete hours are also computed again by every run.
+    Hours older than WD_MONITOR_WINDOW_TTL are expired by mongodb, which removes the
+    buckets of deleted monitors and datasets, and only costs a recompute to windows
+    which are longer.
+
+    Attributes:
+    ------------------
+    collection:
+        window buckets collection
+    rows_collection:
+        raw rows collection of the dataset
+    window_id:
+        id of the window, the monitors sharing a window id share its buckets
+    dataset_id:
+        dataset id
+    model_id:
+        model id of the dataset, stored with the buckets
+    column_map:
+        data types of the row maps when the rows are stored in the COLUMN_MAP format
+    recompute_buckets:
+        number of the latest complete hours computed again by every run
+    computed_buckets:
+        number of hours computed from the raw rows by the last run
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        rows_collection: Collection,
+        window_id: str,
+        dataset_id: UUID,
+        model_id: UUID,
+        column_map: Optional[Dict[str, Dict[str, str]]] = None,
+        recompute_buckets: int = 1,
+    ):
+        self._collection = collection
+        self._rows_collection = rows_collection
+        self.window_id = window_id
+        self._dataset_id = dataset_id
+        self._model_id = model_id
+        self._column_map = column_map
+        self.recompute_buckets = recompute_buckets
+        self.computed_buckets = 0
+        self._daily_stats: Dict[Tuple[datetime, datetime], Optional[DailyStats]] = {}
+
+    def _raw_stats(self, time_filter: Dict, hourly: bool = False) -> DailyStats:
+        return raw_daily_stats(
+            self._rows_collection,
+            self._dataset_id,
+            time_filter={"created_at": time_filter},
+            column_map=self._column_map,
+            hourly=hourly,
+        )
+
+    def stored_stats(self, first_bucket: datetime, end_bucket: datetime) -> DailyStats:
+        """Statistics of the stored hours [first_bucket, end_bucket), by hour"""
+        daily_stats = DailyStats(column_map=self._column_map)
+        for document in self._collection.find(
+            {
+                "window_id": self.window_id,
+                "bucket": {"$gte": first_bucket, "$lt": end_bucket},
+            }
+        ):
+            bucket = document["bucket"]
+            if document.get("column") is None:
+                daily_stats.rows.setdefault(bucket, RowStats()).merge(
+                    RowStats.from_document(document)
+                )
+            else:
+                daily_stats.column(
+                    (bucket, document["mapping"], document["column"]),
+                    document["data_type"],
+                ).merge(ColumnStats.from_document(document))
+        return daily_stats
+
+    def _store(self, daily_stats: DailyStats, buckets: List[datetime]) -> None:
+        """Replaces the stored hours with their statistics, by hour"""
+        owner = {
+            "window_id": self.window_id,
+            "dataset_id": str(self._dataset_id),
+            "model_id": str(self._model_id),
+        }
+        documents: List[Tuple[Dict, Dict]] = [
+            (
+                {"bucket": bucket, "mapping": None, "column": None},
+                daily_stats.rows.get(bucket, RowStats()).to_document(),
+            )
+            for bucket in buckets
+        ]
+        documents.extend(
+            (
+                {"bucket": bucket, "mapping": mapping, "column": column},
+                stats.to_document(),
+            )
+            for (bucket, mapping, column), stats in daily_stats.columns.items()
+        )
+        self._collection.delete_many(
+            {"window_id": self.window_id, "bucket": {"$in": buckets}}
+        )
+        # concurrent runs of the window store the same hours, replacing by key keeps
+        # one document per hour and column
+        self._collection.bulk_write(
+            [
+                ReplaceOne(
+                    {"window_id": self.window_id, **key},
+                    {**owner, **key, **stats},
+                    upsert=True,
+                )
+                for key, stats in documents
+            ],
+            ordered=False,
+        )
+
+    @staticmethod
+    def _spans(buckets: List[datetime]) -> List[List[datetime]]:
+        """Consecutive hours of the sorted buckets"""
+        spans: List[List[datetime]] = []
+        for bucket in buckets:
+            if spans and spans[-1][-1] + ONE_HOUR == bucket:
+                spans[-1].append(bucket)
+            else:
+                spans.append([bucket])
+        return spans
+
+    def daily_stats(self, time_range: Optional[TimeRange]) -> Optional[DailyStats]:
+        """
+        Statistics of the time range, by hour. None when the time range does not
+        contain a whole hour
+        """
+        if time_range is None:
+            return None
+        cache_key = (time_range.start_time, time_range.end_time)
+        if cache_key in self._daily_stats:
+            return self._daily_stats[cache_key]
+
+        first_bucket = hour_ceil(time_range.start_time)
+        end_bucket = hour_floor(time_range.end_time)
+        if first_bucket >= end_bucket:
+            self._daily_stats[cache_key] = None
+            return None
+
+        self._collection.delete_many(
+            {"window_id": self.window_id, "bucket": {"$lt": first_bucket}}
+        )
+        daily_stats = self.stored_stats(first_bucket, end_bucket)
+        recompute_from = max(
+            first_bucket, end_bucket - self.recompute_buckets * ONE_HOUR
+        )
+        stale = set(bucket for bucket in daily_stats.rows if bucket >= recompute_from)
+        if stale:
+            fresh = DailyStats(column_map=self._column_map)
+            for key, stats in daily_stats.columns.items():
+                if key[0] not in stale:
+                    fresh.columns[key] = stats
+            for bucket, stats in daily_stats.rows.items():
+                if bucket not in stale:
+                    fresh.rows[bucket] = stats
+            daily_stats = fresh
+
+        missing, bucket = [], first_bucket
+        while bucket < end_bucket:
+            if bucket not in daily_stats.rows:
+                missing.append(bucket)
+            bucket += ONE_HOUR
+        for span in self._spans(missing):
+            computed = self._raw_stats(
+                {"$gte": span[0], "$lt": span[-1] + ONE_HOUR}, hourly=True
+            )
+            self._store(computed, span)
+            daily_stats.merge(computed)
+        self.computed_buckets = len(missing)
+
+        if time_range.start_time < first_bucket:
+            daily_stats.merge(
+                self._raw_stats({"$gte": time_range.start_time, "$lt": first_bucket})
+            )
+        daily_stats.merge(
+            self._raw_stats({"$gte": end_bucket, "$lte": time_range.end_time})
+        )
+        self._daily_stats[cache_key] = daily_stats
+        return daily_stats
@@ -13,7 +13,10 @@
 #  limitations under the License.
 
 from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import List
 
+from waterdip.core.commons.models import TimeRange
 from waterdip.core.metrics.base import MongoMetric
 from waterdip.core.monitors.models import MonitorCondition
 
@@ -25,6 +28,34 @@ class MonitorEvaluator(ABC):
         self.monitor_condition = monitor_condition
         self.metric = metric
 
+    def _get_columns(self) -> List[str]:
+        columns = []
+        if self.monitor_condition.dimensions.features:
+            columns.extend(self.monitor_condition.dimensions.features)
+        if self.monitor_condition.dimensions.predictions:
+            columns.extend(self.monitor_condition.dimensions.predictions)
+        return columns
+
+    def _does_violate_threshold(self, value) -> bool:
+        threshold = self.monitor_condition.threshold
+        threshold_type, threshold_value = threshold.threshold, threshold.value
+        if threshold_type == "gt":
+            if value > threshold_value:
+                return True
+        elif threshold_type == "lt":
+            if value < threshold_value:
+                return True
+        return False
+
+    def _get_evaluation_window_timerange(self) -> TimeRange:
+        evaluation_window = self.monitor_condition.evaluation_window
+        no_of_days, day_unit = evaluation_window[:-1], evaluation_window[-1]
+
+        return TimeRange(
+            start_time=datetime.utcnow() - timedelta(days=int(no_of_days)),
+            end_time=datetime.utcnow(),
+        )
+
     @abstractmethod
     def evaluate(self, **kwargs) -> bool:
         pass
@@ -13,11 +13,13 @@
 #  limitations under the License.
 
 from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Set
 
-from waterdip.core.commons.models import TimeRange
-from waterdip.core.metrics.data_metrics import CountEmptyHistogram, DataMetrics
+from waterdip.core.metrics.data_metrics import (
+    CategoricalVocabularyDiff,
+    CountEmptyHistogram,
+    DataMetrics,
+)
 from waterdip.core.monitors.evaluators.base import MonitorEvaluator
 from waterdip.core.monitors.models import DataQualityBaseMonitorCondition
 
@@ -30,34 +32,6 @@ class DataQualityMonitorEvaluator(MonitorEvaluator, ABC):
     ):
         super().__init__(monitor_condition, metrics)
 
-    def _get_columns(self):
-        columns = []
-        if self.monitor_condition.dimensions.features:
-            columns.extend(self.monitor_condition.dimensions.features)
-        if self.monitor_condition.dimensions.predictions:
-            columns.extend(self.monitor_condition.dimensions.predictions)
-        return columns
-
-    def _does_violate_threshold(self, value) -> bool:
-        threshold = self.monitor_condition.threshold
-        threshold_type, threshold_value = threshold.threshold, threshold.value
-        if threshold_type == "gt":
-            if value > threshold_value:
-                return True
-        elif threshold_type == "lt":
-            if value < threshold_value:
-                return True
-        return False
-
-    def _get_evaluation_window_timerange(self) -> TimeRange:
-        evaluation_window = self.monitor_condition.evaluation_window
-        no_of_days, day_unit = evaluation_window[:-1], evaluation_window[-1]
-
-        return TimeRange(
-            start_time=datetime.utcnow() - timedelta(days=int(no_of_days)),
-            end_time=datetime.utcnow(),
-        )
-
     @abstractmethod
     def _get_metrics(self, **kwargs) -> Dict[str, Any]:
         pass
@@ -94,3 +68,66 @@ class EmptyValueEvaluator(DataQualityMonitorEvaluator):
                         }
                     )
         return violations
+
+
+class VocabularyEvaluator(DataQualityMonitorEvaluator, ABC):
+    """
+    Compares the categorical values of the evaluation window with the baseline
+    vocabulary of every monitored column
+
+    Attributes:
+    ------------------
+    vocabulary:
+        baseline values of every categorical column, by column name. It may hold
+        more columns than the monitored ones when the metric is shared by a group of
+        monitors
+    """
+
+    # field of CategoricalVocabularyDiff compared with the threshold
+    count_field: str = ""
+    values_field: str = ""
+
+    def __init__(
+        self,
+        monitor_condition: DataQualityBaseMonitorCondition,
+        metric: CategoricalVocabularyDiff,
+        vocabulary: Dict[str, Set[str]],
+    ):
+        super().__init__(monitor_condition, metric)
+        self.vocabulary = vocabulary
+
+    def _get_metrics(self, **kwargs) -> Dict[str, Any]:
+        evaluation_window = self._get_evaluation_window_timerange()
+        return self.metric.aggregation_result(
+            vocabulary=self.vocabulary, time_range=evaluation_window
+        )
+
+    def evaluate(self, **kwargs) -> List[Dict]:
+        diffs = self._get_metrics()
+        violations: List[Dict] = []
+        for col in self._get_columns():
+            diff = diffs.get(col)
+            if diff and self._does_violate_threshold(diff[self.count_field]):
+                violations.append(
+                    {
+                        "metric_value": diff[self.count_field],
+                        "threshold": self.monitor_condition.threshold,
+                        "dimension": col,
+                        "values": diff[self.values_field],
+                    }
+                )
+        return violations
+
+
+class NewValueEvaluator(VocabularyEvaluator):
+    """Number of distinct values of a column which are not in the baseline"""
+
+    count_field = "new_count"
+    values_field = "new_values"
+
+
+class MissingValueEvaluator(VocabularyEvaluator):
+    """Number of baseline values of a column which do not occur anymore"""
+
+    count_field = "missing_count"
+    values_field = "missing_values"
@@ -0,0 +1,48 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Dict, List
+
+from waterdip.core.metrics.drift import PSIDriftMetric
+from waterdip.core.monitors.evaluators.base import MonitorEvaluator
+from waterdip.core.monitors.models import DriftBaseMonitorCondition
+
+
+class PSIDriftEvaluator(MonitorEvaluator):
+    """
+    Compares the PSI of every monitored column in the evaluation window against the
+    threshold. The PSI of all the columns is computed by one metric evaluation
+    """
+
+    def __init__(
+        self, monitor_condition: DriftBaseMonitorCondition, metric: PSIDriftMetric
+    ):
+        super().__init__(monitor_condition, metric)
+
+    def evaluate(self, **kwargs) -> List[Dict]:
+        drift = self.metric.aggregation_result(
+            time_range=self._get_evaluation_window_timerange()
+        )
+        violations: List[Dict] = []
+        for col in self._get_columns():
+            column_drift = drift.get(col)
+            if column_drift and self._does_violate_threshold(column_drift["psi"]):
+                violations.append(
+                    {
+                        "metric_value": column_drift["psi"],
+                        "threshold": self.monitor_condition.threshold,
+                        "dimension": col,
+                    }
+                )
+        return violations
@@ -16,7 +16,14 @@ from celery import Celery
 
 from waterdip.server.commons.config import settings
 
-celery_app = Celery(__name__, include=["waterdip.processor.tasks.monitors"])
+celery_app = Celery(
+    __name__,
+    include=[
+        "waterdip.processor.tasks.monitors",
+        "waterdip.processor.tasks.rollups",
+        "waterdip.processor.tasks.actuals",
+    ],
+)
 
 celery_app.conf.broker_url = settings.redis_url
 celery_app.conf.result_backend = settings.mongo_url
@@ -26,8 +33,16 @@ celery_app.conf.result_extended = True
 celery_app.autodiscover_tasks()
 
 celery_app.conf.beat_schedule = {
-    "generate_monitor_jobs_every_hour": {
-        "task": "generate_monitor_jobs",
+    "generate_monitor_jobs": {
+        "task": "create_process_monitor_jobs",
+        "schedule": settings.monitor_scheduler_interval,
+    },
+    "create_event_rollup_jobs_every_hour": {
+        "task": "create_event_rollup_jobs",
         "schedule": 3600,
-    }
+    },
+    "apply_pending_actuals_every_five_minutes": {
+        "task": "apply_pending_actuals",
+        "schedule": 300,
+    },
 }
@@ -0,0 +1,124 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from waterdip.server.db.repositories.monitor_repository import MonitorRepository
+
+
+def monitor_ref(monitor: Dict) -> Dict[str, str]:
+    """
+    Reference of a monitor in json dictionary format sent to the workers, the
+    monitor id and the version stamp of its definition
+    """
+    return {"monitor_id": str(monitor["monitor_id"]), "version": monitor["version"]}
+
+
+class MonitorCache:
+    """
+    Worker local LRU cache of monitor definitions keyed by monitor ID. Monitor jobs
+    only carry monitor references, a cached definition is used when its version
+    matches the version of the reference, otherwise the definition is loaded from
+    the datastore.
+
+    Attributes:
+    ------------------
+    max_size:
+        maximum number of monitors kept, the least recently used monitor gets
+        evicted first
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._monitors: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._monitors)
+
+    def get(self, monitor_id: str, version: str) -> Optional[Dict]:
+        with self._lock:
+            cached = self._monitors.get(monitor_id)
+            if cached is None or cached[0] != version:
+                return None
+            self._monitors.move_to_end(monitor_id)
+            return cached[1]
+
+    def put(self, monitor: Dict) -> None:
+        if self.max_size <= 0:
+            return
+        monitor_id = str(monitor["monitor_id"])
+        with self._lock:
+            self._monitors[monitor_id] = (monitor["version"], monitor)
+            self._monitors.move_to_end(monitor_id)
+            while len(self._monitors) > self.max_size:
+                self._monitors.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._monitors.clear()
+
+    def resolve(
+        self, refs: List[Dict[str, str]], repository: MonitorRepository
+    ) -> List[Dict]:
+        """
+        Monitor definitions of the references in json dictionary format. The
+        definitions missing from the cache are loaded by one query, a monitor
+        changed since it was scheduled is processed with its latest definition and
+        a deleted monitor which is not cached anymore is skipped
+
+        Parameters
+        ----------
+        refs:
+            monitor references with monitor_id and version
+        repository:
+            monitor repository
+        Returns
+        -------
+        monitor definitions, with their version stamp under "version"
+        """
+        monitors: Dict[str, Dict] = {}
+        missing: List[str] = []
+        for ref in refs:
+            monitor = self.get(ref["monitor_id"], ref["version"])
+            if monitor is None:
+                missing.append(ref["monitor_id"])
+            else:
+                monitors[ref["monitor_id"]] = monitor
+        if missing:
+            for monitor_db in repository.find_monitors(
+                filters={"monitor_id": {"$in": missing}}, limit=0
+            ):
+                monitor = {**monitor_db.dict(), "version": monitor_db.version()}
+                self.put(monitor)
+                monitors[monitor["monitor_id"]] = monitor
+
+        resolved = []
+        for ref in refs:
+            monitor = monitors.get(ref["monitor_id"])
+            if monitor is None:
+                logger.warning(f"Monitor ID [{ref['monitor_id']}] no longer exists")
+                continue
+            if monitor["version"] != ref["version"]:
+                logger.info(
+                    f"Monitor ID [{ref['monitor_id']}] changed since it was "
+                    f"scheduled, processing its latest definition"
+                )
+            resolved.append(monitor)
+        return resolved
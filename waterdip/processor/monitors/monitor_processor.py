@@ -14,19 +14,56 @@
 
 import datetime
 import uuid
-from typing import Dict, List, Union
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, Union
 from uuid import UUID
 
 from loguru import logger
 
-from waterdip.core.commons.models import DataQualityMetric, DatasetType, MonitorType
-from waterdip.core.metrics.data_metrics import CountEmptyHistogram
-from waterdip.core.monitors.evaluators.data_quality import EmptyValueEvaluator
-from waterdip.core.monitors.models import DataQualityBaseMonitorCondition
+from waterdip.core.commons.models import (
+    ColumnDataType,
+    DataQualityMetric,
+    DatasetType,
+    DriftMetric,
+    ModelBaseline,
+    ModelBaselineTimeWindowType,
+    MonitorType,
+    TimeRange,
+)
+from waterdip.core.metrics.base import MongoMetric, SharedMetrics
+from waterdip.core.metrics.data_metrics import (
+    CategoricalVocabularyDiff,
+    CountEmptyHistogram,
+)
+from waterdip.core.metrics.drift import (
+    BaselineCache,
+    BaselineDistribution,
+    ColumnDistributionMetric,
+    PSIDriftMetric,
+)
+from waterdip.core.metrics.profiles import DatasetProfile
+from waterdip.core.metrics.rollups import ONE_MILLISECOND, DailyRollups, day_floor
+from waterdip.core.metrics.windows import SlidingWindowStats
+from waterdip.core.monitors.evaluators.data_quality import (
+    EmptyValueEvaluator,
+    MissingValueEvaluator,
+    NewValueEvaluator,
+)
+from waterdip.core.monitors.evaluators.drift import PSIDriftEvaluator
+from waterdip.core.monitors.models import (
+    DataQualityBaseMonitorCondition,
+    DriftBaseMonitorCondition,
+)
+from waterdip.server.commons.config import settings
 from waterdip.server.db.models.alerts import AlertDB, AlertIdentification, BaseAlertDB
 from waterdip.server.db.models.datasets import BaseDatasetDB
+from waterdip.server.db.models.models import BaseModelVersionDB
 from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASET_PROFILES,
+    MONGO_COLLECTION_EVENT_ROLLUPS,
     MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+    MONGO_COLLECTION_MONITOR_WINDOWS,
     MONGO_COLLECTION_MONITORS,
     MongodbBackend,
 )
@@ -34,6 +71,9 @@ from waterdip.server.db.repositories.alert_repository import AlertRepository
 from waterdip.server.db.repositories.dataset_repository import DatasetRepository
 from waterdip.server.errors.base_errors import EntityNotFoundError
 
+# baseline distributions shared by the monitors processed by the worker
+BASELINE_CACHE = BaselineCache(max_size=settings.drift_baseline_cache_size)
+
 
 class MonitorProcessor:
     """
@@ -44,6 +84,12 @@ class MonitorProcessor:
     ----------
     monitor:
         Monitor data in json dictionary format
+    shared_metrics:
+        metrics shared with the other monitors of the group evaluated together,
+        the metrics of the monitor are computed by the monitor when not provided
+    group_columns:
+        columns monitored by the group, the metrics and baselines shared with the
+        group are computed for all of them
     """
 
     def __init__(
@@ -52,6 +98,8 @@ class MonitorProcessor:
         mongodb_backend: MongodbBackend,
         alert_repo: AlertRepository,
         dataset_repo: DatasetRepository,
+        shared_metrics: Optional[SharedMetrics] = None,
+        group_columns: Optional[List[str]] = None,
     ):
         self.monitor_type: MonitorType = MonitorType(monitor["monitor_type"])
         self._mongo_backend = mongodb_backend
@@ -59,12 +107,35 @@ class MonitorProcessor:
         self._alert_repo = alert_repo
         self._dataset_repo = dataset_repo
         self.monitor_id = monitor["monitor_id"]
-        self._model_version_id = monitor["monitor_identification"]["model_version_id"]
+        self._model_version_id = str(
+            monitor["monitor_identification"]["model_version_id"]
+        )
         self.model_id = monitor["monitor_identification"]["model_id"]
+        self._shared_metrics = shared_metrics
+        self._group_columns = group_columns
         if self.monitor_type == MonitorType.DATA_QUALITY:
             self.monitor_condition = DataQualityBaseMonitorCondition(
                 **monitor["monitor_condition"]
             )
+        elif self.monitor_type == MonitorType.DRIFT:
+            self.monitor_condition = DriftBaseMonitorCondition(
+                **monitor["monitor_condition"]
+            )
+
+    def _metric(self, key: Hashable, factory: Callable[[], MongoMetric]):
+        """
+        Metric of the monitor, shared with the group under the key when the monitor
+        is evaluated with a group
+        """
+        if self._shared_metrics is None:
+            return factory()
+        return self._shared_metrics.get(
+            (key, self.monitor_condition.evaluation_window), factory
+        )
+
+    def _baseline_key(self) -> str:
+        baseline = self.monitor_condition.baseline or ModelBaseline()
+        return baseline.json()
 
     def _data_quality_processor(self) -> List[Dict]:
         """
@@ -72,17 +143,255 @@ class MonitorProcessor:
         Selects the Evaluator type based on evaluation_metric type
         """
         if self.monitor_condition.evaluation_metric == DataQualityMetric.EMPTY_VALUE:
+            column_map = self._get_column_map()
+            event_dataset = self._get_event_dataset()
             evaluator = EmptyValueEvaluator(
                 monitor_condition=self.monitor_condition,
-                metric=CountEmptyHistogram(
-                    collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
-                    dataset_id=self._get_event_dataset().dataset_id,
+                metric=self._metric(
+                    ("empty", str(event_dataset.dataset_id)),
+                    lambda: CountEmptyHistogram(
+                        collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
+                        dataset_id=event_dataset.dataset_id,
+                        column_map=column_map,
+                        rollups=self._get_window_stats(event_dataset, column_map),
+                    ),
+                ),
+            )
+        elif self.monitor_condition.evaluation_metric in (
+            DataQualityMetric.NEW_VALUE,
+            DataQualityMetric.MISSING_VALUE,
+        ):
+            evaluator_class = (
+                NewValueEvaluator
+                if self.monitor_condition.evaluation_metric
+                == DataQualityMetric.NEW_VALUE
+                else MissingValueEvaluator
+            )
+            column_map = self._get_column_map()
+            event_dataset = self._get_event_dataset()
+            columns = {
+                name: data_type
+                for name, data_type in self._get_column_types().items()
+                if data_type == ColumnDataType.CATEGORICAL.value
+            }
+            evaluator = evaluator_class(
+                monitor_condition=self.monitor_condition,
+                metric=self._metric(
+                    (
+                        "vocabulary",
+                        str(event_dataset.dataset_id),
+                        self._baseline_key(),
+                    ),
+                    lambda: CategoricalVocabularyDiff(
+                        collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
+                        dataset_id=event_dataset.dataset_id,
+                        column_map=column_map,
+                        rollups=self._get_window_stats(event_dataset, column_map),
+                    ),
                 ),
+                vocabulary={
+                    name: distribution.vocabulary
+                    for name, distribution in self._get_baseline(
+                        columns, column_map
+                    ).items()
+                },
             )
         else:
             raise NotImplementedError()
         return evaluator.evaluate()
 
+    def _drift_processor(self) -> List[Dict]:
+        """
+        Processor for drift monitors. The event dataset is compared with the baseline
+        of the monitor, with the baseline bins of every monitored column
+        """
+        if self.monitor_condition.evaluation_metric != DriftMetric.PSI:
+            raise NotImplementedError()
+        column_map = self._get_column_map()
+        event_dataset = self._get_event_dataset()
+        evaluator = PSIDriftEvaluator(
+            monitor_condition=self.monitor_condition,
+            metric=self._metric(
+                ("psi", str(event_dataset.dataset_id), self._baseline_key()),
+                lambda: PSIDriftMetric(
+                    collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
+                    dataset_id=event_dataset.dataset_id,
+                    baseline=self._get_baseline(self._get_column_types(), column_map),
+                    column_map=column_map,
+                    rollups=self._get_window_stats(event_dataset, column_map),
+                ),
+            ),
+        )
+        return evaluator.evaluate()
+
+    def _get_model_version(self) -> Optional[BaseModelVersionDB]:
+        model_version = self._database[MONGO_COLLECTION_MODEL_VERSIONS].find_one(
+            {"model_version_id": self._model_version_id}
+        )
+        return BaseModelVersionDB(**model_version) if model_version else None
+
+    def _get_column_map(self) -> Optional[Dict]:
+        """
+        Get row column map of the model version, None for the COLUMN_LIST storage format
+        """
+        model_version = self._get_model_version()
+        if not model_version:
+            return None
+        return model_version.column_map()
+
+    def _get_column_types(self) -> Dict[str, str]:
+        """
+        Data type of every monitored column of the model version, the columns of
+        the group when the monitor is evaluated with a group
+        """
+        model_version = self._get_model_version()
+        if not model_version:
+            raise EntityNotFoundError(
+                type="model_version", name=str(self._model_version_id)
+            )
+        schema = model_version.version_schema
+        data_types = {
+            **{name: column.data_type for name, column in schema.features.items()},
+            **{name: column.data_type for name, column in schema.predictions.items()},
+        }
+        columns = self._group_columns
+        if columns is None:
+            dimensions = self.monitor_condition.dimensions
+            columns = (dimensions.features or []) + (dimensions.predictions or [])
+        return {
+            name: ColumnDataType(data_types[name]).value
+            for name in columns
+            if name in data_types
+        }
+
+    def _get_event_rollups(
+        self, dataset: BaseDatasetDB, column_map: Optional[Dict] = None
+    ) -> Optional[DailyRollups]:
+        if not settings.event_rollups_enabled or dataset.rollup_from is None:
+            return None
+        return DailyRollups(
+            collection=self._database[MONGO_COLLECTION_EVENT_ROLLUPS],
+            rows_collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
+            dataset_id=dataset.dataset_id,
+            rollup_from=dataset.rollup_from,
+            column_map=column_map,
+        )
+
+    def _get_window_stats(
+        self, dataset: BaseDatasetDB, column_map: Optional[Dict] = None
+    ) -> Optional[Union[SlidingWindowStats, DailyRollups]]:
+        """
+        Statistics of the evaluation window of the monitor, kept between the runs as
+        hourly partial aggregates shared by the monitors of the dataset with the same
+        evaluation window. The daily rollups of the event dataset when window states
+        are disabled
+        """
+        if not settings.monitor_window_state_enabled:
+            return self._get_event_rollups(dataset, column_map)
+        return SlidingWindowStats(
+            collection=self._database[MONGO_COLLECTION_MONITOR_WINDOWS],
+            rows_collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
+            window_id=f"{dataset.dataset_id}:{self.monitor_condition.evaluation_window}",
+            dataset_id=dataset.dataset_id,
+            model_id=dataset.model_id,
+            column_map=column_map,
+            recompute_buckets=settings.monitor_window_recompute_buckets,
+        )
+
+    @staticmethod
+    def _days(period: str) -> datetime.timedelta:
+        return datetime.timedelta(days=int(period[:-1]))
+
+    def _get_baseline_window(self, baseline: ModelBaseline) -> TimeRange:
+        """Time range of the time window baseline of the monitor, in whole days"""
+        time_window = baseline.time_window
+        if (
+            time_window.time_window_type
+            == ModelBaselineTimeWindowType.FIXED_TIME_WINDOW
+        ):
+            return TimeRange(
+                start_time=time_window.fixed_time_window.start_time,
+                end_time=time_window.fixed_time_window.end_time,
+            )
+        moving_window = time_window.moving_time_window
+        end_day = day_floor(datetime.datetime.utcnow()) - self._days(
+            moving_window.skip_period
+        )
+        return TimeRange(
+            start_time=end_day - self._days(moving_window.time_period),
+            end_time=end_day - ONE_MILLISECOND,
+        )
+
+    def _get_baseline(
+        self, columns: Dict[str, str], column_map: Optional[Dict] = None
+    ) -> Dict[str, BaselineDistribution]:
+        """
+        Baseline distribution of the columns, by column name. The baseline of the
+        monitor is either the batch dataset of an environment, read from its stored
+        profile when it has one, or a time window of the event dataset, the default
+        moving window when the monitor has no baseline. Baselines are cached by
+        their data: the dataset watermark or the time window
+        """
+        baseline = self.monitor_condition.baseline or ModelBaseline()
+        if baseline.dataset_env is not None:
+            datasets = self._dataset_repo.find_datasets(
+                filters={
+                    "model_version_id": self._model_version_id,
+                    "dataset_type": DatasetType.BATCH,
+                    "environment": baseline.dataset_env,
+                }
+            )
+            if not datasets:
+                raise EntityNotFoundError(
+                    type="baseline_dataset", name=str(baseline.dataset_env)
+                )
+            dataset, time_range = datasets[0], None
+            key = ("dataset", str(dataset.dataset_id), dataset.ingested_rows)
+            metric = ColumnDistributionMetric(
+                collection=self._database[MONGO_COLLECTION_BATCH_ROWS],
+                dataset_id=dataset.dataset_id,
+                column_map=column_map,
+                rollups=DatasetProfile(
+                    collection=self._database[MONGO_COLLECTION_DATASET_PROFILES],
+                    dataset_id=dataset.dataset_id,
+                    column_map=column_map,
+                )
+                if settings.dataset_profiles_enabled
+                else None,
+            )
+        else:
+            dataset, time_range = self._get_event_dataset(), self._get_baseline_window(
+                baseline
+            )
+            key = (
+                "window",
+                str(dataset.dataset_id),
+                time_range.start_time,
+                time_range.end_time,
+            )
+            metric = ColumnDistributionMetric(
+                collection=self._database[MONGO_COLLECTION_EVENT_ROWS],
+                dataset_id=dataset.dataset_id,
+                column_map=column_map,
+                rollups=self._get_event_rollups(dataset, column_map),
+            )
+
+        key += (settings.drift_psi_bins, tuple(sorted(columns.items())))
+        distributions = BASELINE_CACHE.get(key)
+        if distributions is None:
+            distributions = {}
+            column_stats = metric.aggregation_result(
+                columns=columns, time_range=time_range
+            )
+            for name, stats in column_stats.items():
+                distribution = BaselineDistribution.from_stats(
+                    stats, bins=settings.drift_psi_bins
+                )
+                if distribution is not None:
+                    distributions[name] = distribution
+            BASELINE_CACHE.put(key, distributions)
+        return distributions
+
     def _get_event_dataset(self) -> Union[BaseDatasetDB, None]:
         """
         Get event dataset for the model version id
@@ -121,6 +430,8 @@ class MonitorProcessor:
         """
         if self.monitor_type == MonitorType.DATA_QUALITY:
             violations = self._data_quality_processor()
+        elif self.monitor_type == MonitorType.DRIFT:
+            violations = self._drift_processor()
         else:
             raise NotImplementedError()
         logger.info(
@@ -134,3 +445,113 @@ class MonitorProcessor:
             {"$set": {"last_run": datetime.datetime.utcnow()}},
         )
         return violations
+
+
+# monitors of a metric family read the same metric of the event dataset
+METRIC_FAMILIES = {
+    DataQualityMetric.EMPTY_VALUE.value: "empty",
+    DataQualityMetric.NEW_VALUE.value: "vocabulary",
+    DataQualityMetric.MISSING_VALUE.value: "vocabulary",
+    DriftMetric.PSI.value: "psi",
+}
+
+
+def monitor_group_key(monitor: Dict) -> Tuple[str, str, str]:
+    """
+    Group of a monitor in json dictionary format: model version id, evaluation
+    window and metric family
+    """
+    condition = monitor["monitor_condition"]
+    metric = condition["evaluation_metric"]
+    metric = getattr(metric, "value", metric)
+    return (
+        str(monitor["monitor_identification"]["model_version_id"]),
+        condition.get("evaluation_window") or "1d",
+        METRIC_FAMILIES.get(metric, metric),
+    )
+
+
+def group_monitors(monitors: List[Dict]) -> List[List[Dict]]:
+    """Monitors in json dictionary format grouped by monitor_group_key"""
+    groups: Dict[Tuple[str, str, str], List[Dict]] = {}
+    for monitor in monitors:
+        groups.setdefault(monitor_group_key(monitor), []).append(monitor)
+    return list(groups.values())
+
+
+class MonitorGroupProcessor:
+    """
+    Processes the monitors of a group together. The monitors of a group share the
+    model version, the evaluation window and the metric family, the metric of the
+    family is computed once for all the columns of the group and every monitor
+    checks its threshold on the shared result. A monitor which fails to process
+    is logged and does not stop the other monitors of the group
+
+    Attributes
+    ----------
+    monitors:
+        monitors of the group in json dictionary format
+    """
+
+    def __init__(
+        self,
+        monitors: List[Dict],
+        mongodb_backend: MongodbBackend,
+        alert_repo: AlertRepository,
+        dataset_repo: DatasetRepository,
+    ):
+        self.monitors = monitors
+        self._mongo_backend = mongodb_backend
+        self._alert_repo = alert_repo
+        self._dataset_repo = dataset_repo
+
+    def _group_columns(self) -> List[str]:
+        columns: List[str] = []
+        for monitor in self.monitors:
+            dimensions = monitor["monitor_condition"].get("dimensions") or {}
+            for name in (dimensions.get("features") or []) + (
+                dimensions.get("predictions") or []
+            ):
+                if name not in columns:
+                    columns.append(name)
+        return columns
+
+    def process(self) -> Dict:
+        """
+        Process every monitor of the group
+
+        Returns
+        -------
+        violations by monitor id, ids of the failed monitors, number of metric
+        scans and number of scans saved by the group
+        """
+        shared_metrics, columns = SharedMetrics(), self._group_columns()
+        violations: Dict[str, List[Dict]] = {}
+        failed: List[str] = []
+        for monitor in self.monitors:
+            monitor_id = str(monitor["monitor_id"])
+            try:
+                violations[monitor_id] = MonitorProcessor(
+                    monitor=monitor,
+                    mongodb_backend=self._mongo_backend,
+                    alert_repo=self._alert_repo,
+                    dataset_repo=self._dataset_repo,
+                    shared_metrics=shared_metrics,
+                    group_columns=columns,
+                ).process()
+            except Exception:
+                logger.exception(f"failed to process Monitor ID [{monitor_id}]")
+                failed.append(monitor_id)
+        logger.info(
+            "processed {0} monitors of group {1} with {2} metric scans, {3} scans saved",
+            len(self.monitors),
+            monitor_group_key(self.monitors[0]) if self.monitors else None,
+            shared_metrics.scans,
+            shared_metrics.saved_scans,
+        )
+        return {
+            "violations": violations,
+            "failed": failed,
+            "scans": shared_metrics.scans,
+            "saved_scans": shared_metrics.saved_scans,
+        }
@@ -0,0 +1,64 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from loguru import logger
+
+from waterdip.processor.app import celery_app
+from waterdip.processor.tasks.rollups import _rollup_service
+from waterdip.server.commons.config import settings
+from waterdip.server.db.mongodb import MongodbBackend
+from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+from waterdip.server.db.repositories.dataset_row_repository import (
+    EventDatasetRowRepository,
+)
+from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+from waterdip.server.db.repositories.pending_actuals_repository import (
+    PendingActualsRepository,
+)
+from waterdip.server.services.dataset_service import DatasetService
+from waterdip.server.services.logging_service import ActualsLoggingService
+from waterdip.server.services.model_service import ModelVersionService
+from waterdip.server.services.row_service import EventDatasetRowService
+
+
+def _actuals_service() -> ActualsLoggingService:
+    mongo_backend = MongodbBackend.get_instance()
+    dataset_service = DatasetService(
+        repository=DatasetRepository.get_instance(mongodb=mongo_backend),
+        model_version_repository=ModelVersionRepository.get_instance(
+            mongodb=mongo_backend
+        ),
+    )
+    return ActualsLoggingService(
+        model_version_service=ModelVersionService(
+            repository=ModelVersionRepository.get_instance(mongodb=mongo_backend),
+            dataset_service=dataset_service,
+        ),
+        dataset_service=dataset_service,
+        row_service=EventDatasetRowService(
+            repository=EventDatasetRowRepository.get_instance(mongodb=mongo_backend)
+        ),
+        pending_repository=PendingActualsRepository.get_instance(mongodb=mongo_backend),
+        rollup_service=_rollup_service() if settings.event_rollups_enabled else None,
+    )
+
+
+@celery_app.task(name="apply_pending_actuals", bind=True, ignore_result=True)
+def apply_pending_actuals(self):
+    """
+    Joins the actuals which were logged before their predictions to the predictions
+    persisted since then
+    """
+    joined = _actuals_service().apply_pending()
+    logger.info(f"Joined pending actuals: [{joined}]")
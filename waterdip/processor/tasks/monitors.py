@@ -12,29 +12,53 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import List
+from datetime import datetime
+from typing import Dict, List
 
 from loguru import logger
 
+from waterdip.core.commons.models import MonitorType
 from waterdip.processor.app import celery_app
-from waterdip.processor.monitors.monitor_processor import MonitorProcessor
-from waterdip.server.db.models.monitors import MonitorDB
+from waterdip.processor.monitors.monitor_cache import MonitorCache, monitor_ref
+from waterdip.processor.monitors.monitor_processor import (
+    MonitorGroupProcessor,
+    MonitorProcessor,
+    group_monitors,
+)
+from waterdip.server.commons.config import settings
 from waterdip.server.db.mongodb import MongodbBackend
 from waterdip.server.db.repositories.alert_repository import AlertRepository
 from waterdip.server.db.repositories.dataset_repository import DatasetRepository
 from waterdip.server.db.repositories.monitor_repository import MonitorRepository
 
+# monitor definitions of the monitor jobs processed by the worker
+MONITOR_CACHE = MonitorCache(max_size=settings.monitor_cache_size)
 
-@celery_app.task(name="process_monitor", bind=True)
-def process_monitor(self, monitor):
+
+def monitor_queue(monitor: Dict) -> str:
+    """Queue of the jobs of a monitor, drift evaluation has a queue of its own"""
+    if MonitorType(monitor["monitor_type"]) == MonitorType.DRIFT:
+        return settings.monitor_drift_queue
+    return settings.monitor_queue
+
+
+@celery_app.task(name="process_monitor", bind=True, ignore_result=True)
+def process_monitor(self, monitor_id: str, version: str):
     """
-    Process a single incoming monitor data using MonitorProcessor
+    Process a single monitor using MonitorProcessor, the monitor definition is read
+    from the worker cache
     """
-    logger.info(f"Starting processing monitor job: [{monitor.monitor_name}]")
     mongo_backend = MongodbBackend.get_instance()
+    monitors = MONITOR_CACHE.resolve(
+        [{"monitor_id": monitor_id, "version": version}],
+        MonitorRepository.get_instance(mongodb=mongo_backend),
+    )
+    if not monitors:
+        return
+    logger.info(f"Starting processing monitor job: [{monitors[0]['monitor_name']}]")
 
     processor = MonitorProcessor(
-        monitor=monitor,
+        monitor=monitors[0],
         mongodb_backend=mongo_backend,
         alert_repo=AlertRepository.get_instance(mongodb=mongo_backend),
         dataset_repo=DatasetRepository.get_instance(mongodb=mongo_backend),
@@ -42,14 +66,74 @@ def process_monitor(self, monitor):
     processor.process()
 
 
-@celery_app.task(name="create_process_monitor_jobs", bind=True)
-def generate_monitor_jobs(self):
+@celery_app.task(name="process_monitor_group", bind=True, ignore_result=True)
+def process_monitor_group(self, monitors: List[Dict[str, str]]):
+    """
+    Process a group of monitors of one model version, evaluation window and metric
+    family using MonitorGroupProcessor, the metric is computed once for the group.
+    The monitors are references with monitor_id and version, the definitions are
+    read from the worker cache
+    """
+    mongo_backend = MongodbBackend.get_instance()
+    definitions = MONITOR_CACHE.resolve(
+        monitors, MonitorRepository.get_instance(mongodb=mongo_backend)
+    )
+    if not definitions:
+        return
+    logger.info(
+        f"Starting processing monitor group job: "
+        f"{[monitor['monitor_name'] for monitor in definitions]}"
+    )
+
+    processor = MonitorGroupProcessor(
+        monitors=definitions,
+        mongodb_backend=mongo_backend,
+        alert_repo=AlertRepository.get_instance(mongodb=mongo_backend),
+        dataset_repo=DatasetRepository.get_instance(mongodb=mongo_backend),
+    )
+    result = processor.process()
+    logger.info(
+        f"Processed monitor group job: {len(definitions)} monitors, "
+        f"{len(result['failed'])} failed, {result['saved_scans']} scans saved"
+    )
+
+
+@celery_app.task(name="create_process_monitor_jobs", ignore_result=True)
+def generate_monitor_jobs():
     """
-    Gets all the monitors from the datastore.
-    and sends all the monitors to queue to process. process_monitor will pick one monitor at a time to process
+    Claims the monitors which are due from the datastore, by batches, and sends
+    their references to queue to process. process_monitor will pick one monitor at
+    a time to process. With grouped evaluation, the monitors of a batch are sent by
+    group to process_monitor_group. Drift monitors go to the drift queue, the other
+    monitors to the monitor queue. The job counts are logged, the task result is
+    not stored as the task runs on every beat
     """
     monitor_repo = MonitorRepository.get_instance(mongodb=MongodbBackend.get_instance())
-    monitors: List[MonitorDB] = monitor_repo.find_monitors(filters={}, limit=0)
-    for monitor in monitors:
-        logger.info(f"Generating monitor job: [{monitor.monitor_name}]")
-        process_monitor.apply_async(kwargs={"monitor": monitor.dict()})
+    jobs, due_monitors = 0, 0
+    batches = monitor_repo.claim_due_monitors(
+        now=datetime.utcnow(), batch_size=settings.monitor_scheduler_batch_size
+    )
+    for monitors in batches:
+        due_monitors += len(monitors)
+        definitions = [
+            {**monitor.dict(), "version": monitor.version()} for monitor in monitors
+        ]
+        if settings.monitor_grouped_evaluation:
+            for group in group_monitors(definitions):
+                logger.info(
+                    f"Generating monitor group job: {[m['monitor_name'] for m in group]}"
+                )
+                process_monitor_group.apply_async(
+                    kwargs={"monitors": [monitor_ref(monitor) for monitor in group]},
+                    queue=monitor_queue(group[0]),
+                )
+                jobs += 1
+            continue
+        for monitor in definitions:
+            logger.info(f"Generating monitor job: [{monitor['monitor_name']}]")
+            process_monitor.apply_async(
+                kwargs=monitor_ref(monitor), queue=monitor_queue(monitor)
+            )
+            jobs += 1
+    logger.info(f"Generated {jobs} monitor jobs for {due_monitors} due monitors")
+    return {"jobs": jobs, "due_monitors": due_monitors}
@@ -0,0 +1,63 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from uuid import UUID
+
+from loguru import logger
+
+from waterdip.processor.app import celery_app
+from waterdip.server.commons.config import settings
+from waterdip.server.db.mongodb import MongodbBackend
+from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+from waterdip.server.db.repositories.dataset_row_repository import (
+    EventDatasetRowRepository,
+)
+from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+from waterdip.server.db.repositories.rollup_repository import EventRollupRepository
+from waterdip.server.services.rollup_service import EventRollupService
+
+
+def _rollup_service() -> EventRollupService:
+    mongo_backend = MongodbBackend.get_instance()
+    return EventRollupService(
+        repository=EventRollupRepository.get_instance(mongodb=mongo_backend),
+        dataset_repository=DatasetRepository.get_instance(mongodb=mongo_backend),
+        model_version_repository=ModelVersionRepository.get_instance(
+            mongodb=mongo_backend
+        ),
+        row_repository=EventDatasetRowRepository.get_instance(mongodb=mongo_backend),
+    )
+
+
+@celery_app.task(name="rebuild_event_rollups", bind=True, ignore_result=True)
+def rebuild_event_rollups(self, dataset_id):
+    """
+    Recomputes the daily rollups of an event dataset from its raw rows
+    """
+    logger.info(f"Rebuilding event rollups of dataset: [{dataset_id}]")
+    _rollup_service().rebuild(UUID(str(dataset_id)))
+
+
+@celery_app.task(name="create_event_rollup_jobs", bind=True, ignore_result=True)
+def create_event_rollup_jobs(self):
+    """
+    Sends the event datasets which rollups are not complete to the queue to rebuild
+    """
+    if not settings.event_rollups_enabled:
+        return
+    for dataset in _rollup_service().pending_datasets():
+        logger.info(f"Generating event rollup job: [{dataset.dataset_id}]")
+        rebuild_event_rollups.apply_async(
+            kwargs={"dataset_id": str(dataset.dataset_id)}
+        )
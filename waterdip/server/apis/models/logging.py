@@ -18,7 +18,11 @@ from uuid import UUID
 from pydantic import UUID4
 from pydantic.dataclasses import dataclass
 
-from waterdip.server.services.logging_service import ServiceLogEvent, ServiceLogRow
+from waterdip.server.services.logging_service import (
+    ServiceLogActual,
+    ServiceLogEvent,
+    ServiceLogRow,
+)
 
 
 class BatchDatasetLogRowReq(ServiceLogRow):
@@ -76,3 +80,28 @@ class EventLogRequest:
     model_version_id: UUID
     events: List[EventLogRowReq]
     timestamp: Optional[datetime] = None
+
+
+class ActualLogReq(ServiceLogActual):
+    """actuals of one prediction event in Actuals logging API request"""
+
+    pass
+
+
+@dataclass
+class ActualsLogRequest:
+    """
+    Request Body for delayed actuals upload API
+
+    Attributes:
+    ------------------
+    model_version_id:
+        unique id of the model version
+    actuals:
+        actuals with the event_id of the logged prediction event they belong to.
+        Actuals of events which are not logged yet are kept until the event is logged
+
+    """
+
+    model_version_id: UUID
+    actuals: List[ActualLogReq]
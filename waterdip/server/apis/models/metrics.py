@@ -74,6 +74,10 @@ class PerfomanceMetricResponse(BaseModel):
         specificity of the model
     f1:
         f1 of the model
+    macro_precision, macro_recall, macro_f1:
+        one-vs-rest precision, recall and f1 averaged over the classes
+    micro_precision, micro_recall, micro_f1:
+        precision, recall and f1 of the summed one-vs-rest counts of the classes
     """
 
     accuracy: Dict
@@ -86,3 +90,75 @@ class PerfomanceMetricResponse(BaseModel):
     sensitivity: Dict
     specificity: Dict
     f1: Dict
+    macro_precision: Optional[Dict]
+    macro_recall: Optional[Dict]
+    macro_f1: Optional[Dict]
+    micro_precision: Optional[Dict]
+    micro_recall: Optional[Dict]
+    micro_f1: Optional[Dict]
+
+
+class ClassMetrics(BaseModel):
+    """
+    One-vs-rest performance of a prediction class
+
+    Attributes:
+    ------------------
+    class_name:
+        prediction class
+    support:
+        number of rows labelled with the class
+    tp, fp, fn, tn:
+        one-vs-rest confusion counts of the class
+    precision, recall, f1:
+        one-vs-rest metrics of the class, null when undefined
+    """
+
+    class_name: str
+    support: int
+    tp: int
+    fp: int
+    fn: int
+    tn: int
+    precision: Optional[float]
+    recall: Optional[float]
+    f1: Optional[float]
+
+
+class PositionClassMetrics(BaseModel):
+    """
+    Per class performance of one prediction position
+
+    Attributes:
+    ------------------
+    position:
+        index of the prediction in prediction_cf
+    classes:
+        performance per class
+    macro_precision, macro_recall, macro_f1:
+        means over the classes
+    weighted_precision, weighted_recall, weighted_f1:
+        means over the classes weighted by their support
+    """
+
+    position: int
+    classes: List[ClassMetrics]
+    macro_precision: Optional[float]
+    macro_recall: Optional[float]
+    macro_f1: Optional[float]
+    weighted_precision: Optional[float]
+    weighted_recall: Optional[float]
+    weighted_f1: Optional[float]
+
+
+class ClassPerformanceResponse(BaseModel):
+    """
+    Per class performance API response
+
+    Attributes:
+    ------------------
+    positions:
+        performance of every prediction position
+    """
+
+    positions: List[PositionClassMetrics]
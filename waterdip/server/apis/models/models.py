@@ -15,7 +15,7 @@ from datetime import datetime
 from typing import Dict, List, Optional, Union
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, root_validator
 
 from waterdip.core.commons.models import (
     ColumnDataType,
@@ -23,6 +23,7 @@ from waterdip.core.commons.models import (
     ModelBaseline,
     MonitorType,
     PredictionTaskType,
+    RowStorageFormat,
     TimeRange,
 )
 from waterdip.server.apis.models.params import TimeRangeParam
@@ -125,6 +126,10 @@ class RegisterModelVersionRequest(BaseModel):
         schema of this model version
     description:
         small details of this model version, optional
+    storage_format:
+        storage layout of the logged rows, COLUMN_LIST by default.
+        COLUMN_MAP stores column names as document keys, so they can not contain
+        `.` or start with `$`
 
     """
 
@@ -133,6 +138,20 @@ class RegisterModelVersionRequest(BaseModel):
     task_type: PredictionTaskType
     version_schema: ModelVersionSchema
     description: Optional[str]
+    storage_format: RowStorageFormat = RowStorageFormat.COLUMN_LIST
+
+    @root_validator(skip_on_failure=True)
+    def column_map_names_validator(cls, values):
+        if values.get("storage_format") != RowStorageFormat.COLUMN_MAP:
+            return values
+        version_schema: ModelVersionSchema = values["version_schema"]
+        for name in [*version_schema.features, *version_schema.predictions]:
+            if "." in name or name.startswith("$"):
+                raise ValueError(
+                    f"Column [{name}] can not contain '.' or start with '$' "
+                    f"for the {RowStorageFormat.COLUMN_MAP.value} storage format"
+                )
+        return values
 
 
 class RegisterModelVersionResponse(BaseModel):
@@ -79,6 +79,7 @@ class MonitorListRow(BaseModel):
     count_of_alerts: int
     model_name: str
     last_run: Optional[datetime]
+    next_run_at: Optional[datetime]
     created_at: datetime
     severity: MonitorSeverity
 
@@ -13,12 +13,16 @@
 #  limitations under the License.
 
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional
 
 import pymongo
-from fastapi import Query
+from fastapi import HTTPException, Query
 from pydantic import BaseModel, validator
+from starlette import status
+
+from waterdip.core.commons.models import TimeGrain, TimeRange
+from waterdip.core.commons.time_ranges import normalize_time_range
 
 
 @dataclass
@@ -47,19 +51,30 @@ class TimeRangeParam:
     Attributes:
     ------------------
     start_time:
-        start time of the time range, default current day - 7 days
-    page:
-        End time of the time range
+        start time of the time range, default end time - 7 days
+    end_time:
+        end time of the time range, default current time
     """
 
-    start_time: datetime = Query(
-        default=datetime.utcnow() - timedelta(days=7),
-        description="Start time of the time range",
+    start_time: Optional[datetime] = Query(
+        default=None,
+        description="Start time of the time range, default end time - 7 days",
     )
-    end_time: datetime = Query(
-        default=datetime.utcnow(), description="End time of the time range"
+    end_time: Optional[datetime] = Query(
+        default=None, description="End time of the time range, default current time"
     )
 
+    def time_range(self, grain: TimeGrain = TimeGrain.HOUR) -> TimeRange:
+        """Time range snapped to the grain, the defaults are evaluated per request"""
+        try:
+            return normalize_time_range(
+                start_time=self.start_time, end_time=self.end_time, grain=grain
+            )
+        except ValueError as error:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(error)
+            )
+
 
 class RequestSort(BaseModel):
     """Sorting option for any list API"""
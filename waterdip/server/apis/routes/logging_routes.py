@@ -12,10 +12,26 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from fastapi import APIRouter, Body, Depends
+import tempfile
+from typing import List, Literal, Optional
+from uuid import UUID
 
-from waterdip.server.apis.models.logging import BatchDatasetLogRequest, EventLogRequest
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from pydantic import ValidationError, parse_obj_as
+from starlette.concurrency import run_in_threadpool
+
+from waterdip.core.commons.models import BaselineFileFormat
+from waterdip.server.apis.models.logging import (
+    ActualsLogRequest,
+    BatchDatasetLogRequest,
+    BatchDatasetLogRowReq,
+    EventLogRequest,
+)
+from waterdip.server.commons.config import settings
+from waterdip.server.commons.json_stream import JSONStreamError, iter_json_values
+from waterdip.server.services.ingestion_queue import EventIngestionQueue
 from waterdip.server.services.logging_service import (
+    ActualsLoggingService,
     BatchLoggingService,
     EventLoggingService,
 )
@@ -42,6 +58,116 @@ def log_batch_dataset(
     return {"total": logged_row_count}
 
 
+@router.post(
+    "/log.dataset.stream",
+    name="log:dataset:stream",
+)
+async def log_batch_dataset_stream(
+    request: Request,
+    model_version_id: Optional[UUID] = Query(
+        default=None, description="model version of a new upload"
+    ),
+    environment: Optional[Literal["TRAINING", "TESTING", "VALIDATION"]] = Query(
+        default=None, description="environment of the dataset of a new upload"
+    ),
+    upload_id: Optional[UUID] = Query(
+        default=None, description="upload to add the chunk to, a new upload if empty"
+    ),
+    chunk: int = Query(
+        default=0, ge=0, description="index of the chunk, a sent chunk is replaced"
+    ),
+    service: BatchLoggingService = Depends(BatchLoggingService.get_instance),
+):
+    """
+    Uploads the rows of a batch dataset as an NDJSON body or a JSON array. The body
+    is parsed while it is received and the rows are written in batches, so the
+    dataset never has to fit in memory. A large dataset can be split in chunks
+    sent with the upload_id of the first response, a failed chunk is sent again.
+    """
+    if upload_id is None:
+        if model_version_id is None or environment is None:
+            raise HTTPException(
+                status_code=422,
+                detail="model_version_id and environment are required for a new upload",
+            )
+        upload_id = await run_in_threadpool(
+            service.create_upload,
+            model_version_id=model_version_id,
+            environment=environment,
+        )
+    writer = await run_in_threadpool(service.open_chunk, upload_id, chunk)
+
+    batch: List = []
+    try:
+        async for row in iter_json_values(request.stream()):
+            batch.append(row)
+            if len(batch) >= settings.batch_upload_batch_size:
+                rows = parse_obj_as(List[BatchDatasetLogRowReq], batch)
+                await run_in_threadpool(writer.write, rows)
+                batch = []
+        if batch:
+            rows = parse_obj_as(List[BatchDatasetLogRowReq], batch)
+            await run_in_threadpool(writer.write, rows)
+    except (JSONStreamError, ValidationError) as error:
+        raise HTTPException(
+            status_code=422,
+            detail=f"chunk [{chunk}] of upload [{upload_id}] is not complete: {error}",
+        )
+    await run_in_threadpool(writer.commit)
+    return {"upload_id": upload_id, "chunk": chunk, "total": writer.written}
+
+
+# larger uploaded files are spooled to disk
+FILE_SPOOL_SIZE = 64 * 1024 * 1024
+
+
+@router.post(
+    "/log.dataset.file",
+    name="log:dataset:file",
+)
+async def log_batch_dataset_file(
+    request: Request,
+    model_version_id: UUID = Query(..., description="unique id of the model version"),
+    environment: Literal["TRAINING", "TESTING", "VALIDATION"] = Query(
+        ..., description="environment of the dataset"
+    ),
+    file_format: BaselineFileFormat = Query(
+        ..., description="format of the file sent as the request body"
+    ),
+    service: BatchLoggingService = Depends(BatchLoggingService.get_instance),
+):
+    """
+    Creates a batch dataset from a CSV, Parquet or Arrow file sent as the raw
+    request body. The columns of the file are mapped to the model version schema
+    by name, columns which are not part of the schema are ignored.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=FILE_SPOOL_SIZE) as file:
+        async for chunk in request.stream():
+            file.write(chunk)
+        file.seek(0)
+        try:
+            return await run_in_threadpool(
+                service.log_file,
+                model_version_id=model_version_id,
+                environment=environment,
+                file=file,
+                file_format=file_format,
+            )
+        except ValueError as error:
+            raise HTTPException(status_code=422, detail=str(error))
+
+
+@router.get(
+    "/log.dataset.upload",
+    name="log:dataset:upload",
+)
+def log_batch_dataset_upload(
+    upload_id: UUID = Query(..., description="ID of the streamed upload"),
+    service: BatchLoggingService = Depends(BatchLoggingService.get_instance),
+):
+    return service.upload_status(upload_id)
+
+
 @router.post(
     "/log.events",
     name="log:events",
@@ -59,3 +185,29 @@ def log_events(
         log_timestamp=request.timestamp,
     )
     return {"total": logged_row_count}
+
+
+@router.post(
+    "/log.actuals",
+    name="log:actuals",
+    response_model_exclude_none=True,
+)
+def log_actuals(
+    request: ActualsLogRequest = Body(
+        ..., description="delayed actuals of logged prediction events"
+    ),
+    service: ActualsLoggingService = Depends(ActualsLoggingService.get_instance),
+):
+    return service.log(
+        model_version_id=request.model_version_id, actuals=request.actuals
+    )
+
+
+@router.get(
+    "/log.events.stats",
+    name="log:events:stats",
+)
+def log_events_stats(
+    ingestion_queue: EventIngestionQueue = Depends(EventIngestionQueue.get_instance),
+):
+    return ingestion_queue.stats()
@@ -12,23 +12,24 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from uuid import UUID
-
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 
-from waterdip.core.commons.models import TimeRange
-from waterdip.server.apis.models.metrics import DatasetMetricsResponse, PerfomanceMetricResponse
-from waterdip.server.apis.models.params import TimeRangeParam
-from waterdip.server.services.metrics_service import DatasetMetricsService
-from waterdip.core.commons.models import TimeRange
+from waterdip.core.commons.models import TimeGrain
+from waterdip.server.apis.models.metrics import (
+    ClassPerformanceResponse,
+    DatasetMetricsResponse,
+    PerfomanceMetricResponse,
+)
 from waterdip.server.apis.models.params import TimeRangeParam
-
-from waterdip.server.services.metrics_service import ClassificationPerformance
+from waterdip.server.commons.config import settings
+from waterdip.server.services.metrics_cache import MetricsCache
+from waterdip.server.services.metrics_service import (
+    ClassificationPerformance,
+    DatasetMetricsService,
+)
 
 router = APIRouter()
 
@@ -41,12 +42,9 @@ def model_list(
     model_version_id: UUID,
     dataset_id: UUID,
     time_range_param: TimeRangeParam = Depends(),
-    service: DatasetMetricsService = Depends(
-        DatasetMetricsService.get_instance),
+    service: DatasetMetricsService = Depends(DatasetMetricsService.get_instance),
 ):
-    time_range = TimeRange(
-        start_time=time_range_param.start_time, end_time=time_range_param.end_time
-    )
+    time_range = time_range_param.time_range(grain=settings.metrics_time_grain)
 
     metrics: DatasetMetricsResponse = service.combined_metrics(
         model_id=model_id,
@@ -58,6 +56,18 @@ def model_list(
     return metrics
 
 
+@router.get(
+    "/metrics.cache.stats",
+    name="metrics:cache:stats",
+)
+def metrics_cache_stats(
+    metrics_cache: Optional[MetricsCache] = Depends(MetricsCache.get_instance),
+):
+    if metrics_cache is None:
+        return {"backend": "none"}
+    return metrics_cache.stats()
+
+
 @router.get(
     "/metric.performance",
     response_model=PerfomanceMetricResponse,
@@ -66,13 +76,38 @@ def model_list(
 def metric_performance(
     model_id: UUID,
     model_version_id: UUID,
-    start_time: Optional[datetime] = datetime.utcnow() - timedelta(days=7),
-    end_time: Optional[datetime] = datetime.utcnow(),
+    time_range_param: TimeRangeParam = Depends(),
+    granularity: TimeGrain = Query(
+        default=TimeGrain.DAY, description="Size of the time buckets"
+    ),
     metric_service: ClassificationPerformance = Depends(
-        ClassificationPerformance.get_instance),
+        ClassificationPerformance.get_instance
+    ),
 ):
     return metric_service.model_performance(
         model_id=model_id,
         model_version_id=model_version_id,
-        time_range=TimeRange(start_time=start_time, end_time=end_time),
+        # the time range covers whole buckets of the histograms
+        time_range=time_range_param.time_range(grain=granularity),
+        granularity=granularity,
+    )
+
+
+@router.get(
+    "/metric.performance.classes",
+    response_model=ClassPerformanceResponse,
+    name="metric:performance:classes",
+)
+def metric_performance_classes(
+    model_id: UUID,
+    model_version_id: UUID,
+    time_range_param: TimeRangeParam = Depends(),
+    metric_service: ClassificationPerformance = Depends(
+        ClassificationPerformance.get_instance
+    ),
+):
+    return metric_service.class_performance(
+        model_id=model_id,
+        model_version_id=model_version_id,
+        time_range=time_range_param.time_range(grain=settings.metrics_time_grain),
     )
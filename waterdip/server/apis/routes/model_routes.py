@@ -127,6 +127,7 @@ def register_model_version(
         model_id=request.model_id,
         model_version=request.model_version,
         version_schema=request.version_schema,
+        storage_format=request.storage_format,
     )
     return RegisterModelVersionResponse(
         model_version=registered_model_version.model_version,
@@ -28,6 +28,7 @@ from waterdip import __version__ as wd_version
 from waterdip.server.apis.router import api_router
 from waterdip.server.commons.config import settings
 from waterdip.server.db.mongodb import MongodbBackend
+from waterdip.server.services.ingestion_queue import EventIngestionQueue
 from waterdip.utils.logging import configure_logging
 
 
@@ -62,6 +63,18 @@ def configure_database(app: FastAPI):
             ) from error
 
 
+def configure_ingestion(app: FastAPI):
+    """
+    Configures event ingestion for the server.
+    On Shutdown, it drains the write-behind event buffer, if it was ever used
+    """
+
+    @app.on_event("shutdown")
+    def drain_event_ingestion():
+        if EventIngestionQueue._INSTANCE is not None:
+            EventIngestionQueue._INSTANCE.stop(drain=True)
+
+
 def configure_middleware(app: FastAPI):
     """
     Configures fastapi middleware
@@ -115,5 +128,10 @@ app = FastAPI(
     openapi_url="/api/docs/spec.json",
 )
 
-for app_configure in [configure_api_router, configure_middleware, configure_database]:
+for app_configure in [
+    configure_api_router,
+    configure_middleware,
+    configure_database,
+    configure_ingestion,
+]:
     app_configure(app)
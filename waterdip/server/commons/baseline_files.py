@@ -0,0 +1,139 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import csv
+import io
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List
+
+from waterdip.core.commons.models import BaselineFileFormat
+
+# column name -> values of the rows of one record batch
+ColumnBatch = Dict[str, List[Any]]
+
+FILE_EXTENSIONS = {
+    ".csv": BaselineFileFormat.CSV,
+    ".parquet": BaselineFileFormat.PARQUET,
+    ".pq": BaselineFileFormat.PARQUET,
+    ".arrow": BaselineFileFormat.ARROW,
+    ".feather": BaselineFileFormat.ARROW,
+    ".ipc": BaselineFileFormat.ARROW,
+}
+
+
+def file_format_of(path: str) -> BaselineFileFormat:
+    """File format of a baseline file by its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FILE_EXTENSIONS:
+        raise ValueError(
+            f"unknown baseline file extension [{extension}], "
+            f"expected one of {', '.join(FILE_EXTENSIONS)}"
+        )
+    return FILE_EXTENSIONS[extension]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ValueError(
+            "Parquet and Arrow files require the pyarrow package, "
+            "install waterdip with the arrow extra"
+        ) from error
+    return pyarrow
+
+
+def _csv_batches(file: BinaryIO, batch_size: int) -> Iterator[ColumnBatch]:
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns: ColumnBatch = {name: [] for name in header}
+        for record in reader:
+            if not record:
+                continue
+            if len(record) != len(header):
+                raise ValueError(
+                    f"line {reader.line_num} has {len(record)} values, "
+                    f"expected {len(header)}"
+                )
+            # empty cells are missing values, the schema plan converts the rest
+            for values, value in zip(columns.values(), record):
+                values.append(value if value != "" else None)
+            if len(columns[header[0]]) == batch_size:
+                yield columns
+                columns = {name: [] for name in header}
+        if columns[header[0]]:
+            yield columns
+    finally:
+        # the caller owns the binary file
+        text.detach()
+
+
+def _parquet_batches(file: BinaryIO, batch_size: int) -> Iterator[ColumnBatch]:
+    _pyarrow()
+    import pyarrow.parquet as parquet
+
+    for batch in parquet.ParquetFile(file).iter_batches(batch_size=batch_size):
+        yield batch.to_pydict()
+
+
+def _arrow_batches(file: BinaryIO, batch_size: int) -> Iterator[ColumnBatch]:
+    pyarrow = _pyarrow()
+    import pyarrow.ipc as ipc
+
+    try:
+        reader = ipc.open_file(file)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pyarrow.ArrowInvalid:
+        file.seek(0)
+        batches = iter(ipc.open_stream(file))
+    for batch in batches:
+        for offset in range(0, batch.num_rows, batch_size):
+            yield batch.slice(offset, batch_size).to_pydict()
+
+
+_READERS = {
+    BaselineFileFormat.CSV: _csv_batches,
+    BaselineFileFormat.PARQUET: _parquet_batches,
+    BaselineFileFormat.ARROW: _arrow_batches,
+}
+
+
+def read_column_batches(
+    file: BinaryIO, file_format: BaselineFileFormat, batch_size: int = 5000
+) -> Iterator[ColumnBatch]:
+    """
+    Reads a baseline file in record batches of at most batch_size rows, every batch
+    as the list of values of each column. Only one batch is held in memory.
+
+    Parameters
+    ----------
+    file:
+        seekable binary file
+    file_format:
+        format of the file
+    batch_size:
+        maximum number of rows of a batch
+    Raises
+    ------
+    ValueError: for Parquet and Arrow files when pyarrow is not installed
+    """
+    if file_format != BaselineFileFormat.CSV:
+        # fails before the caller starts to write rows
+        _pyarrow()
+    return _READERS[file_format](file, batch_size)
@@ -12,11 +12,49 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from enum import Enum
 from typing import List
 from urllib.parse import urlparse
 
 from pydantic import BaseSettings
 
+from waterdip.core.commons.models import TimeGrain
+
+
+class MetricsBackend(str, Enum):
+    """
+    Where the dataset profile metrics are computed
+
+    Attributes:
+    ------------------
+    MONGO:
+        aggregation pipelines executed by mongodb
+    STREAM:
+        rows streamed from mongodb and aggregated in the server process
+    """
+
+    MONGO = "mongo"
+    STREAM = "stream"
+
+
+class MetricsCacheBackend(str, Enum):
+    """
+    Where computed dataset metrics are cached
+
+    Attributes:
+    ------------------
+    NONE:
+        metrics are computed for every request
+    MEMORY:
+        process local LRU cache
+    REDIS:
+        redis cache shared by all the server processes
+    """
+
+    NONE = "none"
+    MEMORY = "memory"
+    REDIS = "redis"
+
 
 class ServerSettings(BaseSettings):
     """
@@ -33,6 +71,48 @@ class ServerSettings(BaseSettings):
     mongo_collection_event_rows: str = "wd_dataset_event_rows"
     mongo_collection_monitors: str = "wd_monitors"
     mongo_collection_alerts: str = "wd_alerts"
+    mongo_collection_event_rollups: str = "wd_dataset_event_rollups"
+    mongo_collection_pending_actuals: str = "wd_pending_actuals"
+    mongo_collection_dataset_profiles: str = "wd_dataset_profiles"
+    mongo_collection_monitor_windows: str = "wd_monitor_windows"
+    mongo_ensure_indexes: bool = True
+
+    schema_plan_cache_size: int = 1024
+    schema_plan_refresh_seconds: float = 30.0
+
+    event_ingestion_async: bool = False
+    event_ingestion_buffer_size: int = 100000
+    event_ingestion_flush_size: int = 5000
+    event_ingestion_flush_interval: float = 1.0
+
+    event_rollups_enabled: bool = False
+
+    pending_actuals_ttl: int = 7 * 24 * 3600
+
+    batch_upload_batch_size: int = 5000
+    dataset_profiles_enabled: bool = True
+
+    metrics_backend: MetricsBackend = MetricsBackend.MONGO
+    metrics_stream_batch_size: int = 5000
+
+    metrics_time_grain: TimeGrain = TimeGrain.HOUR
+
+    drift_psi_bins: int = 10
+    drift_baseline_cache_size: int = 256
+
+    monitor_grouped_evaluation: bool = True
+    monitor_scheduler_interval: int = 300
+    monitor_scheduler_batch_size: int = 1000
+    monitor_cache_size: int = 4096
+    monitor_queue: str = "monitors"
+    monitor_drift_queue: str = "monitors_drift"
+    monitor_window_state_enabled: bool = True
+    monitor_window_recompute_buckets: int = 1
+    monitor_window_ttl: int = 31 * 24 * 3600
+
+    metrics_cache_backend: MetricsCacheBackend = MetricsCacheBackend.MEMORY
+    metrics_cache_size: int = 256
+    metrics_cache_ttl: int = 300
 
     docs_enabled: bool = True
     is_testing: str = "false"
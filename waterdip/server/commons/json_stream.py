@@ -0,0 +1,108 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, List
+
+# whitespace and the separators of a JSON array between two values
+_SEPARATORS = " \t\r\n[],"
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+# fraction and exponent characters which can continue a decoded number
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]+")
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+def _is_incomplete(buffer: str, error: json.JSONDecodeError) -> bool:
+    """
+    Whether the decoding error is caused by a value which continues in the next
+    chunk, rather than by invalid JSON
+    """
+    if error.pos >= len(buffer) or error.msg.startswith("Unterminated string"):
+        return True
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        # the escape is only decoded once a character follows its 4 hex digits
+        return len(buffer) - error.pos <= 5
+    tail = buffer[error.pos :]
+    return (
+        any(literal.startswith(tail) for literal in _LITERALS)
+        or _NUMBER_TAIL.fullmatch(tail) is not None
+    )
+
+
+def _decode_values(buffer: str, decoder: json.JSONDecoder, final: bool):
+    """
+    Decodes the complete values at the start of the buffer.
+    Returns the decoded values and the remaining, incomplete text
+    """
+    values: List[Any] = []
+    position, size = 0, len(buffer)
+    while True:
+        while position < size and buffer[position] in _SEPARATORS:
+            position += 1
+        if position == size:
+            return values, ""
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if final or not _is_incomplete(buffer, error):
+                raise JSONStreamError(f"invalid JSON at {error.pos}: {error.msg}")
+            return values, buffer[position:]
+        if (
+            not final
+            and not isinstance(value, (dict, list))
+            and (end == size or buffer[end] not in _SEPARATORS)
+        ):
+            # a number or literal not followed by a separator yet may continue in
+            # the next chunk
+            return values, buffer[position:]
+        values.append(value)
+        position = end
+
+
+async def iter_json_values(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yields the values of a streamed NDJSON body or JSON array as soon as they are
+    complete, so that only one network chunk and one incomplete value are held in
+    memory. The body is decoded as UTF-8, a character split between two chunks is
+    joined back.
+
+    Raises
+    ------
+    JSONStreamError: when the body is not a sequence of JSON values
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    remaining = ""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        try:
+            text = text_decoder.decode(chunk)
+        except UnicodeDecodeError as error:
+            raise JSONStreamError(f"invalid UTF-8 body: {error.reason}")
+        values, remaining = _decode_values(remaining + text, decoder, final=False)
+        for value in values:
+            yield value
+
+    values, _ = _decode_values(
+        remaining + text_decoder.decode(b"", final=True), decoder, final=True
+    )
+    for value in values:
+        yield value
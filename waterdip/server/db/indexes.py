@@ -0,0 +1,248 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pymongo
+from loguru import logger
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from waterdip.server.commons.config import settings
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_ALERTS,
+    MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASET_PROFILES,
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_EVENT_ROLLUPS,
+    MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MODEL_VERSIONS,
+    MONGO_COLLECTION_MODELS,
+    MONGO_COLLECTION_MONITOR_WINDOWS,
+    MONGO_COLLECTION_MONITORS,
+    MONGO_COLLECTION_PENDING_ACTUALS,
+)
+
+ASC = pymongo.ASCENDING
+DESC = pymongo.DESCENDING
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """
+    Declaration of one index of a waterdip collection
+
+    Attributes:
+    ------------------
+    collection:
+        name of the collection
+    keys:
+        index keys as (field, direction) pairs, equality fields first, then the
+        sort or range field
+    unique:
+        whether the index enforces unique values
+    partial_filter:
+        only the documents matching the filter are indexed
+    expire_after_seconds:
+        documents are removed by mongodb this many seconds after the date of the
+        single index field
+    heavy:
+        the index is on a collection which can be large, its build is left to the
+        ensure-indexes command unless the collection is empty
+    """
+
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    partial_filter: Optional[Dict] = None
+    expire_after_seconds: Optional[int] = None
+    heavy: bool = False
+
+    @property
+    def name(self) -> str:
+        return "wd_" + "_".join(
+            f"{field}_{direction}" for field, direction in self.keys
+        )
+
+    @property
+    def fields(self) -> List[str]:
+        return [field for field, _ in self.keys]
+
+    @property
+    def options(self) -> Dict:
+        options: Dict = {"name": self.name, "unique": self.unique}
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec(MONGO_COLLECTION_MODELS, (("model_id", ASC),), unique=True),
+    IndexSpec(
+        MONGO_COLLECTION_MODEL_VERSIONS, (("model_version_id", ASC),), unique=True
+    ),
+    # versions of a model, latest first
+    IndexSpec(
+        MONGO_COLLECTION_MODEL_VERSIONS, (("model_id", ASC), ("created_at", DESC))
+    ),
+    IndexSpec(MONGO_COLLECTION_DATASETS, (("dataset_id", ASC),), unique=True),
+    # event / batch dataset of a model version
+    IndexSpec(
+        MONGO_COLLECTION_DATASETS, (("model_version_id", ASC), ("dataset_type", ASC))
+    ),
+    IndexSpec(MONGO_COLLECTION_DATASETS, (("model_id", ASC),)),
+    # metrics and monitors of a dataset over a time range
+    IndexSpec(
+        MONGO_COLLECTION_EVENT_ROWS,
+        (("dataset_id", ASC), ("created_at", ASC)),
+        heavy=True,
+    ),
+    # prediction counts, trends and first / last prediction of a model
+    IndexSpec(
+        MONGO_COLLECTION_EVENT_ROWS,
+        (("model_id", ASC), ("created_at", ASC)),
+        heavy=True,
+    ),
+    # delayed actuals are joined to their prediction by event id, rows logged
+    # before event ids were stored are left out of the uniqueness
+    IndexSpec(
+        MONGO_COLLECTION_EVENT_ROWS,
+        (("model_version_id", ASC), ("event_id", ASC)),
+        unique=True,
+        partial_filter={"event_id": {"$type": "string"}},
+        heavy=True,
+    ),
+    IndexSpec(MONGO_COLLECTION_BATCH_ROWS, (("dataset_id", ASC),), heavy=True),
+    IndexSpec(MONGO_COLLECTION_BATCH_ROWS, (("model_id", ASC),), heavy=True),
+    IndexSpec(MONGO_COLLECTION_BATCH_ROWS, (("model_version_id", ASC),), heavy=True),
+    IndexSpec(MONGO_COLLECTION_MONITORS, (("monitor_id", ASC),), unique=True),
+    IndexSpec(MONGO_COLLECTION_MONITORS, (("monitor_identification.model_id", ASC),)),
+    IndexSpec(
+        MONGO_COLLECTION_MONITORS, (("monitor_identification.model_version_id", ASC),)
+    ),
+    # due monitors claimed by the scheduler
+    IndexSpec(MONGO_COLLECTION_MONITORS, (("next_run_at", ASC),)),
+    IndexSpec(MONGO_COLLECTION_ALERTS, (("alert_id", ASC),), unique=True),
+    # latest alerts and alert counts of a model
+    IndexSpec(MONGO_COLLECTION_ALERTS, (("model_id", ASC), ("created_at", DESC))),
+    # one rollup document per dataset, day and column
+    IndexSpec(
+        MONGO_COLLECTION_EVENT_ROLLUPS,
+        (("dataset_id", ASC), ("day", ASC), ("mapping", ASC), ("column", ASC)),
+        unique=True,
+    ),
+    IndexSpec(MONGO_COLLECTION_EVENT_ROLLUPS, (("model_id", ASC),)),
+    # actuals waiting for their prediction, expired when it never arrives
+    IndexSpec(
+        MONGO_COLLECTION_PENDING_ACTUALS,
+        (("model_version_id", ASC), ("event_id", ASC)),
+        unique=True,
+    ),
+    IndexSpec(
+        MONGO_COLLECTION_PENDING_ACTUALS,
+        (("created_at", ASC),),
+        expire_after_seconds=settings.pending_actuals_ttl,
+    ),
+    # one profile document per batch dataset, upload chunk and column
+    IndexSpec(
+        MONGO_COLLECTION_DATASET_PROFILES,
+        (("dataset_id", ASC), ("chunk", ASC), ("mapping", ASC), ("column", ASC)),
+        unique=True,
+    ),
+    IndexSpec(MONGO_COLLECTION_DATASET_PROFILES, (("model_id", ASC),)),
+    # one window bucket document per monitor window, hour and column
+    IndexSpec(
+        MONGO_COLLECTION_MONITOR_WINDOWS,
+        (("window_id", ASC), ("bucket", ASC), ("mapping", ASC), ("column", ASC)),
+        unique=True,
+    ),
+    IndexSpec(MONGO_COLLECTION_MONITOR_WINDOWS, (("model_id", ASC),)),
+    # hours of the rows logged late, by dataset
+    IndexSpec(MONGO_COLLECTION_MONITOR_WINDOWS, (("dataset_id", ASC), ("bucket", ASC))),
+    # buckets of deleted monitors and datasets
+    IndexSpec(
+        MONGO_COLLECTION_MONITOR_WINDOWS,
+        (("bucket", ASC),),
+        expire_after_seconds=settings.monitor_window_ttl,
+    ),
+]
+
+
+def ensure_indexes(
+    database: Database, indexes: List[IndexSpec] = None, skip_heavy: bool = False
+) -> Dict[str, List[str]]:
+    """
+    Creates the declared indexes which are missing in the database.
+
+    Creating an index which already exists with the same keys and options is a no-op
+    for mongodb, so it is safe to run on every startup. The expiration of an existing
+    TTL index is changed in place with collMod. An index which can not be created,
+    e.g. because of duplicated values for a unique index or a conflicting index with
+    the same name, is logged and skipped.
+
+    Parameters
+    ----------
+    database:
+        mongodb database
+    indexes:
+        index declarations, all waterdip indexes by default
+    skip_heavy:
+        skips the missing heavy indexes of non empty collections, a build would
+        block until it completes
+    Returns
+    -------
+    names of the ensured indexes per collection
+    """
+    ensured: Dict[str, List[str]] = {}
+    for index in INDEXES if indexes is None else indexes:
+        collection = database[index.collection]
+        try:
+            existing = collection.index_information().get(index.name)
+            if existing is None and skip_heavy and index.heavy:
+                if collection.estimated_document_count() > 0:
+                    logger.warning(
+                        "index [{0}] on [{1}] is missing, "
+                        "build it with `waterdip ensure-indexes`",
+                        index.name,
+                        index.collection,
+                    )
+                    continue
+            if (
+                existing is not None
+                and index.expire_after_seconds is not None
+                and existing.get("expireAfterSeconds") != index.expire_after_seconds
+            ):
+                database.command(
+                    "collMod",
+                    index.collection,
+                    index={
+                        "name": index.name,
+                        "expireAfterSeconds": index.expire_after_seconds,
+                    },
+                )
+            else:
+                collection.create_index(list(index.keys), **index.options)
+        except OperationFailure as error:
+            logger.error(
+                "failed to create index [{0}] on [{1}]: {2}",
+                index.name,
+                index.collection,
+                error,
+            )
+            continue
+        ensured.setdefault(index.collection, []).append(index.name)
+    return ensured
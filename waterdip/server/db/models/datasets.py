@@ -34,7 +34,6 @@ ColumnInfoDB = TypeVar("ColumnInfoDB", bound=BaseColumnInfoDB)
 
 
 class BaseDatasetDB(BaseModel):
-
     dataset_id: UUID = Field(default=None)
     dataset_name: str = Field(default=None)
     created_at: datetime = Field(default=None)
@@ -51,6 +50,28 @@ class BaseDatasetDB(BaseModel):
                                                """
     )
     meta: Optional[Dict] = None
+    rollup_from: Optional[datetime] = Field(
+        default=None,
+        description="First day from which the daily rollups of the dataset are complete",
+    )
+    rollup_late_writes: int = Field(
+        default=0,
+        description="Number of rollup increments of days before the current day, a "
+        "rebuild only marks the rollups complete when none happened while it ran",
+    )
+    ingested_rows: int = Field(
+        default=0,
+        description="Number of rows ingested into or updated in the dataset, grows "
+        "with every insert and with every row which receives delayed actuals",
+    )
+    upload_chunks: List[int] = Field(
+        default_factory=list,
+        description="Committed chunks of a streamed upload of a batch dataset",
+    )
+    upload_chunk_rows: Dict[str, int] = Field(
+        default_factory=dict,
+        description="Number of rows of every committed chunk of a streamed upload",
+    )
 
     @classmethod
     @root_validator
@@ -24,6 +24,7 @@ from waterdip.core.commons.models import (
     ModelBaselineTimeWindow,
     ModelBaselineTimeWindowType,
     MovingTimeWindow,
+    RowStorageFormat,
 )
 
 
@@ -96,6 +97,29 @@ class BaseModelVersionDB(BaseModel):
     version_schema: ModelVersionSchemaInDB = Field(
         description="Schema for the model version"
     )
+    storage_format: RowStorageFormat = Field(
+        default=RowStorageFormat.COLUMN_LIST,
+        description="Storage layout of the dataset rows of the model version",
+    )
+
+    def column_map(self) -> Optional[Dict[str, Dict[str, ColumnDataType]]]:
+        """
+        Data types of the row maps for the COLUMN_MAP storage format, i.e.
+        {"features": {"f1": NUMERIC}, "predictions": {"p1": CATEGORICAL}}.
+        Returns None for the COLUMN_LIST storage format
+        """
+        if self.storage_format != RowStorageFormat.COLUMN_MAP:
+            return None
+        return {
+            "features": {
+                name: details.data_type
+                for name, details in self.version_schema.features.items()
+            },
+            "predictions": {
+                name: details.data_type
+                for name, details in self.version_schema.predictions.items()
+            },
+        }
 
     def dict(self, *args, **kwargs) -> "DictStrAny":
         model_version = super().dict(*args, **kwargs)
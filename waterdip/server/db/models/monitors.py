@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import hashlib
 from datetime import datetime
 from typing import Optional, TypeVar
 
@@ -44,6 +45,9 @@ class BaseMonitorDB(BaseModel):
     count_of_alerts: Optional[int]
     model_name: Optional[str]
     last_run: Optional[str]
+    next_run_at: Optional[datetime] = Field(
+        default=None, description="monitors without next run time are due"
+    )
     created_at: datetime
     severity: MonitorSeverity = Field(default=MonitorSeverity.LOW)
 
@@ -59,5 +63,20 @@ class BaseMonitorDB(BaseModel):
 
         return monitor
 
+    def version(self) -> str:
+        """
+        Stamp of the monitor definition, it changes with the type, identification,
+        condition or severity of the monitor
+        """
+        definition = self.json(
+            include={
+                "monitor_type",
+                "monitor_identification",
+                "monitor_condition",
+                "severity",
+            }
+        )
+        return hashlib.sha1(definition.encode()).hexdigest()[:16]
+
 
 MonitorDB = TypeVar("MonitorDB", bound=BaseMonitorDB)
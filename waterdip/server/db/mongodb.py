@@ -25,10 +25,16 @@ MONGO_COLLECTION_BATCH_ROWS = settings.mongo_collection_batch_rows
 MONGO_COLLECTION_EVENT_ROWS = settings.mongo_collection_event_rows
 MONGO_COLLECTION_MONITORS = settings.mongo_collection_monitors
 MONGO_COLLECTION_ALERTS = settings.mongo_collection_alerts
+MONGO_COLLECTION_EVENT_ROLLUPS = settings.mongo_collection_event_rollups
+MONGO_COLLECTION_PENDING_ACTUALS = settings.mongo_collection_pending_actuals
+MONGO_COLLECTION_DATASET_PROFILES = settings.mongo_collection_dataset_profiles
+MONGO_COLLECTION_MONITOR_WINDOWS = settings.mongo_collection_monitor_windows
 
+# write error code of a unique index violation
+DUPLICATE_KEY_ERROR = 11000
 
-class MongodbBackend:
 
+class MongodbBackend:
     _INSTANCE = None
 
     @classmethod
@@ -42,6 +48,22 @@ class MongodbBackend:
 
     def init(self):
         logger.info(f"connected to mongodb {self._client.server_info()}")
+        if settings.mongo_ensure_indexes:
+            self.ensure_indexes(skip_heavy=True)
+
+    def ensure_indexes(self, skip_heavy: bool = False):
+        """
+        Creates the missing indexes of the waterdip collections. With skip_heavy, as
+        on startup, the indexes of the large row collections are only built when the
+        collections are empty
+        """
+        from waterdip.server.db.indexes import ensure_indexes
+
+        ensured = ensure_indexes(self.database, skip_heavy=skip_heavy)
+        logger.info(
+            "ensured {0} mongodb indexes", sum(len(names) for names in ensured.values())
+        )
+        return ensured
 
     def __init__(self, mongo_client: MongoClient, mongo_database: str):
         self._client = mongo_client
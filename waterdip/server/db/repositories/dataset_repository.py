@@ -12,16 +12,22 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from uuid import UUID
 
 from fastapi import Depends
+from pymongo import UpdateOne
 
 from waterdip.server.db.models.datasets import BaseDatasetDB, DatasetDB
-from waterdip.server.db.mongodb import MONGO_COLLECTION_DATASETS, MongodbBackend
+from waterdip.server.db.mongodb import (
+    MONGO_COLLECTION_DATASETS,
+    MONGO_COLLECTION_MONITOR_WINDOWS,
+    MongodbBackend,
+)
 
 
 class DatasetRepository:
-
     _INSTANCE = None
 
     @classmethod
@@ -72,3 +78,88 @@ class DatasetRepository:
         self._mongo.database[MONGO_COLLECTION_DATASETS].delete_many(
             filter={"model_id": model_id}
         )
+
+    def delete_dataset(self, dataset_id: UUID) -> None:
+        self._mongo.database[MONGO_COLLECTION_DATASETS].delete_one(
+            filter={"dataset_id": str(dataset_id)}
+        )
+
+    def update_rollup_from(
+        self,
+        dataset_id: UUID,
+        rollup_from: datetime,
+        only_if_unset: bool = False,
+        late_writes: Optional[int] = None,
+    ) -> bool:
+        """
+        Sets the first day from which the rollups of the dataset are complete.
+        With only_if_unset, an already set day is kept. With late_writes, the day is
+        only set when the late rollup writes of the dataset are still late_writes
+
+        Returns
+        -------
+        Whether the dataset matched the conditions: bool
+        """
+        filters: Dict = {"dataset_id": str(dataset_id)}
+        if only_if_unset:
+            filters["rollup_from"] = None
+        if late_writes is not None:
+            # datasets stored before the counter existed have no late writes field
+            filters["rollup_late_writes"] = (
+                {"$in": [0, None]} if late_writes == 0 else late_writes
+            )
+        updated = self._mongo.database[MONGO_COLLECTION_DATASETS].update_one(
+            filters, {"$set": {"rollup_from": rollup_from}}
+        )
+        return updated.matched_count > 0
+
+    def increment_rollup_late_writes(self, dataset_id: UUID) -> None:
+        """Counts a rollup increment of days before the current day"""
+        self._mongo.database[MONGO_COLLECTION_DATASETS].update_one(
+            {"dataset_id": str(dataset_id)}, {"$inc": {"rollup_late_writes": 1}}
+        )
+
+    def update_upload_chunk(
+        self, dataset_id: UUID, chunk: int, committed: bool, rows: int = 0
+    ) -> None:
+        """
+        Adds a chunk with its number of rows to the committed chunks of an upload, or
+        removes it
+        """
+        if committed:
+            update = {
+                "$addToSet": {"upload_chunks": chunk},
+                "$set": {f"upload_chunk_rows.{chunk}": rows},
+            }
+        else:
+            update = {
+                "$pull": {"upload_chunks": chunk},
+                "$unset": {f"upload_chunk_rows.{chunk}": ""},
+            }
+        self._mongo.database[MONGO_COLLECTION_DATASETS].update_one(
+            {"dataset_id": str(dataset_id)}, update
+        )
+
+    def increment_ingested_rows(self, row_counts: Dict[str, int]) -> None:
+        """Adds the number of newly inserted rows to the ingestion counter per dataset"""
+        requests = [
+            UpdateOne({"dataset_id": dataset_id}, {"$inc": {"ingested_rows": count}})
+            for dataset_id, count in row_counts.items()
+            if count
+        ]
+        if requests:
+            self._mongo.database[MONGO_COLLECTION_DATASETS].bulk_write(
+                requests, ordered=False
+            )
+
+    def delete_monitor_window_hours(self, hours: Dict[str, Set[datetime]]) -> None:
+        """Deletes the monitor window buckets of the hours per dataset"""
+        conditions = [
+            {"dataset_id": dataset_id, "bucket": {"$in": sorted(buckets)}}
+            for dataset_id, buckets in hours.items()
+            if buckets
+        ]
+        if conditions:
+            self._mongo.database[MONGO_COLLECTION_MONITOR_WINDOWS].delete_many(
+                {"$or": conditions}
+            )
@@ -13,22 +13,93 @@
 #  limitations under the License.
 
 from datetime import datetime
-from typing import Dict, List
-
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
 
 from fastapi import Depends
+from pymongo import UpdateOne
 from pymongo.collection import Collection
 
+from waterdip.core.commons.models import ColumnDataType, ColumnMappingType
 from waterdip.server.db.models.dataset_rows import BaseDatasetBatchRowDB, BaseEventRowDB
 from waterdip.server.db.mongodb import (
     MONGO_COLLECTION_BATCH_ROWS,
+    MONGO_COLLECTION_DATASET_PROFILES,
+    MONGO_COLLECTION_EVENT_ROLLUPS,
     MONGO_COLLECTION_EVENT_ROWS,
+    MONGO_COLLECTION_MONITOR_WINDOWS,
+    MONGO_COLLECTION_PENDING_ACTUALS,
     MongodbBackend,
 )
 
 
-class EventDatasetRowRepository:
+def column_list_to_maps(columns: List[Dict]) -> Dict[str, Optional[Dict]]:
+    """
+    Converts the `columns` list of a COLUMN_LIST row to the maps of a COLUMN_MAP row.
+    `actuals` is None when the row has no actual column.
+    """
+    maps: Dict[str, Optional[Dict]] = {
+        "features": {},
+        "predictions": {},
+        "actuals": None,
+    }
+    for column in columns:
+        value = (
+            column.get("value_numeric")
+            if column.get("data_type") == ColumnDataType.NUMERIC.value
+            else column.get("value_categorical")
+        )
+        mapping_type = column.get("mapping_type")
+        if mapping_type == ColumnMappingType.ACTUAL.value:
+            if maps["actuals"] is None:
+                maps["actuals"] = {}
+            maps["actuals"][column["name"]] = value
+        elif mapping_type == ColumnMappingType.PREDICTION.value:
+            maps["predictions"][column["name"]] = value
+        else:
+            maps["features"][column["name"]] = value
+    return maps
 
+
+def convert_rows_to_column_map(
+    collection: Collection,
+    model_version_id: UUID,
+    batch_size: int = 1000,
+    with_actuals: bool = True,
+) -> int:
+    """
+    Rewrites the COLUMN_LIST rows of the model version to the COLUMN_MAP format,
+    batch_size rows per bulk write. Rows are selected by the presence of `columns`,
+    so an interrupted conversion can be resumed by running it again.
+
+    Returns
+    -------
+    Number of converted rows: int
+    """
+    converted = 0
+    filters = {"model_version_id": str(model_version_id), "columns": {"$exists": True}}
+    while True:
+        rows = list(
+            collection.find(filters, {"_id": 1, "columns": 1}).limit(batch_size)
+        )
+        if not rows:
+            return converted
+
+        requests = []
+        for row in rows:
+            maps = column_list_to_maps(row["columns"])
+            if not with_actuals:
+                maps.pop("actuals")
+            requests.append(
+                UpdateOne(
+                    {"_id": row["_id"], "columns": {"$exists": True}},
+                    {"$set": maps, "$unset": {"columns": ""}},
+                )
+            )
+        converted += collection.bulk_write(requests, ordered=False).modified_count
+
+
+class EventDatasetRowRepository:
     _INSTANCE: "EventDatasetRowRepository" = None
 
     @classmethod
@@ -52,6 +123,54 @@ class EventDatasetRowRepository:
         )
         return created_rows.inserted_ids
 
+    def insert_documents(self, documents: List[Dict], ordered: bool = True):
+        """Inserts already converted, BSON ready row documents"""
+        created_rows = self._mongo.database[MONGO_COLLECTION_EVENT_ROWS].insert_many(
+            documents, ordered=ordered
+        )
+        return created_rows.inserted_ids
+
+    def find_by_event_ids(
+        self,
+        model_version_id: UUID,
+        event_ids: Iterable[str],
+        projection: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """Event rows of the model version with the event ids, one indexed query"""
+        return list(
+            self._mongo.database[MONGO_COLLECTION_EVENT_ROWS].find(
+                {
+                    "model_version_id": str(model_version_id),
+                    "event_id": {"$in": list(event_ids)},
+                },
+                projection,
+            )
+        )
+
+    def bulk_update(self, requests: List[UpdateOne]) -> int:
+        """
+        Applies the updates as one unordered bulk write
+
+        Returns
+        -------
+        Number of modified rows: int
+        """
+        if not requests:
+            return 0
+        result = self._mongo.database[MONGO_COLLECTION_EVENT_ROWS].bulk_write(
+            requests, ordered=False
+        )
+        return result.modified_count
+
+    def convert_rows_to_column_map(
+        self, model_version_id: UUID, batch_size: int = 1000
+    ) -> int:
+        return convert_rows_to_column_map(
+            self._mongo.database[MONGO_COLLECTION_EVENT_ROWS],
+            model_version_id=model_version_id,
+            batch_size=batch_size,
+        )
+
     def count_prediction_by_model_id(self, model_id: str):
         return self._mongo.database[MONGO_COLLECTION_EVENT_ROWS].count_documents(
             {"model_id": model_id}
@@ -80,13 +199,25 @@ class EventDatasetRowRepository:
         )
 
     def delete_rows_by_model_id(self, model_id: str):
+        """
+        Deletes the event rows of the model, the daily rollups and the monitor
+        windows of the rows and the actuals still waiting for their rows
+        """
+        self._mongo.database[MONGO_COLLECTION_EVENT_ROLLUPS].delete_many(
+            {"model_id": model_id}
+        )
+        self._mongo.database[MONGO_COLLECTION_MONITOR_WINDOWS].delete_many(
+            {"model_id": model_id}
+        )
+        self._mongo.database[MONGO_COLLECTION_PENDING_ACTUALS].delete_many(
+            {"model_id": model_id}
+        )
         return self._mongo.database[MONGO_COLLECTION_EVENT_ROWS].delete_many(
             {"model_id": model_id}
         )
 
 
 class BatchDatasetRowRepository:
-
     _INSTANCE = None
 
     @classmethod
@@ -116,12 +247,52 @@ class BatchDatasetRowRepository:
         )
         return created_rows.inserted_ids
 
+    def insert_documents(self, documents: List[Dict]):
+        """Inserts already converted, BSON ready row documents"""
+        created_rows = self._mongo.database[MONGO_COLLECTION_BATCH_ROWS].insert_many(
+            documents
+        )
+        return created_rows.inserted_ids
+
+    def convert_rows_to_column_map(
+        self, model_version_id: UUID, batch_size: int = 1000
+    ) -> int:
+        return convert_rows_to_column_map(
+            self._mongo.database[MONGO_COLLECTION_BATCH_ROWS],
+            model_version_id=model_version_id,
+            batch_size=batch_size,
+            with_actuals=False,
+        )
+
+    def delete_upload_chunk(self, dataset_id: UUID, chunk: int) -> int:
+        """Deletes the rows written by a chunk of a streamed upload"""
+        return (
+            self._mongo.database[MONGO_COLLECTION_BATCH_ROWS]
+            .delete_many({"dataset_id": str(dataset_id), "upload_chunk": chunk})
+            .deleted_count
+        )
+
+    def delete_rows_by_dataset_id(self, dataset_id: UUID) -> int:
+        """Deletes the batch rows of the dataset and its profiles"""
+        self._mongo.database[MONGO_COLLECTION_DATASET_PROFILES].delete_many(
+            {"dataset_id": str(dataset_id)}
+        )
+        return (
+            self._mongo.database[MONGO_COLLECTION_BATCH_ROWS]
+            .delete_many({"dataset_id": str(dataset_id)})
+            .deleted_count
+        )
+
     def agg_rows(self, agg_pipeline: List[Dict]):
         return self._mongo.database[MONGO_COLLECTION_BATCH_ROWS].aggregate(
             pipeline=agg_pipeline
         )
 
     def delete_rows_by_model_id(self, model_id: str):
+        """Deletes the batch rows of the model and the profiles of its datasets"""
+        self._mongo.database[MONGO_COLLECTION_DATASET_PROFILES].delete_many(
+            {"model_id": model_id}
+        )
         return self._mongo.database[MONGO_COLLECTION_BATCH_ROWS].delete_many(
             {"model_id": model_id}
         )
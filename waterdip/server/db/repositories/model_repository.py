@@ -18,6 +18,7 @@ from uuid import UUID
 import pymongo
 from fastapi import Depends
 
+from waterdip.core.commons.models import RowStorageFormat
 from waterdip.server.db.models.models import (
     BaseModelDB,
     BaseModelVersionDB,
@@ -106,6 +107,27 @@ class ModelRepository:
 
         return BaseModelDB(**updated_model)
 
+    def add_prediction_classes(self, model_id: UUID, prediction_classes: List) -> None:
+        """
+        Atomically adds the prediction classes to the model, existing classes are
+        kept once. The model document is never read.
+        """
+        collection = self._mongo.database[MONGO_COLLECTION_MODELS]
+        for _ in range(2):
+            added = collection.update_one(
+                {"model_id": str(model_id), "prediction_classes": {"$type": "array"}},
+                {"$addToSet": {"prediction_classes": {"$each": prediction_classes}}},
+            )
+            if added.matched_count:
+                return
+            # prediction_classes is null until the first classes are logged
+            initialized = collection.update_one(
+                {"model_id": str(model_id), "prediction_classes": None},
+                {"$set": {"prediction_classes": prediction_classes}},
+            )
+            if initialized.matched_count:
+                return
+
 
 class ModelVersionRepository:
     _INSTANCE = None
@@ -177,6 +199,26 @@ class ModelVersionRepository:
             agg_model_versions[model_id] = model_versions
         return agg_model_versions
 
+    def find_storage_format(self, model_version_id: UUID) -> Optional[RowStorageFormat]:
+        result = self._mongo.database[MONGO_COLLECTION_MODEL_VERSIONS].find_one(
+            {"model_version_id": str(model_version_id)}, {"storage_format": 1}
+        )
+
+        if not result:
+            return None
+
+        return RowStorageFormat(
+            result.get("storage_format", RowStorageFormat.COLUMN_LIST.value)
+        )
+
+    def update_storage_format(
+        self, model_version_id: UUID, storage_format: RowStorageFormat
+    ) -> None:
+        self._mongo.database[MONGO_COLLECTION_MODEL_VERSIONS].update_one(
+            {"model_version_id": str(model_version_id)},
+            {"$set": {"storage_format": storage_format.value}},
+        )
+
     def delete_versions_by_model_id(self, model_id: str):
         self._mongo.database[MONGO_COLLECTION_MODEL_VERSIONS].delete_many(
             {"model_id": model_id}
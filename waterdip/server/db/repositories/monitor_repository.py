@@ -12,9 +12,12 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import Dict, List, Optional
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
 from uuid import UUID
 
+import pymongo
 from fastapi import Depends
 
 from waterdip.server.db.models.monitors import BaseMonitorDB, MonitorDB
@@ -70,6 +73,85 @@ class MonitorRepository:
 
         return [BaseMonitorDB(**monitor) for monitor in monitors]
 
+    @staticmethod
+    def _due_filter(now: datetime) -> Dict:
+        return {"$or": [{"next_run_at": None}, {"next_run_at": {"$lte": now}}]}
+
+    @staticmethod
+    def _next_run_at(now: datetime, skip_period: Optional[str]) -> datetime:
+        """
+        Next run time of a monitor run now. Runs are aligned on the minute, so that
+        the scheduler ticks following each other by the skip period find the monitor
+        due again
+        """
+        skip_period = timedelta(days=int((skip_period or "1d")[:-1]))
+        return now.replace(second=0, microsecond=0) + max(
+            skip_period, timedelta(minutes=1)
+        )
+
+    def claim_due_monitors(
+        self, now: datetime, batch_size: int = 1000
+    ) -> Iterator[List[MonitorDB]]:
+        """
+        Claims the monitors due at the time, by batches in due time order. The
+        next run time of a claimed monitor is moved by its skip period with an
+        update conditioned on the monitor still being due, so a monitor is claimed
+        by only one of the concurrent schedulers. Only the monitors of the current
+        batch are loaded
+
+        Parameters
+        ----------
+        now:
+            time of the scheduler tick
+        batch_size:
+            number of monitors claimed by one batch
+        Returns
+        -------
+        batches of the claimed monitors
+        """
+        collection = self._mongo.database[MONGO_COLLECTION_MONITORS]
+        due = self._due_filter(now)
+        while True:
+            candidates = list(
+                collection.find(
+                    due, {"monitor_id": 1, "monitor_condition.skip_period": 1}
+                )
+                .sort("next_run_at", pymongo.ASCENDING)
+                .limit(batch_size)
+            )
+            if not candidates:
+                return
+            claim_id = str(uuid.uuid4())
+            skip_periods: Dict[Optional[str], List[str]] = {}
+            for candidate in candidates:
+                condition = candidate.get("monitor_condition") or {}
+                skip_periods.setdefault(condition.get("skip_period"), []).append(
+                    candidate["monitor_id"]
+                )
+            for skip_period, monitor_ids in skip_periods.items():
+                collection.update_many(
+                    {"monitor_id": {"$in": monitor_ids}, **due},
+                    {
+                        "$set": {
+                            "next_run_at": self._next_run_at(now, skip_period),
+                            "claim_id": claim_id,
+                        }
+                    },
+                )
+            claimed = [
+                BaseMonitorDB(**monitor)
+                for monitor in collection.find(
+                    {
+                        "monitor_id": {
+                            "$in": [candidate["monitor_id"] for candidate in candidates]
+                        },
+                        "claim_id": claim_id,
+                    }
+                )
+            ]
+            if claimed:
+                yield claimed
+
     def delete_monitor(self, monitor_id: UUID) -> Dict:
         try:
             self._mongo.database[MONGO_COLLECTION_MONITORS].delete_one(
@@ -0,0 +1,115 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+from uuid import UUID
+
+from fastapi import Depends
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from waterdip.server.db.mongodb import MONGO_COLLECTION_PENDING_ACTUALS, MongodbBackend
+
+
+class PendingActualsRepository:
+    """
+    Actuals which were logged before the event row of their prediction, one document
+    per model version and event id. Documents not claimed by a prediction expire
+    through the TTL index on created_at.
+    """
+
+    _INSTANCE: "PendingActualsRepository" = None
+
+    @classmethod
+    def get_instance(
+        cls, mongodb: MongodbBackend = Depends(MongodbBackend.get_instance)
+    ):
+        if cls._INSTANCE is None:
+            cls._INSTANCE = cls(mongodb=mongodb)
+        return cls._INSTANCE
+
+    def __init__(self, mongodb: MongodbBackend):
+        self._mongo = mongodb
+
+    @property
+    def collection(self) -> Collection:
+        return self._mongo.database[MONGO_COLLECTION_PENDING_ACTUALS]
+
+    def upsert_many(
+        self,
+        model_id: UUID,
+        model_version_id: UUID,
+        actuals: Dict[str, Dict[str, Any]],
+    ) -> None:
+        """Stores the actuals by event id, a later log of an event id replaces it"""
+        if not actuals:
+            return
+        now = datetime.utcnow()
+        self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"model_version_id": str(model_version_id), "event_id": event_id},
+                    {
+                        "$set": {"actuals": values, "created_at": now},
+                        "$setOnInsert": {"model_id": str(model_id)},
+                    },
+                    upsert=True,
+                )
+                for event_id, values in actuals.items()
+            ],
+            ordered=False,
+        )
+
+    def find_by_event_ids(
+        self, model_version_id: UUID, event_ids: Iterable[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Pending actuals of the event ids, by event id"""
+        return {
+            document["event_id"]: document["actuals"]
+            for document in self.collection.find(
+                {
+                    "model_version_id": str(model_version_id),
+                    "event_id": {"$in": list(event_ids)},
+                },
+                {"event_id": 1, "actuals": 1},
+            )
+        }
+
+    def find_model_versions(self) -> List[str]:
+        """Model versions having pending actuals"""
+        return self.collection.distinct("model_version_id")
+
+    def find_by_model_version(
+        self, model_version_id: UUID, limit: int = 0
+    ) -> Dict[str, Dict[str, Any]]:
+        """Pending actuals of the model version by event id, the oldest first"""
+        return {
+            document["event_id"]: document["actuals"]
+            for document in self.collection.find(
+                {"model_version_id": str(model_version_id)},
+                {"event_id": 1, "actuals": 1},
+                sort=[("created_at", 1)],
+                limit=limit,
+            )
+        }
+
+    def delete_many(self, model_version_id: UUID, event_ids: Iterable[str]) -> int:
+        event_ids = list(event_ids)
+        if not event_ids:
+            return 0
+        return self.collection.delete_many(
+            {"model_version_id": str(model_version_id), "event_id": {"$in": event_ids}}
+        ).deleted_count
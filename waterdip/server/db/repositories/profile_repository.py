@@ -0,0 +1,89 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+from fastapi import Depends
+from pymongo.collection import Collection
+
+from waterdip.core.metrics.rollups import ColumnStats, DailyStats
+from waterdip.server.db.mongodb import MONGO_COLLECTION_DATASET_PROFILES, MongodbBackend
+
+
+class DatasetProfileRepository:
+    """
+    Stored profiles of the batch datasets, one document per dataset, upload chunk and
+    column with the mergeable statistics of the column
+    """
+
+    _INSTANCE: "DatasetProfileRepository" = None
+
+    @classmethod
+    def get_instance(
+        cls, mongodb: MongodbBackend = Depends(MongodbBackend.get_instance)
+    ):
+        if cls._INSTANCE is None:
+            cls._INSTANCE = cls(mongodb=mongodb)
+        return cls._INSTANCE
+
+    def __init__(self, mongodb: MongodbBackend):
+        self._mongo = mongodb
+
+    @property
+    def collection(self) -> Collection:
+        return self._mongo.database[MONGO_COLLECTION_DATASET_PROFILES]
+
+    def replace_chunk(
+        self,
+        dataset_id: UUID,
+        model_id: UUID,
+        model_version_id: UUID,
+        chunk: int,
+        daily_stats: DailyStats,
+    ) -> int:
+        """
+        Replaces the profile of an upload chunk of the dataset with the statistics of
+        its rows. All the days of the statistics are merged into the profile
+
+        Returns
+        -------
+        Number of stored profile documents: int
+        """
+        self.delete_chunk(dataset_id, chunk)
+        merged: Dict[Tuple[str, str], ColumnStats] = {}
+        for (_, mapping, column), stats in daily_stats.columns.items():
+            if (mapping, column) not in merged:
+                merged[(mapping, column)] = ColumnStats(stats.data_type)
+            merged[(mapping, column)].merge(stats)
+
+        documents: List[Dict] = [
+            {
+                "dataset_id": str(dataset_id),
+                "model_id": str(model_id),
+                "model_version_id": str(model_version_id),
+                "chunk": chunk,
+                "mapping": mapping,
+                "column": column,
+                **stats.to_document(),
+            }
+            for (mapping, column), stats in merged.items()
+        ]
+        if documents:
+            self.collection.insert_many(documents)
+        return len(documents)
+
+    def delete_chunk(self, dataset_id: UUID, chunk: int) -> None:
+        self.collection.delete_many({"dataset_id": str(dataset_id), "chunk": chunk})
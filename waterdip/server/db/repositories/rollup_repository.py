@@ -0,0 +1,185 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from datetime import datetime
+from typing import Dict, List, Tuple, Union
+from uuid import UUID
+
+from fastapi import Depends
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+
+from waterdip.core.metrics.rollups import (
+    MAX_TRACKED_VALUES,
+    ColumnStats,
+    DailyStats,
+    RowStats,
+    fold_values,
+)
+from waterdip.server.db.mongodb import (
+    DUPLICATE_KEY_ERROR,
+    MONGO_COLLECTION_EVENT_ROLLUPS,
+    MongodbBackend,
+)
+
+
+class EventRollupRepository:
+    _INSTANCE: "EventRollupRepository" = None
+
+    @classmethod
+    def get_instance(
+        cls, mongodb: MongodbBackend = Depends(MongodbBackend.get_instance)
+    ):
+        if cls._INSTANCE is None:
+            cls._INSTANCE = cls(mongodb=mongodb)
+        return cls._INSTANCE
+
+    def __init__(self, mongodb: MongodbBackend):
+        self._mongo = mongodb
+
+    @property
+    def collection(self) -> Collection:
+        return self._mongo.database[MONGO_COLLECTION_EVENT_ROLLUPS]
+
+    @staticmethod
+    def _documents(
+        dataset_id: UUID, daily_stats: DailyStats
+    ) -> List[Tuple[Dict, Union[RowStats, ColumnStats]]]:
+        """(rollup key, statistics) of every rollup document of the daily statistics"""
+        documents = [
+            (
+                {
+                    "dataset_id": str(dataset_id),
+                    "day": day,
+                    "mapping": None,
+                    "column": None,
+                },
+                stats,
+            )
+            for day, stats in daily_stats.rows.items()
+        ]
+        documents.extend(
+            (
+                {
+                    "dataset_id": str(dataset_id),
+                    "day": day,
+                    "mapping": mapping,
+                    "column": column,
+                },
+                stats,
+            )
+            for (day, mapping, column), stats in daily_stats.columns.items()
+        )
+        return documents
+
+    def increment(
+        self,
+        dataset_id: UUID,
+        model_id: UUID,
+        model_version_id: UUID,
+        daily_stats: DailyStats,
+    ) -> None:
+        """Adds the daily statistics to the stored rollups, upserting missing days"""
+        owner = {"model_id": str(model_id), "model_version_id": str(model_version_id)}
+        requests, value_keys = [], []
+        for key, stats in self._documents(dataset_id, daily_stats):
+            update = stats.to_update()
+            update["$setOnInsert"] = {**update.get("$setOnInsert", {}), **owner}
+            requests.append(UpdateOne(key, update, upsert=True))
+            if isinstance(stats, ColumnStats) and stats.values:
+                value_keys.append(key)
+        if not requests:
+            return
+
+        try:
+            self.collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as error:
+            # concurrent upserts of a new rollup document can race on the unique
+            # index, the losing updates are applied again on the now existing document
+            failed = error.details.get("writeErrors", [])
+            if any(e.get("code") != DUPLICATE_KEY_ERROR for e in failed):
+                raise
+            self.collection.bulk_write(
+                [requests[e["index"]] for e in failed], ordered=False
+            )
+        self._fold_values(value_keys)
+
+    def _fold_values(self, keys: List[Dict]) -> None:
+        """
+        Increments add new categorical values to the stored rollup documents. The
+        least frequent values of the documents having more than MAX_TRACKED_VALUES
+        values are folded into other_count
+        """
+        if not keys:
+            return
+        oversized = self.collection.aggregate(
+            [
+                {"$match": {"$or": keys}},
+                {
+                    "$project": {
+                        "size": {
+                            "$size": {"$objectToArray": {"$ifNull": ["$values", {}]}}
+                        }
+                    }
+                },
+                {"$match": {"size": {"$gt": MAX_TRACKED_VALUES}}},
+            ]
+        )
+        for document in oversized:
+            values = self.collection.find_one({"_id": document["_id"]}, {"values": 1})[
+                "values"
+            ]
+            kept, _ = fold_values(values)
+            folded = {key: n for key, n in values.items() if key not in kept}
+            # a concurrent increment of a folded value fails the update, the values
+            # are folded again by the next increment
+            self.collection.update_one(
+                {
+                    "_id": document["_id"],
+                    **{f"values.{key}": n for key, n in folded.items()},
+                },
+                {
+                    "$unset": {f"values.{key}": "" for key in folded},
+                    "$inc": {"other_count": sum(folded.values())},
+                },
+            )
+
+    def replace_days(
+        self,
+        dataset_id: UUID,
+        model_id: UUID,
+        model_version_id: UUID,
+        daily_stats: DailyStats,
+        first_day: datetime,
+        end_day: datetime,
+    ) -> int:
+        """
+        Replaces the stored rollups of the days [first_day, end_day)
+
+        Returns
+        -------
+        Number of stored rollup documents: int
+        """
+        owner = {"model_id": str(model_id), "model_version_id": str(model_version_id)}
+        days = {"$gte": first_day, "$lt": end_day}
+        self.collection.delete_many({"dataset_id": str(dataset_id), "day": days})
+        documents = [
+            {**key, **owner, **stats.to_document()}
+            for key, stats in self._documents(dataset_id, daily_stats)
+            if first_day <= key["day"] < end_day
+        ]
+        if documents:
+            self.collection.insert_many(documents)
+        return len(documents)
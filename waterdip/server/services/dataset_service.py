@@ -11,13 +11,16 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-from typing import List, Optional, TypeVar
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, TypeVar
 from uuid import UUID
 
 from fastapi import Depends
 from pydantic import Field
 
 from waterdip.core.commons.models import DatasetType
+from waterdip.core.metrics.windows import late_hours
 from waterdip.server.apis.models.params import RequestPagination, RequestSort
 from waterdip.server.db.models.datasets import BaseDatasetDB, DatasetDB
 from waterdip.server.db.repositories.dataset_repository import DatasetRepository
@@ -150,3 +153,24 @@ class DatasetService:
 
     def delete_datasets_by_model_id(self, model_id: UUID):
         self._repository.delete_datasets_by_model_id(str(model_id))
+
+    def delete_dataset(self, dataset_id: UUID) -> None:
+        self._repository.delete_dataset(dataset_id)
+
+    def update_upload_chunk(
+        self, dataset_id: UUID, chunk: int, committed: bool, rows: int = 0
+    ) -> None:
+        self._repository.update_upload_chunk(dataset_id, chunk, committed, rows)
+
+    def record_ingested_rows(self, documents: List[Dict]) -> None:
+        """
+        Advances the ingestion watermark of the datasets of persisted row documents.
+        Cached dataset metrics are keyed on the watermark, so they are invalidated.
+        The monitor window hours of rows logged late are deleted to be computed again
+        """
+        self._repository.increment_ingested_rows(
+            Counter(str(document["dataset_id"]) for document in documents)
+        )
+        self._repository.delete_monitor_window_hours(
+            late_hours(documents, now=datetime.utcnow())
+        )
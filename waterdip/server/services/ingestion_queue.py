@@ -0,0 +1,408 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from fastapi import Depends, HTTPException
+from loguru import logger
+from pymongo.errors import BulkWriteError
+
+from waterdip.server.commons.config import settings
+from waterdip.server.db.repositories.pending_actuals_repository import (
+    PendingActualsRepository,
+)
+from waterdip.server.services.dataset_service import DatasetService
+from waterdip.server.services.model_service import ModelService
+from waterdip.server.services.rollup_service import EventRollupService
+from waterdip.server.services.row_service import EventDatasetRowService
+
+
+class EventIngestionQueue:
+    """
+    Write-behind buffer for logged events.
+
+    Converted event row documents are accepted into a bounded in-process buffer and
+    persisted by a background flusher thread. The flusher coalesces the documents of
+    many log requests into one unordered `insert_many`, and the prediction classes of
+    the same model into one update. Pending actuals claimed by the buffered events
+    are released once their event rows are persisted.
+
+    A flush is triggered when the buffer holds `flush_size` documents or when
+    `flush_interval` seconds passed since the last flush, whichever comes first.
+    When the buffer is full, new events are rejected with HTTP 429 so the callers
+    can back off and retry. A flush which fails puts its documents back at the front
+    of the buffer, the flusher then retries with an exponential backoff up to
+    `max_backoff` seconds. Once the queue is stopping, new events are rejected with
+    HTTP 503.
+
+    Attributes:
+    ------------------
+    max_size:
+        maximum number of documents waiting in the buffer
+    flush_size:
+        maximum number of documents written by one flush
+    flush_interval:
+        maximum time in seconds a document waits in the buffer
+    max_backoff:
+        maximum time in seconds between the retries of a failing flush
+    """
+
+    _INSTANCE: "EventIngestionQueue" = None
+
+    @classmethod
+    def get_instance(
+        cls,
+        row_service: EventDatasetRowService = Depends(
+            EventDatasetRowService.get_instance
+        ),
+        model_service: ModelService = Depends(ModelService.get_instance),
+        rollup_service: EventRollupService = Depends(EventRollupService.get_instance),
+        dataset_service: DatasetService = Depends(DatasetService.get_instance),
+        pending_repository: PendingActualsRepository = Depends(
+            PendingActualsRepository.get_instance
+        ),
+    ):
+        if not cls._INSTANCE:
+            cls._INSTANCE = cls(
+                row_service=row_service,
+                model_service=model_service,
+                dataset_service=dataset_service,
+                pending_repository=pending_repository,
+                rollup_service=rollup_service
+                if settings.event_rollups_enabled
+                else None,
+                max_size=settings.event_ingestion_buffer_size,
+                flush_size=settings.event_ingestion_flush_size,
+                flush_interval=settings.event_ingestion_flush_interval,
+            )
+        return cls._INSTANCE
+
+    def __init__(
+        self,
+        row_service: EventDatasetRowService,
+        model_service: ModelService,
+        max_size: int = 100000,
+        flush_size: int = 5000,
+        flush_interval: float = 1.0,
+        rollup_service: Optional[EventRollupService] = None,
+        dataset_service: Optional[DatasetService] = None,
+        pending_repository: Optional[PendingActualsRepository] = None,
+        max_backoff: float = 30.0,
+    ):
+        self._row_service = row_service
+        self._model_service = model_service
+        self._rollup_service = rollup_service
+        self._dataset_service = dataset_service
+        self._pending_repository = pending_repository
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+
+        self._documents: Deque[Dict] = deque()
+        self._prediction_classes: Dict[str, set] = {}
+        # (model_version_id, event_id) of the buffered rows having claimed actuals
+        self._claimed_actuals: Set[Tuple[str, str]] = set()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._running = False
+        self._stopping = False
+        # seconds until the retry of a failed flush, 0 when the last flush succeeded
+        self._backoff = 0.0
+
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._failed_rows = 0
+        self._failed_flushes = 0
+        self._rejected_rows = 0
+        self._last_flush_latency_ms: Optional[float] = None
+        self._max_flush_latency_ms: Optional[float] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._documents)
+
+    def start(self) -> None:
+        with self._condition:
+            if self._running or self._stopping:
+                return
+            self._running = True
+            self._flusher = threading.Thread(
+                target=self._run, name="wd-event-ingestion-flusher", daemon=True
+            )
+            self._flusher.start()
+        logger.info(
+            "event ingestion flusher started with buffer size {0}, flush size {1}",
+            self.max_size,
+            self.flush_size,
+        )
+
+    def stop(self, drain: bool = True) -> None:
+        """
+        Stops the flusher thread and rejects the events submitted afterwards. With
+        drain, the buffered documents are persisted before returning, until a flush
+        fails.
+        """
+        with self._condition:
+            self._stopping = True
+            running, self._running = self._running, False
+            self._condition.notify_all()
+        if running and self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        if drain:
+            while self.flush() > 0:
+                pass
+            logger.info("event ingestion buffer drained, {0} rows left", self.depth)
+
+    def submit(
+        self,
+        documents: List[Dict],
+        model_id: UUID,
+        prediction_classes: List,
+        claimed_actuals: Optional[List[str]] = None,
+    ) -> int:
+        """
+        Accepts converted event row documents to be persisted by the flusher
+
+        Parameters
+        ----------
+        documents:
+            event row documents
+        model_id:
+            Model ID of the events
+        prediction_classes:
+            prediction values of the events
+        claimed_actuals:
+            event ids of the events having pending actuals attached, the pending
+            actuals are deleted after the event rows are persisted
+        Returns
+        -------
+        Number of accepted rows: int
+        """
+        if not documents:
+            return 0
+        if self._stopping:
+            with self._condition:
+                self._rejected_rows += len(documents)
+            raise HTTPException(
+                status_code=503, detail="Event ingestion is shutting down, retry later"
+            )
+        if not self._running:
+            self.start()
+
+        with self._condition:
+            if len(self._documents) + len(documents) > self.max_size:
+                self._rejected_rows += len(documents)
+                raise HTTPException(
+                    status_code=429,
+                    detail="Event ingestion buffer is full, retry later",
+                )
+            self._documents.extend(documents)
+            self._prediction_classes.setdefault(str(model_id), set()).update(
+                prediction_classes
+            )
+            if claimed_actuals:
+                claimed = set(claimed_actuals)
+                self._claimed_actuals.update(
+                    (document["model_version_id"], document["event_id"])
+                    for document in documents
+                    if document["event_id"] in claimed
+                )
+            # a failing flush is retried after its backoff only
+            if len(self._documents) >= self.flush_size and not self._backoff:
+                self._condition.notify()
+
+        return len(documents)
+
+    def _take(self) -> Tuple[List[Dict], Dict[str, set]]:
+        with self._condition:
+            size = min(self.flush_size, len(self._documents))
+            documents = [self._documents.popleft() for _ in range(size)]
+            prediction_classes, self._prediction_classes = (
+                self._prediction_classes,
+                {},
+            )
+        return documents, prediction_classes
+
+    def _requeue(
+        self, documents: List[Dict], prediction_classes: Dict[str, set]
+    ) -> None:
+        """Puts the documents of a failed flush back at the front of the buffer"""
+        with self._condition:
+            self._documents.extendleft(reversed(documents))
+            for model_id, classes in prediction_classes.items():
+                self._prediction_classes.setdefault(model_id, set()).update(classes)
+
+    def _insert(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Inserts the documents, returns the successfully inserted ones. The
+        documents rejected by the database are dropped, other errors are raised
+        """
+        if not documents:
+            return documents
+        try:
+            self._row_service.insert_documents(documents, ordered=False)
+            self._flushed_rows += len(documents)
+            return documents
+        except BulkWriteError as error:
+            inserted = error.details.get("nInserted", 0)
+            self._flushed_rows += inserted
+            self._failed_rows += len(documents) - inserted
+            write_errors = error.details.get("writeErrors", [])
+            logger.error(
+                "failed to flush {0} event rows: {1}",
+                len(documents) - inserted,
+                write_errors[:1],
+            )
+            failed = {write_error["index"] for write_error in write_errors}
+            return [doc for i, doc in enumerate(documents) if i not in failed]
+
+    def _release_pending_actuals(
+        self, documents: List[Dict], inserted: List[Dict]
+    ) -> None:
+        """
+        Deletes the pending actuals claimed by the inserted rows. The claims of rows
+        which failed are dropped, their pending actuals stay to be claimed again
+        """
+        with self._condition:
+            if not self._claimed_actuals:
+                return
+            taken = {
+                (document["model_version_id"], document["event_id"])
+                for document in documents
+            } & self._claimed_actuals
+            self._claimed_actuals -= taken
+        if not taken or self._pending_repository is None:
+            return
+
+        released: Dict[str, List[str]] = {}
+        for document in inserted:
+            key = (document["model_version_id"], document["event_id"])
+            if key in taken:
+                released.setdefault(key[0], []).append(key[1])
+        for model_version_id, event_ids in released.items():
+            try:
+                self._pending_repository.delete_many(model_version_id, event_ids)
+            except Exception as error:
+                logger.error(
+                    "failed to release {0} pending actuals of model version {1}: {2}",
+                    len(event_ids),
+                    model_version_id,
+                    error,
+                )
+
+    def _ingested(self, documents: List[Dict]) -> None:
+        """Updates the dataset watermarks and rollups with persisted event rows"""
+        if not documents:
+            return
+        if self._dataset_service is not None:
+            try:
+                self._dataset_service.record_ingested_rows(documents)
+            except Exception as error:
+                logger.error(
+                    "failed to record {0} ingested event rows: {1}",
+                    len(documents),
+                    error,
+                )
+        if self._rollup_service is not None:
+            try:
+                self._rollup_service.increment(documents)
+            except Exception as error:
+                logger.error(
+                    "failed to roll up {0} event rows: {1}", len(documents), error
+                )
+
+    def flush(self) -> int:
+        """
+        Persists at most flush_size buffered documents. When the insert fails, the
+        documents are put back in the buffer and the next flush is delayed
+
+        Returns
+        -------
+        Number of documents taken from the buffer and not put back: int
+        """
+        with self._flush_lock:
+            documents, prediction_classes = self._take()
+            if not documents and not prediction_classes:
+                return 0
+
+            start_time = time.perf_counter()
+            try:
+                inserted = self._insert(documents)
+            except Exception as error:
+                self._requeue(documents, prediction_classes)
+                self._failed_flushes += 1
+                self._backoff = min(
+                    max(self._backoff * 2, self.flush_interval), self.max_backoff
+                )
+                logger.error(
+                    "failed to flush {0} event rows, retrying in {1}s: {2}",
+                    len(documents),
+                    self._backoff,
+                    error,
+                )
+                return 0
+            self._backoff = 0.0
+            self._release_pending_actuals(documents, inserted)
+            self._ingested(inserted)
+            for model_id, classes in prediction_classes.items():
+                try:
+                    self._model_service.update_prediction_classes(
+                        UUID(model_id), list(classes)
+                    )
+                except Exception as error:
+                    logger.error(
+                        "failed to update prediction classes of model {0}: {1}",
+                        model_id,
+                        error,
+                    )
+
+            latency_ms = round((time.perf_counter() - start_time) * 1000, 2)
+            self._flushes += 1
+            self._last_flush_latency_ms = latency_ms
+            self._max_flush_latency_ms = max(
+                self._max_flush_latency_ms or 0, latency_ms
+            )
+            return len(documents)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._backoff:
+                    self._condition.wait(timeout=self._backoff)
+                elif self._running and len(self._documents) < self.flush_size:
+                    self._condition.wait(timeout=self.flush_interval)
+                if not self._running:
+                    return
+            self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "running": self._running,
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "flushes": self._flushes,
+            "flushed_rows": self._flushed_rows,
+            "failed_rows": self._failed_rows,
+            "failed_flushes": self._failed_flushes,
+            "rejected_rows": self._rejected_rows,
+            "last_flush_latency_ms": self._last_flush_latency_ms,
+            "max_flush_latency_ms": self._max_flush_latency_ms,
+        }
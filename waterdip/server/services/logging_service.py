@@ -11,35 +11,43 @@
 #  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
-import functools
 import uuid
-from dataclasses import dataclass
+from contextlib import closing
+from dataclasses import dataclass, replace
 from datetime import datetime
-from typing import Dict, List, Optional, Union
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 from uuid import UUID
 
 from fastapi import Depends
-
-from waterdip.core.commons.models import ColumnDataType, ColumnMappingType, Environment
-from waterdip.server.db.models.dataset_rows import (
-    DataColumn,
-    DatasetBatchRowDB,
-    EventDataColumnDB,
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from waterdip.core.commons.models import (
+    BaselineFileFormat,
+    ColumnMappingType,
+    DatasetType,
+    Environment,
 )
+from waterdip.core.metrics.profiles import profile_stats
+from waterdip.core.metrics.rollups import DailyStats
+from waterdip.server.commons.baseline_files import read_column_batches
+from waterdip.server.commons.config import settings
 from waterdip.server.db.models.datasets import DatasetDB
-from waterdip.server.db.models.models import (
-    BaseModelVersionDB,
-    ModelVersionSchemaFieldDetails,
-    ModelVersionSchemaInDB,
+from waterdip.server.db.mongodb import DUPLICATE_KEY_ERROR
+from waterdip.server.db.repositories.pending_actuals_repository import (
+    PendingActualsRepository,
 )
+from waterdip.server.db.repositories.profile_repository import DatasetProfileRepository
+from waterdip.server.errors.base_errors import EntityNotFoundError
 from waterdip.server.services.dataset_service import DatasetService, ServiceBatchDataset
+from waterdip.server.services.ingestion_queue import EventIngestionQueue
 from waterdip.server.services.model_service import ModelService, ModelVersionService
+from waterdip.server.services.rollup_service import EventRollupService
 from waterdip.server.services.row_service import (
     BatchDatasetRowService,
     EventDatasetRowService,
-    ServiceClassificationEventRow,
-    ServiceDatasetBatchRow,
 )
+from waterdip.server.services.schema_plan import SchemaPlan
 
 
 @dataclass
@@ -57,10 +65,19 @@ class ServiceLogEvent:
     timestamp: Optional[datetime] = None
 
 
+@dataclass
+class ServiceLogActual:
+    event_id: str
+    actuals: Dict[str, Union[str, float, int, bool, None]]
+
+
 class BatchLoggingService:
     """
-    Batch Logging service prepare the batch logged data to be persisted in DB
+    Batch Logging service prepare the batch logged data to be persisted in DB.
 
+    With a profile repository, the profile of a batch dataset is computed while its
+    rows are inserted and stored next to them, so the dataset metrics never have to
+    scan the rows. Streamed uploads store one profile per committed chunk.
     """
 
     _INSTANCE: "BatchLoggingService" = None
@@ -75,12 +92,18 @@ class BatchLoggingService:
         row_service: BatchDatasetRowService = Depends(
             BatchDatasetRowService.get_instance
         ),
+        profile_repository: DatasetProfileRepository = Depends(
+            DatasetProfileRepository.get_instance
+        ),
     ):
         if not cls._INSTANCE:
             cls._INSTANCE = cls(
                 model_version_service=model_version_service,
                 dataset_service=dataset_service,
                 row_service=row_service,
+                profile_repository=profile_repository
+                if settings.dataset_profiles_enabled
+                else None,
             )
         return cls._INSTANCE
 
@@ -89,84 +112,12 @@ class BatchLoggingService:
         model_version_service: ModelVersionService,
         dataset_service: DatasetService,
         row_service: BatchDatasetRowService,
+        profile_repository: Optional[DatasetProfileRepository] = None,
     ):
         self._model_version_service = model_version_service
         self._dataset_service = dataset_service
         self._row_service = row_service
-
-    @staticmethod
-    def _data_column_converter(
-        column_name: str,
-        column_value: Union[str, float, int, bool],
-        field_schema: ModelVersionSchemaFieldDetails,
-        column_mapping_type: ColumnMappingType,
-    ) -> DataColumn:
-        """
-        Converts API logged column to db DataColumn
-        If column type is CATEGORICAL then column value added to value_categorical key
-        If column type is NUMERIC then column value added to value_numeric key
-
-        """
-        if field_schema.data_type == ColumnDataType.CATEGORICAL:
-            _column = DataColumn(
-                name=column_name,
-                value_categorical=str(column_value),
-                data_type=field_schema.data_type,
-                mapping_type=column_mapping_type,
-            )
-            return _column
-        elif field_schema.data_type == ColumnDataType.NUMERIC:
-            _column = DataColumn(
-                name=column_name,
-                value_numeric=float(column_value),
-                data_type=field_schema.data_type,
-                mapping_type=column_mapping_type,
-            )
-            return _column
-
-    def _log_row_to_batch_row_db_converter(
-        self,
-        dataset_id: UUID,
-        row: ServiceLogRow,
-        schema: ModelVersionSchemaInDB,
-        model_id: UUID,
-        model_version_id: UUID,
-    ) -> ServiceDatasetBatchRow:
-        """
-        Converts API logged row to db Dataset Row.
-        The method takes ServiceLogRow as inout and converts each column using _data_column_converter
-        """
-        converted_columns: List[DataColumn] = []
-        all_columns = {
-            ColumnMappingType.FEATURE: row.features,
-            ColumnMappingType.PREDICTION: row.predictions,
-        }
-        for mapping_type, columns in all_columns.items():
-            for name, data in columns.items():
-                # get schema details based on the column name
-                schema_details: ModelVersionSchemaFieldDetails = (
-                    schema.features.get(name)
-                    if mapping_type == ColumnMappingType.FEATURE
-                    else schema.predictions.get(name)
-                )
-                # Converts the column
-                converted_columns.append(
-                    self._data_column_converter(
-                        column_name=name,
-                        column_value=data,
-                        field_schema=schema_details,
-                        column_mapping_type=mapping_type,
-                    )
-                )
-
-        return ServiceDatasetBatchRow(
-            model_id=model_id,
-            model_version_id=model_version_id,
-            row_id=uuid.uuid4(),
-            dataset_id=dataset_id,
-            columns=converted_columns,
-            created_at=datetime.utcnow(),
-        )
+        self._profile_repository = profile_repository
 
     def log(
         self, model_version_id: UUID, environment: str, rows: List[ServiceLogRow]
@@ -186,31 +137,262 @@ class BatchLoggingService:
         -------
         Number of rows inserted: int
         """
-        model_version: BaseModelVersionDB = self._model_version_service.find_by_id(
+        plan = self._model_version_service.find_schema_plan(
+            model_version_id=model_version_id
+        )
+        dataset_id = self._create_dataset(plan.model_id, model_version_id, environment)
+        batch_row_documents = plan.batch_row_documents(
+            rows=rows,
+            model_id=plan.model_id,
+            model_version_id=model_version_id,
+            dataset_id=dataset_id,
+            created_at=datetime.utcnow(),
+        )
+        inserted = self._row_service.insert_documents(documents=batch_row_documents)
+        self._dataset_service.record_ingested_rows(batch_row_documents)
+        if self._profile_repository is not None:
+            self._store_profile(
+                plan,
+                model_version_id,
+                dataset_id,
+                profile_stats(batch_row_documents, plan.column_map()),
+            )
+        return inserted
+
+    def log_file(
+        self,
+        model_version_id: UUID,
+        environment: str,
+        file: BinaryIO,
+        file_format: BaselineFileFormat,
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Creates a batch dataset from a CSV, Parquet or Arrow file. The file is read
+        in record batches which are converted column by column and inserted one
+        batch at a time. The dataset is created once the first batch is converted,
+        and it is deleted with its rows when a later batch fails.
+
+        Parameters
+        ----------
+        model_version_id:
+            Model Version ID
+        environment:
+            Name of the Environment
+        file:
+            seekable binary file
+        file_format:
+            format of the file
+        batch_size:
+            rows per record batch, WD_BATCH_UPLOAD_BATCH_SIZE by default
+        Returns
+        -------
+        ID of the created dataset as "dataset_id" and number of inserted rows as
+        "total"
+        """
+        plan = self._model_version_service.find_schema_plan(
             model_version_id=model_version_id
         )
+        # the reader is closed before the caller closes the file, also on failure
+        with closing(
+            read_column_batches(
+                file, file_format, batch_size or settings.batch_upload_batch_size
+            )
+        ) as batches:
+            return self._log_batches(plan, model_version_id, environment, batches)
+
+    def _log_batches(
+        self,
+        plan: SchemaPlan,
+        model_version_id: UUID,
+        environment: str,
+        batches: Iterator[Dict[str, List[Any]]],
+    ) -> Dict[str, Any]:
         dataset_id = uuid.uuid4()
+
+        def convert(columns: Dict[str, List[Any]]) -> List[Dict]:
+            return plan.batch_column_documents(
+                columns,
+                model_id=plan.model_id,
+                model_version_id=model_version_id,
+                dataset_id=dataset_id,
+                created_at=datetime.utcnow(),
+            )
+
+        # the first batch is read and converted before the dataset is created, so a
+        # file that does not match the schema leaves nothing behind
+        columns = next(batches, None)
+        documents = convert(columns) if columns is not None else []
+        self._create_dataset(
+            plan.model_id, model_version_id, environment, dataset_id=dataset_id
+        )
+        inserted, daily_stats = 0, DailyStats(column_map=plan.column_map())
+        try:
+            while True:
+                inserted += self._row_service.insert_documents(documents=documents)
+                self._dataset_service.record_ingested_rows(documents)
+                if self._profile_repository is not None:
+                    profile_stats(documents, daily_stats=daily_stats)
+                columns = next(batches, None)
+                if columns is None:
+                    break
+                documents = convert(columns)
+            if self._profile_repository is not None:
+                self._store_profile(plan, model_version_id, dataset_id, daily_stats)
+        except Exception:
+            self._row_service.delete_rows_by_dataset_id(dataset_id)
+            self._dataset_service.delete_dataset(dataset_id)
+            raise
+        return {"dataset_id": dataset_id, "total": inserted}
+
+    def _store_profile(
+        self,
+        plan: SchemaPlan,
+        model_version_id: UUID,
+        dataset_id: UUID,
+        daily_stats: DailyStats,
+    ) -> None:
+        """Stores the profile of all the rows of a dataset as its only chunk"""
+        self._profile_repository.replace_chunk(
+            dataset_id=dataset_id,
+            model_id=plan.model_id,
+            model_version_id=model_version_id,
+            chunk=0,
+            daily_stats=daily_stats,
+        )
+
+    def _create_dataset(
+        self,
+        model_id: UUID,
+        model_version_id: UUID,
+        environment: str,
+        dataset_id: Optional[UUID] = None,
+    ) -> UUID:
+        dataset_id = dataset_id or uuid.uuid4()
         dataset = ServiceBatchDataset(
             dataset_id=dataset_id,
             dataset_name=environment,
             created_at=datetime.utcnow(),
-            model_id=model_version.model_id,
+            model_id=model_id,
             model_version_id=model_version_id,
             environment=Environment(environment),
         )
-
         self._dataset_service.create_batch_dataset(dataset=dataset)
-        data_rows_in_db: List[DatasetBatchRowDB] = [
-            self._log_row_to_batch_row_db_converter(
-                dataset_id=dataset_id,
-                row=row,
-                schema=model_version.version_schema,
-                model_id=model_version.model_id,
-                model_version_id=model_version_id,
+        return dataset_id
+
+    def create_upload(self, model_version_id: UUID, environment: str) -> UUID:
+        """
+        Creates the batch dataset of a streamed upload, its ID is the upload ID.
+        The rows are then written chunk by chunk with `open_chunk`
+        """
+        plan = self._model_version_service.find_schema_plan(
+            model_version_id=model_version_id
+        )
+        return self._create_dataset(plan.model_id, model_version_id, environment)
+
+    def _find_upload(self, upload_id: UUID) -> DatasetDB:
+        dataset = self._dataset_service.find_dataset_by_id(upload_id)
+        if dataset.dataset_type != DatasetType.BATCH:
+            raise EntityNotFoundError(name=str(upload_id), type="Batch Dataset")
+        return dataset
+
+    def open_chunk(self, upload_id: UUID, chunk: int) -> "BatchUploadChunk":
+        """
+        Starts writing a chunk of a streamed upload. The rows of an earlier attempt
+        of the same chunk are deleted, so a failed chunk can be sent again
+        """
+        dataset = self._find_upload(upload_id)
+        plan = self._model_version_service.find_schema_plan(
+            model_version_id=dataset.model_version_id
+        )
+        self._dataset_service.update_upload_chunk(upload_id, chunk, committed=False)
+        self._row_service.delete_upload_chunk(upload_id, chunk)
+        if self._profile_repository is not None:
+            self._profile_repository.delete_chunk(upload_id, chunk)
+        return BatchUploadChunk(
+            plan=plan,
+            dataset=dataset,
+            chunk=chunk,
+            row_service=self._row_service,
+            dataset_service=self._dataset_service,
+            profile_repository=self._profile_repository,
+        )
+
+    def upload_status(self, upload_id: UUID) -> Dict[str, Any]:
+        """
+        Committed chunks of a streamed upload and their number of rows, to resume it
+        after a failure
+        """
+        dataset = self._find_upload(upload_id)
+        return {
+            "upload_id": upload_id,
+            "chunks": sorted(dataset.upload_chunks or []),
+            "rows": sum(dataset.upload_chunk_rows.values()),
+        }
+
+
+class BatchUploadChunk:
+    """
+    Writer of one chunk of a streamed batch dataset upload. Rows are converted and
+    inserted batch by batch and tagged with the chunk, the chunk is committed once
+    all of its rows are written. The profile of the chunk is stored on commit
+
+    Attributes:
+    ------------------
+    chunk:
+        index of the chunk in the upload
+    written:
+        number of rows written so far
+    """
+
+    def __init__(
+        self,
+        plan: SchemaPlan,
+        dataset: DatasetDB,
+        chunk: int,
+        row_service: BatchDatasetRowService,
+        dataset_service: DatasetService,
+        profile_repository: Optional[DatasetProfileRepository] = None,
+    ):
+        self._plan = plan
+        self._dataset = dataset
+        self._row_service = row_service
+        self._dataset_service = dataset_service
+        self._profile_repository = profile_repository
+        self._daily_stats = DailyStats(column_map=plan.column_map())
+        self.chunk = chunk
+        self.written = 0
+
+    def write(self, rows: List[ServiceLogRow]) -> int:
+        """Converts and inserts one batch of rows, returns the number of rows"""
+        documents = self._plan.batch_row_documents(
+            rows=rows,
+            model_id=self._dataset.model_id,
+            model_version_id=self._dataset.model_version_id,
+            dataset_id=self._dataset.dataset_id,
+            created_at=datetime.utcnow(),
+        )
+        for document in documents:
+            document["upload_chunk"] = self.chunk
+        inserted = self._row_service.insert_documents(documents=documents)
+        self._dataset_service.record_ingested_rows(documents)
+        if self._profile_repository is not None:
+            profile_stats(documents, daily_stats=self._daily_stats)
+        self.written += inserted
+        return inserted
+
+    def commit(self) -> None:
+        if self._profile_repository is not None:
+            self._profile_repository.replace_chunk(
+                dataset_id=self._dataset.dataset_id,
+                model_id=self._dataset.model_id,
+                model_version_id=self._dataset.model_version_id,
+                chunk=self.chunk,
+                daily_stats=self._daily_stats,
             )
-            for row in rows
-        ]
-        return self._row_service.insert_rows(data_rows_in_db)
+        self._dataset_service.update_upload_chunk(
+            self._dataset.dataset_id, self.chunk, committed=True, rows=self.written
+        )
 
 
 class EventLoggingService:
@@ -227,6 +409,13 @@ class EventLoggingService:
         row_service: EventDatasetRowService = Depends(
             EventDatasetRowService.get_instance
         ),
+        ingestion_queue: EventIngestionQueue = Depends(
+            EventIngestionQueue.get_instance
+        ),
+        rollup_service: EventRollupService = Depends(EventRollupService.get_instance),
+        pending_repository: PendingActualsRepository = Depends(
+            PendingActualsRepository.get_instance
+        ),
     ):
         if not cls._INSTANCE:
             cls._INSTANCE = cls(
@@ -234,6 +423,13 @@ class EventLoggingService:
                 dataset_service=dataset_service,
                 row_service=row_service,
                 model_service=model_service,
+                ingestion_queue=ingestion_queue
+                if settings.event_ingestion_async
+                else None,
+                rollup_service=rollup_service
+                if settings.event_rollups_enabled
+                else None,
+                pending_repository=pending_repository,
             )
         return cls._INSTANCE
 
@@ -243,240 +439,335 @@ class EventLoggingService:
         dataset_service: DatasetService,
         row_service: EventDatasetRowService,
         model_service: ModelService = Depends(ModelService.get_instance),
+        ingestion_queue: Optional[EventIngestionQueue] = None,
+        rollup_service: Optional[EventRollupService] = None,
+        pending_repository: Optional[PendingActualsRepository] = None,
     ):
         self._model_version_service = model_version_service
         self._dataset_service = dataset_service
         self._row_service = row_service
         self._model_service = model_service
+        self._ingestion_queue = ingestion_queue
+        self._rollup_service = rollup_service
+        self._pending_repository = pending_repository
 
     @staticmethod
-    def _convert_event_column(
-        column_name: str,
-        column_value: Union[str, float, int, bool, None],
-        field_schema: ModelVersionSchemaFieldDetails,
-        column_mapping_type: ColumnMappingType,
-    ) -> EventDataColumnDB:
+    def _event_timestamp(event: ServiceLogEvent, log_timestamp: datetime = None):
         """
-        Converts API logged event column to db data format
-        If column type is CATEGORICAL then column value added to value_categorical key
-        If column type is NUMERIC then column value added to value_numeric key
+        The timestamp hierarchy:
+            1. Time provided with each event gets the highest priority
+            2. Time provided with the event log gets next priority
+            3. If no time is provided, then current UTC time will be generated
         """
-        if field_schema.data_type == ColumnDataType.CATEGORICAL:
-            _column = EventDataColumnDB(
-                name=column_name,
-                value_categorical=str(column_value)
-                if column_value is not None
-                else None,
-                data_type=field_schema.data_type,
-                mapping_type=column_mapping_type,
-            )
-            return _column
-        elif field_schema.data_type == ColumnDataType.NUMERIC:
-            _column = EventDataColumnDB(
-                name=column_name,
-                value_numeric=float(column_value) if column_value is not None else None,
-                data_type=field_schema.data_type,
-                mapping_type=column_mapping_type,
-            )
-            return _column
+        if event.timestamp is not None:
+            timestamp = event.timestamp
+        elif log_timestamp is not None:
+            timestamp = log_timestamp
+        else:
+            timestamp = datetime.utcnow()
+
+        return timestamp
 
-    def _convert_features(
+    def log(
         self,
-        features: Dict[str, Union[str, float, int, bool, None]],
-        version_schema: ModelVersionSchemaInDB,
-    ):
+        model_version_id: UUID,
+        events: List[ServiceLogEvent],
+        log_timestamp: Optional[datetime] = None,
+    ) -> int:
         """
-        Re-format only feature columns to DB data format
+        Converts logged events to event rows and persists them.
+        With an ingestion queue, the rows are handed over to the queue and persisted
+        in background, the returned count is then the number of accepted rows.
+        Events whose event id is already stored for the model version, e.g. a retried
+        log request, are treated as already ingested and counted as accepted.
         """
-        converted_columns: List[EventDataColumnDB] = []
-        for feature_name, feature_data in features.items():
-            schema_details: ModelVersionSchemaFieldDetails = (
-                version_schema.features.get(feature_name)
-            )
-            converted_columns.append(
-                self._convert_event_column(
-                    feature_name,
-                    feature_data,
-                    schema_details,
-                    ColumnMappingType.FEATURE,
-                )
+        plan = self._model_version_service.find_schema_plan(
+            model_version_id=model_version_id, with_event_dataset=True
+        )
+        events, claimed = self._claim_pending_actuals(model_version_id, events)
+        event_documents, classes = plan.classification_event_documents(
+            events=events,
+            timestamps=[
+                self._event_timestamp(event, log_timestamp) for event in events
+            ],
+            model_id=plan.model_id,
+            model_version_id=model_version_id,
+            dataset_id=plan.event_dataset_id,
+        )
+
+        if self._ingestion_queue is not None:
+            return self._ingestion_queue.submit(
+                documents=event_documents,
+                model_id=plan.model_id,
+                prediction_classes=classes,
+                claimed_actuals=claimed,
             )
-        return converted_columns
 
-    def _convert_classification_predictions(
-        self,
-        predictions: Dict[str, Union[str, float, int, bool, None]],
-        version_schema: ModelVersionSchemaInDB,
-    ):
+        self._model_service.update_prediction_classes(plan.model_id, classes)
+
+        inserted = event_documents
+        try:
+            self._row_service.insert_documents(documents=event_documents, ordered=False)
+        except BulkWriteError as error:
+            write_errors = error.details.get("writeErrors", [])
+            failed = {write_error["index"] for write_error in write_errors}
+            inserted = [
+                document
+                for i, document in enumerate(event_documents)
+                if i not in failed
+            ]
+            if any(e.get("code") != DUPLICATE_KEY_ERROR for e in write_errors):
+                self._ingested(inserted)
+                raise
+        self._ingested(inserted)
+        self._release_pending_actuals(model_version_id, claimed)
+        return len(event_documents)
+
+    def _claim_pending_actuals(
+        self, model_version_id: UUID, events: List[ServiceLogEvent]
+    ) -> Tuple[List[ServiceLogEvent], List[str]]:
         """
-        Re-format only prediction columns to DB data format
-        Prediction_cf list gets created. It holds the target column data.
-        The item of the list get inserted at the index number provided by the model schema
+        Attaches the actuals which were logged before their prediction to the events
+        without actuals. Returns the events and the claimed event ids
         """
-        converted_columns: List[EventDataColumnDB] = []
-        prediction_cf: List = [None] * len(version_schema.predictions.keys())
-        prediction_clases: List = []
-        for prediction_name, prediction_data in predictions.items():
-            schema_details: ModelVersionSchemaFieldDetails = (
-                version_schema.predictions.get(prediction_name)
-            )
-            converted_columns.append(
-                self._convert_event_column(
-                    prediction_name,
-                    prediction_data,
-                    schema_details,
-                    ColumnMappingType.PREDICTION,
-                )
-            )
-            prediction_cf[schema_details.list_index] = (
-                str(prediction_data)
-                if schema_details.data_type == ColumnDataType.CATEGORICAL
-                else float(prediction_data)
-            )
-            prediction_clases.append(prediction_data)
+        if self._pending_repository is None:
+            return events, []
+        waiting = [
+            str(event.event_id)
+            for event in events
+            if event.event_id and not event.actuals
+        ]
+        if not waiting:
+            return events, []
+        pending = self._pending_repository.find_by_event_ids(model_version_id, waiting)
+        if not pending:
+            return events, []
+        return [
+            replace(event, actuals=pending[str(event.event_id)])
+            if event.event_id and not event.actuals and str(event.event_id) in pending
+            else event
+            for event in events
+        ], list(pending)
+
+    def _release_pending_actuals(
+        self, model_version_id: UUID, event_ids: List[str]
+    ) -> None:
+        if event_ids:
+            self._pending_repository.delete_many(model_version_id, event_ids)
+
+    def _ingested(self, documents: List[Dict]) -> None:
+        """Updates the dataset watermarks and rollups with persisted event rows"""
+        if not documents:
+            return
+        self._dataset_service.record_ingested_rows(documents)
+        if self._rollup_service is not None:
+            self._rollup_service.increment(documents)
+
+
+class ActualsLoggingService:
+    """
+    Joins delayed actuals to the event rows of their predictions by event id.
 
-        return converted_columns, prediction_cf, prediction_clases
+    The rows of a log call are read by one indexed query on (model_version_id,
+    event_id) and updated by one unordered bulk write. Actuals which arrive before
+    their prediction are kept as pending actuals, they are attached to the prediction
+    when it is logged or by the periodic `apply_pending` otherwise.
+    """
+
+    _INSTANCE: "ActualsLoggingService" = None
+
+    # fields of the stored rows needed to update their actuals and rollups
+    ROW_PROJECTION = {
+        "dataset_id": 1,
+        "model_id": 1,
+        "model_version_id": 1,
+        "event_id": 1,
+        "created_at": 1,
+        "prediction_cf": 1,
+        "actual_cf": 1,
+        "is_match": 1,
+    }
+
+    @classmethod
+    def get_instance(
+        cls,
+        model_version_service: ModelVersionService = Depends(
+            ModelVersionService.get_instance
+        ),
+        dataset_service: DatasetService = Depends(DatasetService.get_instance),
+        row_service: EventDatasetRowService = Depends(
+            EventDatasetRowService.get_instance
+        ),
+        pending_repository: PendingActualsRepository = Depends(
+            PendingActualsRepository.get_instance
+        ),
+        rollup_service: EventRollupService = Depends(EventRollupService.get_instance),
+    ):
+        if not cls._INSTANCE:
+            cls._INSTANCE = cls(
+                model_version_service=model_version_service,
+                dataset_service=dataset_service,
+                row_service=row_service,
+                pending_repository=pending_repository,
+                rollup_service=rollup_service
+                if settings.event_rollups_enabled
+                else None,
+            )
+        return cls._INSTANCE
 
-    def _convert_classification_actuals(
+    def __init__(
         self,
-        actuals: Dict[str, Union[str, float, int, bool]],
-        version_schema: ModelVersionSchemaInDB,
-        prediction_cf: List,
+        model_version_service: ModelVersionService,
+        dataset_service: DatasetService,
+        row_service: EventDatasetRowService,
+        pending_repository: PendingActualsRepository,
+        rollup_service: Optional[EventRollupService] = None,
     ):
-        """
-        Re-format actual columns to DB data format
-        actual_cf list gets created. It holds the actual column data.
-        The item of the list get inserted at the index number provided by the model schema.
-        The index number is the link between prediction value and the actual
-        value for multiclass multilabel classification
-
-        For example:
-        prediction_cf = ["yellow", "false"]
-        actual_cf = ["red", "false"]
-        Both the items in the 0th position represents 1st label.
-        Item in the 1st position represents 2nd label.
+        self._model_version_service = model_version_service
+        self._dataset_service = dataset_service
+        self._row_service = row_service
+        self._pending_repository = pending_repository
+        self._rollup_service = rollup_service
 
+    @staticmethod
+    def _row_update(
+        row: Dict, fields: Dict[str, Any], stored_columns: Optional[List[Dict]]
+    ) -> UpdateOne:
         """
-        converted_columns: List[EventDataColumnDB] = []
-        actual_cf: List = [None] * len(version_schema.predictions.keys())
+        Update setting the actuals of an event row. The replaced ACTUAL columns of a
+        COLUMN_LIST row are left out of its stored columns, which are set again
+        with the new ACTUAL columns in the same update
 
-        for actual_name, actual_data in actuals.items():
-            schema_details: ModelVersionSchemaFieldDetails = (
-                version_schema.predictions.get(actual_name)
-            )
-            converted_columns.append(
-                self._convert_event_column(
-                    actual_name, actual_data, schema_details, ColumnMappingType.ACTUAL
-                )
-            )
-            actual_cf[schema_details.list_index] = (
-                str(actual_data)
-                if schema_details.data_type == ColumnDataType.CATEGORICAL
-                else float(actual_data)
-            )
-
-        is_match = (
-            True
-            if functools.reduce(
-                lambda x, y: x and y,
-                map(lambda p, q: p == q, prediction_cf, actual_cf),
-                True,
+        Parameters
+        ----------
+        row:
+            stored row document
+        fields:
+            actual fields of the row
+        stored_columns:
+            stored columns of the row, only needed when the row has actuals already
+        """
+        fields = dict(fields)
+        columns = fields.pop("columns", None)
+        if columns is None:
+            return UpdateOne({"_id": row["_id"]}, {"$set": fields})
+        if row.get("actual_cf") is None:
+            return UpdateOne(
+                {"_id": row["_id"]},
+                {"$set": fields, "$push": {"columns": {"$each": columns}}},
             )
-            else False
+        kept = [
+            column
+            for column in stored_columns or []
+            if column.get("mapping_type") != ColumnMappingType.ACTUAL.value
+        ]
+        return UpdateOne(
+            {"_id": row["_id"]}, {"$set": {**fields, "columns": kept + columns}}
         )
-        return converted_columns, actual_cf, is_match
 
-    def _convert_classification_event(
-        self,
-        model_id: UUID,
-        model_version_id: UUID,
-        dataset_id: UUID,
-        event: ServiceLogEvent,
-        timestamp: datetime,
-        version_schema: ModelVersionSchemaInDB,
-    ) -> ServiceClassificationEventRow:
-        """ """
-        converted_features = self._convert_features(event.features, version_schema)
-        (
-            converted_predictions,
-            prediction_cf,
-            prediction_classes,
-        ) = self._convert_classification_predictions(event.predictions, version_schema)
-        converted_actuals, actual_cf, is_match = [], None, None
-
-        if event.actuals:
-            (
-                converted_actuals,
-                actual_cf,
-                is_match,
-            ) = self._convert_classification_actuals(
-                event.actuals, version_schema, prediction_cf
-            )
+    def _join(
+        self, model_version_id: UUID, actuals: Dict[str, Dict[str, Any]]
+    ) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+        """
+        Sets the actuals on the stored event rows of their event ids
 
-        return (
-            ServiceClassificationEventRow(
-                model_id=model_id,
-                model_version_id=model_version_id,
-                event_id=event.event_id if event.event_id else str(uuid.uuid4()),
-                row_id=uuid.uuid4(),
-                dataset_id=dataset_id,
-                columns=converted_features + converted_predictions + converted_actuals,
-                prediction_cf=prediction_cf,
-                actual_cf=actual_cf,
-                created_at=timestamp,
-                is_match=is_match,
-            ),
-            prediction_classes,
+        Returns
+        -------
+        matched event ids and the actuals of the event ids without a row
+        """
+        plan = self._model_version_service.find_schema_plan(
+            model_version_id=model_version_id
+        )
+        rows = self._row_service.find_by_event_ids(
+            model_version_id, actuals.keys(), projection=self.ROW_PROJECTION
         )
 
-    @staticmethod
-    def _event_timestamp(event: ServiceLogEvent, log_timestamp: datetime = None):
-        """
-        The timestamp hierarchy:
-            1. Time provided with each event gets the highest priority
-            2. Time provided with the event log gets next priority
-            3. If no time is provided, then current UTC time will be generated
-        """
-        if event.timestamp is not None:
-            timestamp = event.timestamp
-        elif log_timestamp is not None:
-            timestamp = log_timestamp
-        else:
-            timestamp = datetime.utcnow()
+        updates: List[Tuple[Dict, Dict]] = []
+        for row in rows:
+            fields = plan.actual_fields(actuals[row["event_id"]], row["prediction_cf"])
+            if fields["actual_cf"] != row.get("actual_cf"):
+                updates.append((row, fields))
+        matched = [row["event_id"] for row in rows]
+        matched_ids = set(matched)
+        unmatched = {
+            event_id: values
+            for event_id, values in actuals.items()
+            if event_id not in matched_ids
+        }
+        for values in unmatched.values():
+            # rejects invalid actuals before they are stored as pending
+            plan.actual_fields(values, [])
+
+        replaced = [
+            row["event_id"]
+            for row, fields in updates
+            if "columns" in fields and row.get("actual_cf") is not None
+        ]
+        stored_columns: Dict[Any, List[Dict]] = {}
+        if replaced:
+            for row in self._row_service.find_by_event_ids(
+                model_version_id, replaced, projection={"columns": 1}
+            ):
+                stored_columns[row["_id"]] = row.get("columns")
+        self._row_service.bulk_update(
+            [
+                self._row_update(row, fields, stored_columns.get(row["_id"]))
+                for row, fields in updates
+            ]
+        )
 
-        return timestamp
+        if updates:
+            self._dataset_service.record_ingested_rows([row for row, _ in updates])
+            if self._rollup_service is not None:
+                self._rollup_service.move_actuals(updates)
+        return matched, unmatched
 
     def log(
-        self,
-        model_version_id: UUID,
-        events: List[ServiceLogEvent],
-        log_timestamp: Optional[datetime] = None,
-    ) -> int:
-        model_version: BaseModelVersionDB = self._model_version_service.find_by_id(
-            model_version_id=model_version_id
-        )
+        self, model_version_id: UUID, actuals: List[ServiceLogActual]
+    ) -> Dict[str, int]:
+        """
+        Sets delayed actuals on the event rows of their predictions. A later actual
+        of the same event id replaces the earlier one.
 
-        event_dataset: DatasetDB = (
-            self._dataset_service.find_event_dataset_by_model_version_id(
+        Parameters
+        ----------
+        model_version_id:
+            Model Version ID of the predictions
+        actuals:
+            actuals with the event id of their prediction
+        Returns
+        -------
+        number of actuals joined to a row as "matched", and of actuals kept until
+        their prediction is logged as "pending"
+        """
+        by_event_id = {str(actual.event_id): actual.actuals for actual in actuals}
+        matched, unmatched = self._join(model_version_id, by_event_id)
+        # earlier pending actuals of the matched events would overwrite these
+        self._pending_repository.delete_many(model_version_id, matched)
+        if unmatched:
+            plan = self._model_version_service.find_schema_plan(
                 model_version_id=model_version_id
             )
-        )
-
-        events_row_db: List[ServiceClassificationEventRow] = []
-        classes = []
-        for event in events:
-            event_db, prediction_classes = self._convert_classification_event(
-                model_id=model_version.model_id,
-                model_version_id=model_version_id,
-                dataset_id=event_dataset.dataset_id,
-                event=event,
-                timestamp=self._event_timestamp(event, log_timestamp),
-                version_schema=model_version.version_schema,
+            self._pending_repository.upsert_many(
+                plan.model_id, model_version_id, unmatched
             )
-            for prediction_class in prediction_classes:
-                classes.append(prediction_class)
-            events_row_db.append(event_db)
+        return {"matched": len(matched), "pending": len(unmatched)}
 
-        self._model_service.update_prediction_classes(model_version.model_id, classes)
+    def apply_pending(self, batch_size: int = 10000) -> int:
+        """
+        Joins the pending actuals to the predictions which were persisted after
+        their actuals, e.g. through the ingestion queue
 
-        return self._row_service.insert_rows(rows=events_row_db)
+        Returns
+        -------
+        Number of joined pending actuals: int
+        """
+        joined = 0
+        for model_version_id in self._pending_repository.find_model_versions():
+            pending = self._pending_repository.find_by_model_version(
+                UUID(model_version_id), limit=batch_size
+            )
+            matched, _ = self._join(UUID(model_version_id), pending)
+            self._pending_repository.delete_many(UUID(model_version_id), matched)
+            joined += len(matched)
+        return joined
@@ -0,0 +1,238 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from waterdip.core.commons.models import DatasetType, TimeRange
+from waterdip.server.apis.models.metrics import DatasetMetricsResponse
+from waterdip.server.commons.config import MetricsCacheBackend, settings
+from waterdip.server.db.models.datasets import DatasetDB
+from waterdip.server.db.models.models import ModelVersionSchemaInDB
+
+METRICS_CACHE_KEY_PREFIX = "wd:metrics.dataset"
+
+
+def _isoformat(value: Optional[datetime]) -> str:
+    return value.isoformat() if value is not None else ""
+
+
+def schema_hash(version_schema: ModelVersionSchemaInDB) -> str:
+    """Stable hash of a model version schema"""
+    return hashlib.sha1(
+        version_schema.json(sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def dataset_metrics_key(
+    dataset: DatasetDB,
+    version_schema: ModelVersionSchemaInDB,
+    time_range: Optional[TimeRange] = None,
+) -> str:
+    """
+    Cache key of the metrics of a dataset.
+
+    The key holds the ingestion watermark of the dataset, so the cached metrics of a
+    dataset are not found anymore once new rows are ingested. Metrics of batch
+    datasets do not depend on the time range.
+    """
+    if dataset.dataset_type == DatasetType.BATCH or time_range is None:
+        start_time, end_time = "", ""
+    else:
+        start_time = _isoformat(time_range.start_time)
+        end_time = _isoformat(time_range.end_time)
+    return ":".join(
+        [
+            METRICS_CACHE_KEY_PREFIX,
+            str(dataset.dataset_id),
+            start_time,
+            end_time,
+            schema_hash(version_schema),
+            str(dataset.ingested_rows),
+        ]
+    )
+
+
+class MetricsCache(ABC):
+    """
+    Cache of computed dataset metrics with hit and miss counters.
+
+    Entries of event datasets expire after `ttl` seconds, as a safety net for rows
+    written without advancing the dataset watermark. Batch datasets are immutable
+    after logging, their entries never expire and only get evicted.
+
+    Attributes:
+    ------------------
+    ttl:
+        seconds an entry of an event dataset is kept
+    """
+
+    _INSTANCE: "MetricsCache" = None
+
+    backend: MetricsCacheBackend = MetricsCacheBackend.NONE
+
+    @classmethod
+    def get_instance(cls) -> Optional["MetricsCache"]:
+        """Configured metrics cache, None when caching is disabled"""
+        if cls._INSTANCE is None:
+            if settings.metrics_cache_backend == MetricsCacheBackend.MEMORY:
+                cls._INSTANCE = MemoryMetricsCache(
+                    max_size=settings.metrics_cache_size, ttl=settings.metrics_cache_ttl
+                )
+            elif settings.metrics_cache_backend == MetricsCacheBackend.REDIS:
+                cls._INSTANCE = RedisMetricsCache(
+                    url=settings.redis_url, ttl=settings.metrics_cache_ttl
+                )
+        return cls._INSTANCE
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self._hits = 0
+        self._misses = 0
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[DatasetMetricsResponse]:
+        pass
+
+    @abstractmethod
+    def _put(
+        self, key: str, metrics: DatasetMetricsResponse, ttl: Optional[int]
+    ) -> None:
+        pass
+
+    def _size(self) -> Optional[int]:
+        return None
+
+    def get(self, key: str) -> Optional[DatasetMetricsResponse]:
+        metrics = self._get(key)
+        if metrics is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return metrics
+
+    def put(
+        self,
+        key: str,
+        metrics: DatasetMetricsResponse,
+        dataset_type: DatasetType = DatasetType.EVENT,
+    ) -> None:
+        self._put(key, metrics, None if dataset_type == DatasetType.BATCH else self.ttl)
+
+    def stats(self) -> Dict:
+        lookups = self._hits + self._misses
+        return {
+            "backend": self.backend.value,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+            "size": self._size(),
+        }
+
+
+class MemoryMetricsCache(MetricsCache):
+    """
+    Process local LRU cache of dataset metrics
+
+    Attributes:
+    ------------------
+    max_size:
+        maximum number of entries kept, the least recently used one gets evicted first
+    """
+
+    backend = MetricsCacheBackend.MEMORY
+
+    def __init__(self, max_size: int = 256, ttl: int = 300):
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Optional[float], DatasetMetricsResponse]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[DatasetMetricsResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, metrics = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return metrics
+
+    def _put(
+        self, key: str, metrics: DatasetMetricsResponse, ttl: Optional[int]
+    ) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, metrics)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _size(self) -> Optional[int]:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisMetricsCache(MetricsCache):
+    """
+    Redis cache of dataset metrics shared by all the server processes.
+
+    Eviction is left to the redis `maxmemory-policy`. An unavailable redis never
+    fails a request, the metrics are then computed as if they were not cached.
+    """
+
+    backend = MetricsCacheBackend.REDIS
+
+    def __init__(self, url: str, ttl: int = 300, client=None):
+        super().__init__(ttl=ttl)
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._client = client
+
+    def _get(self, key: str) -> Optional[DatasetMetricsResponse]:
+        try:
+            payload = self._client.get(key)
+        except Exception as error:
+            logger.error("failed to read cached metrics [{0}]: {1}", key, error)
+            return None
+        if payload is None:
+            return None
+        return DatasetMetricsResponse.parse_raw(payload)
+
+    def _put(
+        self, key: str, metrics: DatasetMetricsResponse, ttl: Optional[int]
+    ) -> None:
+        try:
+            self._client.set(key, metrics.json(), ex=ttl)
+        except Exception as error:
+            logger.error("failed to cache metrics [{0}]: {1}", key, error)
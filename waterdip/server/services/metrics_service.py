@@ -12,40 +12,50 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 import json
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, List, Optional, Union
 from uuid import UUID
 
 from fastapi import Depends, HTTPException
+from pymongo import ReadPreference
+from pymongo.collection import Collection
 
 from waterdip.core.commons.models import (
     ColumnDataType,
     DatasetType,
     Histogram,
+    TimeGrain,
     TimeRange,
 )
+from waterdip.core.commons.time_ranges import grain_buckets
 from waterdip.core.metrics.classification_metrics import (
+    ClassificationClassMetrics,
     ClassificationDateHistogramDBMetrics,
 )
-from waterdip.core.metrics.data_metrics import (
-    CardinalityCategorical,
-    CategoricalCountHistogram,
-    CountEmptyHistogram,
-    NumericBasicMetrics,
-    NumericCountHistogram,
-)
+from waterdip.core.metrics.data_metrics import DatasetProfileMetric
+from waterdip.core.metrics.profiles import DatasetProfile
+from waterdip.core.metrics.rollups import DailyRollups
+from waterdip.core.metrics.streaming import StreamingDatasetProfile
 from waterdip.server.apis.models.metrics import (
     CategoricalColumnStats,
     DatasetMetricsResponse,
     NumericColumnStats,
 )
-from waterdip.server.commons.config import settings
-from waterdip.server.db.models.models import ModelVersionSchemaInDB
+from waterdip.server.commons.config import MetricsBackend, MetricsCacheBackend, settings
+from waterdip.server.db.models.datasets import DatasetDB
+from waterdip.server.db.models.models import ModelVersionDB, ModelVersionSchemaInDB
 from waterdip.server.db.repositories.dataset_row_repository import (
     BatchDatasetRowRepository,
     EventDatasetRowRepository,
 )
+from waterdip.server.db.repositories.profile_repository import DatasetProfileRepository
 from waterdip.server.services.dataset_service import DatasetService
+from waterdip.server.services.metrics_cache import MetricsCache, dataset_metrics_key
 from waterdip.server.services.model_service import ModelService, ModelVersionService
+from waterdip.server.services.rollup_service import EventRollupService
+
+# a week of minutes
+MAX_PERFORMANCE_BUCKETS = 7 * 24 * 60
 
 
 class DatasetMetricsService:
@@ -64,6 +74,11 @@ class DatasetMetricsService:
         model_version_service: ModelVersionService = Depends(
             ModelVersionService.get_instance
         ),
+        rollup_service: EventRollupService = Depends(EventRollupService.get_instance),
+        metrics_cache: Optional[MetricsCache] = Depends(MetricsCache.get_instance),
+        profile_repository: DatasetProfileRepository = Depends(
+            DatasetProfileRepository.get_instance
+        ),
     ):
         if not cls._INSTANCE:
             cls._INSTANCE = cls(
@@ -71,6 +86,15 @@ class DatasetMetricsService:
                 batch_repo=batch_repo,
                 dataset_service=dataset_service,
                 model_version_service=model_version_service,
+                rollup_service=rollup_service
+                if settings.event_rollups_enabled
+                else None,
+                metrics_cache=metrics_cache
+                if settings.metrics_cache_backend != MetricsCacheBackend.NONE
+                else None,
+                profile_repository=profile_repository
+                if settings.dataset_profiles_enabled
+                else None,
             )
         return cls._INSTANCE
 
@@ -80,47 +104,20 @@ class DatasetMetricsService:
         batch_repo: BatchDatasetRowRepository,
         dataset_service: DatasetService,
         model_version_service: ModelVersionService,
+        rollup_service: Optional[EventRollupService] = None,
+        metrics_cache: Optional[MetricsCache] = None,
+        profile_repository: Optional[DatasetProfileRepository] = None,
     ):
         self._event_repo = event_repo
         self._batch_repo = batch_repo
         self._dataset_service = dataset_service
         self._model_version_service = model_version_service
+        self._rollup_service = rollup_service
+        self._metrics_cache = metrics_cache
+        self._profile_repository = profile_repository
 
-    def numeric_basic_metrics(
-        self, dataset_id: UUID, dataset_type: DatasetType, time_range: TimeRange = None
-    ) -> Dict[str, Dict]:
-        if dataset_type == DatasetType.BATCH:
-            basic_metrics = NumericBasicMetrics(
-                collection=self._batch_repo.collection,
-                dataset_id=dataset_id,
-            )
-            columns = basic_metrics.aggregation_result(
-                std_dev_disable=settings.is_testing
-            )
-        else:
-            basic_metrics = NumericBasicMetrics(
-                collection=self._event_repo.collection, dataset_id=dataset_id
-            )
-            columns = basic_metrics.aggregation_result(
-                time_range=time_range, std_dev_disable=settings.is_testing
-            )
-
-        return columns
-
-    def empty_histogram(
-        self, dataset_id: UUID, dataset_type: DatasetType, time_range: TimeRange = None
-    ) -> Dict[str, Dict]:
-        if dataset_type == DatasetType.BATCH:
-            hist_empty = CountEmptyHistogram(
-                collection=self._batch_repo.collection, dataset_id=dataset_id
-            )
-            columns = hist_empty.aggregation_result()
-        else:
-            hist_empty = CountEmptyHistogram(
-                collection=self._event_repo.collection, dataset_id=dataset_id
-            )
-            columns = hist_empty.aggregation_result(time_range=time_range)
-
+    @staticmethod
+    def _missing_values(columns: Dict[str, Dict]) -> Dict[str, Dict]:
         column_empty_histogram: Dict[str, Dict] = {}
 
         for column_name, empty_value in columns.items():
@@ -130,73 +127,18 @@ class DatasetMetricsService:
             }
         return column_empty_histogram
 
-    def numeric_count_histogram(
-        self,
-        dataset_id: UUID,
-        dataset_type: DatasetType,
-        numeric_columns: list,
-        time_range: TimeRange = None,
-    ) -> Dict[str, Histogram]:
-        column_histograms: Dict[str, Histogram] = {}
-        if len(numeric_columns) > 0:
-            if dataset_type == DatasetType.BATCH:
-                hist_categorical = NumericCountHistogram(
-                    collection=self._batch_repo.collection, dataset_id=dataset_id
-                )
-                columns = hist_categorical.aggregation_result(
-                    numeric_columns=numeric_columns
-                )
-            else:
-                hist_categorical = NumericCountHistogram(
-                    collection=self._event_repo.collection, dataset_id=dataset_id
-                )
-                columns = hist_categorical.aggregation_result(
-                    time_range=time_range, numeric_columns=numeric_columns
-                )
-
-            for column_name, hist_value in columns.items():
-                column_histograms[column_name] = Histogram(
-                    bins=hist_value["bins"], val=hist_value["count"]
-                )
-        return column_histograms
-
-    def categorical_count_histogram(
-        self, dataset_id: UUID, dataset_type: DatasetType, time_range: TimeRange = None
-    ) -> Dict[str, Histogram]:
-        if dataset_type == DatasetType.BATCH:
-            hist_categorical = CategoricalCountHistogram(
-                collection=self._batch_repo.collection, dataset_id=dataset_id
-            )
-            columns = hist_categorical.aggregation_result()
-        else:
-            hist_categorical = CategoricalCountHistogram(
-                collection=self._event_repo.collection, dataset_id=dataset_id
-            )
-            columns = hist_categorical.aggregation_result(time_range=time_range)
-
+    @staticmethod
+    def _histograms(columns: Dict[str, Dict]) -> Dict[str, Histogram]:
         column_histograms: Dict[str, Histogram] = {}
 
         for column_name, hist_value in columns.items():
             column_histograms[column_name] = Histogram(
                 bins=hist_value["bins"], val=hist_value["count"]
             )
-
         return column_histograms
 
-    def categorical_cardinality(
-        self, dataset_id: UUID, dataset_type: DatasetType, time_range: TimeRange = None
-    ) -> Dict[str, Dict]:
-        if dataset_type == DatasetType.BATCH:
-            cardinality = CardinalityCategorical(
-                collection=self._batch_repo.collection, dataset_id=dataset_id
-            )
-            columns = cardinality.aggregation_result()
-        else:
-            cardinality = CardinalityCategorical(
-                collection=self._event_repo.collection, dataset_id=dataset_id
-            )
-            columns = cardinality.aggregation_result(time_range=time_range)
-
+    @staticmethod
+    def _cardinality(columns: Dict[str, Dict]) -> Dict[str, Dict]:
         column_cardinality: Dict[str, Dict] = {}
 
         for column_name, cardinal_values in columns.items():
@@ -206,6 +148,56 @@ class DatasetMetricsService:
             }
         return column_cardinality
 
+    @staticmethod
+    def _profile_metric(collection: Collection, **kwargs) -> DatasetProfileMetric:
+        """Dataset profile metric of the configured metrics backend"""
+        if settings.metrics_backend == MetricsBackend.STREAM:
+            # streamed scans can be served by a secondary to spare the primary
+            return StreamingDatasetProfile(
+                collection=collection.with_options(
+                    read_preference=ReadPreference.SECONDARY_PREFERRED
+                ),
+                batch_size=settings.metrics_stream_batch_size,
+                **kwargs,
+            )
+        return DatasetProfileMetric(collection=collection, **kwargs)
+
+    def dataset_profile(
+        self,
+        dataset_id: UUID,
+        dataset_type: DatasetType,
+        numeric_columns: list,
+        time_range: TimeRange = None,
+        column_map: Optional[Dict] = None,
+        rollups: Optional[Union[DailyRollups, DatasetProfile]] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Results of the categorical and numeric histograms, empty histogram,
+        cardinality and numeric basic metrics by metric name, with one aggregation
+        """
+        if dataset_type == DatasetType.BATCH:
+            profile = self._profile_metric(
+                collection=self._batch_repo.collection,
+                dataset_id=dataset_id,
+                column_map=column_map,
+                rollups=rollups,
+            )
+            return profile.aggregation_result(
+                numeric_columns=numeric_columns, std_dev_disable=settings.is_testing
+            )
+
+        profile = self._profile_metric(
+            collection=self._event_repo.collection,
+            dataset_id=dataset_id,
+            column_map=column_map,
+            rollups=rollups,
+        )
+        return profile.aggregation_result(
+            numeric_columns=numeric_columns,
+            time_range=time_range,
+            std_dev_disable=settings.is_testing,
+        )
+
     @staticmethod
     def _get_all_columns(version_schema: ModelVersionSchemaInDB):
         columns = {"CATEGORICAL": {}, "NUMERIC": {}}
@@ -235,20 +227,61 @@ class DatasetMetricsService:
             model_version_id=model_version_id
         )
 
+        if self._metrics_cache is None:
+            return self._combined_metrics(dataset, model_version, time_range)
+
+        key = dataset_metrics_key(dataset, model_version.version_schema, time_range)
+        metrics = self._metrics_cache.get(key)
+        if metrics is None:
+            metrics = self._combined_metrics(dataset, model_version, time_range)
+            self._metrics_cache.put(key, metrics, dataset_type=dataset.dataset_type)
+        return metrics
+
+    def _dataset_rollups(
+        self, dataset: DatasetDB, column_map: Optional[Dict] = None
+    ) -> Optional[Union[DailyRollups, DatasetProfile]]:
+        """
+        Precomputed statistics of a dataset, the stored profile of a batch dataset or
+        the daily rollups of an event dataset
+        """
+        if dataset.dataset_type == DatasetType.BATCH:
+            if self._profile_repository is None:
+                return None
+            return DatasetProfile(
+                collection=self._profile_repository.collection,
+                dataset_id=dataset.dataset_id,
+                column_map=column_map,
+            )
+        if self._rollup_service is None:
+            return None
+        return self._rollup_service.daily_rollups(dataset, column_map)
+
+    def _combined_metrics(
+        self,
+        dataset: DatasetDB,
+        model_version: ModelVersionDB,
+        time_range: TimeRange,
+    ) -> DatasetMetricsResponse:
+        dataset_id = dataset.dataset_id
         columns = self._get_all_columns(version_schema=model_version.version_schema)
+        column_map = model_version.column_map()
         params = {
             "dataset_id": dataset_id,
             "time_range": time_range,
             "dataset_type": dataset.dataset_type,
+            "column_map": column_map,
+            "rollups": self._dataset_rollups(dataset, column_map),
         }
-        categorical_count_histogram = self.categorical_count_histogram(**params)
-        numeric_count_histogram = self.numeric_count_histogram(
-            **{**params, "numeric_columns": columns["NUMERIC"].keys()}
+        profile = self.dataset_profile(
+            **params, numeric_columns=columns["NUMERIC"].keys()
         )
-
-        empty_histogram = self.empty_histogram(**params)
-        categorical_cardinality = self.categorical_cardinality(**params)
-        numeric_basic_metrics = self.numeric_basic_metrics(**params)
+        categorical_count_histogram = self._histograms(
+            profile["categorical_count_hist"]
+        )
+        numeric_count_histogram = self._histograms(profile["numeric_count_hist"])
+        empty_histogram = self._missing_values(profile["count_empty_hist"])
+        categorical_cardinality = self._cardinality(profile["categorical_cardinality"])
+        numeric_basic_metrics = profile["numeric_basic"]
 
         cat_columns_stats: List[CategoricalColumnStats] = []
         numeric_columns_stats: List[NumericColumnStats] = []
@@ -304,12 +337,20 @@ class ClassificationPerformance:
         ),
         dataset_service: DatasetService = Depends(DatasetService.get_instance),
         model_service: ModelService = Depends(ModelService.get_instance),
+        model_version_service: ModelVersionService = Depends(
+            ModelVersionService.get_instance
+        ),
+        rollup_service: EventRollupService = Depends(EventRollupService.get_instance),
     ):
         if not cls._INSTANCE:
             cls._INSTANCE = cls(
                 event_repo=event_repo,
                 dataset_service=dataset_service,
                 model_service=model_service,
+                model_version_service=model_version_service,
+                rollup_service=rollup_service
+                if settings.event_rollups_enabled
+                else None,
             )
         return cls._INSTANCE
 
@@ -318,17 +359,39 @@ class ClassificationPerformance:
         event_repo: EventDatasetRowRepository,
         dataset_service: DatasetService,
         model_service: ModelService,
+        model_version_service: ModelVersionService,
+        rollup_service: Optional[EventRollupService] = None,
     ):
         self._event_repo = event_repo
         self._dataset_service = dataset_service
         self._model_service = model_service
+        self._model_version_service = model_version_service
+        self._rollup_service = rollup_service
+
+    @staticmethod
+    def _bucket_label(bucket: datetime, granularity: TimeGrain) -> str:
+        if granularity in (TimeGrain.MINUTE, TimeGrain.HOUR):
+            return bucket.strftime("%d-%m-%Y %H:%M")
+        return bucket.strftime("%d-%m-%Y")
 
     def model_performance(
-        self, model_id: UUID, model_version_id: UUID, time_range: TimeRange
+        self,
+        model_id: UUID,
+        model_version_id: UUID,
+        time_range: TimeRange,
+        granularity: TimeGrain = TimeGrain.DAY,
     ):
-        dataset_id = self._dataset_service.find_event_dataset_by_model_version_id(
+        buckets = len(grain_buckets(time_range, granularity))
+        if buckets > MAX_PERFORMANCE_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Time range has {buckets} {granularity.value} buckets, "
+                f"at most {MAX_PERFORMANCE_BUCKETS} are allowed",
+            )
+        dataset = self._dataset_service.find_event_dataset_by_model_version_id(
             model_version_id
-        ).dataset_id
+        )
+        dataset_id = dataset.dataset_id
         positive_class = self._model_service.find_by_id(model_id).positive_class
         if positive_class is None:
             raise HTTPException(
@@ -339,24 +402,41 @@ class ClassificationPerformance:
             self._event_repo.collection,
             dataset_id=dataset_id,
             positive_class=positive_class["name"],
+            rollups=self._rollup_service.daily_rollups(dataset)
+            if self._rollup_service is not None
+            else None,
+            granularity=granularity,
         )
 
         result = hist.aggregation_result(time_range=time_range)
-        response = {}
-        for key, value in result.items():
-            response[key] = []
-            for date in value:
-                response[key].append({date: value[date]})
-            response[key].sort(key=lambda x: list(x.keys())[0])
-
-        output = {}
-        for key, value in response.items():
-            output[key] = {
-                "date": [],
-                "value": [],
-            }
-            for date in value:
-                output[key]["date"].append(list(date.keys())[0])
-                output[key]["value"].append(list(date.values())[0])
+        dates = [
+            self._bucket_label(bucket, granularity) for bucket in result["buckets"]
+        ]
+        return {
+            key: {"date": dates, "value": values}
+            for key, values in result.items()
+            if key != "buckets"
+        }
 
-        return output
+    def class_performance(
+        self, model_id: UUID, model_version_id: UUID, time_range: TimeRange
+    ) -> Dict:
+        """
+        Per class precision, recall and f1 of every prediction position, covering all
+        the known prediction classes of the model. The known classes are converted by
+        the prediction columns of the model version schema, as in prediction_cf
+        """
+        dataset = self._dataset_service.find_event_dataset_by_model_version_id(
+            model_version_id
+        )
+        prediction_classes = (
+            self._model_service.find_by_id(model_id).prediction_classes or []
+        )
+        plan = self._model_version_service.find_schema_plan(model_version_id)
+        metrics = ClassificationClassMetrics(
+            self._event_repo.collection, dataset_id=dataset.dataset_id
+        )
+        return metrics.aggregation_result(
+            time_range=time_range,
+            position_classes=plan.class_keys(prediction_classes),
+        )
@@ -0,0 +1,149 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+from typing import Dict, Optional
+from uuid import UUID
+
+from fastapi import Depends
+from loguru import logger
+
+from waterdip.core.commons.models import RowStorageFormat
+from waterdip.server.commons.config import settings
+from waterdip.server.db.models.models import ModelVersionDB
+from waterdip.server.db.repositories.dataset_row_repository import (
+    BatchDatasetRowRepository,
+    EventDatasetRowRepository,
+)
+from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+from waterdip.server.errors.base_errors import EntityNotFoundError
+
+
+class RowStorageMigrationService:
+    """
+    Migrates the stored rows of a model version from the COLUMN_LIST storage format
+    to the COLUMN_MAP storage format.
+
+    The model version is switched to COLUMN_MAP first, then the existing event and
+    batch rows are rewritten in batches. Running servers re-check the storage format
+    of their cached schema plans every WD_SCHEMA_PLAN_REFRESH_SECONDS, so they write
+    COLUMN_MAP rows at the latest that long after the switch is stored. The rows
+    written meanwhile are converted by a final pass, which waits for the refresh.
+
+    Attributes:
+    ------------------
+    plan_refresh_seconds:
+        seconds waited after the switch before the final pass, the schema plan
+        refresh interval of the servers by default
+    """
+
+    _INSTANCE: "RowStorageMigrationService" = None
+
+    @classmethod
+    def get_instance(
+        cls,
+        model_version_repository: ModelVersionRepository = Depends(
+            ModelVersionRepository.get_instance
+        ),
+        event_row_repository: EventDatasetRowRepository = Depends(
+            EventDatasetRowRepository.get_instance
+        ),
+        batch_row_repository: BatchDatasetRowRepository = Depends(
+            BatchDatasetRowRepository.get_instance
+        ),
+    ):
+        if not cls._INSTANCE:
+            cls._INSTANCE = cls(
+                model_version_repository=model_version_repository,
+                event_row_repository=event_row_repository,
+                batch_row_repository=batch_row_repository,
+            )
+        return cls._INSTANCE
+
+    def __init__(
+        self,
+        model_version_repository: ModelVersionRepository,
+        event_row_repository: EventDatasetRowRepository,
+        batch_row_repository: BatchDatasetRowRepository,
+        plan_refresh_seconds: Optional[float] = None,
+    ):
+        self._model_version_repository = model_version_repository
+        self._event_row_repository = event_row_repository
+        self._batch_row_repository = batch_row_repository
+        self.plan_refresh_seconds = (
+            settings.schema_plan_refresh_seconds
+            if plan_refresh_seconds is None
+            else plan_refresh_seconds
+        )
+
+    @staticmethod
+    def _validate_column_names(model_version: ModelVersionDB) -> None:
+        schema = model_version.version_schema
+        for name in [*schema.features, *schema.predictions]:
+            if "." in name or name.startswith("$"):
+                raise ValueError(
+                    f"Column [{name}] can not be stored in the "
+                    f"{RowStorageFormat.COLUMN_MAP.value} format, "
+                    "column names can not contain '.' or start with '$'"
+                )
+
+    def migrate_to_column_map(
+        self, model_version_id: UUID, batch_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Migrates the rows of the model version to the COLUMN_MAP storage format
+
+        Parameters
+        ----------
+        model_version_id:
+            Model Version ID
+        batch_size:
+            number of rows rewritten per bulk write
+        Returns
+        -------
+        number of converted event rows and batch rows
+        """
+        model_version = self._model_version_repository.find_by_id(model_version_id)
+        if not model_version:
+            raise EntityNotFoundError(name=str(model_version_id), type="Model Version")
+        self._validate_column_names(model_version)
+
+        if model_version.storage_format != RowStorageFormat.COLUMN_MAP:
+            self._model_version_repository.update_storage_format(
+                model_version_id, RowStorageFormat.COLUMN_MAP
+            )
+        switched_at = time.monotonic()
+
+        repositories = {
+            "event_rows": self._event_row_repository,
+            "batch_rows": self._batch_row_repository,
+        }
+        converted = {rows: 0 for rows in repositories}
+        for final_pass in (False, True):
+            if final_pass:
+                # servers may write COLUMN_LIST rows until their plans are refreshed
+                time.sleep(
+                    max(0.0, switched_at + self.plan_refresh_seconds - time.monotonic())
+                )
+            for rows, repository in repositories.items():
+                converted[rows] += repository.convert_rows_to_column_map(
+                    model_version_id, batch_size=batch_size
+                )
+        logger.info(
+            "model version [{0}] migrated to {1}, converted rows {2}",
+            model_version_id,
+            RowStorageFormat.COLUMN_MAP.value,
+            converted,
+        )
+        return converted
@@ -12,12 +12,14 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import threading
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional, Union
 
-from waterdip.core.commons.models import Environment, TimeRange
+from waterdip.core.commons.models import Environment, RowStorageFormat, TimeRange
 from waterdip.server.apis.models.params import RequestPagination, RequestSort
+from waterdip.server.commons.config import settings
 from waterdip.server.db.models.datasets import DatasetDB
 
 try:
@@ -58,6 +60,7 @@ from waterdip.server.services.row_service import (
     BatchDatasetRowService,
     EventDatasetRowService,
 )
+from waterdip.server.services.schema_plan import SchemaPlan, SchemaPlanCache
 
 
 class ModelVersionService:
@@ -81,6 +84,10 @@ class ModelVersionService:
     ):
         self._repository = repository
         self._dataset_service = dataset_service
+        self._plan_cache = SchemaPlanCache(
+            max_size=settings.schema_plan_cache_size,
+            refresh_seconds=settings.schema_plan_refresh_seconds,
+        )
 
     def find_by_id(self, model_version_id: uuid.UUID) -> Optional[ModelVersionDB]:
         found_model_version = self._repository.find_by_id(
@@ -93,6 +100,54 @@ class ModelVersionService:
 
         return found_model_version
 
+    def find_schema_plan(
+        self, model_version_id: uuid.UUID, with_event_dataset: bool = False
+    ) -> SchemaPlan:
+        """
+        Returns the compiled schema plan of the model version.
+        The plan is compiled on the first call and then served from the process local
+        cache, so repeated logging for the same model version does not read the
+        model version or the event dataset from DB. Once every
+        WD_SCHEMA_PLAN_REFRESH_SECONDS a cache hit reads the storage format of the
+        model version, a plan compiled for another storage format or for a deleted
+        model version is dropped.
+
+        Parameters:
+            model_version_id(UUID): model version unique ID
+            with_event_dataset(bool): resolves the event dataset ID of the plan as well
+
+        Returns:
+            SchemaPlan: compiled schema plan of the model version
+        """
+        plan = self._plan_cache.get(model_version_id)
+        if (
+            plan is not None
+            and self._plan_cache.claim_refresh(model_version_id)
+            and plan.storage_format
+            != self._repository.find_storage_format(model_version_id)
+        ):
+            self._plan_cache.invalidate(model_version_id)
+            plan = None
+        if plan is None:
+            model_version = self.find_by_id(model_version_id=model_version_id)
+            plan = SchemaPlan.compile(
+                model_version.version_schema,
+                model_id=model_version.model_id,
+                model_version_id=model_version.model_version_id,
+                storage_format=model_version.storage_format,
+            )
+            self._plan_cache.put(model_version_id, plan)
+
+        if with_event_dataset and plan.event_dataset_id is None:
+            event_dataset = (
+                self._dataset_service.find_event_dataset_by_model_version_id(
+                    model_version_id=model_version_id
+                )
+            )
+            plan.event_dataset_id = event_dataset.dataset_id
+
+        return plan
+
     def get_all_datasets(self, model_version_id: uuid.UUID) -> List[DatasetDB]:
         list_dataset: tuple[List[DatasetDB], int] = self._dataset_service.list_dataset(
             model_version_id=model_version_id
@@ -130,6 +185,7 @@ class ModelVersionService:
         model_id: uuid.UUID,
         model_version: str,
         version_schema: ModelVersionSchema,
+        storage_format: RowStorageFormat = RowStorageFormat.COLUMN_LIST,
     ) -> ModelVersionDB:
         model_version_id, serving_dataset_id = uuid.uuid4(), uuid.uuid4()
 
@@ -152,6 +208,7 @@ class ModelVersionService:
                 predictions=self._schema_conversion(
                     version_schema, "predictions"),
             ),
+            storage_format=storage_format,
         )
         model_version = self._repository.register_model_version(
             model_version_db)
@@ -161,6 +218,7 @@ class ModelVersionService:
 
     def delete_versions_by_model_id(self, model_id: uuid.UUID) -> None:
         self._repository.delete_versions_by_model_id(str(model_id))
+        self._plan_cache.invalidate_model(model_id)
 
     def agg_model_versions_per_model(
         self, model_ids: List[str]
@@ -233,6 +291,9 @@ class ModelService:
         self._batch_dataset_row_service = batch_dataset_row_service
         self._dataset_service = dataset_service
         self._monitor_repo = monitor_repo
+        # process local cache of the prediction classes already stored per model
+        self._known_prediction_classes: Dict[str, set] = {}
+        self._known_prediction_classes_lock = threading.Lock()
 
     def register_model(
         self, model_name: str, model_id: Optional[UUID] = None
@@ -390,6 +451,8 @@ class ModelService:
         self._alert_service.delete_alerts_by_model_id(model_id)
         self._model_version_service.delete_versions_by_model_id(model_id)
         self._repository.delete_model(model_id)
+        with self._known_prediction_classes_lock:
+            self._known_prediction_classes.pop(str(model_id), None)
 
     def update_model(
         self,
@@ -407,20 +470,33 @@ class ModelService:
         )
         return updated_model
 
-    def update_prediction_classes(self, model_id: UUID, prediction_classes: List):
-        if prediction_classes is []:
-            return
-
-        model = self._repository.find_by_id(model_id)
-        previous_prediction_classes = model.prediction_classes
-        if previous_prediction_classes is not None:
-            prediction_classes.extend(previous_prediction_classes)
+    def update_prediction_classes(
+        self, model_id: UUID, prediction_classes: List
+    ) -> List:
+        """
+        Adds the logged prediction classes to the model.
+        Classes are de-duplicated within the batch, and classes this process already
+        stored are skipped, so the DB is only written when a new class shows up.
 
-        prediction_classes = list(set(prediction_classes))
-        updates = {
-            "prediction_classes": prediction_classes,
-        }
-        updated_model = self._repository.update_model(
-            model_id=model_id, updates=updates
+        Returns:
+            List: newly stored prediction classes
+        """
+        batch_classes = list(dict.fromkeys(prediction_classes))
+        with self._known_prediction_classes_lock:
+            known_classes = self._known_prediction_classes.setdefault(
+                str(model_id), set()
+            )
+            new_classes = [
+                prediction_class
+                for prediction_class in batch_classes
+                if prediction_class not in known_classes
+            ]
+        if not new_classes:
+            return []
+
+        self._repository.add_prediction_classes(
+            model_id=model_id, prediction_classes=new_classes
         )
-        return updated_model
+        with self._known_prediction_classes_lock:
+            known_classes.update(new_classes)
+        return new_classes
@@ -0,0 +1,324 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Depends
+from loguru import logger
+
+from waterdip.core.commons.models import DatasetType
+from waterdip.core.metrics.rollups import (
+    ONE_DAY,
+    DailyRollups,
+    DailyStats,
+    day_floor,
+    raw_daily_stats,
+)
+from waterdip.server.commons.config import settings
+from waterdip.server.db.models.datasets import DatasetDB
+from waterdip.server.db.repositories.dataset_repository import DatasetRepository
+from waterdip.server.db.repositories.dataset_row_repository import (
+    EventDatasetRowRepository,
+)
+from waterdip.server.db.repositories.model_repository import ModelVersionRepository
+from waterdip.server.db.repositories.rollup_repository import EventRollupRepository
+from waterdip.server.errors.base_errors import EntityNotFoundError
+
+
+class EventRollupService:
+    """
+    Maintains the daily rollups of the event datasets.
+
+    Rollups are incremented with every persisted batch of event rows. The first
+    increment of a dataset marks the rollups complete from the next day on, as the
+    current day already has rows which were never rolled up. A rebuild recomputes the
+    past days of a dataset from its raw rows, after which the rollups are complete
+    from the first day of the dataset.
+
+    Attributes:
+    ------------------
+    rebuild_chunk_days:
+        number of days recomputed by one aggregation of a rebuild
+    """
+
+    _INSTANCE: "EventRollupService" = None
+
+    @classmethod
+    def get_instance(
+        cls,
+        repository: EventRollupRepository = Depends(EventRollupRepository.get_instance),
+        dataset_repository: DatasetRepository = Depends(DatasetRepository.get_instance),
+        model_version_repository: ModelVersionRepository = Depends(
+            ModelVersionRepository.get_instance
+        ),
+        row_repository: EventDatasetRowRepository = Depends(
+            EventDatasetRowRepository.get_instance
+        ),
+    ):
+        if not cls._INSTANCE:
+            cls._INSTANCE = cls(
+                repository=repository,
+                dataset_repository=dataset_repository,
+                model_version_repository=model_version_repository,
+                row_repository=row_repository,
+            )
+        return cls._INSTANCE
+
+    def __init__(
+        self,
+        repository: EventRollupRepository,
+        dataset_repository: DatasetRepository,
+        model_version_repository: ModelVersionRepository,
+        row_repository: EventDatasetRowRepository,
+        rebuild_chunk_days: int = 7,
+    ):
+        self._repository = repository
+        self._dataset_repository = dataset_repository
+        self._model_version_repository = model_version_repository
+        self._row_repository = row_repository
+        self.rebuild_chunk_days = rebuild_chunk_days
+        # process local caches of the column maps per model version and of the
+        # datasets which rollup_from is already set
+        self._column_maps: Dict[str, Optional[Dict]] = {}
+        self._tracked_datasets: set = set()
+        self._lock = threading.Lock()
+
+    def _column_map(self, model_version_id: str) -> Optional[Dict]:
+        with self._lock:
+            if model_version_id in self._column_maps:
+                return self._column_maps[model_version_id]
+        model_version = self._model_version_repository.find_by_id(
+            UUID(model_version_id)
+        )
+        if not model_version:
+            raise EntityNotFoundError(name=model_version_id, type="Model Version")
+        column_map = model_version.column_map()
+        with self._lock:
+            self._column_maps[model_version_id] = column_map
+        return column_map
+
+    def increment(self, documents: List[Dict]) -> None:
+        """
+        Adds persisted event row documents to the daily rollups of their datasets
+        """
+        datasets: Dict[Tuple[str, str, str], List[Dict]] = {}
+        for document in documents:
+            key = (
+                str(document["dataset_id"]),
+                str(document["model_id"]),
+                str(document["model_version_id"]),
+            )
+            datasets.setdefault(key, []).append(document)
+
+        for (dataset_id, model_id, model_version_id), rows in datasets.items():
+            daily_stats = DailyStats(column_map=self._column_map(model_version_id))
+            for row in rows:
+                daily_stats.add_document(row)
+            self._increment(dataset_id, model_id, model_version_id, daily_stats)
+            self._track(dataset_id)
+
+    def move_actuals(self, updates: List[Tuple[Dict, Dict]]) -> None:
+        """
+        Moves rolled up event rows to delayed actuals
+
+        Parameters
+        ----------
+        updates:
+            (stored row document, new actual fields) of every updated row. The row
+            document has the created_at, prediction_cf, actual_cf and is_match of the
+            row before the update
+        """
+        datasets: Dict[Tuple[str, str, str], List[Tuple[Dict, Dict]]] = {}
+        for row, fields in updates:
+            key = (
+                str(row["dataset_id"]),
+                str(row["model_id"]),
+                str(row["model_version_id"]),
+            )
+            datasets.setdefault(key, []).append((row, fields))
+
+        for (dataset_id, model_id, model_version_id), rows in datasets.items():
+            daily_stats = DailyStats(column_map=self._column_map(model_version_id))
+            replaced_columns = False
+            for row, fields in rows:
+                replaced = row.get("actual_cf") is not None
+                replaced_columns = replaced_columns or (
+                    replaced and "columns" in fields
+                )
+                daily_stats.move_actuals(
+                    row,
+                    actual_cf=fields["actual_cf"],
+                    is_match=fields["is_match"],
+                    columns=None if replaced else fields.get("columns"),
+                )
+            self._increment(dataset_id, model_id, model_version_id, daily_stats)
+            if replaced_columns:
+                self._invalidate(dataset_id)
+
+    def _increment(
+        self,
+        dataset_id: str,
+        model_id: str,
+        model_version_id: str,
+        daily_stats: DailyStats,
+    ) -> None:
+        """
+        Adds daily statistics to the rollups of a dataset. Increments of past days are
+        counted on the dataset, a rebuild running meanwhile could overwrite them. When
+        the increment fails, the rollups are read from the rows until the next rebuild
+        """
+        today = day_floor(datetime.utcnow())
+        try:
+            if any(day < today for day in daily_stats.rows):
+                self._dataset_repository.increment_rollup_late_writes(UUID(dataset_id))
+            self._repository.increment(
+                dataset_id=dataset_id,
+                model_id=model_id,
+                model_version_id=model_version_id,
+                daily_stats=daily_stats,
+            )
+        except Exception:
+            self._invalidate(dataset_id)
+            raise
+
+    def _invalidate(self, dataset_id: str) -> None:
+        """
+        Reads the past days of the dataset from the raw rows until the next rebuild,
+        for rollups which can not be adjusted incrementally
+        """
+        with self._lock:
+            self._tracked_datasets.add(dataset_id)
+        self._dataset_repository.update_rollup_from(
+            UUID(dataset_id), day_floor(datetime.utcnow()) + ONE_DAY
+        )
+        logger.info(
+            "rollups of dataset [{0}] are read from the rows until the next rebuild",
+            dataset_id,
+        )
+
+    def _track(self, dataset_id: str) -> None:
+        with self._lock:
+            if dataset_id in self._tracked_datasets:
+                return
+            self._tracked_datasets.add(dataset_id)
+        self._dataset_repository.update_rollup_from(
+            UUID(dataset_id),
+            day_floor(datetime.utcnow()) + ONE_DAY,
+            only_if_unset=True,
+        )
+
+    def _find_dataset(self, dataset_id: UUID) -> DatasetDB:
+        datasets = self._dataset_repository.find_datasets(
+            filters={"dataset_id": str(dataset_id)}
+        )
+        if not datasets:
+            raise EntityNotFoundError(name=str(dataset_id), type="Dataset")
+        return datasets[0]
+
+    def rebuild(self, dataset_id: UUID) -> int:
+        """
+        Recomputes the rollups of the days before the current day from the raw rows.
+        A past day incremented while the rebuild runs can be overwritten with rows
+        read before the increment, the rollups are then left incomplete for the next
+        rebuild
+
+        Returns
+        -------
+        Number of stored rollup documents: int
+        """
+        dataset = self._find_dataset(dataset_id)
+        column_map = self._column_map(str(dataset.model_version_id))
+        end_day = day_floor(datetime.utcnow())
+        first_row = self._row_repository.collection.find_one(
+            {"dataset_id": str(dataset_id)}, sort=[("created_at", 1)]
+        )
+        first_day = day_floor(first_row["created_at"]) if first_row else end_day
+
+        stored = 0
+        chunk_start, chunk_size = first_day, timedelta(days=self.rebuild_chunk_days)
+        while chunk_start < end_day:
+            chunk_end = min(chunk_start + chunk_size, end_day)
+            daily_stats = raw_daily_stats(
+                self._row_repository.collection,
+                dataset_id,
+                time_filter={"created_at": {"$gte": chunk_start, "$lt": chunk_end}},
+                column_map=column_map,
+            )
+            stored += self._repository.replace_days(
+                dataset_id=dataset_id,
+                model_id=dataset.model_id,
+                model_version_id=dataset.model_version_id,
+                daily_stats=daily_stats,
+                # rollups older than the first row belong to deleted rows
+                first_day=datetime.min if chunk_start == first_day else chunk_start,
+                end_day=chunk_end,
+            )
+            chunk_start = chunk_end
+
+        if dataset.rollup_from is None:
+            # rows of the current day are not rolled up yet, increments take over
+            # from the next day on
+            self._dataset_repository.update_rollup_from(
+                dataset_id, end_day + ONE_DAY, only_if_unset=True
+            )
+        elif dataset.rollup_from <= end_day:
+            if not self._dataset_repository.update_rollup_from(
+                dataset_id, first_day, late_writes=dataset.rollup_late_writes
+            ):
+                self._invalidate(str(dataset_id))
+
+        logger.info(
+            "rebuilt {0} rollup documents of dataset [{1}] until {2}",
+            stored,
+            dataset_id,
+            end_day,
+        )
+        return stored
+
+    def pending_datasets(self) -> List[DatasetDB]:
+        """Event datasets which rollups are not complete up to the current day"""
+        return self._dataset_repository.find_datasets(
+            filters={
+                "dataset_type": DatasetType.EVENT.value,
+                "$or": [
+                    {"rollup_from": None},
+                    {"rollup_from": {"$gte": day_floor(datetime.utcnow())}},
+                ],
+            },
+            limit=0,
+        )
+
+    def daily_rollups(
+        self, dataset: DatasetDB, column_map: Optional[Dict] = None
+    ) -> Optional[DailyRollups]:
+        """
+        Rollups reader of an event dataset, None when rollups are disabled or not
+        available for the dataset yet
+        """
+        if (
+            not settings.event_rollups_enabled
+            or dataset.dataset_type != DatasetType.EVENT
+            or dataset.rollup_from is None
+        ):
+            return None
+        return DailyRollups(
+            collection=self._repository.collection,
+            rows_collection=self._row_repository.collection,
+            dataset_id=dataset.dataset_id,
+            rollup_from=dataset.rollup_from,
+            column_map=column_map,
+        )
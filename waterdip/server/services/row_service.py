@@ -13,10 +13,11 @@
 #  limitations under the License.
 
 from datetime import date, datetime, timedelta
-from typing import Dict, List, Union
+from typing import Dict, Iterable, List, Optional, Union
 from uuid import UUID
 
 from fastapi import Depends
+from pymongo import UpdateOne
 
 from waterdip.server.apis.models.models import DateHistogram, ModelOverviewPredictions
 from waterdip.server.db.models.dataset_rows import (
@@ -57,6 +58,18 @@ class BatchDatasetRowService:
         inserted_rows = self._repository.insert_rows(rows)
         return len(inserted_rows)
 
+    def insert_documents(self, documents: List[Dict]) -> int:
+        if not documents:
+            return 0
+        inserted_rows = self._repository.insert_documents(documents)
+        return len(inserted_rows)
+
+    def delete_upload_chunk(self, dataset_id: UUID, chunk: int) -> int:
+        return self._repository.delete_upload_chunk(dataset_id, chunk)
+
+    def delete_rows_by_dataset_id(self, dataset_id: UUID) -> int:
+        return self._repository.delete_rows_by_dataset_id(dataset_id)
+
     def delete_rows_by_model_id(self, model_id: UUID) -> int:
         self._repository.delete_rows_by_model_id(str(model_id))
 
@@ -93,6 +106,25 @@ class EventDatasetRowService:
         inserted_rows = self._repository.insert_rows(rows)
         return len(inserted_rows)
 
+    def insert_documents(self, documents: List[Dict], ordered: bool = True) -> int:
+        if not documents:
+            return 0
+        inserted_rows = self._repository.insert_documents(documents, ordered=ordered)
+        return len(inserted_rows)
+
+    def find_by_event_ids(
+        self,
+        model_version_id: UUID,
+        event_ids: Iterable[str],
+        projection: Optional[Dict] = None,
+    ) -> List[Dict]:
+        return self._repository.find_by_event_ids(
+            model_version_id, event_ids, projection=projection
+        )
+
+    def bulk_update(self, requests: List[UpdateOne]) -> int:
+        return self._repository.bulk_update(requests)
+
     def count_prediction_by_model_id(self, model_id: str) -> int:
         total_predictions = self._repository.count_prediction_by_model_id(
             model_id)
@@ -0,0 +1,634 @@
+#  Copyright 2022-present, the Waterdip Labs Pvt. Ltd.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+
+from waterdip.core.commons.models import (
+    ColumnDataType,
+    ColumnMappingType,
+    RowStorageFormat,
+)
+from waterdip.server.db.models.models import ModelVersionSchemaInDB
+
+ColumnValue = Union[str, float, int, bool, None]
+
+
+def _to_numeric(value: ColumnValue) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _to_categorical(value: ColumnValue) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def _to_numeric_class(value: ColumnValue) -> str:
+    return str(float(value))
+
+
+# data type -> (row value field, value converter, prediction_cf/actual_cf converter)
+_DATA_TYPE_CONVERTERS: Dict[ColumnDataType, Tuple[str, Callable, Callable]] = {
+    ColumnDataType.NUMERIC: ("value_numeric", _to_numeric, _to_numeric_class),
+    ColumnDataType.CATEGORICAL: ("value_categorical", _to_categorical, str),
+}
+
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    """
+    Conversion details of a single model version schema column, resolved once
+
+    Attributes:
+    ------------------
+    name:
+        name of the column
+    data_type:
+        data type of the column
+    list_index:
+        position of the column in prediction_cf / actual_cf, only for prediction columns
+    value_field:
+        row column field the converted value is stored in
+    convert:
+        converts the logged value to the stored column value
+    convert_class:
+        converts the logged value to the prediction_cf / actual_cf item
+    """
+
+    name: str
+    data_type: ColumnDataType
+    list_index: Optional[int]
+    value_field: str
+    convert: Callable[[ColumnValue], Any]
+    convert_class: Callable[[ColumnValue], str]
+
+    @classmethod
+    def compile(
+        cls, name: str, data_type: ColumnDataType, list_index: Optional[int] = None
+    ) -> "ColumnPlan":
+        if data_type not in _DATA_TYPE_CONVERTERS:
+            raise ValueError(
+                f"Column [{name}] of data type [{data_type.value}] can not be logged"
+            )
+        value_field, convert, convert_class = _DATA_TYPE_CONVERTERS[data_type]
+        return cls(
+            name=name,
+            data_type=data_type,
+            list_index=list_index,
+            value_field=value_field,
+            convert=convert,
+            convert_class=convert_class,
+        )
+
+
+class SchemaPlan:
+    """
+    Precompiled converter table of a model version schema.
+
+    The plan resolves every schema column to its converter once, and then turns
+    logged payloads straight into BSON ready row documents. The documents have the same
+    structure as `BaseClassificationEventRowDB.dict()` and `BaseDatasetBatchRowDB.dict()`,
+    without building any pydantic model per row or per column.
+
+    With the COLUMN_MAP storage format, the `columns` list is replaced by flat
+    `features`, `predictions` and `actuals` maps of column name to converted value.
+
+    Attributes:
+    ------------------
+    features:
+        plan of every feature column, in schema order
+    predictions:
+        plan of every prediction column, in schema order
+    model_id:
+        ID of the model the schema belongs to
+    model_version_id:
+        ID of the model version the schema belongs to
+    event_dataset_id:
+        ID of the event dataset of the model version, resolved on first event log
+    storage_format:
+        storage layout of the produced row documents
+
+    Examples:
+        >>> plan = SchemaPlan.compile(model_version.version_schema)
+        >>> documents, classes = plan.classification_event_documents(
+        >>>     events=events,
+        >>>     timestamps=timestamps,
+        >>>     model_id=model_version.model_id,
+        >>>     model_version_id=model_version.model_version_id,
+        >>>     dataset_id=event_dataset.dataset_id,
+        >>> )
+    """
+
+    def __init__(
+        self,
+        features: Dict[str, ColumnPlan],
+        predictions: Dict[str, ColumnPlan],
+        model_id: Optional[UUID] = None,
+        model_version_id: Optional[UUID] = None,
+        storage_format: RowStorageFormat = RowStorageFormat.COLUMN_LIST,
+    ):
+        self.features = features
+        self.predictions = predictions
+        self.prediction_size = len(predictions)
+        self.model_id = model_id
+        self.model_version_id = model_version_id
+        self.event_dataset_id: Optional[UUID] = None
+        self.storage_format = storage_format
+
+    @classmethod
+    def compile(
+        cls,
+        version_schema: ModelVersionSchemaInDB,
+        model_id: Optional[UUID] = None,
+        model_version_id: Optional[UUID] = None,
+        storage_format: RowStorageFormat = RowStorageFormat.COLUMN_LIST,
+    ) -> "SchemaPlan":
+        return cls(
+            features={
+                name: ColumnPlan.compile(name, details.data_type)
+                for name, details in version_schema.features.items()
+            },
+            predictions={
+                name: ColumnPlan.compile(name, details.data_type, details.list_index)
+                for name, details in version_schema.predictions.items()
+            },
+            model_id=model_id,
+            model_version_id=model_version_id,
+            storage_format=storage_format,
+        )
+
+    def column_map(self) -> Optional[Dict[str, Dict[str, ColumnDataType]]]:
+        """
+        Data types of the row maps for the COLUMN_MAP storage format, as
+        `ModelVersionDB.column_map`. Returns None for the COLUMN_LIST storage format
+        """
+        if self.storage_format != RowStorageFormat.COLUMN_MAP:
+            return None
+        return {
+            "features": {name: c.data_type for name, c in self.features.items()},
+            "predictions": {name: c.data_type for name, c in self.predictions.items()},
+        }
+
+    @staticmethod
+    def _column_plan(
+        plans: Dict[str, ColumnPlan], name: str, mapping_type: ColumnMappingType
+    ) -> ColumnPlan:
+        plan = plans.get(name)
+        if plan is None:
+            raise ValueError(
+                f"{mapping_type.value} column [{name}] is not part of the model version schema"
+            )
+        return plan
+
+    def _event_columns(
+        self,
+        values: Dict[str, ColumnValue],
+        plans: Dict[str, ColumnPlan],
+        mapping_type: ColumnMappingType,
+        columns: List[Dict],
+    ) -> None:
+        mapping = mapping_type.value
+        for name, value in values.items():
+            plan = self._column_plan(plans, name, mapping_type)
+            column = {
+                "name": name,
+                "value_numeric": None,
+                "value_categorical": None,
+                "data_type": plan.data_type.value,
+                "mapping_type": mapping,
+                "column_list_index": None,
+            }
+            column[plan.value_field] = plan.convert(value)
+            columns.append(column)
+
+    def _batch_columns(
+        self,
+        values: Dict[str, ColumnValue],
+        plans: Dict[str, ColumnPlan],
+        mapping_type: ColumnMappingType,
+        columns: List[Dict],
+    ) -> None:
+        mapping = mapping_type.value
+        for name, value in values.items():
+            plan = self._column_plan(plans, name, mapping_type)
+            column = {
+                "name": name,
+                "value_numeric": None,
+                "value_categorical": None,
+                "data_type": plan.data_type.value,
+                "mapping_type": mapping,
+            }
+            column[plan.value_field] = plan.convert(value)
+            columns.append(column)
+
+    def _value_map(
+        self,
+        values: Dict[str, ColumnValue],
+        plans: Dict[str, ColumnPlan],
+        mapping_type: ColumnMappingType,
+    ) -> Dict[str, Any]:
+        value_map = {}
+        for name, value in values.items():
+            value_map[name] = self._column_plan(plans, name, mapping_type).convert(
+                value
+            )
+        return value_map
+
+    def _event_row_columns(self, event) -> Dict:
+        if self.storage_format == RowStorageFormat.COLUMN_MAP:
+            return {
+                "features": self._value_map(
+                    event.features, self.features, ColumnMappingType.FEATURE
+                ),
+                "predictions": self._value_map(
+                    event.predictions, self.predictions, ColumnMappingType.PREDICTION
+                ),
+                "actuals": self._value_map(
+                    event.actuals, self.predictions, ColumnMappingType.ACTUAL
+                )
+                if event.actuals
+                else None,
+            }
+
+        columns: List[Dict] = []
+        self._event_columns(
+            event.features, self.features, ColumnMappingType.FEATURE, columns
+        )
+        self._event_columns(
+            event.predictions, self.predictions, ColumnMappingType.PREDICTION, columns
+        )
+        if event.actuals:
+            self._event_columns(
+                event.actuals, self.predictions, ColumnMappingType.ACTUAL, columns
+            )
+        return {"columns": columns}
+
+    def _batch_row_columns(self, row) -> Dict:
+        if self.storage_format == RowStorageFormat.COLUMN_MAP:
+            return {
+                "features": self._value_map(
+                    row.features, self.features, ColumnMappingType.FEATURE
+                ),
+                "predictions": self._value_map(
+                    row.predictions, self.predictions, ColumnMappingType.PREDICTION
+                ),
+            }
+
+        columns: List[Dict] = []
+        self._batch_columns(
+            row.features, self.features, ColumnMappingType.FEATURE, columns
+        )
+        self._batch_columns(
+            row.predictions, self.predictions, ColumnMappingType.PREDICTION, columns
+        )
+        return {"columns": columns}
+
+    def _classes(
+        self, values: Dict[str, ColumnValue], mapping_type: ColumnMappingType
+    ) -> List[str]:
+        """
+        Builds prediction_cf / actual_cf. Every item is placed at the list index of
+        the prediction column provided by the model version schema, the prediction
+        columns which are not logged are left None
+        """
+        classes: List = [None] * self.prediction_size
+        for name, value in values.items():
+            plan = self._column_plan(self.predictions, name, mapping_type)
+            classes[plan.list_index] = plan.convert_class(value)
+        return classes
+
+    def class_keys(self, values: Iterable[ColumnValue]) -> Dict[int, List[str]]:
+        """
+        Logged prediction values as prediction_cf / actual_cf items, by the list index
+        of every prediction column. Values which can not be converted by a column
+        are skipped for it
+        """
+        keys: Dict[int, List[str]] = {}
+        for plan in self.predictions.values():
+            column_keys: Dict[str, None] = {}
+            for value in values:
+                try:
+                    column_keys[plan.convert_class(value)] = None
+                except (TypeError, ValueError):
+                    continue
+            keys[plan.list_index] = list(column_keys)
+        return keys
+
+    def actual_fields(
+        self, actuals: Dict[str, ColumnValue], prediction_cf: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Event row fields of delayed actuals: actual_cf, is_match and either the
+        `actuals` map of COLUMN_MAP rows or the ACTUAL `columns` of COLUMN_LIST rows
+
+        Parameters
+        ----------
+        actuals:
+            actual value of every prediction column
+        prediction_cf:
+            prediction_cf of the event row
+        """
+        actual_cf = self._classes(actuals, ColumnMappingType.ACTUAL)
+        fields: Dict[str, Any] = {
+            "actual_cf": actual_cf,
+            "is_match": prediction_cf == actual_cf,
+        }
+        if self.storage_format == RowStorageFormat.COLUMN_MAP:
+            fields["actuals"] = self._value_map(
+                actuals, self.predictions, ColumnMappingType.ACTUAL
+            )
+        else:
+            columns: List[Dict] = []
+            self._event_columns(
+                actuals, self.predictions, ColumnMappingType.ACTUAL, columns
+            )
+            fields["columns"] = columns
+        return fields
+
+    def classification_event_documents(
+        self,
+        events: Iterable,
+        timestamps: Iterable[datetime],
+        model_id: UUID,
+        model_version_id: UUID,
+        dataset_id: UUID,
+    ) -> Tuple[List[Dict], List]:
+        """
+        Converts logged classification events to event row documents
+
+        Parameters
+        ----------
+        events:
+            logged events having features, predictions, actuals and event_id attributes
+        timestamps:
+            created_at timestamp of each event, in the same order as events
+        model_id:
+            Model ID of the events
+        model_version_id:
+            Model Version ID of the events
+        dataset_id:
+            ID of the event dataset
+        Returns
+        -------
+        event row documents and all the logged prediction values
+        """
+        model_id, model_version_id = str(model_id), str(model_version_id)
+        dataset_id = str(dataset_id)
+        documents: List[Dict] = []
+        prediction_classes: List = []
+
+        for event, timestamp in zip(events, timestamps):
+            row_columns = self._event_row_columns(event)
+            prediction_cf = self._classes(
+                event.predictions, ColumnMappingType.PREDICTION
+            )
+            prediction_classes.extend(event.predictions.values())
+
+            actual_cf, is_match = None, None
+            if event.actuals:
+                actual_cf = self._classes(event.actuals, ColumnMappingType.ACTUAL)
+                is_match = prediction_cf == actual_cf
+
+            documents.append(
+                {
+                    "row_id": str(uuid.uuid4()),
+                    "dataset_id": dataset_id,
+                    "model_id": model_id,
+                    "model_version_id": model_version_id,
+                    "event_id": str(event.event_id)
+                    if event.event_id
+                    else str(uuid.uuid4()),
+                    **row_columns,
+                    "created_at": timestamp,
+                    "meta": None,
+                    "prediction_cf": prediction_cf,
+                    "actual_cf": actual_cf,
+                    "is_match": is_match,
+                }
+            )
+
+        return documents, prediction_classes
+
+    def batch_row_documents(
+        self,
+        rows: Iterable,
+        model_id: UUID,
+        model_version_id: UUID,
+        dataset_id: UUID,
+        created_at: datetime,
+    ) -> List[Dict]:
+        """
+        Converts logged batch rows to batch row documents
+
+        Parameters
+        ----------
+        rows:
+            logged rows having features and predictions attributes
+        model_id:
+            Model ID of the rows
+        model_version_id:
+            Model Version ID of the rows
+        dataset_id:
+            ID of the batch dataset
+        created_at:
+            creation time of the rows
+        Returns
+        -------
+        batch row documents
+        """
+        model_id, model_version_id = str(model_id), str(model_version_id)
+        dataset_id = str(dataset_id)
+        documents: List[Dict] = []
+
+        for row in rows:
+            row_columns = self._batch_row_columns(row)
+            documents.append(
+                {
+                    "row_id": str(uuid.uuid4()),
+                    "dataset_id": dataset_id,
+                    "model_id": model_id,
+                    "model_version_id": model_version_id,
+                    **row_columns,
+                    "created_at": created_at,
+                    "meta": None,
+                }
+            )
+
+        return documents
+
+    def batch_column_documents(
+        self,
+        columns: Dict[str, List[ColumnValue]],
+        model_id: UUID,
+        model_version_id: UUID,
+        dataset_id: UUID,
+        created_at: datetime,
+    ) -> List[Dict]:
+        """
+        Converts a columnar record batch to batch row documents. Every column is
+        resolved and converted once for all of its values, the rows are then
+        assembled from the converted columns. Columns which are not part of the
+        model version schema are ignored
+
+        Parameters
+        ----------
+        columns:
+            values of the rows by column name, all the lists have the same length
+        Returns
+        -------
+        batch row documents, as built by `batch_row_documents` for the same rows
+        """
+        model_id, model_version_id = str(model_id), str(model_version_id)
+        dataset_id = str(dataset_id)
+        size = len(next(iter(columns.values()), []))
+        converted: List[Tuple[ColumnPlan, ColumnMappingType, List]] = []
+        for name, values in columns.items():
+            for plans, mapping_type in (
+                (self.features, ColumnMappingType.FEATURE),
+                (self.predictions, ColumnMappingType.PREDICTION),
+            ):
+                plan = plans.get(name)
+                if plan is not None:
+                    converted.append(
+                        (plan, mapping_type, [plan.convert(v) for v in values])
+                    )
+                    break
+        # features before predictions, as in the rows of `batch_row_documents`
+        converted.sort(key=lambda column: column[1] != ColumnMappingType.FEATURE)
+
+        if self.storage_format == RowStorageFormat.COLUMN_MAP:
+            row_columns = [{"features": {}, "predictions": {}} for _ in range(size)]
+            for plan, mapping_type, values in converted:
+                field = (
+                    "features"
+                    if mapping_type == ColumnMappingType.FEATURE
+                    else "predictions"
+                )
+                for row, value in zip(row_columns, values):
+                    row[field][plan.name] = value
+        else:
+            row_columns = [{"columns": []} for _ in range(size)]
+            for plan, mapping_type, values in converted:
+                template = {
+                    "name": plan.name,
+                    "value_numeric": None,
+                    "value_categorical": None,
+                    "data_type": plan.data_type.value,
+                    "mapping_type": mapping_type.value,
+                }
+                for row, value in zip(row_columns, values):
+                    row["columns"].append({**template, plan.value_field: value})
+
+        return [
+            {
+                "row_id": str(uuid.uuid4()),
+                "dataset_id": dataset_id,
+                "model_id": model_id,
+                "model_version_id": model_version_id,
+                **row,
+                "created_at": created_at,
+                "meta": None,
+            }
+            for row in row_columns
+        ]
+
+
+class SchemaPlanCache:
+    """
+    Process local LRU cache of compiled schema plans keyed by model version ID.
+
+    Model version schemas are immutable after registration, only the storage format
+    of a model version can change by a row storage migration, which runs in another
+    process. A cached plan is due for a refresh refresh_seconds after it was stored
+    or last refreshed, the callers then re-check its storage format and drop a stale
+    plan through `invalidate`.
+
+    Attributes:
+    ------------------
+    max_size:
+        maximum number of plans kept, the least recently used plan gets evicted first
+    refresh_seconds:
+        seconds after which a cached plan is due for a refresh
+    """
+
+    def __init__(self, max_size: int = 1024, refresh_seconds: float = 30.0):
+        self.max_size = max_size
+        self.refresh_seconds = refresh_seconds
+        self._plans: "OrderedDict[str, SchemaPlan]" = OrderedDict()
+        self._refreshed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+    def get(self, model_version_id: UUID) -> Optional[SchemaPlan]:
+        key = str(model_version_id)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+            return plan
+
+    def claim_refresh(self, model_version_id: UUID) -> bool:
+        """
+        Whether the cached plan is due for a refresh. The refresh is claimed by the
+        caller, the other callers get False until refresh_seconds elapsed again
+        """
+        key = str(model_version_id)
+        now = time.monotonic()
+        with self._lock:
+            refreshed_at = self._refreshed_at.get(key)
+            if refreshed_at is None or now - refreshed_at < self.refresh_seconds:
+                return False
+            self._refreshed_at[key] = now
+            return True
+
+    def put(self, model_version_id: UUID, plan: SchemaPlan) -> None:
+        if self.max_size <= 0:
+            return
+        key = str(model_version_id)
+        with self._lock:
+            self._plans[key] = plan
+            self._refreshed_at[key] = time.monotonic()
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                evicted, _ = self._plans.popitem(last=False)
+                del self._refreshed_at[evicted]
+
+    def invalidate(self, model_version_id: UUID) -> None:
+        with self._lock:
+            self._plans.pop(str(model_version_id), None)
+            self._refreshed_at.pop(str(model_version_id), None)
+
+    def invalidate_model(self, model_id: UUID) -> None:
+        """Drops the plans of all the versions of a model"""
+        model_id = str(model_id)
+        with self._lock:
+            for key in [
+                key
+                for key, plan in self._plans.items()
+                if str(plan.model_id) == model_id
+            ]:
+                del self._plans[key]
+                del self._refreshed_at[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+            self._refreshed_at.clear()